@@ -0,0 +1,54 @@
+"""pytest 公共配置：让测试可以直接导入 scripts/ 下的运维脚本模块，并提供基于黄金库克隆的测试数据库。"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent
+SCRIPTS_DIR = ROOT / "scripts"
+if str(SCRIPTS_DIR) not in sys.path:
+    sys.path.insert(0, str(SCRIPTS_DIR))
+
+import db_snapshot  # noqa: E402
+
+MIGRATIONS_DIR = ROOT / "prisma" / "migrations"
+
+
+@pytest.fixture(scope="session")
+def golden_cache_dir(pytestconfig, tmp_path_factory) -> Path:
+    """黄金库缓存目录：优先放在 .pytest_cache 中跨运行复用，并行 worker 共享同一目录。"""
+    cache = getattr(pytestconfig, "cache", None)
+    if cache is not None:
+        return cache.mkdir("ehs-golden")
+    return tmp_path_factory.getbasetemp().parent / "ehs-golden"
+
+
+@pytest.fixture(scope="session")
+def schema_db(golden_cache_dir) -> Path:
+    """只有表结构的模板库（按顺序执行 prisma/migrations 下的全部迁移），每个会话最多构建一次。"""
+    return db_snapshot.golden_database(golden_cache_dir, test_users=False, migrations_dir=MIGRATIONS_DIR)
+
+
+@pytest.fixture(scope="session")
+def golden_db(golden_cache_dir) -> Path:
+    """迁移 + hazard_lifecycle 测试用户的黄金库，集成测试从这里克隆。"""
+    return db_snapshot.golden_database(golden_cache_dir, migrations_dir=MIGRATIONS_DIR)
+
+
+@pytest.fixture
+def migrated_db(schema_db, tmp_path) -> Path:
+    """与生产结构一致的空 SQLite 数据库（从模板库克隆，不再每个测试重跑迁移）。"""
+    db_file = tmp_path / "ehs.db"
+    db_snapshot.clone_database(schema_db, db_file)
+    return db_file
+
+
+@pytest.fixture
+def snapshot_db(golden_db, tmp_path) -> Path:
+    """黄金库的独立副本，测试结束随 tmp_path 丢弃，可随意写入。"""
+    db_file = tmp_path / "ehs.db"
+    db_snapshot.clone_database(golden_db, db_file)
+    return db_file
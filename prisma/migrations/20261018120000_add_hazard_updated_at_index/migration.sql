@@ -0,0 +1,2 @@
+-- CreateIndex: 隐患分析列存按 updatedAt 水位线增量导出
+CREATE INDEX "HazardRecord_updatedAt_idx" ON "HazardRecord"("updatedAt");
@@ -0,0 +1,35 @@
+-- CreateTable: Dashboard 预聚合计数（ehs-db dashboard refresh 增量维护）
+CREATE TABLE "DashboardCounter" (
+    "metric" TEXT NOT NULL,
+    "departmentId" TEXT NOT NULL DEFAULT '',
+    "period" TEXT NOT NULL DEFAULT '',
+    "status" TEXT NOT NULL DEFAULT '',
+    "level" TEXT NOT NULL DEFAULT '',
+    "count" INTEGER NOT NULL DEFAULT 0,
+    "updatedAt" DATETIME NOT NULL,
+
+    PRIMARY KEY ("metric", "departmentId", "period", "status", "level")
+);
+
+-- CreateTable
+CREATE TABLE "DashboardContribution" (
+    "source" TEXT NOT NULL,
+    "rowId" TEXT NOT NULL,
+    "buckets" TEXT NOT NULL,
+
+    PRIMARY KEY ("source", "rowId")
+);
+
+-- CreateTable
+CREATE TABLE "DashboardWatermark" (
+    "source" TEXT NOT NULL PRIMARY KEY,
+    "watermark" DATETIME,
+    "lastId" TEXT,
+    "updatedAt" DATETIME NOT NULL
+);
+
+-- CreateIndex: 增量刷新沿 (updatedAt, id) 键集分页
+CREATE INDEX "Incident_updatedAt_idx" ON "Incident"("updatedAt");
+
+-- CreateIndex
+CREATE INDEX "TrainingAssignment_updatedAt_idx" ON "TrainingAssignment"("updatedAt");
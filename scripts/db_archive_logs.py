@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 SystemLog 分批归档
+把早于截止时间的 SystemLog 按 (createdAt, rowid) 键集分页读出，写入按月分区的压缩归档文件，
+每批写入并 fsync 后再分小事务删除，事务之间暂停，写锁持有时间不超过预算，
+避免一次性 DELETE 长时间占用写锁、阻塞隐患上报等写操作
+
+归档文件: <归档目录>/systemlog-YYYY-MM.cols.jsonl.gz
+每批是一个独立的 gzip 成员，内容为一行按列存放的 JSON（{"rows": n, "columns": {列名: [值, ...]}}），
+同一列的值相邻，压缩率高于逐行 JSON；中途中断后重跑可能重复写入最后一批，read_partition 按 id 去重
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+DEFAULT_RETENTION_DAYS = 90  # 与 logArchive.service.ts 的数据库保留天数一致
+DEFAULT_BATCH = 2000
+DEFAULT_LOCK_BUDGET_MS = 50.0
+DEFAULT_PAUSE_MS = 100.0
+PROGRESS_INTERVAL_S = 5.0
+PARTITION_SUFFIX = ".cols.jsonl.gz"
+
+
+def archive_dir_for(db_file: Path) -> Path:
+    """data/db/ehs.db -> data/backups/logs/archives（与 logArchive.service.ts 相同的目录）"""
+    return db_file.resolve().parent.parent / "backups" / "logs" / "archives"
+
+
+def cutoff_ms(before: Optional[str] = None, retention_days: int = DEFAULT_RETENTION_DAYS) -> int:
+    """截止时间（Unix 毫秒，Prisma 在 SQLite 中按毫秒整数存储 DateTime）"""
+    if before:
+        moment = datetime.strptime(before, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    else:
+        moment = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    return int(moment.timestamp() * 1000)
+
+
+def partition_month(created_at) -> str:
+    if isinstance(created_at, (int, float)):
+        return datetime.fromtimestamp(created_at / 1000, tz=timezone.utc).strftime("%Y-%m")
+    return str(created_at)[:7]
+
+
+def partition_path(archive_dir: Path, month: str) -> Path:
+    return archive_dir / f"systemlog-{month}{PARTITION_SUFFIX}"
+
+
+def fetch_batch(conn: sqlite3.Connection, cutoff: int, after: Optional[tuple], limit: int):
+    """键集分页：沿 SystemLog_createdAt_idx（隐含 rowid）顺序读取，不用 OFFSET"""
+    if after is None:
+        cursor = conn.execute(
+            'SELECT rowid, * FROM "SystemLog" WHERE "createdAt" < ? ORDER BY "createdAt", rowid LIMIT ?',
+            (cutoff, limit),
+        )
+    else:
+        cursor = conn.execute(
+            'SELECT rowid, * FROM "SystemLog" WHERE "createdAt" < ? AND ("createdAt", rowid) > (?, ?) '
+            'ORDER BY "createdAt", rowid LIMIT ?',
+            (cutoff, after[0], after[1], limit),
+        )
+    columns = [d[0] for d in cursor.description][1:]
+    return columns, cursor.fetchall()
+
+
+def write_row_group(path: Path, columns: list[str], rows: list[tuple]) -> int:
+    """追加一个 gzip 成员并 fsync，返回写入的压缩字节数"""
+    group = {"rows": len(rows), "columns": {name: [row[i] for row in rows] for i, name in enumerate(columns)}}
+    data = gzip.compress((json.dumps(group, ensure_ascii=False) + "\n").encode("utf-8"))
+    with open(path, "ab") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data)
+
+
+def read_partition(path: Path) -> Iterator[dict]:
+    """按行读出归档分区，重复写入的记录按 id 去重"""
+    seen = set()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            group = json.loads(line)
+            names = list(group["columns"])
+            for values in zip(*group["columns"].values()):
+                row = dict(zip(names, values))
+                if row.get("id") in seen:
+                    continue
+                seen.add(row.get("id"))
+                yield row
+
+
+def delete_rows(
+    conn: sqlite3.Connection,
+    rowids: list[int],
+    chunk: int,
+    lock_budget_ms: float,
+    pause_ms: float,
+    report: dict,
+) -> int:
+    """
+    分小事务删除：每个 BEGIN IMMEDIATE 删除 chunk 行，
+    按上一次的每行耗时调整下一次的行数，使写锁持有时间保持在预算的一半左右；返回调整后的 chunk
+    """
+    pos = 0
+    while pos < len(rowids):
+        part = rowids[pos:pos + chunk]
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            f'DELETE FROM "SystemLog" WHERE rowid IN ({", ".join("?" for _ in part)})', part
+        )
+        conn.execute("COMMIT")
+        held_ms = (time.perf_counter() - start) * 1000
+        report["lock_ms"].append(held_ms)
+        if held_ms > lock_budget_ms:
+            report["over_budget"] += 1
+        report["deleted"] += len(part)
+        pos += len(part)
+
+        per_row = held_ms / len(part)
+        if per_row > 0:
+            chunk = max(1, min(int(lock_budget_ms / 2 / per_row), chunk * 4, 999))
+        if pos < len(rowids):
+            time.sleep(pause_ms / 1000)
+    return chunk
+
+
+@traced("db.archive_logs")
+def archive_logs(
+    db_file: Path,
+    archive_dir: Path,
+    cutoff: int,
+    batch: int = DEFAULT_BATCH,
+    lock_budget_ms: float = DEFAULT_LOCK_BUDGET_MS,
+    pause_ms: float = DEFAULT_PAUSE_MS,
+    delete: bool = True,
+) -> dict:
+    """归档早于 cutoff 的 SystemLog，返回行数、分区文件、写锁耗时与速率"""
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    report: dict = {
+        "db": str(db_file),
+        "cutoff": datetime.fromtimestamp(cutoff / 1000, tz=timezone.utc).isoformat(),
+        "archived": 0,
+        "deleted": 0,
+        "bytes": 0,
+        "partitions": defaultdict(int),
+        "lock_ms": [],
+        "over_budget": 0,
+        "lock_budget_ms": lock_budget_ms,
+    }
+    started = last_progress = time.perf_counter()
+    chunk = 64
+    after = None
+    with closing(connect(db_file)) as conn:
+        while True:
+            columns, rows = fetch_batch(conn, cutoff, after, batch)
+            if not rows:
+                break
+            created_index = columns.index("createdAt")
+            by_month: dict[str, list[tuple]] = defaultdict(list)
+            for row in rows:
+                by_month[partition_month(row[created_index + 1])].append(row[1:])
+            for month, month_rows in by_month.items():
+                report["bytes"] += write_row_group(partition_path(archive_dir, month), columns, month_rows)
+                report["partitions"][month] += len(month_rows)
+            report["archived"] += len(rows)
+            after = (rows[-1][created_index + 1], rows[-1][0])
+
+            if delete:
+                chunk = delete_rows(conn, [row[0] for row in rows], chunk, lock_budget_ms, pause_ms, report)
+
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL_S:
+                last_progress = now
+                print(f"   ... 已归档 {report['archived']} 行（{report['archived'] / (now - started):,.0f} 行/秒）")
+
+        if delete and report["deleted"]:
+            # PASSIVE 不等待读者，不会阻塞应用
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+    report["duration"] = time.perf_counter() - started
+    report["rows_per_sec"] = report["archived"] / report["duration"] if report["duration"] else 0.0
+    report["partitions"] = dict(sorted(report["partitions"].items()))
+    annotate(rows=report["archived"], bytes=report["bytes"])
+    return report
+
+
+def print_archive_report(report: dict, archive_dir: Path):
+    print(f"\n🗄️  SystemLog 归档: {report['db']}")
+    print(f"   截止时间: {report['cutoff']}")
+    if not report["archived"]:
+        print("   ✓ 没有需要归档的日志")
+        return
+    print(f"   归档 {report['archived']} 行，删除 {report['deleted']} 行，耗时 {report['duration']:.2f}s"
+          f"（{report['rows_per_sec']:,.0f} 行/秒）")
+    print(f"   压缩后 {report['bytes'] / 1024:.1f}KB → {archive_dir}")
+    for month, count in report["partitions"].items():
+        print(f"      {month}: {count} 行")
+    if report["lock_ms"]:
+        lock_ms = report["lock_ms"]
+        print(f"   写锁持有: {len(lock_ms)} 次，平均 {sum(lock_ms) / len(lock_ms):.1f}ms，"
+              f"最长 {max(lock_ms):.1f}ms（预算 {report['lock_budget_ms']:.0f}ms）")
+        if report["over_budget"]:
+            print(f"   ⚠️  {report['over_budget']} 次删除超出写锁预算")
+        print("   💡 删除释放的空间可通过 ehs-db maintain 回收")
+
+
+def run(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return 1
+    archive_dir = Path(args.out) if args.out else archive_dir_for(db_file)
+    try:
+        cutoff = cutoff_ms(args.before, args.retention_days)
+    except ValueError:
+        print(f"❌ 日期格式应为 YYYY-MM-DD: {args.before}")
+        return 1
+    report = archive_logs(
+        db_file,
+        archive_dir,
+        cutoff,
+        batch=args.batch,
+        lock_budget_ms=args.lock_budget_ms,
+        pause_ms=args.pause_ms,
+        delete=not args.no_delete,
+    )
+    print_archive_report(report, archive_dir)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db archive-logs 子命令"""
+    parser = subparsers.add_parser("archive-logs", help="分批归档并删除过期的 SystemLog，写锁时间受预算限制")
+    parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    parser.add_argument("--out", type=str, help="归档目录 (默认: data/backups/logs/archives)")
+    parser.add_argument("--before", type=str, help="归档该日期 (YYYY-MM-DD, UTC) 之前的日志")
+    parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=DEFAULT_RETENTION_DAYS,
+        help=f"未指定 --before 时保留最近多少天 (默认: {DEFAULT_RETENTION_DAYS})"
+    )
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help=f"每批读取行数 (默认: {DEFAULT_BATCH})")
+    parser.add_argument(
+        "--lock-budget-ms",
+        type=float,
+        default=DEFAULT_LOCK_BUDGET_MS,
+        help=f"单次删除事务的写锁时间预算 (默认: {DEFAULT_LOCK_BUDGET_MS:.0f})"
+    )
+    parser.add_argument(
+        "--pause-ms",
+        type=float,
+        default=DEFAULT_PAUSE_MS,
+        help=f"删除事务之间的暂停时间 (默认: {DEFAULT_PAUSE_MS:.0f})"
+    )
+    parser.add_argument("--no-delete", action="store_true", help="只导出归档文件，不删除数据库中的记录")
+    parser.set_defaults(func=run)
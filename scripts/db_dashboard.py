@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 Dashboard 预聚合
+Dashboard 的统计每次请求都扫描 HazardRecord、Incident、TrainingAssignment，记录积累几年后越来越慢。
+这里把计数维护在 DashboardCounter 中，Dashboard 只读取计数桶（行数与桶数有关，与记录数无关）：
+- refresh: 按 (updatedAt, id) 水位线只处理上次之后变更的行；DashboardContribution 记着每行当前计入的桶，
+  变更时先减旧桶再加新桶，每批在一个短事务里连同水位线一起提交，中断后重跑不会重复计数。
+  计数行数与源表行数不一致时（有硬删除）再做一次反连接，扣掉已删除的行
+- show: 只读计数桶，输出本月隐患、逾期整改、事故与培训完成率
+
+计数桶 (metric, departmentId, period, status, level)：
+  hazard                 整改部门 × 上报月份 × status × riskLevel（不含已作废）
+  hazard_open_deadline   整改部门 × 整改期限日期 × riskLevel，只计未闭环的隐患；
+                         逾期数随时间变化，读取时对期限早于今天的桶求和，不需要每天重算
+  incident               责任部门 × 发生月份 × status × severity
+  training               学员所在部门 × 分配月份 × completed/incomplete（isPassed）
+月份与日期按 UTC 计算；学员调换部门不会改变已有分配的归属，--full 重建时按当前部门重新归集
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import time
+from collections import Counter, defaultdict
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from db_hazard_analytics import SAFETY_LAG_MS, month_of
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+REFRESH_BATCH = 1000
+CLOSED_STATUSES = {"closed"}
+COUNTER_COLUMNS = ("metric", "departmentId", "period", "status", "level")
+
+
+def day_of(value) -> str:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+def _hazard_buckets(row: dict) -> list[tuple]:
+    if row["isVoided"]:
+        return []
+    dept = row["rectificationDeptId"] or ""
+    buckets = [("hazard", dept, month_of(row["reportTime"]), row["status"] or "", row["riskLevel"] or "")]
+    if row["deadline"] is not None and row["status"] not in CLOSED_STATUSES:
+        buckets.append(("hazard_open_deadline", dept, day_of(row["deadline"]), "", row["riskLevel"] or ""))
+    return buckets
+
+
+def _incident_buckets(row: dict) -> list[tuple]:
+    return [("incident", row["departmentId"] or "", month_of(row["occurredAt"]), row["status"] or "",
+             row["severity"] or "")]
+
+
+def _training_buckets(row: dict) -> list[tuple]:
+    status = "completed" if row["isPassed"] else "incomplete"
+    return [("training", row["departmentId"] or "", month_of(row["createdAt"]), status, "")]
+
+
+# source -> (FROM 子句, 读取的列, 计数桶函数)；FROM 子句中源表别名固定为 t
+SOURCES: dict[str, tuple[str, tuple[str, ...], Callable[[dict], list[tuple]]]] = {
+    "HazardRecord": (
+        '"HazardRecord" t',
+        ('t."status"', 't."riskLevel"', 't."rectificationDeptId"', 't."reportTime"', 't."deadline"', 't."isVoided"'),
+        _hazard_buckets,
+    ),
+    "Incident": (
+        '"Incident" t',
+        ('t."status"', 't."severity"', 't."departmentId"', 't."occurredAt"'),
+        _incident_buckets,
+    ),
+    "TrainingAssignment": (
+        '"TrainingAssignment" t LEFT JOIN "User" u ON u."id" = t."userId"',
+        ('t."isPassed"', 't."createdAt"', 'u."departmentId"'),
+        _training_buckets,
+    ),
+}
+
+
+def fetch_changes(conn: sqlite3.Connection, source: str, after: Optional[tuple], upper: int, limit: int) -> list[dict]:
+    """沿 <表>_updatedAt_idx 按 (updatedAt, id) 键集分页"""
+    from_clause, columns, _ = SOURCES[source]
+    select = f'SELECT t."id", t."updatedAt", {", ".join(columns)} FROM {from_clause} WHERE t."updatedAt" <= ?'
+    params: list = [upper]
+    if after is not None:
+        select += ' AND (t."updatedAt", t."id") > (?, ?)'
+        params += list(after)
+    cursor = conn.execute(select + ' ORDER BY t."updatedAt", t."id" LIMIT ?', params + [limit])
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+def _old_buckets(conn: sqlite3.Connection, source: str, row_ids: list[str]) -> dict[str, list[tuple]]:
+    placeholders = ", ".join("?" for _ in row_ids)
+    rows = conn.execute(
+        f'SELECT "rowId", "buckets" FROM "DashboardContribution" WHERE "source" = ? AND "rowId" IN ({placeholders})',
+        [source, *row_ids],
+    )
+    return {row_id: [tuple(b) for b in json.loads(buckets)] for row_id, buckets in rows}
+
+
+def apply_delta(conn: sqlite3.Connection, delta: Counter, now_ms: int) -> int:
+    """把计数增量写入 DashboardCounter，归零的桶直接删除；返回改动的桶数"""
+    changes = [(*bucket, count) for bucket, count in delta.items() if count]
+    if not changes:
+        return 0
+    conn.executemany(
+        'INSERT INTO "DashboardCounter" ("metric", "departmentId", "period", "status", "level", "count", "updatedAt") '
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        'ON CONFLICT ("metric", "departmentId", "period", "status", "level") '
+        'DO UPDATE SET "count" = "count" + excluded."count", "updatedAt" = excluded."updatedAt"',
+        [(*change, now_ms) for change in changes],
+    )
+    conn.executemany(
+        'DELETE FROM "DashboardCounter" WHERE "metric" = ? AND "departmentId" = ? AND "period" = ? '
+        'AND "status" = ? AND "level" = ? AND "count" <= 0',
+        [change[:5] for change in changes if change[5] < 0],
+    )
+    return len(changes)
+
+
+def _save_watermark(conn: sqlite3.Connection, source: str, after: Optional[tuple], now_ms: int):
+    conn.execute(
+        'INSERT INTO "DashboardWatermark" ("source", "watermark", "lastId", "updatedAt") VALUES (?, ?, ?, ?) '
+        'ON CONFLICT ("source") DO UPDATE SET "watermark" = excluded."watermark", "lastId" = excluded."lastId", '
+        '"updatedAt" = excluded."updatedAt"',
+        (source, after[0] if after else None, after[1] if after else None, now_ms),
+    )
+
+
+def refresh_source(conn: sqlite3.Connection, source: str, upper: int, batch: int, now_ms: int) -> dict:
+    """处理一个源表水位线之后的变更，再扣除已硬删除的行"""
+    bucket_fn = SOURCES[source][2]
+    state = conn.execute(
+        'SELECT "watermark", "lastId" FROM "DashboardWatermark" WHERE "source" = ?', (source,)
+    ).fetchone()
+    after = tuple(state) if state and state[0] is not None else None
+    stats = {"changed": 0, "deleted": 0, "buckets": 0}
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = fetch_changes(conn, source, after, upper, batch)
+            if not rows:
+                conn.execute("COMMIT")
+                break
+            old = _old_buckets(conn, source, [row["id"] for row in rows])
+            delta: Counter = Counter()
+            contributions = []
+            for row in rows:
+                new = bucket_fn(row)
+                delta.subtract(old.get(row["id"], ()))
+                delta.update(new)
+                contributions.append((source, row["id"], json.dumps(new, ensure_ascii=False)))
+            stats["buckets"] += apply_delta(conn, delta, now_ms)
+            conn.executemany(
+                'INSERT OR REPLACE INTO "DashboardContribution" ("source", "rowId", "buckets") VALUES (?, ?, ?)',
+                contributions,
+            )
+            after = (rows[-1]["updatedAt"], rows[-1]["id"])
+            _save_watermark(conn, source, after, now_ms)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        stats["changed"] += len(rows)
+    stats["deleted"] = sweep_deleted(conn, source, now_ms)
+    stats["watermark"] = after[0] if after else None
+    return stats
+
+
+def sweep_deleted(conn: sqlite3.Connection, source: str, now_ms: int) -> int:
+    """两边行数相同时跳过（只需两次 COUNT）；否则反连接找出源表中已不存在的行并扣除其计数"""
+    contributed = conn.execute(
+        'SELECT COUNT(*) FROM "DashboardContribution" WHERE "source" = ?', (source,)
+    ).fetchone()[0]
+    if contributed <= conn.execute(f'SELECT COUNT(*) FROM "{source}"').fetchone()[0]:
+        return 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        gone = conn.execute(
+            f'SELECT c."rowId", c."buckets" FROM "DashboardContribution" c WHERE c."source" = ? '
+            f'AND NOT EXISTS (SELECT 1 FROM "{source}" t WHERE t."id" = c."rowId")',
+            (source,),
+        ).fetchall()
+        delta: Counter = Counter()
+        for _, buckets in gone:
+            delta.subtract(tuple(b) for b in json.loads(buckets))
+        apply_delta(conn, delta, now_ms)
+        conn.executemany(
+            'DELETE FROM "DashboardContribution" WHERE "source" = ? AND "rowId" = ?',
+            [(source, row_id) for row_id, _ in gone],
+        )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return len(gone)
+
+
+@traced("db.dashboard.refresh")
+def refresh(
+    db_file: Path,
+    full: bool = False,
+    batch: int = REFRESH_BATCH,
+    sources: Optional[Iterable[str]] = None,
+    now_ms: Optional[int] = None,
+) -> dict:
+    """增量刷新各源表的计数，返回每个源处理的行数与耗时"""
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    upper = now_ms - SAFETY_LAG_MS
+    sources = list(sources or SOURCES)
+    report: dict = {"db": str(db_file), "full": full, "sources": {}}
+    started = time.perf_counter()
+    with closing(connect(db_file)) as conn:
+        if full:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('DELETE FROM "DashboardCounter"')
+            conn.execute('DELETE FROM "DashboardContribution"')
+            conn.execute('DELETE FROM "DashboardWatermark"')
+            conn.execute("COMMIT")
+            sources = list(SOURCES)
+        for source in sources:
+            source_started = time.perf_counter()
+            stats = refresh_source(conn, source, upper, batch, now_ms)
+            stats["duration"] = time.perf_counter() - source_started
+            report["sources"][source] = stats
+        report["counters"] = conn.execute('SELECT COUNT(*) FROM "DashboardCounter"').fetchone()[0]
+    report["duration"] = time.perf_counter() - started
+    annotate(rows=sum(s["changed"] for s in report["sources"].values()), counters=report["counters"])
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 读取
+# ---------------------------------------------------------------------------
+
+def read_counters(conn: sqlite3.Connection, metric: str, **filters) -> list[dict]:
+    """读取一个指标的计数桶（走 DashboardCounter 主键前缀），filters 按列等值过滤"""
+    sql = 'SELECT "departmentId", "period", "status", "level", "count" FROM "DashboardCounter" WHERE "metric" = ?'
+    params: list = [metric]
+    for name, value in filters.items():
+        sql += f' AND "{name}" = ?'
+        params.append(value)
+    cursor = conn.execute(sql, params)
+    return [dict(zip(COUNTER_COLUMNS[1:] + ("count",), row)) for row in cursor]
+
+
+def dashboard_summary(conn: sqlite3.Connection, today: Optional[str] = None) -> dict:
+    """Dashboard 需要的统计，全部只读计数桶"""
+    today = today or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    month = today[:7]
+    by_status: Counter = Counter()
+    by_level: Counter = Counter()
+    for bucket in read_counters(conn, "hazard", period=month):
+        by_status[bucket["status"]] += bucket["count"]
+        by_level[bucket["level"]] += bucket["count"]
+    overdue: Counter = Counter()
+    open_by_level: Counter = Counter()
+    for bucket in read_counters(conn, "hazard_open_deadline"):
+        open_by_level[bucket["level"]] += bucket["count"]
+        if bucket["period"] < today:
+            overdue[bucket["departmentId"]] += bucket["count"]
+    training: dict = defaultdict(lambda: {"completed": 0, "total": 0})
+    for bucket in read_counters(conn, "training"):
+        entry = training[bucket["departmentId"]]
+        entry["total"] += bucket["count"]
+        if bucket["status"] == "completed":
+            entry["completed"] += bucket["count"]
+    incidents: Counter = Counter()
+    for bucket in read_counters(conn, "incident"):
+        incidents[bucket["period"]] += bucket["count"]
+    return {
+        "today": today,
+        "hazards_this_month": sum(by_status.values()),
+        "hazards_this_month_by_status": dict(by_status),
+        "hazards_this_month_by_level": dict(by_level),
+        "overdue_total": sum(overdue.values()),
+        "overdue_by_department": dict(overdue),
+        "open_with_deadline_by_level": dict(open_by_level),
+        "training_by_department": {dept: dict(entry) for dept, entry in training.items()},
+        "incidents_by_month": dict(sorted(incidents.items())),
+    }
+
+
+def department_names(conn: sqlite3.Connection) -> dict[str, str]:
+    return {row[0]: row[1] for row in conn.execute('SELECT "id", "name" FROM "Department"')}
+
+
+def print_refresh_report(report: dict):
+    print(f"\n📊 Dashboard 预聚合{'全量重建' if report['full'] else '增量刷新'}: {report['db']}")
+    for source, stats in report["sources"].items():
+        watermark = (datetime.fromtimestamp(stats["watermark"] / 1000).strftime("%Y-%m-%d %H:%M:%S")
+                     if isinstance(stats["watermark"], (int, float)) else "-")
+        line = f"   {source:<20}变更 {stats['changed']:>7} 行，改动计数桶 {stats['buckets']:>6}，水位线 {watermark}"
+        if stats["deleted"]:
+            line += f"，扣除已删除 {stats['deleted']} 行"
+        print(line)
+    print(f"   计数桶 {report['counters']} 个，耗时 {report['duration']:.2f}s")
+
+
+def print_summary(summary: dict, names: dict[str, str]):
+    def dept(dept_id: str) -> str:
+        return names.get(dept_id, dept_id) or "（未指定部门）"
+
+    print(f"\n📈 Dashboard 统计（{summary['today']}，来自预聚合计数）")
+    print(f"   本月隐患: {summary['hazards_this_month']}")
+    for status, count in sorted(summary["hazards_this_month_by_status"].items()):
+        print(f"      {status or '-':<16}{count:>8}")
+    print(f"   逾期未整改: {summary['overdue_total']}")
+    for dept_id, count in sorted(summary["overdue_by_department"].items(), key=lambda item: -item[1]):
+        print(f"      {dept(dept_id):<16}{count:>8}")
+    if summary["training_by_department"]:
+        print("   培训完成率:")
+        for dept_id, entry in sorted(summary["training_by_department"].items(), key=lambda item: dept(item[0])):
+            rate = entry["completed"] / entry["total"] * 100 if entry["total"] else 0.0
+            print(f"      {dept(dept_id):<16}{entry['completed']:>6}/{entry['total']:<6}{rate:>6.1f}%")
+    if summary["incidents_by_month"]:
+        print("   事故（按月）:")
+        for month, count in list(summary["incidents_by_month"].items())[-12:]:
+            print(f"      {month:<16}{count:>8}")
+
+
+def _database(args: argparse.Namespace) -> Optional[Path]:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return None
+    return db_file
+
+
+def run_refresh(args: argparse.Namespace) -> int:
+    db_file = _database(args)
+    if db_file is None:
+        return 1
+    print_refresh_report(refresh(db_file, full=args.full, batch=args.batch))
+    return 0
+
+
+def run_show(args: argparse.Namespace) -> int:
+    db_file = _database(args)
+    if db_file is None:
+        return 1
+    with closing(connect(db_file)) as conn:
+        summary = dashboard_summary(conn, args.today)
+        names = department_names(conn)
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary, names)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db dashboard 子命令"""
+    parser = subparsers.add_parser("dashboard", help="Dashboard 预聚合计数：按水位线增量刷新与只读统计")
+    commands = parser.add_subparsers(dest="dashboard_command", help="命令")
+
+    refresh_parser = commands.add_parser("refresh", help="只处理水位线之后变更的行，更新 DashboardCounter")
+    refresh_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    refresh_parser.add_argument("--full", action="store_true", help="清空计数并全量重建（同步学员部门调整）")
+    refresh_parser.add_argument("--batch", type=int, default=REFRESH_BATCH, help=f"每个事务处理的行数 (默认: {REFRESH_BATCH})")
+    refresh_parser.set_defaults(func=run_refresh)
+
+    show_parser = commands.add_parser("show", help="只读计数桶输出 Dashboard 统计")
+    show_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    show_parser.add_argument("--today", type=str, help="以该日期 (YYYY-MM-DD, UTC) 计算本月与逾期")
+    show_parser.add_argument("--json", action="store_true", help="输出 JSON")
+    show_parser.set_defaults(func=run_show)
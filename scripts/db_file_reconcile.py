@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+EHS 系统存储孤儿文件对账
+cleanup-orphan-files.js 先把引用读进内存，再对每个对象单独 statObject，几十万对象时要跑几个小时。
+这里把三路有序流做一次归并连接（merge-join），内存占用与对象数量无关：
+- 存储：MinIO 数据目录（data/minio-data/ehs-private、ehs-public）与 public/uploads，
+  并行 os.scandir 预读子目录，按完整对象键的字典序逐个产出
+- 引用：FileMetadata、ArchiveFile 等表中的文件路径，按 storage.ts parseFileRecordFromDb 的规则
+  解析成 (存储, 对象键)，由 SQLite 排序（超出缓存时落盘的外部排序）后流式读出
+- FileDeletionQueue 中仍在 pending/retrying 的记录，避免重复入队
+
+报告孤儿对象（有对象无引用）、悬空引用（有引用无对象）与可回收字节数；
+指定 --enqueue 时把 MinIO 中的孤儿对象分批写入 FileDeletionQueue，由 cleanup-zombie-thumbnails.js 执行删除。
+public/uploads 中的孤儿文件只报告，不入队（队列只服务 MinIO）
+"""
+
+from __future__ import annotations
+
+import argparse
+import heapq
+import itertools
+import json
+import os
+import secrets
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+MINIO_BUCKETS = {"private": "ehs-private", "public": "ehs-public"}  # 与 minio.ts 的 BUCKETS 一致
+UPLOADS_STORE = "uploads"
+MINIO_META_FILE = "xl.meta"  # MinIO 单盘 (xl-single) 格式下每个对象是一个目录
+MINIO_SYSTEM_DIR = ".minio.sys"
+DEFAULT_MIN_AGE_HOURS = 24.0  # 与 cleanup-orphan-files.js 的 TEMP_FILE_EXPIRY_HOURS 一致，给未提交的表单留时间
+DEFAULT_BATCH = 500
+DEFAULT_WORKERS = 8
+DEFAULT_SHOW = 20
+
+# (表, 列, 是否检查悬空引用)；其余列只用于保护被引用的对象，不报告悬空
+REFERENCE_COLUMNS = [
+    ("FileMetadata", "filePath", True),
+    ("ArchiveFile", "filePath", True),
+    ("TrainingMaterial", "url", False),
+    ("TrainingMaterial", "convertedUrl", False),
+    ("TrainingMaterial", "thumbnail", False),
+    ("Document", "docxPath", False),
+    ("Document", "pdfPath", False),
+    ("User", "avatar", False),
+]
+
+OBJECT, REFERENCE, QUEUED = 0, 1, 2
+
+
+def parse_file_record(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """
+    数据库文件记录 -> (存储, 对象键)，与 parseFileRecordFromDb 相同：
+    JSON {"bucket","key"}、"private:key"/"public:key"，其余默认是 public bucket 的键；
+    旧格式 "/uploads/..." 是 public/uploads 下的本地文件（同时保护 public bucket 中的同名对象，见 reference_rows）
+    """
+    if not value:
+        return None
+    if value.startswith("{"):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            parsed = None
+        if isinstance(parsed, dict) and parsed.get("bucket") and parsed.get("key"):
+            return str(parsed["bucket"]), str(parsed["key"])
+    bucket, sep, key = value.partition(":")
+    if sep and bucket in MINIO_BUCKETS:
+        return bucket, key
+    if value.startswith("/uploads/"):
+        return UPLOADS_STORE, value[len("/uploads/"):]
+    return "public", value
+
+
+# ==================== 存储端：按键有序的目录遍历 ====================
+
+def _list_dir(path: str) -> list[tuple[str, str, int, int, int]]:
+    """
+    列出一个目录，返回按排序名排好的 (排序名, 名称, 类型, 字节数, mtime_ns)；类型 0 文件 1 对象目录 2 普通目录。
+    普通目录的排序名是 "名称/"，这样深度优先遍历产出的完整键整体有序（"a-b" < "a/b"）
+    """
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name == MINIO_SYSTEM_DIR:
+                            continue
+                        if os.path.exists(os.path.join(entry.path, MINIO_META_FILE)):
+                            size, mtime = _object_dir_stat(entry.path)
+                            entries.append((entry.name, entry.name, 1, size, mtime))
+                        else:
+                            entries.append((entry.name + "/", entry.name, 2, 0, 0))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        entries.append((entry.name, entry.name, 0, stat.st_size, stat.st_mtime_ns))
+                except OSError:
+                    continue
+    except OSError:
+        return []
+    entries.sort()
+    return entries
+
+
+def _object_dir_stat(path: str) -> tuple[int, int]:
+    """MinIO 对象目录占用的磁盘字节数（xl.meta 与数据分片之和）与 xl.meta 的修改时间"""
+    size = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    try:
+        mtime = os.stat(os.path.join(path, MINIO_META_FILE)).st_mtime_ns
+    except OSError:
+        mtime = 0
+    return size, mtime
+
+
+def walk_sorted(root: Path, workers: int = DEFAULT_WORKERS) -> Iterator[tuple[str, int, int]]:
+    """
+    按对象键字典序产出 root 下的 (键, 字节数, mtime_ns)。
+    每进入一个目录就把其后最多 workers 个子目录的 scandir 交给线程池预读，
+    同时在途的目录列表数量受 workers × 目录深度限制
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        yield from _walk(pool, workers, str(root), "", pool.submit(_list_dir, str(root)))
+
+
+def _walk(pool: ThreadPoolExecutor, window: int, path: str, prefix: str, listing: Future):
+    entries = listing.result()
+    subdirs = [entry for entry in entries if entry[2] == 2]
+    futures: dict[str, Future] = {}
+    submitted = 0
+    seen = 0
+    for sort_name, name, kind, size, mtime in entries:
+        if kind != 2:
+            yield prefix + name, size, mtime
+            continue
+        while submitted < len(subdirs) and submitted <= seen + window:
+            sub = subdirs[submitted][1]
+            futures[sub] = pool.submit(_list_dir, os.path.join(path, sub))
+            submitted += 1
+        seen += 1
+        yield from _walk(pool, window, os.path.join(path, name), prefix + name + "/", futures.pop(name))
+
+
+def storage_stores(minio_data: Optional[Path], uploads_dir: Optional[Path]) -> dict[str, Path]:
+    """存在的存储根目录（存储名 -> 目录），按存储名排序以便与引用流归并"""
+    stores = {}
+    if minio_data is not None:
+        for store, bucket in MINIO_BUCKETS.items():
+            if (minio_data / bucket).is_dir():
+                stores[store] = minio_data / bucket
+    if uploads_dir is not None and uploads_dir.is_dir():
+        stores[UPLOADS_STORE] = uploads_dir
+    return dict(sorted(stores.items()))
+
+
+def object_rows(stores: dict[str, Path], workers: int) -> Iterator[tuple]:
+    for store, root in stores.items():
+        for key, size, mtime in walk_sorted(root, workers):
+            yield (store, key), OBJECT, (size, mtime)
+
+
+# ==================== 数据库端：有序的引用与删除队列 ====================
+
+def _store_of(value):
+    parsed = parse_file_record(value)
+    return parsed[0] if parsed else None
+
+
+def _key_of(value):
+    parsed = parse_file_record(value)
+    return parsed[1] if parsed else None
+
+
+def reference_rows(conn: sqlite3.Connection) -> Iterator[tuple]:
+    """所有引用按 (存储, 键) 排序后逐行产出 ((存储, 键), REFERENCE, (表, id, 是否检查悬空))"""
+    conn.create_function("ehs_store", 1, _store_of, deterministic=True)
+    conn.create_function("ehs_key", 1, _key_of, deterministic=True)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    selects = []
+    for table, column, checked in REFERENCE_COLUMNS:
+        if table not in tables:
+            continue
+        columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        if column not in columns:
+            continue
+        source = f'FROM "{table}" WHERE "{column}" IS NOT NULL AND "{column}" <> \'\''
+        selects.append(
+            f'SELECT ehs_store("{column}") AS store, ehs_key("{column}") AS key, '
+            f"'{table}' AS tbl, id, {int(checked)} AS checked {source}"
+        )
+        selects.append(
+            f"SELECT 'public', substr(\"{column}\", {len('/uploads/') + 1}), '{table}', id, 0 "
+            f"{source} AND substr(\"{column}\", 1, {len('/uploads/')}) = '/uploads/'"
+        )
+    if not selects:
+        return
+    sql = " UNION ALL ".join(selects) + " ORDER BY store, key"
+    for store, key, table, row_id, checked in conn.execute(sql):
+        if store is not None:
+            yield (store, key), REFERENCE, (table, row_id, bool(checked))
+
+
+def queued_rows(conn: sqlite3.Connection) -> Iterator[tuple]:
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    if "FileDeletionQueue" not in tables:
+        return
+    sql = (
+        'SELECT "bucket", "objectName" FROM "FileDeletionQueue" '
+        "WHERE \"status\" IN ('pending', 'retrying') ORDER BY 1, 2"
+    )
+    for bucket, key in conn.execute(sql):
+        yield (bucket, key), QUEUED, None
+
+
+def merge_join(*streams: Iterable[tuple]) -> Iterator[tuple[tuple[str, str], list[tuple]]]:
+    """把各自按 (存储, 键) 有序的流归并，同一个键的所有行一起产出"""
+    merged = heapq.merge(*streams, key=lambda row: (row[0], row[1]))
+    for store_key, group in itertools.groupby(merged, key=lambda row: row[0]):
+        yield store_key, list(group)
+
+
+# ==================== 对账 ====================
+
+def _new_store_stats() -> dict:
+    return {"objects": 0, "bytes": 0, "referenced": 0, "orphans": 0, "orphan_bytes": 0,
+            "young": 0, "queued": 0, "dangling": 0}
+
+
+@traced("files.reconcile")
+def reconcile(
+    db_file: Path,
+    minio_data: Optional[Path] = None,
+    uploads_dir: Optional[Path] = None,
+    min_age_hours: float = DEFAULT_MIN_AGE_HOURS,
+    enqueue: bool = False,
+    batch: int = DEFAULT_BATCH,
+    workers: int = DEFAULT_WORKERS,
+    show: int = DEFAULT_SHOW,
+    now_ms: Optional[int] = None,
+) -> dict:
+    """一次归并完成对账，返回各存储的统计、样例与入队数量"""
+    started = time.perf_counter()
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    min_age_ns = int(min_age_hours * 3600 * 1e9)
+    now_ns = now_ms * 1_000_000
+    stores = storage_stores(minio_data, uploads_dir)
+    stats = {store: _new_store_stats() for store in stores}
+    report: dict = {
+        "db": str(db_file),
+        "stores": {store: str(root) for store, root in stores.items()},
+        "orphan_samples": [],
+        "dangling_samples": [],
+        "dangling_by_table": defaultdict(int),
+        "enqueued": 0,
+        "skipped_referenced": 0,
+    }
+
+    with closing(connect(db_file)) as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS reconcile_orphans (store TEXT, key TEXT)")
+        conn.execute("DELETE FROM temp.reconcile_orphans")
+        pending_spool: list[tuple[str, str]] = []
+        rows = merge_join(object_rows(stores, workers), reference_rows(conn), queued_rows(conn))
+        for (store, key), group in rows:
+            objects = [payload for _, kind, payload in group if kind == OBJECT]
+            refs = [payload for _, kind, payload in group if kind == REFERENCE]
+            queued = any(kind == QUEUED for _, kind, _ in group)
+            if objects:
+                size, mtime = objects[0]
+                entry = stats[store]
+                entry["objects"] += 1
+                entry["bytes"] += size
+                if refs:
+                    entry["referenced"] += 1
+                elif now_ns - mtime < min_age_ns:
+                    entry["young"] += 1
+                elif queued:
+                    entry["queued"] += 1
+                else:
+                    entry["orphans"] += 1
+                    entry["orphan_bytes"] += size
+                    if len(report["orphan_samples"]) < show:
+                        report["orphan_samples"].append({"store": store, "key": key, "bytes": size})
+                    if enqueue and store in MINIO_BUCKETS:
+                        pending_spool.append((store, key))
+                        if len(pending_spool) >= batch:
+                            _spool(conn, pending_spool)
+            elif store in stores:
+                for table, row_id, checked in refs:
+                    if not checked:
+                        continue
+                    stats[store]["dangling"] += 1
+                    report["dangling_by_table"][table] += 1
+                    if len(report["dangling_samples"]) < show:
+                        report["dangling_samples"].append({"store": store, "key": key, "table": table, "id": row_id})
+        _spool(conn, pending_spool)
+
+        if enqueue:
+            report["enqueued"], report["skipped_referenced"] = enqueue_orphans(conn, batch, now_ms)
+        conn.execute("DROP TABLE IF EXISTS temp.reconcile_orphans")
+
+    totals = _new_store_stats()
+    for entry in stats.values():
+        for name, value in entry.items():
+            totals[name] += value
+    report["by_store"] = dict(sorted(stats.items()))
+    report["totals"] = totals
+    report["dangling_by_table"] = dict(report["dangling_by_table"])
+    report["duration"] = time.perf_counter() - started
+    report["objects_per_sec"] = totals["objects"] / report["duration"] if report["duration"] else 0.0
+    annotate(objects=totals["objects"], orphans=totals["orphans"], bytes=totals["orphan_bytes"])
+    return report
+
+
+def _spool(conn: sqlite3.Connection, pending: list[tuple[str, str]]):
+    """孤儿对象先暂存到连接私有的临时表，归并结束、读游标关闭后再写入主库，避免读写互相阻塞"""
+    if pending:
+        conn.executemany("INSERT INTO temp.reconcile_orphans (store, key) VALUES (?, ?)", pending)
+        pending.clear()
+
+
+def enqueue_orphans(conn: sqlite3.Connection, batch: int, now_ms: int) -> tuple[int, int]:
+    """
+    把暂存的孤儿对象按批写入 FileDeletionQueue（每批一个 BEGIN IMMEDIATE 短事务）。
+    写入前在同一事务里再查一次 FileMetadata（filePath 有唯一索引），跳过扫描之后刚被登记的文件；
+    返回 (入队数, 跳过数)
+    """
+    enqueued = skipped = 0
+    after = 0
+    while True:
+        chunk = conn.execute(
+            "SELECT rowid, store, key FROM temp.reconcile_orphans WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (after, batch),
+        ).fetchall()
+        if not chunk:
+            break
+        after = chunk[-1][0]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for _, store, key in chunk:
+                file_path = f"{store}:{key}"
+                if conn.execute('SELECT 1 FROM "FileMetadata" WHERE "filePath" = ?', (file_path,)).fetchone():
+                    skipped += 1
+                    continue
+                conn.execute(
+                    'INSERT INTO "FileDeletionQueue" ("id", "filePath", "bucket", "objectName", "status", '
+                    '"retryCount", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, \'pending\', 0, ?, ?)',
+                    ("c" + secrets.token_hex(12), file_path, store, key, now_ms, now_ms),
+                )
+                enqueued += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return enqueued, skipped
+
+
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
+
+
+def print_reconcile_report(report: dict, enqueue: bool):
+    print(f"\n🧹 存储对账: {report['db']}")
+    if not report["stores"]:
+        print("   ⚠️  没有找到任何存储目录，只检查了引用")
+    for store, root in report["stores"].items():
+        entry = report["by_store"][store]
+        print(f"   [{store}] {root}")
+        print(f"      对象 {entry['objects']} 个（{_format_bytes(entry['bytes'])}），被引用 {entry['referenced']}，"
+              f"孤儿 {entry['orphans']}（{_format_bytes(entry['orphan_bytes'])}），"
+              f"未满保留期 {entry['young']}，已在删除队列 {entry['queued']}，悬空引用 {entry['dangling']}")
+    totals = report["totals"]
+    print(f"   合计: 孤儿 {totals['orphans']} 个，可回收 {_format_bytes(totals['orphan_bytes'])}；"
+          f"悬空引用 {totals['dangling']} 条；耗时 {report['duration']:.2f}s"
+          f"（{report['objects_per_sec']:,.0f} 对象/秒）")
+    for sample in report["orphan_samples"]:
+        print(f"      孤儿: {sample['store']}:{sample['key']} ({_format_bytes(sample['bytes'])})")
+    for sample in report["dangling_samples"]:
+        print(f"      悬空: {sample['table']} {sample['id']} -> {sample['store']}:{sample['key']}")
+    if enqueue:
+        print(f"   ✅ 已写入 FileDeletionQueue: {report['enqueued']} 条"
+              + (f"（{report['skipped_referenced']} 条扫描后已被登记，跳过）" if report["skipped_referenced"] else ""))
+        if report["by_store"].get(UPLOADS_STORE, {}).get("orphans"):
+            print("   💡 public/uploads 中的孤儿文件不入队，确认后可手动删除")
+    elif totals["orphans"]:
+        print("   💡 加 --enqueue 把 MinIO 孤儿对象写入删除队列，由 cleanup-zombie-thumbnails.js 执行删除")
+
+
+def run(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return 1
+    report = reconcile(
+        db_file,
+        minio_data=Path(args.minio_data) if args.minio_data else None,
+        uploads_dir=Path(args.uploads) if args.uploads else None,
+        min_age_hours=args.min_age_hours,
+        enqueue=args.enqueue,
+        batch=args.batch,
+        workers=args.workers,
+        show=args.show,
+    )
+    print_reconcile_report(report, args.enqueue)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db reconcile-files 子命令"""
+    parser = subparsers.add_parser("reconcile-files", help="一次归并对账存储文件与数据库引用，报告孤儿对象与悬空引用")
+    parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    parser.add_argument("--minio-data", type=str, default="data/minio-data", help="MinIO 数据目录 (默认: data/minio-data)")
+    parser.add_argument("--uploads", type=str, default="public/uploads", help="本地上传目录 (默认: public/uploads)")
+    parser.add_argument(
+        "--min-age-hours",
+        type=float,
+        default=DEFAULT_MIN_AGE_HOURS,
+        help=f"比这更新的未引用对象视为上传中，不算孤儿 (默认: {DEFAULT_MIN_AGE_HOURS:.0f})"
+    )
+    parser.add_argument("--enqueue", action="store_true", help="把 MinIO 孤儿对象写入 FileDeletionQueue")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help=f"每个入队事务的行数 (默认: {DEFAULT_BATCH})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help=f"目录预读线程数 (默认: {DEFAULT_WORKERS})")
+    parser.add_argument("--show", type=int, default=DEFAULT_SHOW, help=f"最多列出多少条样例 (默认: {DEFAULT_SHOW})")
+    parser.set_defaults(func=run)
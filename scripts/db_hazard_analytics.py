@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+EHS 系统隐患分析列存
+把 HazardRecord 增量导出到按月分区的列式存储，管理层的统计（风险等级、部门、状态、月份）
+只扫描列存文件，不再查询生产库：
+- export: 按 (updatedAt, id) 水位线只拉取上次导出之后变更的行，按 id 合并进 createdAt 所在月份的分区
+- stats: 读取所需的列做分组计数
+
+存储布局: <存储目录>/month=YYYY-MM/
+  _meta.json      行数与各列编码
+  <列>.i64.z      整数/时间/布尔列：小端 int64 数组（NULL 用最小值表示），zlib 压缩
+  <列>.codes.z    文本列：uint32 字典编码（0 表示 NULL），zlib 压缩
+  <列>.dict.json  文本列的字典
+<存储目录>/_state.json 记录水位线
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+# 分析用到的列；长文本（描述、照片、日志 JSON）不进入列存
+ANALYTICS_COLUMNS = {
+    "id": "dict",
+    "code": "dict",
+    "status": "dict",
+    "riskLevel": "dict",
+    "checkType": "dict",
+    "rectificationType": "dict",
+    "type": "dict",
+    "location": "dict",
+    "rootCause": "dict",
+    "reporterId": "dict",
+    "reporterDeptName": "dict",
+    "rectificationDeptId": "dict",
+    "rectificationDeptName": "dict",
+    "currentStepId": "dict",
+    "currentStepIndex": "int",
+    "isVoided": "int",
+    "requireEmergencyPlan": "int",
+    "reportTime": "int",
+    "deadline": "int",
+    "rectificationTime": "int",
+    "verificationTime": "int",
+    "createdAt": "int",
+    "updatedAt": "int",
+}
+NULL_INT = -(1 << 63)
+EXPORT_BATCH = 2000
+# 应用在提交前生成 updatedAt，稍晚提交的事务可能带着更早的时间戳；水位线不越过 now - lag
+SAFETY_LAG_MS = 5000
+STATE_FILE = "_state.json"
+META_FILE = "_meta.json"
+
+
+def store_dir_for(db_file: Path) -> Path:
+    """data/db/ehs.db -> data/analytics/hazards"""
+    return db_file.resolve().parent.parent / "analytics" / "hazards"
+
+
+def month_of(created_at) -> str:
+    if isinstance(created_at, (int, float)):
+        return datetime.fromtimestamp(created_at / 1000, tz=timezone.utc).strftime("%Y-%m")
+    return str(created_at)[:7]
+
+
+def _to_int(value) -> int:
+    if value is None:
+        return NULL_INT
+    if isinstance(value, str):
+        # CURRENT_TIMESTAMP 默认值写入的文本时间
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).replace(
+            tzinfo=timezone.utc).timestamp() * 1000)
+    return int(value)
+
+
+# ---------------------------------------------------------------------------
+# 分区读写
+# ---------------------------------------------------------------------------
+
+def _int_bytes(values: list) -> bytes:
+    data = array("q", (_to_int(v) for v in values))
+    if sys.byteorder == "big":
+        data.byteswap()
+    return zlib.compress(data.tobytes(), 6)
+
+
+def _int_values(raw: bytes) -> list:
+    data = array("q")
+    data.frombytes(zlib.decompress(raw))
+    if sys.byteorder == "big":
+        data.byteswap()
+    return [None if v == NULL_INT else v for v in data]
+
+
+def _dict_encode(values: list) -> tuple[bytes, list[str]]:
+    dictionary: dict[str, int] = {}
+    codes = array("I")
+    for value in values:
+        if value is None:
+            codes.append(0)
+            continue
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary) + 1
+        codes.append(code)
+    if sys.byteorder == "big":
+        codes.byteswap()
+    return zlib.compress(codes.tobytes(), 6), list(dictionary)
+
+
+def _dict_decode(raw: bytes, dictionary: list[str]) -> list:
+    codes = array("I")
+    codes.frombytes(zlib.decompress(raw))
+    if sys.byteorder == "big":
+        codes.byteswap()
+    lookup = [None] + dictionary
+    return [lookup[c] for c in codes]
+
+
+def read_partition(part_dir: Path, columns: Optional[list[str]] = None) -> dict[str, list]:
+    """只读取需要的列"""
+    meta = json.loads((part_dir / META_FILE).read_text(encoding="utf-8"))
+    result = {}
+    for name in columns or list(meta["columns"]):
+        kind = meta["columns"].get(name)
+        if kind == "int":
+            result[name] = _int_values((part_dir / f"{name}.i64.z").read_bytes())
+        elif kind == "dict":
+            dictionary = json.loads((part_dir / f"{name}.dict.json").read_text(encoding="utf-8"))
+            result[name] = _dict_decode((part_dir / f"{name}.codes.z").read_bytes(), dictionary)
+        else:
+            result[name] = [None] * meta["rows"]
+    return result
+
+
+def write_partition(part_dir: Path, data: dict[str, list]):
+    """先写入临时目录再替换，读者不会看到写了一半的分区"""
+    tmp_dir = part_dir.with_name(part_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    rows = len(data["id"])
+    for name, kind in ANALYTICS_COLUMNS.items():
+        values = data.get(name, [None] * rows)
+        if kind == "int":
+            (tmp_dir / f"{name}.i64.z").write_bytes(_int_bytes(values))
+        else:
+            raw, dictionary = _dict_encode(values)
+            (tmp_dir / f"{name}.codes.z").write_bytes(raw)
+            (tmp_dir / f"{name}.dict.json").write_text(json.dumps(dictionary, ensure_ascii=False), encoding="utf-8")
+    (tmp_dir / META_FILE).write_text(
+        json.dumps({"rows": rows, "columns": ANALYTICS_COLUMNS}, ensure_ascii=False), encoding="utf-8"
+    )
+    old_dir = part_dir.with_name(part_dir.name + ".old")
+    if part_dir.exists():
+        os.replace(part_dir, old_dir)
+    os.replace(tmp_dir, part_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def partitions(store_dir: Path) -> list[tuple[str, Path]]:
+    if not store_dir.exists():
+        return []
+    return sorted(
+        (path.name[len("month="):], path) for path in store_dir.iterdir()
+        if path.is_dir() and path.name.startswith("month=") and "." not in path.name
+    )
+
+
+def merge_rows(part_dir: Path, rows: list[dict]) -> tuple[int, int]:
+    """按 id 合并：已存在的行整行替换，新行追加；返回 (新增, 更新)"""
+    if (part_dir / META_FILE).exists():
+        data = read_partition(part_dir, list(ANALYTICS_COLUMNS))
+    else:
+        data = {name: [] for name in ANALYTICS_COLUMNS}
+    index = {row_id: i for i, row_id in enumerate(data["id"])}
+    added = updated = 0
+    for row in rows:
+        position = index.get(row["id"])
+        if position is None:
+            index[row["id"]] = len(data["id"])
+            for name in ANALYTICS_COLUMNS:
+                data[name].append(row.get(name))
+            added += 1
+        else:
+            for name in ANALYTICS_COLUMNS:
+                data[name][position] = row.get(name)
+            updated += 1
+    write_partition(part_dir, data)
+    return added, updated
+
+
+# ---------------------------------------------------------------------------
+# 增量导出
+# ---------------------------------------------------------------------------
+
+def load_state(store_dir: Path) -> dict:
+    state_file = store_dir / STATE_FILE
+    if state_file.exists():
+        return json.loads(state_file.read_text(encoding="utf-8"))
+    return {"watermark": None, "lastId": None}
+
+
+def save_state(store_dir: Path, state: dict):
+    tmp = store_dir / (STATE_FILE + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, store_dir / STATE_FILE)
+
+
+def fetch_changes(conn: sqlite3.Connection, after: Optional[tuple], upper: int, limit: int) -> list[dict]:
+    """沿 HazardRecord_updatedAt_idx 按 (updatedAt, id) 键集分页"""
+    columns = ", ".join(f'"{name}"' for name in ANALYTICS_COLUMNS)
+    if after is None:
+        cursor = conn.execute(
+            f'SELECT {columns} FROM "HazardRecord" WHERE "updatedAt" <= ? ORDER BY "updatedAt", "id" LIMIT ?',
+            (upper, limit),
+        )
+    else:
+        cursor = conn.execute(
+            f'SELECT {columns} FROM "HazardRecord" WHERE "updatedAt" <= ? AND ("updatedAt", "id") > (?, ?) '
+            'ORDER BY "updatedAt", "id" LIMIT ?',
+            (upper, after[0], after[1], limit),
+        )
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+
+@traced("db.hazard_analytics.export")
+def export_incremental(
+    db_file: Path,
+    store_dir: Path,
+    full: bool = False,
+    batch: int = EXPORT_BATCH,
+    now_ms: Optional[int] = None,
+) -> dict:
+    """拉取水位线之后变更的隐患并合并进列存，返回新增/更新行数与耗时"""
+    store_dir.mkdir(parents=True, exist_ok=True)
+    if full:
+        for _, part_dir in partitions(store_dir):
+            shutil.rmtree(part_dir)
+        state = {"watermark": None, "lastId": None}
+    else:
+        state = load_state(store_dir)
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    upper = now_ms - SAFETY_LAG_MS
+    report: dict = {"store": str(store_dir), "fetched": 0, "added": 0, "updated": 0, "months": Counter()}
+    started = time.perf_counter()
+
+    after = (state["watermark"], state["lastId"]) if state["watermark"] is not None else None
+    with closing(connect(db_file)) as conn:
+        while True:
+            rows = fetch_changes(conn, after, upper, batch)
+            if not rows:
+                break
+            by_month: dict[str, list[dict]] = defaultdict(list)
+            for row in rows:
+                by_month[month_of(row["createdAt"])].append(row)
+            for month, month_rows in by_month.items():
+                added, updated = merge_rows(store_dir / f"month={month}", month_rows)
+                report["added"] += added
+                report["updated"] += updated
+                report["months"][month] += len(month_rows)
+            report["fetched"] += len(rows)
+            after = (rows[-1]["updatedAt"], rows[-1]["id"])
+            # 每批合并完成后推进水位线，中断后重跑只会重复合并最后一批（按 id 幂等）
+            save_state(store_dir, {
+                "watermark": after[0],
+                "lastId": after[1],
+                "exportedAt": datetime.now().isoformat(),
+            })
+
+    report["watermark"] = after[0] if after else None
+    report["duration"] = time.perf_counter() - started
+    report["months"] = dict(sorted(report["months"].items()))
+    annotate(rows=report["fetched"])
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 分析
+# ---------------------------------------------------------------------------
+
+def scan(store_dir: Path, columns: list[str], months: Optional[list[str]] = None) -> Iterator[tuple[str, dict]]:
+    for month, part_dir in partitions(store_dir):
+        if months and month not in months:
+            continue
+        yield month, read_partition(part_dir, columns)
+
+
+def summarize(store_dir: Path, by: list[str], include_voided: bool = False) -> Counter:
+    """按给定列（可含 month）分组计数，默认排除已作废的隐患"""
+    columns = [name for name in by if name != "month"] + ([] if include_voided else ["isVoided"])
+    counts: Counter = Counter()
+    for month, data in scan(store_dir, columns):
+        rows = len(next(iter(data.values()))) if data else 0
+        for i in range(rows):
+            if not include_voided and data["isVoided"][i]:
+                continue
+            counts[tuple(month if name == "month" else data[name][i] for name in by)] += 1
+    return counts
+
+
+def print_export_report(report: dict):
+    rate = report["fetched"] / report["duration"] if report["duration"] else 0
+    print(f"\n📊 隐患列存增量导出: {report['store']}")
+    if not report["fetched"]:
+        print("   ✓ 自上次导出以来没有变更")
+        return
+    print(f"   拉取 {report['fetched']} 行（新增 {report['added']}，更新 {report['updated']}），"
+          f"耗时 {report['duration']:.2f}s（{rate:,.0f} 行/秒）")
+    for month, count in report["months"].items():
+        print(f"      {month}: {count} 行")
+    watermark = datetime.fromtimestamp(report["watermark"] / 1000).strftime("%Y-%m-%d %H:%M:%S")
+    print(f"   水位线: {watermark}")
+
+
+def print_summary(counts: Counter, by: list[str]):
+    print(f"\n📈 隐患统计（按 {', '.join(by)}）")
+    if not counts:
+        print("   （列存为空，请先执行 ehs-db hazards export）")
+        return
+    for key, count in sorted(counts.items(), key=lambda item: [str(v) for v in item[0]]):
+        label = " | ".join("-" if v is None else str(v) for v in key)
+        print(f"   {label:<48}{count:>8}")
+    print(f"   {'合计':<46}{sum(counts.values()):>8}")
+
+
+def run_export(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return 1
+    store = Path(args.store) if args.store else store_dir_for(db_file)
+    print_export_report(export_incremental(db_file, store, full=args.full, batch=args.batch))
+    return 0
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    if args.store:
+        store = Path(args.store)
+    else:
+        db_file = find_database(args.db)
+        if db_file is None:
+            print("❌ 未找到列存目录，请通过 --store 指定")
+            return 1
+        store = store_dir_for(db_file)
+    unknown = [name for name in args.by if name != "month" and name not in ANALYTICS_COLUMNS]
+    if unknown:
+        print(f"❌ 列存中没有这些列: {', '.join(unknown)}")
+        return 1
+    print_summary(summarize(store, args.by, args.include_voided), args.by)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db hazards 子命令"""
+    parser = subparsers.add_parser("hazards", help="隐患分析列存：增量导出与离线统计")
+    commands = parser.add_subparsers(dest="hazards_command", help="命令")
+
+    export_parser = commands.add_parser("export", help="把水位线之后变更的隐患合并进按月分区的列存")
+    export_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    export_parser.add_argument("--store", type=str, help="列存目录 (默认: data/analytics/hazards)")
+    export_parser.add_argument("--full", action="store_true", help="清空列存并全量重建（同步硬删除的记录）")
+    export_parser.add_argument("--batch", type=int, default=EXPORT_BATCH, help=f"每批行数 (默认: {EXPORT_BATCH})")
+    export_parser.set_defaults(func=run_export)
+
+    stats_parser = commands.add_parser("stats", help="只读取列存做分组计数，不访问数据库")
+    stats_parser.add_argument("--db", type=str, help="用于推断默认列存目录的数据库路径")
+    stats_parser.add_argument("--store", type=str, help="列存目录 (默认: data/analytics/hazards)")
+    stats_parser.add_argument(
+        "--by",
+        nargs="+",
+        default=["month", "riskLevel"],
+        help="分组列，如 month riskLevel status rectificationDeptName (默认: month riskLevel)"
+    )
+    stats_parser.add_argument("--include-voided", action="store_true", help="包含已作废的隐患")
+    stats_parser.set_defaults(func=run_stats)
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 SQLite 在线空间回收
+删除大量 SystemLog / AIApiLog / Notification 后数据库文件不会自动变小，
+而直接 VACUUM 会长时间锁库。这里提供两种方式：
+- copy: 应用运行时用 VACUUM INTO 生成紧凑副本，在短暂维护窗口内（可自动停启容器）
+  独占数据库文件后原子替换原文件；应用仍连接着数据库时拒绝替换
+- incremental: 数据库为 auto_vacuum=INCREMENTAL 时，按时间片执行 incremental_vacuum，
+  每片只短暂持有写锁，应用无需停机
+两种方式都会报告回收字节数、写锁持有时长以及维护期间探测查询的延迟变化
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional
+
+from db_preflight import connect, find_database, page_stats, wal_file
+from deploy_checks import percentile
+from ops_runner import run_command
+from ops_trace import annotate, traced
+
+
+DEFAULT_PROBE_SQL = 'SELECT "id" FROM "HazardRecord" ORDER BY "createdAt" DESC LIMIT 50'
+DEFAULT_SLICE_MS = 50
+DEFAULT_PAUSE_MS = 200
+DEFAULT_BUDGET_S = 300
+DEFAULT_LOCK_TIMEOUT_S = 2.0
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+
+class LatencyProbe:
+    """在独立连接上反复执行探测查询，记录维护期间应用侧查询的延迟"""
+
+    def __init__(self, db_file: Path, sql: str = DEFAULT_PROBE_SQL, interval: float = 0.05):
+        self.db_file = db_file
+        self.sql = sql
+        self.interval = interval
+        self.samples: list[float] = []
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        with closing(connect(self.db_file)) as conn:
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute(self.sql).fetchall()
+                    self.samples.append((time.perf_counter() - start) * 1000)
+                except sqlite3.Error:
+                    self.errors += 1
+                self._stop.wait(self.interval)
+
+    def measure(self, seconds: float) -> dict:
+        """不做维护、单独探测一段时间，作为延迟基线"""
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def start(self) -> "LatencyProbe":
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join()
+        return summarize_latency(self.samples, self.errors)
+
+
+def summarize_latency(samples: list[float], errors: int = 0) -> dict:
+    if not samples:
+        return {"count": 0, "errors": errors}
+    ordered = sorted(samples)
+    return {
+        "count": len(samples),
+        "errors": errors,
+        "p50_ms": round(percentile(ordered, 50), 2),
+        "p95_ms": round(percentile(ordered, 95), 2),
+        "max_ms": round(ordered[-1], 2),
+    }
+
+
+def total_bytes(db_file: Path) -> int:
+    wal = wal_file(db_file)
+    return db_file.stat().st_size + (wal.stat().st_size if wal.exists() else 0)
+
+
+def auto_vacuum_mode(conn: sqlite3.Connection) -> str:
+    return AUTO_VACUUM_MODES.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0], "unknown")
+
+
+@traced("db.maintain.incremental")
+def incremental_vacuum(
+    db_file: Path,
+    slice_ms: float = DEFAULT_SLICE_MS,
+    pause_ms: float = DEFAULT_PAUSE_MS,
+    budget_s: float = DEFAULT_BUDGET_S,
+) -> dict:
+    """
+    分片执行 incremental_vacuum：每片在 BEGIN IMMEDIATE 事务中释放若干空闲页，
+    根据上一片的实际耗时调整下一片的页数，使写锁持有时间接近 slice_ms
+    """
+    report: dict = {"mode": "incremental", "lock_ms": [], "pages_freed": 0}
+    with closing(connect(db_file)) as conn:
+        mode = auto_vacuum_mode(conn)
+        if mode != "incremental":
+            raise ValueError(
+                f"auto_vacuum={mode}，无法增量回收；先执行一次 maintain --mode copy --enable-incremental"
+            )
+
+        pages = 64
+        deadline = time.monotonic() + budget_s
+        while time.monotonic() < deadline:
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_before == 0:
+                break
+            start = time.perf_counter()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(f"PRAGMA incremental_vacuum({pages})").fetchall()
+            conn.execute("COMMIT")
+            held_ms = (time.perf_counter() - start) * 1000
+            report["lock_ms"].append(held_ms)
+
+            freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            report["pages_freed"] += freed
+            if freed and held_ms > 0:
+                per_page = held_ms / freed
+                pages = max(1, min(int(slice_ms / per_page), pages * 4))
+            time.sleep(pause_ms / 1000)
+
+        # 截断 WAL，让回收的页真正从磁盘上消失
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        report["remaining_free_pages"] = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return report
+
+
+def _stop_container(container: str):
+    run_command(["docker", "stop", container])
+
+
+def _start_container(container: str):
+    run_command(["docker", "start", container])
+
+
+@traced("db.maintain.copy")
+def vacuum_into_and_swap(
+    db_file: Path,
+    stop_container: Optional[str] = None,
+    enable_incremental: bool = False,
+    keep_backup: bool = True,
+    before_window: Optional[Callable[[], object]] = None,
+    lock_timeout_s: float = DEFAULT_LOCK_TIMEOUT_S,
+) -> dict:
+    """
+    VACUUM INTO 生成紧凑副本后原子替换：
+    1. 应用运行时在只读快照上生成副本（不阻塞读写）
+    2. 维护窗口：停止容器（可选），以 EXCLUSIVE 锁模式独占数据库文件；
+       仍有其他连接（应用未停止）时拿不到独占锁，拒绝替换
+    3. 持有独占锁确认生成副本以来没有新的提交（有则在锁内重新生成），截断 WAL 并切回
+       rollback 日志，os.replace 原子替换文件后才关闭连接释放锁，最后重启容器
+    """
+    report: dict = {"mode": "copy", "lock_ms": [], "copies": 0}
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    tmp_file = db_file.with_name(f"{db_file.name}.maintain-{stamp}")
+    backup_file = db_file.with_name(f"{db_file.name}.pre-maintain-{stamp}")
+
+    def make_copy(conn: sqlite3.Connection) -> float:
+        tmp_file.unlink(missing_ok=True)
+        if enable_incremental:
+            # 仅对随后的 VACUUM / VACUUM INTO 生效
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        start = time.perf_counter()
+        conn.execute("VACUUM INTO ?", (str(tmp_file),))
+        report["copies"] += 1
+        return time.perf_counter() - start
+
+    conn = connect(db_file)
+    stopped = False
+    try:
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        report["online_copy_s"] = make_copy(conn)
+
+        if before_window:
+            before_window()
+        if stop_container:
+            window_start = time.perf_counter()
+            _stop_container(stop_container)
+            stopped = True
+
+        # EXCLUSIVE 锁模式下 COMMIT 后仍保留文件锁，直到连接关闭；
+        # WAL 模式下其他连接只要打开着就持有共享锁，此时 BEGIN EXCLUSIVE 会超时
+        start = time.perf_counter()
+        conn.execute(f"PRAGMA busy_timeout = {int(lock_timeout_s * 1000)}")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE").fetchall()
+        try:
+            conn.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            raise RuntimeError(
+                "仍有其他连接在使用数据库，拒绝替换文件；请使用 --stop-container 停止应用或改用 --mode incremental"
+            ) from None
+        unchanged = conn.execute("PRAGMA data_version").fetchone()[0] == version
+        conn.execute("COMMIT")
+        if not unchanged:
+            # 生成副本期间有新的写入，在独占锁内重新生成，此后不会再有写入
+            report["window_copy_s"] = make_copy(conn)
+
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        # 切回 rollback 日志：删除旧文件的 -wal，之后关闭连接也不会再按文件名处理新文件的 WAL
+        conn.execute("PRAGMA journal_mode = DELETE").fetchall()
+        with closing(sqlite3.connect(str(tmp_file), isolation_level=None)) as copy:
+            copy.execute("PRAGMA journal_mode = WAL").fetchall()
+        if keep_backup:
+            os.link(db_file, backup_file)
+            report["backup"] = str(backup_file)
+        for suffix in ("-wal", "-shm", "-journal"):
+            db_file.with_name(db_file.name + suffix).unlink(missing_ok=True)
+        os.replace(tmp_file, db_file)
+        conn.close()
+        report["lock_ms"].append((time.perf_counter() - start) * 1000)
+        report["swap_ms"] = report["lock_ms"][-1]
+    finally:
+        conn.close()
+        tmp_file.unlink(missing_ok=True)
+        if stopped:
+            _start_container(stop_container)
+            report["window_s"] = time.perf_counter() - window_start
+    return report
+
+
+def maintain(
+    db_file: Path,
+    mode: str = "incremental",
+    probe_sql: str = DEFAULT_PROBE_SQL,
+    baseline_s: float = 2.0,
+    **kwargs,
+) -> dict:
+    """执行空间回收并汇总回收字节数、写锁时长与探测查询延迟"""
+    with closing(connect(db_file)) as conn:
+        before = page_stats(conn, db_file)
+    bytes_before = total_bytes(db_file)
+
+    baseline = LatencyProbe(db_file, probe_sql).measure(baseline_s) if baseline_s > 0 else None
+    probe = LatencyProbe(db_file, probe_sql).start()
+    started = time.perf_counter()
+    try:
+        if mode == "copy":
+            # 探测连接也会占住数据库，替换窗口开始前先停止探测
+            report = vacuum_into_and_swap(db_file, before_window=probe.stop, **kwargs)
+        else:
+            report = incremental_vacuum(db_file, **kwargs)
+    finally:
+        during = probe.stop()
+
+    with closing(connect(db_file)) as conn:
+        after = page_stats(conn, db_file)
+        report["auto_vacuum"] = auto_vacuum_mode(conn)
+    report.update(
+        db=str(db_file),
+        duration_s=time.perf_counter() - started,
+        before=before,
+        after=after,
+        reclaimed_bytes=bytes_before - total_bytes(db_file),
+        latency_baseline=baseline,
+        latency_during=during,
+    )
+    annotate(bytes=report["reclaimed_bytes"])
+    return report
+
+
+def print_maintain_report(report: dict):
+    mb = 1024 * 1024
+    before, after = report["before"], report["after"]
+    print(f"\n🧹 SQLite 空间回收 ({report['mode']}): {report['db']}")
+    print(f"   耗时 {report['duration_s']:.2f}s，回收 {report['reclaimed_bytes'] / mb:.1f}MB")
+    print(f"   页数 {before['page_count']} -> {after['page_count']}，"
+          f"空闲页 {before['freelist_count']} -> {after['freelist_count']}，auto_vacuum={report['auto_vacuum']}")
+    if report.get("online_copy_s") is not None:
+        print(f"   在线生成副本 {report['online_copy_s']:.2f}s（共 {report['copies']} 次），"
+              f"替换 {report.get('swap_ms', 0):.0f}ms")
+    if report.get("window_s") is not None:
+        print(f"   维护窗口（容器停止）{report['window_s']:.2f}s")
+    if report.get("pages_freed") is not None:
+        print(f"   增量回收 {report['pages_freed']} 页，剩余空闲页 {report['remaining_free_pages']}")
+
+    locks = report["lock_ms"]
+    if locks:
+        print(f"   写锁持有 {len(locks)} 次: 平均 {statistics.mean(locks):.1f}ms，"
+              f"p95 {percentile(sorted(locks), 95):.1f}ms，最长 {max(locks):.1f}ms")
+
+    for label, key in (("基线", "latency_baseline"), ("维护期间", "latency_during")):
+        stats = report.get(key)
+        if stats and stats["count"]:
+            print(f"   探测查询{label}: p50 {stats['p50_ms']}ms，p95 {stats['p95_ms']}ms，"
+                  f"最长 {stats['max_ms']}ms（{stats['count']} 次，失败 {stats['errors']}）")
+
+
+def run(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return 1
+
+    if args.mode == "copy":
+        kwargs = dict(
+            stop_container=args.stop_container,
+            enable_incremental=args.enable_incremental,
+            keep_backup=not args.no_backup,
+        )
+    else:
+        kwargs = dict(slice_ms=args.slice_ms, pause_ms=args.pause_ms, budget_s=args.budget)
+
+    try:
+        report = maintain(db_file, args.mode, probe_sql=args.probe_sql, baseline_s=args.baseline, **kwargs)
+    except (ValueError, RuntimeError, sqlite3.Error) as e:
+        print(f"❌ 空间回收失败: {e}")
+        return 1
+    print_maintain_report(report)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db maintain 子命令"""
+    parser = subparsers.add_parser("maintain", help="在线回收 SQLite 空间（VACUUM INTO 替换或增量回收）")
+    parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    parser.add_argument(
+        "--mode",
+        choices=["incremental", "copy"],
+        default="incremental",
+        help="incremental: 分片增量回收，不停机；copy: VACUUM INTO 后在维护窗口原子替换 (默认: incremental)"
+    )
+    parser.add_argument("--stop-container", type=str, help="copy 模式下在替换窗口内停止并重启的容器 (如 ehs-app)")
+    parser.add_argument(
+        "--enable-incremental",
+        action="store_true",
+        help="copy 模式下同时把副本切换为 auto_vacuum=INCREMENTAL，之后可用增量回收"
+    )
+    parser.add_argument("--no-backup", action="store_true", help="copy 模式下不保留替换前的数据库文件")
+    parser.add_argument(
+        "--slice-ms",
+        type=float,
+        default=DEFAULT_SLICE_MS,
+        help=f"增量回收每片持有写锁的目标毫秒数 (默认: {DEFAULT_SLICE_MS})"
+    )
+    parser.add_argument(
+        "--pause-ms",
+        type=float,
+        default=DEFAULT_PAUSE_MS,
+        help=f"增量回收两片之间的间隔毫秒数 (默认: {DEFAULT_PAUSE_MS})"
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET_S,
+        help=f"增量回收的最长总时长秒数 (默认: {DEFAULT_BUDGET_S})"
+    )
+    parser.add_argument("--probe-sql", type=str, default=DEFAULT_PROBE_SQL, help="用于测量延迟影响的探测查询")
+    parser.add_argument("--baseline", type=float, default=2.0, help="维护前测量基线延迟的秒数 (默认: 2)")
+    parser.set_defaults(func=run)
@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+EHS 系统数据库流式导出/导入 (NDJSON)
+替代把整库读入内存的 database_full.json 备份/恢复脚本，内存占用与数据库大小无关：
+- export: 在同一个读事务（一致快照）内逐表逐行写出 <表名>.ndjson[.gz]，并生成 manifest.json
+- import: 按外键依赖把表分层，同一层的表并行解析文件，由单一写连接按层顺序
+  以大事务 + executemany 批量写入；也可以流式读取旧版 database_full.json
+DateTime 保持 SQLite 中的原始存储值（Prisma 为毫秒整数），导出再导入不丢精度
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import gzip
+import itertools
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from db_preflight import connect, find_database, user_tables
+from ops_trace import annotate, traced
+
+
+MANIFEST_NAME = "manifest.json"
+LEGACY_FULL_BACKUP = Path(__file__).resolve().parents[1] / "data" / "core_data" / "database_full.json"
+IMPORT_BATCH = 5000
+QUEUE_BATCHES = 4
+READ_CHUNK = 1 << 20
+
+
+# ---------------------------------------------------------------------------
+# 表结构与外键分层
+# ---------------------------------------------------------------------------
+
+def table_columns(conn: sqlite3.Connection, table: str) -> list[dict]:
+    return [
+        {"name": name, "type": (col_type or "").upper(), "pk": pk}
+        for _, name, col_type, _, _, pk in conn.execute(f'PRAGMA table_info("{table}")')
+    ]
+
+
+def table_dependencies(conn: sqlite3.Connection, tables: list[str]) -> dict[str, set[str]]:
+    """表 -> 它通过外键引用的其他表（忽略自引用，自引用由延迟外键检查处理）"""
+    known = set(tables)
+    return {
+        table: {
+            row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{table}")')
+            if row[2] != table and row[2] in known
+        }
+        for table in tables
+    }
+
+
+def dependency_levels(dependencies: dict[str, set[str]], strict: bool = False) -> list[list[str]]:
+    """
+    拓扑分层：第 0 层不依赖任何表，第 n 层只依赖前 n 层；
+    存在环时把剩余的表放在最后一层（导出只用于标注层号）。
+    导入时每张表单独提交，延迟外键检查跨不过表之间的事务边界，
+    strict=True 时遇到环直接抛出 ValueError
+    """
+    remaining = {table: set(deps) for table, deps in dependencies.items()}
+    levels: list[list[str]] = []
+    done: set[str] = set()
+    while remaining:
+        level = sorted(table for table, deps in remaining.items() if deps <= done)
+        if not level:
+            if strict:
+                raise ValueError(
+                    "外键存在环，无法按表逐个提交导入，涉及的表: " + ", ".join(sorted(remaining))
+                )
+            level = sorted(remaining)
+        levels.append(level)
+        done.update(level)
+        for table in level:
+            remaining.pop(table)
+    return levels
+
+
+# ---------------------------------------------------------------------------
+# 导出
+# ---------------------------------------------------------------------------
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {"$b64": base64.b64encode(value).decode("ascii")}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and set(value) == {"$b64"}:
+        return base64.b64decode(value["$b64"])
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _open_text(path: Path, mode: str):
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+    return open(path, mode, encoding="utf-8")
+
+
+@traced("db.ndjson.export")
+def export_database(db_file: Path, out_dir: Path, compress: bool = False) -> dict:
+    """在同一个读事务内逐行导出所有业务表，返回 manifest"""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    manifest: dict = {"version": 1, "exportedAt": datetime.now().isoformat(), "source": str(db_file), "tables": []}
+    total_bytes = 0
+    with closing(connect(db_file)) as conn:
+        conn.execute("BEGIN")
+        tables = user_tables(conn)
+        levels = dependency_levels(table_dependencies(conn, tables))
+        level_of = {table: i for i, level in enumerate(levels) for table in level}
+        for table in tables:
+            table_started = time.perf_counter()
+            columns = table_columns(conn, table)
+            names = [c["name"] for c in columns]
+            path = out_dir / f"{table}.ndjson{'.gz' if compress else ''}"
+            rows = 0
+            with _open_text(path, "w") as f:
+                cursor = conn.execute(f'SELECT * FROM "{table}"')
+                while True:
+                    chunk = cursor.fetchmany(IMPORT_BATCH)
+                    if not chunk:
+                        break
+                    f.writelines(
+                        json.dumps(dict(zip(names, map(_encode_value, row))), ensure_ascii=False) + "\n"
+                        for row in chunk
+                    )
+                    rows += len(chunk)
+            total_bytes += path.stat().st_size
+            manifest["tables"].append({
+                "name": table,
+                "file": path.name,
+                "rows": rows,
+                "level": level_of[table],
+                "columns": columns,
+                "seconds": round(time.perf_counter() - table_started, 3),
+            })
+        conn.execute("COMMIT")
+    manifest["duration"] = time.perf_counter() - started
+    (out_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    annotate(rows=sum(t["rows"] for t in manifest["tables"]), bytes=total_bytes)
+    return manifest
+
+
+# ---------------------------------------------------------------------------
+# 导入数据源：NDJSON 目录 / 旧版 database_full.json
+# ---------------------------------------------------------------------------
+
+def iter_ndjson(path: Path) -> Iterator[dict]:
+    with _open_text(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class _JsonStream:
+    """增量 JSON 读取器：只在缓冲区中保留尚未解析的部分"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_CHUNK)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n\ufeff":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError("JSON 文件意外结束")
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误: 期望 {char!r}，实际 {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # 数字可能被缓冲区边界截断，确认其后还有内容
+            if end == len(self.buf) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self) -> Iterator[str]:
+        """遍历对象的键，调用方负责读取每个键对应的值"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def array(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def iter_legacy_backup(path: Path) -> Iterator[tuple[str, Iterator[dict]]]:
+    """流式读取 {"metadata": ..., "data": {"模型名": [记录, ...]}}，逐个产出 (模型名, 记录迭代器)"""
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JsonStream(f)
+        for key in stream.items():
+            if key != "data":
+                stream.value()
+                continue
+            for model in stream.items():
+                records = stream.array()
+                yield model, records
+                # 调用方未读完时跳过剩余记录
+                for _ in records:
+                    pass
+
+
+def _iso_to_ms(value):
+    if isinstance(value, str) and len(value) >= 19 and value[4] == "-" and value[10] == "T":
+        try:
+            return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+        except ValueError:
+            return value
+    return value
+
+
+# ---------------------------------------------------------------------------
+# 导入
+# ---------------------------------------------------------------------------
+
+def _insert_sql(table: str, columns: list[str], pk: list[str], mode: str) -> str:
+    names = ", ".join(f'"{c}"' for c in columns)
+    placeholders = ", ".join("?" for _ in columns)
+    if mode == "upsert" and pk:
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in pk)
+        conflict = ", ".join(f'"{c}"' for c in pk)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        return f'INSERT INTO "{table}" ({names}) VALUES ({placeholders}) ON CONFLICT ({conflict}) {action}'
+    verb = "INSERT" if mode == "insert" else "INSERT OR IGNORE"
+    return f'{verb} INTO "{table}" ({names}) VALUES ({placeholders})'
+
+
+def _batches(records: Iterator[dict], columns: list[str], datetime_columns: set[str], size: int):
+    batch = []
+    for record in records:
+        batch.append([
+            _iso_to_ms(value) if name in datetime_columns else value
+            for name, value in ((name, _decode_value(record.get(name))) for name in columns)
+        ])
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+_DONE = object()
+
+
+def _reader(records: Iterator[dict], columns, datetime_columns, size, out: queue.Queue):
+    """读取线程：解析文件并把批次放入有界队列，写线程消费得慢时自动阻塞"""
+    try:
+        for batch in _batches(records, columns, datetime_columns, size):
+            out.put(batch)
+    except Exception as e:  # 交给写线程报告
+        out.put(e)
+    out.put(_DONE)
+
+
+@traced("db.ndjson.import")
+def import_tables(
+    db_file: Path,
+    sources: dict[str, Callable[[], Iterator[dict]]],
+    mode: str = "upsert",
+    clear: bool = False,
+    batch: int = IMPORT_BATCH,
+    workers: int = 4,
+) -> dict:
+    """
+    sources: 表名 -> 返回记录迭代器的函数
+    按外键分层导入：同一层的表最多 workers 个同时在读取线程中解析，写入由当前线程按表顺序完成，
+    每张表一个事务并开启延迟外键检查（自引用的表无需按父子顺序排列）；
+    表之间存在外键环时无法逐表提交，开始写入前抛出 ValueError
+    """
+    report: dict = {"db": str(db_file), "tables": {}, "skipped": [], "errors": {}}
+    started = time.perf_counter()
+    with closing(connect(db_file)) as conn:
+        conn.execute("PRAGMA foreign_keys = ON")
+        existing = set(user_tables(conn))
+        report["skipped"] = sorted(set(sources) - existing)
+        tables = [t for t in sources if t in existing]
+        levels = dependency_levels(table_dependencies(conn, tables), strict=True)
+        report["levels"] = levels
+
+        if clear:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("PRAGMA defer_foreign_keys = ON")
+            for level in reversed(levels):
+                for table in level:
+                    conn.execute(f'DELETE FROM "{table}"')
+            conn.execute("COMMIT")
+
+        for level in levels:
+            for offset in range(0, len(level), max(1, workers)):
+                group = level[offset:offset + max(1, workers)]
+                pending = {}
+                for table in group:
+                    records = iter(sources[table]())
+                    first = next(records, None)
+                    if first is None:
+                        report["tables"][table] = {"rows": 0, "seconds": 0.0}
+                        continue
+                    info = table_columns(conn, table)
+                    # 旧备份中没有后续迁移新增的列，这些列交给表定义中的默认值
+                    columns = [c["name"] for c in info if c["name"] in first]
+                    datetime_columns = {c["name"] for c in info if c["type"] == "DATETIME"}
+                    pk = [c["name"] for c in sorted(info, key=lambda c: c["pk"]) if c["pk"]]
+                    q: queue.Queue = queue.Queue(maxsize=QUEUE_BATCHES)
+                    thread = threading.Thread(
+                        target=_reader,
+                        args=(itertools.chain([first], records), columns, datetime_columns, batch, q),
+                        daemon=True,
+                    )
+                    thread.start()
+                    pending[table] = (q, thread, _insert_sql(table, columns, pk, mode))
+                for table, (q, thread, sql) in pending.items():
+                    report["tables"][table] = _write_table(conn, table, q, sql, report["errors"])
+                    thread.join()
+
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        report["fk_violations"] = len(violations)
+    report["duration"] = time.perf_counter() - started
+    report["rows"] = sum(t["rows"] for t in report["tables"].values())
+    annotate(rows=report["rows"])
+    return report
+
+
+def _write_table(conn: sqlite3.Connection, table: str, q: queue.Queue, sql: str, errors: dict) -> dict:
+    started = time.perf_counter()
+    rows = 0
+    drained = False
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("PRAGMA defer_foreign_keys = ON")
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                drained = True
+                break
+            if isinstance(item, Exception):
+                raise item
+            conn.executemany(sql, item)
+            rows += len(item)
+        conn.execute("COMMIT")
+    except (sqlite3.DatabaseError, ValueError, OSError) as e:
+        conn.execute("ROLLBACK")
+        errors[table] = str(e)
+        # 延迟外键在 COMMIT 时才报错，此时 _DONE 已经取出；否则排空队列，让读取线程结束
+        while not drained and q.get() is not _DONE:
+            pass
+        rows = 0
+    return {"rows": rows, "seconds": time.perf_counter() - started}
+
+
+def ndjson_sources(in_dir: Path) -> dict[str, Callable[[], Iterator[dict]]]:
+    manifest_file = in_dir / MANIFEST_NAME
+    if manifest_file.exists():
+        manifest = json.loads(manifest_file.read_text(encoding="utf-8"))
+        files = {t["name"]: in_dir / t["file"] for t in manifest["tables"]}
+    else:
+        files = {
+            path.name.split(".ndjson")[0]: path
+            for path in sorted(in_dir.iterdir()) if ".ndjson" in path.name
+        }
+    return {table: (lambda path=path: iter_ndjson(path)) for table, path in files.items()}
+
+
+def import_legacy_backup(db_file: Path, backup_file: Path, **kwargs) -> dict:
+    """
+    导入旧版 database_full.json：文件只能顺序读取，先把每个模型的记录流式转存为临时 NDJSON，
+    再按外键分层导入，整个过程不把文件整体读入内存
+    """
+    import tempfile
+
+    with closing(connect(db_file)) as conn:
+        by_lower = {table.lower(): table for table in user_tables(conn)}
+    with tempfile.TemporaryDirectory(prefix="ehs-legacy-") as tmp:
+        tmp_dir = Path(tmp)
+        unknown = []
+        for model, records in iter_legacy_backup(backup_file):
+            table = by_lower.get(model.lower())
+            if table is None:
+                unknown.append(model)
+                continue
+            with open(tmp_dir / f"{table}.ndjson", "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        report = import_tables(db_file, ndjson_sources(tmp_dir), **kwargs)
+    report["skipped"] = sorted(set(report["skipped"]) | set(unknown))
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 输出与命令行
+# ---------------------------------------------------------------------------
+
+def print_export_report(manifest: dict, out_dir: Path):
+    rows = sum(t["rows"] for t in manifest["tables"])
+    rate = rows / manifest["duration"] if manifest["duration"] else 0
+    print(f"\n📤 流式导出完成: {out_dir}")
+    print(f"   {len(manifest['tables'])} 张表，{rows} 行，耗时 {manifest['duration']:.2f}s（{rate:,.0f} 行/秒）")
+    for table in manifest["tables"]:
+        if table["rows"]:
+            print(f"      {table['name']:<32}{table['rows']:>10} 行  (第 {table['level']} 层)")
+
+
+def print_import_report(report: dict):
+    rate = report["rows"] / report["duration"] if report["duration"] else 0
+    print(f"\n📥 流式导入: {report['db']}")
+    print(f"   {report['rows']} 行，耗时 {report['duration']:.2f}s（{rate:,.0f} 行/秒），"
+          f"外键分层 {len(report['levels'])} 层")
+    for table, info in report["tables"].items():
+        if info["rows"]:
+            print(f"      {table:<32}{info['rows']:>10} 行  ({info['seconds']:.2f}s)")
+    for table, error in report["errors"].items():
+        print(f"   ❌ {table}: {error}（该表已回滚）")
+    if report["skipped"]:
+        print(f"   ⚠️  目标库中不存在，已跳过: {', '.join(report['skipped'])}")
+    if report["fk_violations"]:
+        print(f"   ⚠️  外键检查发现 {report['fk_violations']} 处引用缺失")
+
+
+def run_export(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return 1
+    out_dir = Path(args.out) if args.out else Path("backups") / f"ndjson-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    manifest = export_database(db_file, out_dir, compress=args.gzip)
+    print_export_report(manifest, out_dir)
+    return 0
+
+
+def run_import(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库（请先执行 prisma migrate deploy 创建表结构），或通过 --db 指定")
+        return 1
+    source = Path(args.source)
+    kwargs = dict(mode=args.mode, clear=args.clear, batch=args.batch, workers=args.workers)
+    try:
+        if source.is_dir():
+            report = import_tables(db_file, ndjson_sources(source), **kwargs)
+        elif source.exists():
+            report = import_legacy_backup(db_file, source, **kwargs)
+        else:
+            print(f"❌ 找不到导入源: {source}")
+            return 1
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print_import_report(report)
+    return 1 if report["errors"] else 0
+
+
+def register(subparsers):
+    """注册 ehs-db export / import 子命令"""
+    export_parser = subparsers.add_parser("export", help="逐表流式导出为 NDJSON（一致快照）")
+    export_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    export_parser.add_argument("--out", type=str, help="导出目录 (默认: ./backups/ndjson-<时间戳>)")
+    export_parser.add_argument("--gzip", action="store_true", help="以 .ndjson.gz 压缩写出")
+    export_parser.set_defaults(func=run_export)
+
+    import_parser = subparsers.add_parser("import", help="按外键顺序流式导入 NDJSON 目录或旧版 database_full.json")
+    import_parser.add_argument(
+        "source",
+        type=str,
+        nargs="?",
+        default=str(LEGACY_FULL_BACKUP),
+        help="ehs-db export 的导出目录，或 database_full.json 文件 (默认: data/core_data/database_full.json)"
+    )
+    import_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    import_parser.add_argument(
+        "--mode",
+        choices=["upsert", "ignore", "insert"],
+        default="upsert",
+        help="主键冲突时: upsert 更新现有记录 / ignore 保留现有记录 / insert 报错回滚 (默认: upsert)"
+    )
+    import_parser.add_argument("--clear", action="store_true", help="导入前清空涉及的表（按外键 ON DELETE CASCADE 级联）")
+    import_parser.add_argument("--batch", type=int, default=IMPORT_BATCH, help=f"每批写入行数 (默认: {IMPORT_BATCH})")
+    import_parser.add_argument("--workers", type=int, default=4, help="同一外键层内并行解析的表数 (默认: 4)")
+    import_parser.set_defaults(func=run_import)
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 SQLite 启动前检查
+在应用启动（或滚动更新）之前确保 data/db/ehs.db 处于良好状态：
+- journal_mode 必须为 WAL
+- sqlite_stat1 过期（缺失或行数偏差过大）时执行 ANALYZE
+- 检查空闲页比例与 B-tree 叶子页碎片率
+- WAL 文件过大时执行 wal_checkpoint(TRUNCATE)
+- quick_check 完整性检查，_prisma_migrations 中没有失败的迁移
+并输出前后页数与各步骤耗时
+部署脚本在应用仍在服务时以只读方式检查（read_only=True）：只做完整性与迁移检查，
+WAL 切换、ANALYZE 与检查点只作为警告提示，留给维护窗口执行 ehs-db preflight
+"""
+
+from __future__ import annotations
+
+import argparse
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from ops_trace import add_trace_arguments, annotate, setup_tracing, traced
+
+
+ROOT = Path(__file__).resolve().parents[1]
+# docker-compose.prod.yml 把上层 data 目录挂载到容器的 /app/data
+DB_CANDIDATES = [ROOT.parent / "data" / "db" / "ehs.db", ROOT / "data" / "db" / "ehs.db"]
+MIGRATIONS_DIR = ROOT / "prisma" / "migrations"
+
+DEFAULT_WAL_LIMIT_MB = 64
+DEFAULT_STATS_DRIFT = 0.2
+FREELIST_WARN_RATIO = 0.2
+FRAGMENTATION_WARN_RATIO = 0.3
+BUSY_TIMEOUT_MS = 5000
+
+
+def find_database(db_path: Optional[str] = None) -> Optional[Path]:
+    """返回指定的数据库路径，未指定时按部署目录约定查找第一个存在的文件"""
+    if db_path:
+        return Path(db_path)
+    for candidate in DB_CANDIDATES:
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def connect(db_file: Path, read_only: bool = False) -> sqlite3.Connection:
+    if read_only:
+        conn = sqlite3.connect(f"{db_file.resolve().as_uri()}?mode=ro", timeout=BUSY_TIMEOUT_MS / 1000,
+                               isolation_level=None, uri=True)
+    else:
+        conn = sqlite3.connect(str(db_file), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def wal_file(db_file: Path) -> Path:
+    return db_file.with_name(db_file.name + "-wal")
+
+
+def page_stats(conn: sqlite3.Connection, db_file: Path) -> dict:
+    """页数、空闲页数与文件大小"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal = wal_file(db_file)
+    return {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": freelist_count,
+        "freelist_ratio": freelist_count / page_count if page_count else 0.0,
+        "db_bytes": db_file.stat().st_size,
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+    }
+
+
+def user_tables(conn: sqlite3.Connection) -> list[str]:
+    return [
+        row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' AND name NOT LIKE '_prisma_%' ORDER BY name"
+        )
+    ]
+
+
+def stale_statistics(conn: sqlite3.Connection, drift: float = DEFAULT_STATS_DRIFT) -> list[str]:
+    """
+    返回统计信息过期的表：
+    sqlite_stat1 不存在、非空表没有统计行，或统计行数与实际行数偏差超过 drift
+    """
+    tables = user_tables(conn)
+    has_stat1 = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).fetchone()
+    recorded: dict[str, int] = {}
+    if has_stat1:
+        for tbl, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            # stat 的第一个数字是 ANALYZE 时的行数（估计值）
+            recorded[tbl] = max(recorded.get(tbl, 0), int(stat.split()[0]))
+
+    stale = []
+    for table in tables:
+        actual = conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+        if table not in recorded:
+            if actual:
+                stale.append(table)
+            continue
+        baseline = recorded[table]
+        if abs(actual - baseline) > max(baseline, 1) * drift:
+            stale.append(table)
+    return stale
+
+
+def fragmentation(conn: sqlite3.Connection) -> Optional[dict[str, float]]:
+    """
+    各 B-tree 的叶子页碎片率：按逻辑顺序遍历叶子页，页号不连续的比例
+    SQLite 未编译 dbstat 时返回 None
+    """
+    try:
+        rows = conn.execute(
+            "SELECT name, pageno FROM dbstat WHERE pagetype = 'leaf' ORDER BY name, path"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return None
+
+    result: dict[str, float] = {}
+    current, previous, jumps, leaves = None, None, 0, 0
+    for name, pageno in rows + [(None, None)]:
+        if name != current:
+            if current is not None and leaves > 1:
+                result[current] = jumps / (leaves - 1)
+            current, previous, jumps, leaves = name, None, 0, 0
+        if name is None:
+            break
+        if previous is not None and pageno != previous + 1:
+            jumps += 1
+        previous = pageno
+        leaves += 1
+    return result
+
+
+def migration_status(conn: sqlite3.Connection, migrations_dir: Path = MIGRATIONS_DIR) -> Optional[dict]:
+    """
+    对照 prisma/migrations 检查 _prisma_migrations：
+    failed 为开始后既未完成也未回滚的迁移（migrate deploy 会因此拒绝执行），
+    pending 为尚未执行、将由新版本启动时执行的迁移；库中没有 _prisma_migrations 时返回 None
+    """
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_prisma_migrations'"
+    ).fetchone():
+        return None
+    failed = [row[0] for row in conn.execute(
+        'SELECT "migration_name" FROM "_prisma_migrations" '
+        'WHERE "finished_at" IS NULL AND "rolled_back_at" IS NULL ORDER BY "started_at"'
+    )]
+    applied = {row[0] for row in conn.execute(
+        'SELECT "migration_name" FROM "_prisma_migrations" WHERE "finished_at" IS NOT NULL'
+    )}
+    pending = [path.parent.name for path in sorted(migrations_dir.glob("*/migration.sql"))
+               if path.parent.name not in applied and path.parent.name not in failed]
+    return {"failed": failed, "pending": pending}
+
+
+def _timed(report: dict, step: str, func):
+    start = time.perf_counter()
+    value = func()
+    report["timings"][step] = time.perf_counter() - start
+    return value
+
+
+@traced("db.preflight")
+def run_preflight(
+    db_file: Path,
+    wal_limit_mb: float = DEFAULT_WAL_LIMIT_MB,
+    stats_drift: float = DEFAULT_STATS_DRIFT,
+    analyze: bool = True,
+    check_fragmentation: bool = True,
+    read_only: bool = False,
+    migrations_dir: Path = MIGRATIONS_DIR,
+) -> dict:
+    """
+    执行启动前检查与调优，返回包含前后页数、执行动作与耗时的报告
+    read_only=True 时以只读方式打开数据库，需要写入的调优只记为警告
+    """
+    report: dict = {"db": str(db_file), "read_only": read_only, "actions": [], "warnings": [], "errors": [],
+                    "timings": {}}
+    started = time.perf_counter()
+
+    with closing(connect(db_file, read_only=read_only)) as conn:
+        report["before"] = page_stats(conn, db_file)
+
+        mode = _timed(report, "journal_mode", lambda: conn.execute("PRAGMA journal_mode").fetchone()[0])
+        if mode.lower() != "wal":
+            if read_only:
+                report["warnings"].append(f"journal_mode 为 {mode}，请在维护窗口执行 ehs-db preflight 切换到 WAL")
+            else:
+                new_mode = _timed(
+                    report, "enable_wal", lambda: conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+                )
+                if new_mode.lower() == "wal":
+                    report["actions"].append(f"journal_mode {mode} -> wal")
+                else:
+                    report["warnings"].append(f"无法切换到 WAL 模式（当前 {new_mode}），数据库可能正被占用")
+        report["journal_mode"] = conn.execute("PRAGMA journal_mode").fetchone()[0]
+
+        integrity = _timed(report, "quick_check", lambda: [row[0] for row in conn.execute("PRAGMA quick_check")])
+        if integrity != ["ok"]:
+            report["errors"].append(f"quick_check 发现 {len(integrity)} 处问题: {'; '.join(integrity[:3])}")
+
+        migrations = _timed(report, "migrations", lambda: migration_status(conn, migrations_dir))
+        report["migrations"] = migrations
+        if migrations and migrations["failed"]:
+            report["errors"].append(
+                f"存在失败的迁移 {', '.join(migrations['failed'])}，需先用 prisma migrate resolve 处理"
+            )
+
+        if analyze:
+            stale = _timed(report, "stats_check", lambda: stale_statistics(conn, stats_drift))
+            report["stale_tables"] = stale
+            if stale and read_only:
+                report["warnings"].append(
+                    f"{len(stale)} 张表统计信息过期，请在维护窗口执行 ehs-db preflight 更新"
+                )
+            elif stale:
+                _timed(report, "analyze", lambda: conn.execute("ANALYZE"))
+                report["actions"].append(f"ANALYZE（{len(stale)} 张表统计信息过期）")
+
+        freelist_ratio = report["before"]["freelist_ratio"]
+        if freelist_ratio > FREELIST_WARN_RATIO:
+            report["warnings"].append(
+                f"空闲页占比 {freelist_ratio:.0%}，建议执行 ehs-db maintain 回收空间"
+            )
+
+        if check_fragmentation:
+            fragments = _timed(report, "fragmentation", lambda: fragmentation(conn))
+            if fragments is not None:
+                worst = sorted(fragments.items(), key=lambda item: -item[1])[:5]
+                report["fragmentation"] = dict(worst)
+                fragmented = [name for name, ratio in worst if ratio > FRAGMENTATION_WARN_RATIO]
+                if fragmented:
+                    report["warnings"].append(f"碎片率较高: {', '.join(fragmented)}")
+
+        wal_bytes = report["before"]["wal_bytes"]
+        if wal_bytes > wal_limit_mb * 1024 * 1024 and report["journal_mode"].lower() == "wal":
+            if read_only:
+                report["warnings"].append(
+                    f"WAL 文件 {_format_bytes(wal_bytes)} 超过 {wal_limit_mb:g}MB，请在维护窗口执行 ehs-db preflight"
+                )
+            else:
+                busy, log_frames, checkpointed = _timed(
+                    report, "wal_checkpoint",
+                    lambda: conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone(),
+                )
+                if busy:
+                    report["warnings"].append(
+                        f"WAL 检查点被占用，仅写回 {checkpointed}/{log_frames} 帧"
+                    )
+                else:
+                    report["actions"].append(f"wal_checkpoint(TRUNCATE) 写回 {checkpointed} 帧")
+
+        report["after"] = page_stats(conn, db_file)
+
+    report["duration"] = time.perf_counter() - started
+    annotate(bytes=report["before"]["db_bytes"] + report["before"]["wal_bytes"])
+    return report
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}MB"
+
+
+def print_preflight_report(report: dict):
+    before, after = report["before"], report["after"]
+    mode = "（只读）" if report.get("read_only") else ""
+    print(f"\n🩺 SQLite 启动前检查{mode}: {report['db']} ({report['duration']:.2f}s)")
+    print(f"   journal_mode: {report['journal_mode']}")
+    print(f"   {'':<12}{'页数':>10}{'空闲页':>10}{'数据库':>12}{'WAL':>12}")
+    for label, stats in (("检查前", before), ("检查后", after)):
+        print(
+            f"   {label:<12}{stats['page_count']:>10}{stats['freelist_count']:>10}"
+            f"{_format_bytes(stats['db_bytes']):>12}{_format_bytes(stats['wal_bytes']):>12}"
+        )
+    for name, ratio in report.get("fragmentation", {}).items():
+        print(f"   碎片率 {name}: {ratio:.0%}")
+    migrations = report.get("migrations")
+    if migrations and migrations["pending"]:
+        print(f"   待执行迁移 {len(migrations['pending'])} 个（新版本启动时执行）: {', '.join(migrations['pending'])}")
+    for action in report["actions"]:
+        print(f"   ✅ {action}")
+    for warning in report["warnings"]:
+        print(f"   ⚠️  {warning}")
+    for error in report["errors"]:
+        print(f"   ❌ {error}")
+    timings = ", ".join(f"{step} {seconds * 1000:.0f}ms" for step, seconds in report["timings"].items())
+    print(f"   耗时: {timings}")
+
+
+def preflight_database(db_path: Optional[str] = None, **kwargs) -> bool:
+    """
+    部署脚本的调用入口：找不到数据库（如全新部署）时跳过，
+    数据库无法打开、完整性检查失败或存在失败的迁移时返回 False 由调用方决定是否中止
+    """
+    db_file = find_database(db_path)
+    if db_file is None or not db_file.exists():
+        print("\nℹ️  未找到 SQLite 数据库，跳过启动前检查（首次部署时由迁移创建）")
+        return True
+    try:
+        report = run_preflight(db_file, **kwargs)
+    except sqlite3.DatabaseError as e:
+        print(f"\n❌ SQLite 启动前检查失败: {db_file}: {e}")
+        return False
+    print_preflight_report(report)
+    return not report["errors"]
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    parser.add_argument(
+        "--wal-limit-mb",
+        type=float,
+        default=DEFAULT_WAL_LIMIT_MB,
+        help=f"WAL 文件超过该大小时执行 TRUNCATE 检查点 (默认: {DEFAULT_WAL_LIMIT_MB})"
+    )
+    parser.add_argument("--no-analyze", action="store_true", help="不检查统计信息、不执行 ANALYZE")
+    parser.add_argument("--no-fragmentation", action="store_true", help="不统计 B-tree 碎片率")
+
+
+def run(args: argparse.Namespace) -> int:
+    ok = preflight_database(
+        args.db,
+        wal_limit_mb=args.wal_limit_mb,
+        analyze=not args.no_analyze,
+        check_fragmentation=not args.no_fragmentation,
+    )
+    return 0 if ok else 1
+
+
+def register(subparsers):
+    """注册 ehs-db preflight 子命令"""
+    parser = subparsers.add_parser("preflight", help="启动前检查：WAL、统计信息、碎片率与 WAL 检查点")
+    add_arguments(parser)
+    parser.set_defaults(func=run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统 SQLite 启动前检查与调优")
+    add_arguments(parser)
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    setup_tracing(args)
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
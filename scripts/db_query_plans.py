@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+EHS 系统热点查询的执行计划回归检查
+- prisma/query-plans.json 记录应用的热点 SQL（Prisma 生成的形式）
+- 在数据库副本上执行 EXPLAIN QUERY PLAN，出现全表扫描或为排序建立临时 B-tree 时判定失败，
+  并根据 WHERE / ORDER BY / SELECT 列给出覆盖索引建议
+- 目录中已知且暂时接受的问题用 allow 标注，新出现的问题才会失败
+- 目录可以从开启了 query 日志的应用输出（prisma:query ...）中采集
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import sqlite3
+import tempfile
+from collections import Counter
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from db_preflight import find_database
+from ops_runner import run_command
+
+
+ROOT = Path(__file__).resolve().parents[1]
+CATALOG_FILE = ROOT / "prisma" / "query-plans.json"
+MIGRATIONS_DIR = ROOT / "prisma" / "migrations"
+
+FULL_SCAN = "SCAN"
+TEMP_BTREE = "TEMP B-TREE"
+
+_IDENT = r"[`\"]?(\w+)[`\"]?"
+_COLUMN = re.compile(rf"(?:[`\"]?main[`\"]?\.)?{_IDENT}\.{_IDENT}")
+_TABLE_ALIAS = re.compile(rf"(?:FROM|JOIN)\s+(?:[`\"]?main[`\"]?\.)?{_IDENT}(?:\s+AS\s+{_IDENT})?", re.IGNORECASE)
+_EQUALITY = re.compile(rf"{_COLUMN.pattern}\s*(?:=|IS NULL\b|IN\s*\()", re.IGNORECASE)
+_RANGE = re.compile(rf"{_COLUMN.pattern}\s*(?:>=|<=|>|<)", re.IGNORECASE)
+_ORDER_BY = re.compile(r"ORDER BY\s+(.+?)(?:\s+LIMIT\b|\s+OFFSET\b|\)|$)", re.IGNORECASE)
+_PRISMA_QUERY = re.compile(r"prisma:query\s+(.*)$")
+_SKIP_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE")
+
+
+@dataclass
+class PlanResult:
+    name: str
+    plan: list[str]
+    issues: list[str] = field(default_factory=list)
+    allowed: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    suggestions: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and not self.issues
+
+
+def load_catalog(catalog_file: Path = CATALOG_FILE) -> list[dict]:
+    return json.loads(catalog_file.read_text(encoding="utf-8"))
+
+
+def save_catalog(catalog: list[dict], catalog_file: Path = CATALOG_FILE):
+    catalog_file.write_text(json.dumps(catalog, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def normalize_sql(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+def placeholder_count(sql: str) -> int:
+    """统计 ? 参数个数（忽略字符串字面量中的问号）"""
+    return re.sub(r"'(?:[^']|'')*'", "''", sql).count("?")
+
+
+def apply_migrations(conn: sqlite3.Connection, migrations_dir: Path = MIGRATIONS_DIR):
+    for migration in sorted(migrations_dir.glob("*/migration.sql")):
+        conn.executescript(migration.read_text(encoding="utf-8"))
+
+
+def open_copy(db_file: Optional[Path], workdir: Path) -> sqlite3.Connection:
+    """
+    打开数据库副本：指定了数据库时用 backup API 复制一份（不影响线上文件），
+    否则按 prisma/migrations 建立一个只有表结构的空库
+    """
+    target = workdir / "plans.db"
+    conn = sqlite3.connect(str(target))
+    if db_file:
+        with closing(sqlite3.connect(f"{db_file.resolve().as_uri()}?mode=ro", uri=True)) as source:
+            source.backup(conn)
+    else:
+        apply_migrations(conn)
+    return conn
+
+
+def table_names(conn: sqlite3.Connection) -> set[str]:
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def explain(conn: sqlite3.Connection, sql: str) -> list[str]:
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", [None] * placeholder_count(sql)).fetchall()
+    return [row[3] for row in rows]
+
+
+def plan_issues(
+    plan: Iterable[str],
+    tables: set[str],
+    aliases: Optional[dict[str, str]] = None,
+    sort_table: Optional[str] = None,
+) -> tuple[list[tuple[str, str, Optional[str]]], list[str]]:
+    """
+    返回 (问题列表, 提示列表)；问题为 (类型, 计划行, 涉及的表)
+    - SCAN <表>（未使用任何索引）视为全表扫描
+    - USE TEMP B-TREE FOR ORDER BY / GROUP BY / DISTINCT 视为临时排序，归到 sort_table（ORDER BY 所属的表）
+    - SCAN <表> USING [COVERING] INDEX 是按索引顺序遍历，只作为提示
+    """
+    aliases = aliases or {}
+    issues, warnings = [], []
+    last_table = None
+    for detail in plan:
+        match = re.match(r"(?:SCAN|SEARCH)\s+(?:main\.)?(\w+)", detail)
+        if match:
+            last_table = aliases.get(match.group(1), match.group(1))
+        if detail.startswith("SCAN ") and last_table in tables:
+            if " USING " in detail:
+                warnings.append(f"索引全扫描: {detail}")
+            else:
+                issues.append((FULL_SCAN, detail, last_table))
+        elif detail.startswith("USE TEMP B-TREE"):
+            issues.append((TEMP_BTREE, detail, sort_table or last_table))
+    return issues, warnings
+
+
+def _resolve_aliases(sql: str) -> dict[str, str]:
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(sql):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def _columns(pattern: re.Pattern, text: str, table: str, aliases: dict[str, str]) -> list[str]:
+    columns = []
+    for owner, column in pattern.findall(text):
+        if aliases.get(owner, owner) == table and column not in columns:
+            columns.append(column)
+    return columns
+
+
+def order_by_table(sql: str) -> Optional[str]:
+    """ORDER BY 第一列所属的表"""
+    match = _ORDER_BY.search(sql)
+    columns = _COLUMN.findall(match.group(1)) if match else []
+    if not columns:
+        return None
+    return _resolve_aliases(sql).get(columns[0][0], columns[0][0])
+
+
+def suggest_index(sql: str, table: str) -> Optional[str]:
+    """
+    按“等值列 → 排序列（没有排序时取范围列）→ 查询列”的顺序给出覆盖索引建议，
+    同时给出对应的 schema.prisma @@index 写法
+    """
+    aliases = _resolve_aliases(sql)
+    head, _, rest = sql.partition(" FROM ")
+    where = rest.split(" ORDER BY ")[0]
+
+    equality = _columns(_EQUALITY, where, table, aliases)
+    ranges = [c for c in _columns(_RANGE, where, table, aliases) if c not in equality]
+    order_match = _ORDER_BY.search(sql)
+    order = [
+        c for c in _columns(_COLUMN, order_match.group(1), table, aliases) if c not in equality
+    ] if order_match else []
+
+    keys = equality + (order or ranges[:1])
+    if not keys:
+        return None
+    selected = [c for c in _columns(_COLUMN, head, table, aliases) if c not in keys and c != "id"]
+    columns = keys + selected if len(keys) + len(selected) <= 6 else keys
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    name = f"{table}_{'_'.join(columns)}_idx"
+    return f'CREATE INDEX "{name}" ON "{table}"({quoted});  -- schema.prisma: @@index([{", ".join(columns)}])'
+
+
+def check_entry(conn: sqlite3.Connection, entry: dict, tables: set[str]) -> PlanResult:
+    result = PlanResult(name=entry["name"], plan=[])
+    try:
+        result.plan = explain(conn, entry["sql"])
+    except sqlite3.Error as e:
+        result.error = str(e)
+        return result
+
+    sql = normalize_sql(entry["sql"])
+    issues, result.warnings = plan_issues(result.plan, tables, _resolve_aliases(sql), order_by_table(sql))
+    allow = set(entry.get("allow", []))
+    for kind, detail, table in issues:
+        (result.allowed if kind in allow else result.issues).append(detail)
+        if table:
+            suggestion = suggest_index(sql, table)
+            if suggestion and suggestion not in result.suggestions:
+                result.suggestions.append(suggestion)
+    return result
+
+
+def check_catalog(conn: sqlite3.Connection, catalog: list[dict]) -> list[PlanResult]:
+    tables = table_names(conn)
+    return [check_entry(conn, entry, tables) for entry in catalog]
+
+
+def print_plan_report(results: list[PlanResult]):
+    failed = [r for r in results if not r.ok]
+    print(f"\n🔎 执行计划检查: {len(results)} 条查询，{len(failed)} 条不通过")
+    for result in results:
+        if result.error:
+            print(f"   ❌ {result.name}: {result.error}")
+            continue
+        mark = "❌" if result.issues else ("⚠️ " if result.allowed else "✅")
+        print(f"   {mark} {result.name}")
+        for detail in result.issues:
+            print(f"        问题: {detail}")
+        for detail in result.allowed:
+            print(f"        已知: {detail}")
+        for warning in result.warnings:
+            print(f"        提示: {warning}")
+        if result.issues or result.allowed:
+            for suggestion in result.suggestions:
+                print(f"        建议: {suggestion}")
+
+
+def extract_queries(lines: Iterable[str]) -> Counter:
+    """从应用日志中提取 prisma:query 语句并按出现次数计数"""
+    counts: Counter = Counter()
+    for line in lines:
+        match = _PRISMA_QUERY.search(line)
+        if not match:
+            continue
+        sql = normalize_sql(match.group(1))
+        if sql and not sql.upper().startswith(_SKIP_STATEMENTS):
+            counts[sql] += 1
+    return counts
+
+
+def merge_captured(catalog: list[dict], counts: Counter, limit: int = 20) -> list[dict]:
+    """把出现次数最多的查询追加到目录中，已存在的语句只更新计数"""
+    known = {normalize_sql(entry["sql"]): entry for entry in catalog}
+    added = 0
+    for sql, count in counts.most_common():
+        if sql in known:
+            known[sql]["captured_count"] = count
+            continue
+        if added >= limit:
+            continue
+        tables = _TABLE_ALIAS.findall(sql)
+        table = tables[0][0] if tables else "query"
+        entry = {
+            "name": f"captured.{table}.{sum(1 for e in catalog if e['name'].startswith(f'captured.{table}.')) + 1}",
+            "source": "从应用 query 日志采集",
+            "sql": sql,
+            "captured_count": count,
+        }
+        catalog.append(entry)
+        known[sql] = entry
+        added += 1
+    return catalog
+
+
+def run_check(args: argparse.Namespace) -> int:
+    catalog = load_catalog(Path(args.catalog))
+    db_file = None if args.schema_only else find_database(args.db)
+    with tempfile.TemporaryDirectory() as workdir:
+        with closing(open_copy(db_file, Path(workdir))) as conn:
+            print(f"📂 数据库: {db_file or '按 prisma/migrations 建立的空库'}")
+            results = check_catalog(conn, catalog)
+    print_plan_report(results)
+    return 0 if all(r.ok for r in results) else 1
+
+
+def run_capture(args: argparse.Namespace) -> int:
+    lines: list[str] = []
+    for log_file in args.log or []:
+        lines.extend(Path(log_file).read_text(encoding="utf-8", errors="replace").splitlines())
+    if args.container:
+        result = run_command(["docker", "logs", "--since", args.since, args.container], echo=False)
+        lines.extend(result.stdout.splitlines() + result.stderr.splitlines())
+    counts = extract_queries(lines)
+    if not counts:
+        print("⚠️  日志中没有 prisma:query 语句（src/lib/prisma.ts 需开启 log: ['query']）")
+        return 1
+
+    catalog_file = Path(args.catalog)
+    catalog = load_catalog(catalog_file) if catalog_file.exists() else []
+    before = len(catalog)
+    save_catalog(merge_captured(catalog, counts, args.limit), catalog_file)
+    print(f"✅ 采集到 {len(counts)} 种查询，新增 {len(catalog) - before} 条到 {catalog_file}")
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db plans 子命令"""
+    parser = subparsers.add_parser("plans", help="热点查询执行计划回归检查")
+    commands = parser.add_subparsers(dest="plans_command", help="命令")
+
+    check_parser = commands.add_parser("check", help="对目录中的查询执行 EXPLAIN QUERY PLAN")
+    check_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db，在副本上检查)")
+    check_parser.add_argument("--schema-only", action="store_true", help="只按 prisma/migrations 建立空库检查")
+    check_parser.add_argument("--catalog", type=str, default=str(CATALOG_FILE), help="查询目录文件")
+    check_parser.set_defaults(func=run_check)
+
+    capture_parser = commands.add_parser("capture", help="从应用 query 日志采集热点查询到目录")
+    capture_parser.add_argument("--log", action="append", help="应用日志文件（可多次指定）")
+    capture_parser.add_argument("--container", type=str, help="直接读取容器日志 (如 ehs-app)")
+    capture_parser.add_argument("--since", type=str, default="24h", help="读取容器日志的时间范围 (默认: 24h)")
+    capture_parser.add_argument("--limit", type=int, default=20, help="最多新增的查询数量 (默认: 20)")
+    capture_parser.add_argument("--catalog", type=str, default=str(CATALOG_FILE), help="查询目录文件")
+    capture_parser.set_defaults(func=run_capture)
@@ -0,0 +1,713 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 SQLite 损坏扫描与数据抢救
+不依赖 SQLite 自身能否打开损坏的文件，直接按页解析数据库文件：
+- scan: 多进程并行逐页校验 B-tree 页头与单元格指针，再从 sqlite_master 出发遍历每棵 B-tree，
+  报告损坏的页以及它们属于哪张表/索引
+- salvage: 把所有可读的行批量写入一个新的数据库；未受损的表走 SQLite 快速路径，
+  受损的表逐个解析叶子页记录，跳过损坏的页
+存在 -wal 文件时先在临时副本上合并其中已提交的帧（校验 salt 与校验和），原文件与 -wal 保持原样
+文件格式参考 https://www.sqlite.org/fileformat2.html
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import mmap
+import os
+import sqlite3
+import shutil
+import struct
+import tempfile
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing, contextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Iterator, Optional
+
+from db_preflight import wal_file
+from ops_trace import annotate, traced
+
+
+HEADER_MAGIC = b"SQLite format 3\x00"
+INTERIOR_INDEX, INTERIOR_TABLE, LEAF_INDEX, LEAF_TABLE = 2, 5, 10, 13
+BTREE_TYPES = {INTERIOR_INDEX, INTERIOR_TABLE, LEAF_INDEX, LEAF_TABLE}
+TEXT_ENCODINGS = {1: "utf-8", 2: "utf-16-le", 3: "utf-16-be"}
+SCAN_CHUNK_PAGES = 4096
+SALVAGE_BATCH = 5000
+# WAL 文件头魔数：最低位为 1 时校验和按大端序计算
+WAL_MAGIC = {0x377F0682: "<", 0x377F0683: ">"}
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+
+
+@dataclass
+class DbHeader:
+    page_size: int
+    reserved: int
+    page_count: int
+    freelist_trunk: int
+    freelist_count: int
+    encoding: str
+    autovacuum: bool = False
+
+    @property
+    def usable(self) -> int:
+        return self.page_size - self.reserved
+
+
+@dataclass
+class SchemaObject:
+    type: str
+    name: str
+    tbl_name: str
+    rootpage: int
+    sql: Optional[str]
+
+
+@dataclass
+class ScanReport:
+    path: str
+    header: DbHeader
+    damaged: dict[int, str] = field(default_factory=dict)
+    owners: dict[int, str] = field(default_factory=dict)
+    page_types: Counter = field(default_factory=Counter)
+    free_pages: set[int] = field(default_factory=set)
+    orphan_leaves: list[int] = field(default_factory=list)
+    schema: list[SchemaObject] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def unreachable_leaves(self) -> int:
+        return len(self.orphan_leaves)
+
+    def damaged_by_owner(self) -> dict[str, list[int]]:
+        result: dict[str, list[int]] = defaultdict(list)
+        for pgno in sorted(self.damaged):
+            result[self.owners.get(pgno, "(未归属/空闲页)")].append(pgno)
+        return dict(result)
+
+
+def read_header(data: bytes, file_size: int) -> DbHeader:
+    if data[:16] != HEADER_MAGIC:
+        raise ValueError("不是 SQLite 数据库文件（文件头损坏）")
+    page_size = struct.unpack(">H", data[16:18])[0]
+    page_size = 65536 if page_size == 1 else page_size
+    if page_size < 512 or page_size & (page_size - 1):
+        raise ValueError(f"文件头中的页大小无效: {page_size}")
+    return DbHeader(
+        page_size=page_size,
+        reserved=data[20],
+        # 文件头中的页数在旧版本写入时可能不可信，以文件大小为准
+        page_count=file_size // page_size,
+        freelist_trunk=struct.unpack(">I", data[32:36])[0],
+        freelist_count=struct.unpack(">I", data[36:40])[0],
+        encoding=TEXT_ENCODINGS.get(struct.unpack(">I", data[56:60])[0], "utf-8"),
+        autovacuum=struct.unpack(">I", data[52:56])[0] != 0,
+    )
+
+
+def _wal_checksum(data: bytes, s1: int, s2: int, order: str) -> tuple[int, int]:
+    words = struct.unpack(f"{order}{len(data) // 4}I", data)
+    for i in range(0, len(words), 2):
+        s1 = (s1 + words[i] + s2) & 0xFFFFFFFF
+        s2 = (s2 + words[i + 1] + s1) & 0xFFFFFFFF
+    return s1, s2
+
+
+def committed_wal_frames(wal: Path) -> tuple[int, dict[int, bytes], int]:
+    """
+    读取 WAL 中已提交事务的页：返回 (页大小, {页号: 最新页内容}, 提交后的数据库页数)
+    遇到 salt 不符或校验和错误的帧即停止，最后一个提交帧之后的帧（未提交或写了一半）丢弃
+    WAL 为空或文件头无效时返回 (0, {}, 0)
+    """
+    data = wal.read_bytes()
+    if len(data) < WAL_HEADER_SIZE:
+        return 0, {}, 0
+    magic, _, page_size, _, salt1, salt2, check1, check2 = struct.unpack(">8I", data[:WAL_HEADER_SIZE])
+    order = WAL_MAGIC.get(magic)
+    if order is None or page_size < 512 or page_size & (page_size - 1):
+        return 0, {}, 0
+    checksum = _wal_checksum(data[:24], 0, 0, order)
+    if checksum != (check1, check2):
+        return 0, {}, 0
+
+    committed: dict[int, bytes] = {}
+    pending: dict[int, bytes] = {}
+    db_pages = 0
+    frame_size = WAL_FRAME_HEADER_SIZE + page_size
+    for offset in range(WAL_HEADER_SIZE, len(data) - frame_size + 1, frame_size):
+        pgno, commit_size, frame_salt1, frame_salt2, frame_check1, frame_check2 = struct.unpack(
+            ">6I", data[offset:offset + WAL_FRAME_HEADER_SIZE]
+        )
+        page = data[offset + WAL_FRAME_HEADER_SIZE:offset + frame_size]
+        if (frame_salt1, frame_salt2) != (salt1, salt2):
+            break
+        checksum = _wal_checksum(page, *_wal_checksum(data[offset:offset + 8], *checksum, order), order)
+        if checksum != (frame_check1, frame_check2):
+            break
+        pending[pgno] = page
+        if commit_size:
+            committed.update(pending)
+            pending.clear()
+            db_pages = commit_size
+    return page_size, committed, db_pages
+
+
+@contextmanager
+def wal_applied(path: Path) -> Iterator[Path]:
+    """
+    yield 一个包含 WAL 中已提交内容的数据库文件：没有 -wal（或其中没有已提交的帧）时就是原文件，
+    否则是合并后的临时副本，退出时删除
+    """
+    wal = wal_file(path)
+    page_size, pages, db_pages = committed_wal_frames(wal) if wal.exists() else (0, {}, 0)
+    if not pages:
+        yield path
+        return
+    with tempfile.TemporaryDirectory(prefix="ehs-salvage-") as tmp:
+        merged = Path(tmp) / path.name
+        shutil.copyfile(path, merged)
+        with open(merged, "r+b") as f:
+            for pgno, page in pages.items():
+                f.seek((pgno - 1) * page_size)
+                f.write(page)
+            f.truncate(db_pages * page_size)
+        print(f"🧩 已在临时副本上合并 {wal.name} 中已提交的 {len(pages)} 个页")
+        yield merged
+
+
+def special_pages(header: DbHeader) -> set[int]:
+    """没有 B-tree 页头的固定位置页：auto_vacuum 的指针映射页与 1GB 处的锁字节页"""
+    pages = {0x40000000 // header.page_size + 1}
+    if header.autovacuum:
+        pgno, step = 2, header.usable // 5 + 1
+        while pgno <= header.page_count:
+            pages.add(pgno)
+            pgno += step
+    return pages
+
+
+def read_varint(buf, offset: int) -> tuple[int, int]:
+    """解析 SQLite 大端变长整数，返回 (值, 下一个偏移)"""
+    value = 0
+    for i in range(8):
+        byte = buf[offset + i]
+        value = (value << 7) | (byte & 0x7F)
+        if byte < 0x80:
+            return value, offset + i + 1
+    return (value << 8) | buf[offset + 8], offset + 9
+
+
+def page_slice(buf, header: DbHeader, pgno: int) -> tuple[int, int]:
+    """返回页在文件中的起始偏移和 B-tree 页头偏移（第 1 页跳过 100 字节文件头）"""
+    start = (pgno - 1) * header.page_size
+    return start, start + (100 if pgno == 1 else 0)
+
+
+def check_btree_page(buf, header: DbHeader, pgno: int) -> Optional[str]:
+    """校验 B-tree 页头、单元格指针数组与空闲块链；页正常时返回 None，否则返回原因"""
+    start, hdr = page_slice(buf, header, pgno)
+    usable = header.usable
+    page_type = buf[hdr]
+    if page_type not in BTREE_TYPES:
+        return f"页类型无效 ({page_type})"
+    first_freeblock, cell_count, content_start = struct.unpack_from(">HHH", buf, hdr + 1)
+    content_start = content_start or 65536
+    fragmented = buf[hdr + 7]
+    header_size = 12 if page_type in (INTERIOR_INDEX, INTERIOR_TABLE) else 8
+    pointers_end = hdr - start + header_size + 2 * cell_count
+
+    if pointers_end > usable:
+        return f"单元格数过大 ({cell_count})"
+    if content_start > usable or (cell_count and content_start < pointers_end):
+        return f"内容区起点无效 ({content_start})"
+    if fragmented > 60:
+        return f"碎片字节数无效 ({fragmented})"
+    if header_size == 12:
+        right = struct.unpack_from(">I", buf, hdr + 8)[0]
+        if not 1 <= right <= header.page_count:
+            return f"最右子页号越界 ({right})"
+    for i in range(cell_count):
+        pointer = struct.unpack_from(">H", buf, hdr + header_size + 2 * i)[0]
+        if not content_start <= pointer < usable:
+            return f"第 {i} 个单元格指针越界 ({pointer})"
+
+    freeblock, hops = first_freeblock, 0
+    while freeblock:
+        if freeblock < pointers_end or freeblock > usable - 4 or hops > usable // 4:
+            return f"空闲块链损坏 ({freeblock})"
+        next_block, size = struct.unpack_from(">HH", buf, start + freeblock)
+        if size < 4 or freeblock + size > usable or (next_block and next_block <= freeblock + size - 1):
+            return f"空闲块链损坏 ({freeblock})"
+        freeblock, hops = next_block, hops + 1
+    return None
+
+
+def _scan_chunk(path: str, header: DbHeader, first: int, last: int) -> tuple[dict[int, str], Counter]:
+    """工作进程：校验 [first, last] 范围内看起来是 B-tree 页的页"""
+    damaged: dict[int, str] = {}
+    types: Counter = Counter()
+    skip = special_pages(header)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for pgno in range(first, last + 1):
+            if pgno in skip:
+                types["other"] += 1
+                continue
+            _, hdr = page_slice(buf, header, pgno)
+            page_type = buf[hdr]
+            if page_type not in BTREE_TYPES:
+                # 溢出页、空闲页与指针映射页没有页头，由 B-tree 遍历判断其归属
+                types["other"] += 1
+                continue
+            types[page_type] += 1
+            reason = check_btree_page(buf, header, pgno)
+            if reason:
+                damaged[pgno] = reason
+    return damaged, types
+
+
+def parallel_page_scan(path: Path, header: DbHeader, workers: Optional[int] = None) -> tuple[dict[int, str], Counter]:
+    chunks = [
+        (first, min(first + SCAN_CHUNK_PAGES - 1, header.page_count))
+        for first in range(1, header.page_count + 1, SCAN_CHUNK_PAGES)
+    ]
+    damaged: dict[int, str] = {}
+    types: Counter = Counter()
+    if len(chunks) == 1 or workers == 1:
+        results = [_scan_chunk(str(path), header, first, last) for first, last in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            results = list(pool.map(_scan_chunk, *zip(*[(str(path), header, a, b) for a, b in chunks])))
+    for chunk_damaged, chunk_types in results:
+        damaged.update(chunk_damaged)
+        types.update(chunk_types)
+    return damaged, types
+
+
+def cell_offsets(buf, header: DbHeader, pgno: int) -> list[int]:
+    start, hdr = page_slice(buf, header, pgno)
+    page_type = buf[hdr]
+    header_size = 12 if page_type in (INTERIOR_INDEX, INTERIOR_TABLE) else 8
+    cell_count = struct.unpack_from(">H", buf, hdr + 3)[0]
+    return [
+        start + struct.unpack_from(">H", buf, hdr + header_size + 2 * i)[0]
+        for i in range(cell_count)
+    ]
+
+
+def child_pages(buf, header: DbHeader, pgno: int) -> list[int]:
+    _, hdr = page_slice(buf, header, pgno)
+    children = [struct.unpack_from(">I", buf, offset)[0] for offset in cell_offsets(buf, header, pgno)]
+    children.append(struct.unpack_from(">I", buf, hdr + 8)[0])
+    return children
+
+
+def walk_btree(buf, header: DbHeader, root: int, damaged: dict[int, str]) -> Iterator[tuple[int, int]]:
+    """
+    从根页出发遍历一棵 B-tree，产出 (页号, 页类型)；
+    越界、重复引用或类型不一致的页记入 damaged，且不再向下遍历
+    """
+    stack, seen = [(root, None)], set()
+    while stack:
+        pgno, expected_kind = stack.pop()
+        if not 1 <= pgno <= header.page_count:
+            continue
+        if pgno in seen:
+            damaged.setdefault(pgno, "页被重复引用（树中存在环）")
+            continue
+        seen.add(pgno)
+        _, hdr = page_slice(buf, header, pgno)
+        page_type = buf[hdr]
+        is_table = page_type in (INTERIOR_TABLE, LEAF_TABLE)
+        if page_type not in BTREE_TYPES or (expected_kind is not None and expected_kind != is_table):
+            damaged.setdefault(pgno, f"树中的页类型无效 ({page_type})")
+            yield pgno, page_type
+            continue
+        yield pgno, page_type
+        if pgno in damaged or page_type in (LEAF_INDEX, LEAF_TABLE):
+            continue
+        for child in child_pages(buf, header, pgno):
+            if not 1 <= child <= header.page_count:
+                damaged.setdefault(pgno, f"子页号越界 ({child})")
+                continue
+            stack.append((child, is_table))
+
+
+def freelist_pages(buf, header: DbHeader) -> set[int]:
+    pages, trunk = set(), header.freelist_trunk
+    while trunk and 1 <= trunk <= header.page_count and trunk not in pages:
+        pages.add(trunk)
+        start = (trunk - 1) * header.page_size
+        next_trunk, count = struct.unpack_from(">II", buf, start)
+        count = min(count, (header.usable - 8) // 4)
+        pages.update(struct.unpack_from(f">{count}I", buf, start + 8))
+        trunk = next_trunk
+    return pages
+
+
+def decode_record(buf, offset: int, end: int, encoding: str) -> list:
+    """解析一条记录（记录头 + 各列值）"""
+    header_size, pos = read_varint(buf, offset)
+    header_end = offset + header_size
+    serial_types = []
+    while pos < header_end:
+        serial_type, pos = read_varint(buf, pos)
+        serial_types.append(serial_type)
+
+    values, pos = [], header_end
+    for serial_type in serial_types:
+        if serial_type == 0:
+            values.append(None)
+        elif serial_type in (8, 9):
+            values.append(serial_type - 8)
+        elif serial_type <= 6:
+            size = (1, 2, 3, 4, 6, 8)[serial_type - 1]
+            values.append(int.from_bytes(buf[pos:pos + size], "big", signed=True))
+            pos += size
+        elif serial_type == 7:
+            values.append(struct.unpack_from(">d", buf, pos)[0])
+            pos += 8
+        elif serial_type >= 12:
+            size = (serial_type - 12) // 2
+            raw = bytes(buf[pos:pos + size])
+            values.append(raw if serial_type % 2 == 0 else raw.decode(encoding, errors="replace"))
+            pos += size
+        else:
+            raise ValueError(f"保留的 serial type {serial_type}")
+        if pos > end:
+            raise ValueError("记录超出单元格范围")
+    return values
+
+
+def _table_payload(buf, header: DbHeader, cell: int) -> tuple[int, bytes]:
+    """读取表叶子页单元格：返回 (rowid, 完整负载)，负载超出本页时沿溢出页链拼接"""
+    usable = header.usable
+    payload_size, pos = read_varint(buf, cell)
+    rowid, pos = read_varint(buf, pos)
+    if rowid >= 1 << 63:
+        rowid -= 1 << 64
+    max_local = usable - 35
+    if payload_size <= max_local:
+        return rowid, bytes(buf[pos:pos + payload_size])
+
+    min_local = (usable - 12) * 32 // 255 - 23
+    local = min_local + (payload_size - min_local) % (usable - 4)
+    local = local if local <= max_local else min_local
+    parts = [bytes(buf[pos:pos + local])]
+    remaining = payload_size - local
+    overflow = struct.unpack_from(">I", buf, pos + local)[0]
+    hops = 0
+    while remaining > 0:
+        if not 1 <= overflow <= header.page_count or hops > header.page_count:
+            raise ValueError("溢出页链损坏")
+        start = (overflow - 1) * header.page_size
+        chunk = min(remaining, usable - 4)
+        parts.append(bytes(buf[start + 4:start + 4 + chunk]))
+        remaining -= chunk
+        overflow = struct.unpack_from(">I", buf, start)[0]
+        hops += 1
+    return rowid, b"".join(parts)
+
+
+def leaf_rows(buf, header: DbHeader, pgno: int) -> Iterator[tuple[int, list]]:
+    """解析表叶子页上的所有行；单元格损坏时跳过该行"""
+    for cell in cell_offsets(buf, header, pgno):
+        try:
+            rowid, payload = _table_payload(buf, header, cell)
+            yield rowid, decode_record(payload, 0, len(payload), header.encoding)
+        except (ValueError, IndexError, struct.error):
+            continue
+
+
+def read_schema(buf, header: DbHeader, damaged: dict[int, str]) -> list[SchemaObject]:
+    """直接解析第 1 页开始的 sqlite_master 表，不经过 SQLite"""
+    objects = []
+    for pgno, page_type in walk_btree(buf, header, 1, damaged):
+        if page_type != LEAF_TABLE or pgno in damaged:
+            continue
+        for _, values in leaf_rows(buf, header, pgno):
+            if len(values) >= 5 and isinstance(values[3], int):
+                objects.append(SchemaObject(*values[:5]))
+    return objects
+
+
+@traced("db.salvage.scan")
+def scan_database(path: Path, workers: Optional[int] = None) -> ScanReport:
+    """并行逐页校验后遍历所有 B-tree，把损坏页归属到表/索引"""
+    started = time.perf_counter()
+    file_size = path.stat().st_size
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        header = read_header(buf[:100], file_size)
+        report = ScanReport(path=str(path), header=header)
+        report.damaged, report.page_types = parallel_page_scan(path, header, workers)
+
+        report.owners[1] = "sqlite_master"
+        report.schema = read_schema(buf, header, report.damaged)
+        for pgno, _ in walk_btree(buf, header, 1, {}):
+            report.owners[pgno] = "sqlite_master"
+        for obj in report.schema:
+            if obj.rootpage:
+                for pgno, _ in walk_btree(buf, header, obj.rootpage, report.damaged):
+                    report.owners.setdefault(pgno, obj.name)
+
+        report.free_pages = freelist_pages(buf, header)
+        # 空闲页上的旧内容不算损坏
+        for pgno in report.free_pages:
+            if pgno not in report.owners:
+                report.damaged.pop(pgno, None)
+        # 内部页损坏后，其下方完好的叶子页无法从任何根页到达，抢救时按列数归还给受损的表
+        skip = special_pages(header)
+        report.orphan_leaves = [
+            pgno for pgno in range(1, header.page_count + 1)
+            if pgno not in report.owners and pgno not in report.free_pages and pgno not in skip
+            and pgno not in report.damaged and buf[page_slice(buf, header, pgno)[1]] == LEAF_TABLE
+        ]
+    report.duration = time.perf_counter() - started
+    annotate(bytes=file_size)
+    return report
+
+
+def print_scan_report(report: ScanReport):
+    header = report.header
+    size_mb = header.page_count * header.page_size / (1024 * 1024)
+    rate = header.page_count / report.duration if report.duration else 0
+    print(f"\n🔬 页级扫描: {report.path}")
+    print(f"   {header.page_count} 页 × {header.page_size}B ({size_mb:.1f}MB)，"
+          f"耗时 {report.duration:.2f}s（{rate:,.0f} 页/秒）")
+    print(f"   表/索引 {len(report.schema)} 个，空闲页 {len(report.free_pages)}，"
+          f"无法从任何表到达的叶子页 {report.unreachable_leaves}")
+    if not report.damaged:
+        print("   ✅ 未发现损坏的页")
+        return
+    print(f"   ❌ 损坏页 {len(report.damaged)} 个:")
+    for owner, pages in report.damaged_by_owner().items():
+        preview = ", ".join(str(p) for p in pages[:10]) + (" ..." if len(pages) > 10 else "")
+        print(f"      {owner}: {len(pages)} 页 [{preview}]")
+        for pgno in pages[:3]:
+            print(f"         页 {pgno}: {report.damaged[pgno]}")
+
+
+def _column_defaults(conn: sqlite3.Connection, table: str) -> list[tuple[str, object, bool]]:
+    """列名、默认值与是否为 INTEGER PRIMARY KEY（rowid 别名）"""
+    columns = []
+    info = conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+    single_pk = sum(1 for row in info if row[5]) == 1
+    for _, name, col_type, _, default, pk in info:
+        value = conn.execute(f"SELECT {default}").fetchone()[0] if default is not None else None
+        columns.append((name, value, bool(pk) and single_pk and col_type.upper() == "INTEGER"))
+    return columns
+
+
+def _insert_rows(target: sqlite3.Connection, table: str, columns: list, rows: Iterator[tuple[int, list]],
+                 batch: int) -> int:
+    names = ", ".join(f'"{name}"' for name, _, _ in columns)
+    placeholders = ", ".join("?" for _ in range(len(columns) + 1))
+    sql = f'INSERT OR IGNORE INTO "{table}" (rowid, {names}) VALUES ({placeholders})'
+    inserted, pending = 0, []
+    for rowid, values in rows:
+        values = list(values[:len(columns)])
+        # ALTER TABLE ADD COLUMN 之前写入的记录列数较少，补默认值
+        values += [default for _, default, _ in columns[len(values):]]
+        for i, (_, _, is_rowid_alias) in enumerate(columns):
+            if is_rowid_alias and values[i] is None:
+                values[i] = rowid
+        pending.append([rowid] + values)
+        if len(pending) >= batch:
+            inserted += target.executemany(sql, pending).rowcount
+            pending = []
+    if pending:
+        inserted += target.executemany(sql, pending).rowcount
+    return inserted
+
+
+def _sqlite_rows(source: sqlite3.Connection, table: str, batch: int) -> Iterator[tuple[int, list]]:
+    last = None
+    while True:
+        if last is None:
+            rows = source.execute(f'SELECT rowid, * FROM "{table}" ORDER BY rowid LIMIT ?', (batch,)).fetchall()
+        else:
+            rows = source.execute(
+                f'SELECT rowid, * FROM "{table}" WHERE rowid > ? ORDER BY rowid LIMIT ?', (last, batch)
+            ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield row[0], list(row[1:])
+        last = rows[-1][0]
+
+
+def _page_rows(buf, report: ScanReport, table: str, orphans: list[int]) -> Iterator[tuple[int, list]]:
+    header = report.header
+    for pgno, owner in report.owners.items():
+        if owner == table and pgno not in report.damaged and buf[page_slice(buf, header, pgno)[1]] == LEAF_TABLE:
+            yield from leaf_rows(buf, header, pgno)
+    for pgno in orphans:
+        yield from leaf_rows(buf, header, pgno)
+
+
+def assign_orphan_leaves(buf, report: ScanReport, column_counts: dict[str, int]) -> dict[str, list[int]]:
+    """
+    把无法到达的叶子页按记录列数分配给受损的表；
+    列数与多张受损表相同时无法判断归属，放弃该页
+    """
+    by_count: dict[int, list[str]] = defaultdict(list)
+    for table, count in column_counts.items():
+        by_count[count].append(table)
+    assigned: dict[str, list[int]] = defaultdict(list)
+    for pgno in report.orphan_leaves:
+        first = next(leaf_rows(buf, report.header, pgno), None)
+        candidates = by_count.get(len(first[1]), []) if first else []
+        if len(candidates) == 1:
+            assigned[candidates[0]].append(pgno)
+    return assigned
+
+
+@traced("db.salvage.salvage")
+def salvage_database(source_path: Path, output_path: Path, report: Optional[ScanReport] = None,
+                     batch: int = SALVAGE_BATCH) -> dict:
+    """
+    把可读的行写入新数据库：先建表、导入数据，最后再建索引、触发器和视图
+    存在 -wal 时从合并了已提交帧的临时副本抢救；report 须来自同一个文件，否则重新扫描
+    """
+    if output_path.exists():
+        raise FileExistsError(f"输出文件已存在: {output_path}")
+    with wal_applied(source_path) as merged:
+        if report is None or report.path != str(merged):
+            report = scan_database(merged)
+        return _salvage(merged, output_path, report, batch)
+
+
+def _salvage(source_path: Path, output_path: Path, report: ScanReport, batch: int) -> dict:
+    damaged_tables = set(report.damaged_by_owner())
+    result: dict = {"tables": {}, "failed_objects": [], "output": str(output_path)}
+    started = time.perf_counter()
+
+    target = sqlite3.connect(str(output_path), isolation_level=None)
+    target.execute("PRAGMA journal_mode = OFF")
+    target.execute("PRAGMA synchronous = OFF")
+    # immutable=1: 不创建 -shm/-wal，也不理会锁，损坏文件保持原样
+    source = sqlite3.connect(f"{source_path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+    with closing(target), closing(source), open(source_path, "rb") as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        tables = [o for o in report.schema if o.type == "table" and o.sql and not o.name.startswith("sqlite_")]
+        for obj in tables:
+            target.execute(obj.sql)
+        columns_by_table = {obj.name: _column_defaults(target, obj.name) for obj in tables}
+        orphans = assign_orphan_leaves(
+            buf, report, {name: len(cols) for name, cols in columns_by_table.items() if name in damaged_tables}
+        )
+
+        for obj in tables:
+            columns = columns_by_table[obj.name]
+            target.execute("BEGIN")
+            table_started = time.perf_counter()
+            method = "pages" if obj.name in damaged_tables else "sqlite"
+            count = 0
+            if method == "sqlite":
+                try:
+                    count = _insert_rows(target, obj.name, columns, _sqlite_rows(source, obj.name, batch), batch)
+                except sqlite3.DatabaseError:
+                    method = "pages"
+            if method == "pages":
+                count += _insert_rows(
+                    target, obj.name, columns, _page_rows(buf, report, obj.name, orphans.get(obj.name, [])), batch
+                )
+            target.execute("COMMIT")
+            result["tables"][obj.name] = {
+                "rows": count,
+                "method": method,
+                "seconds": time.perf_counter() - table_started,
+            }
+
+        for obj in report.schema:
+            if obj.type in ("index", "trigger", "view") and obj.sql:
+                try:
+                    target.execute(obj.sql)
+                except sqlite3.DatabaseError as e:
+                    result["failed_objects"].append(f"{obj.name}: {e}")
+
+    result["duration"] = time.perf_counter() - started
+    result["rows"] = sum(t["rows"] for t in result["tables"].values())
+    annotate(rows=result["rows"])
+    return result
+
+
+def print_salvage_report(result: dict):
+    rate = result["rows"] / result["duration"] if result["duration"] else 0
+    print(f"\n🛟 数据抢救完成: {result['output']}")
+    print(f"   共 {result['rows']} 行，耗时 {result['duration']:.2f}s（{rate:,.0f} 行/秒）")
+    for name, info in result["tables"].items():
+        if info["rows"] or info["method"] == "pages":
+            mark = "🩹" if info["method"] == "pages" else "  "
+            print(f"   {mark} {name:<32}{info['rows']:>10} 行  ({info['method']}, {info['seconds']:.2f}s)")
+    for failure in result["failed_objects"]:
+        print(f"   ⚠️  无法重建 {failure}")
+
+
+def _scan_json(report: ScanReport) -> dict:
+    return {
+        "path": report.path,
+        "page_size": report.header.page_size,
+        "page_count": report.header.page_count,
+        "duration_s": round(report.duration, 3),
+        "damaged": {owner: pages for owner, pages in report.damaged_by_owner().items()},
+        "reasons": {str(pgno): reason for pgno, reason in sorted(report.damaged.items())},
+        "unreachable_leaves": report.orphan_leaves,
+    }
+
+
+def run_scan(args: argparse.Namespace) -> int:
+    try:
+        with wal_applied(Path(args.file)) as source:
+            report = scan_database(source, args.workers)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法扫描 {args.file}: {e}")
+        return 1
+    report = replace(report, path=args.file)
+    print_scan_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(_scan_json(report), ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"   报告已写入: {args.json}")
+    return 1 if report.damaged else 0
+
+
+def run_salvage(args: argparse.Namespace) -> int:
+    output = Path(args.output)
+    if output.exists():
+        print(f"❌ 输出文件已存在: {output}")
+        return 1
+    try:
+        with wal_applied(Path(args.file)) as source:
+            report = scan_database(source, args.workers)
+            print_scan_report(replace(report, path=args.file))
+            result = salvage_database(source, output, report, args.batch)
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法抢救 {args.file}: {e}")
+        return 1
+    print_salvage_report(result)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db scan / salvage 子命令"""
+    scan_parser = subparsers.add_parser("scan", help="并行逐页扫描数据库文件，报告损坏的页及所属表")
+    scan_parser.add_argument("file", type=str, help="数据库文件（如 prisma/dev.db.corrupted.*）")
+    scan_parser.add_argument("--workers", type=int, help="并行进程数 (默认: CPU 核数)")
+    scan_parser.add_argument("--json", type=str, help="把扫描结果写入 JSON 文件")
+    scan_parser.set_defaults(func=run_scan)
+
+    salvage_parser = subparsers.add_parser("salvage", help="把损坏数据库中所有可读的行导入新数据库")
+    salvage_parser.add_argument("file", type=str, help="损坏的数据库文件")
+    salvage_parser.add_argument("--output", type=str, required=True, help="新数据库文件路径（不能已存在）")
+    salvage_parser.add_argument("--workers", type=int, help="扫描的并行进程数 (默认: CPU 核数)")
+    salvage_parser.add_argument(
+        "--batch",
+        type=int,
+        default=SALVAGE_BATCH,
+        help=f"每批写入的行数 (默认: {SALVAGE_BATCH})"
+    )
+    salvage_parser.set_defaults(func=run_salvage)
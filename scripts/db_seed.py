@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+EHS 系统大规模测试数据生成 (SQLite 直写)
+替代 stress-test-generate-data*.ts 逐条走 Prisma 的做法，直接按表结构批量写入：
+部门树、用户、隐患及其工作流步骤、可见性记录与通知，分布接近生产数据
+- 上报量按工作日/周末加权分布到每天，少数活跃用户贡献大部分上报
+- 越早的隐患越大概率已闭环，未闭环隐患停留在工作流的各个步骤
+- 工作流步骤取自 data/hazard-workflow.json，状态推导与后端一致
+写入时删除相关表的二级索引、关闭 synchronous，在同一个事务内 executemany 批量写入后重建索引；
+任一步失败整体回滚（包括删掉的索引）
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import random
+import sqlite3
+import string
+import time
+from collections import Counter
+from contextlib import closing
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from db_preflight import connect, find_database
+from hazard_lifecycle import status_for_step
+from ops_trace import annotate, traced
+
+
+WORKFLOW_FILE = Path(__file__).resolve().parents[1] / "data" / "hazard-workflow.json"
+DEFAULT_STEPS = [
+    {"id": "report", "name": "上报并指派", "handlerStrategy": {"type": "fixed"}},
+    {"id": "assign", "name": "开始整改", "handlerStrategy": {"type": "reporter_manager"}},
+    {"id": "rectify", "name": "提交整改", "handlerStrategy": {"type": "fixed"}},
+    {"id": "verify", "name": "验收闭环", "handlerStrategy": {"type": "fixed"}},
+]
+SEED_TABLES = ["Department", "User", "HazardRecord", "HazardWorkflowStep", "HazardVisibility", "Notification"]
+SEED_BATCH = 20000
+DAY_MS = 86_400_000
+# 隐患编号 Hazard + YYYYMMDD + 3 位序号，每天最多 999 个（与 HazardCodePool 一致），超出的不分配编号；
+# 序号接在库中当天已有编号之后，同一库多次生成不会冲突
+MAX_CODES_PER_DAY = 999
+
+RISK_LEVELS = {"low": 55, "medium": 30, "high": 12, "major": 3}
+CHECK_TYPES = {"daily": 60, "special": 12, "monthly": 12, "pre-holiday": 6, "self": 7, "other": 3}
+HAZARD_TYPES = {"火灾": 22, "机械伤害": 25, "触电": 18, "中毒": 8, "窒息": 5, "爆炸": 4, "高处坠落": 10, "其他": 8}
+AREAS = {"车间": 45, "仓库": 20, "施工现场": 15, "办公室": 10, "其他": 10}
+DESCRIPTIONS = [
+    "消防通道被杂物堵塞", "灭火器压力不足", "配电箱未上锁", "电缆老化破损", "设备防护罩缺失",
+    "作业人员未佩戴安全帽", "化学品未按要求分类存放", "应急照明失效", "安全警示标识缺失",
+    "登高作业未系安全带", "通风设备运行异常", "地面油污未及时清理",
+]
+DEPARTMENT_NAMES = ["生产", "设备", "质量", "安环", "行政", "采购", "仓储", "研发"]
+JOB_TITLES = {"操作工": 50, "班组长": 12, "技术员": 12, "工程师": 10, "安全员": 6, "主管": 6, "经理": 4}
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢"
+GIVEN = "伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华玉萍红鹏辉建国志宏海峰晨浩宇欣怡佳琪子涵梓轩"
+REPORTER_PERMISSIONS = json.dumps({"hidden_danger": ["report", "view"]}, ensure_ascii=False)
+# 占位 bcrypt 哈希，生成的账号不可登录
+PASSWORD_HASH = "$2b$10$seedseedseedseedseedseOq0Cj8QmX6s7vWm0Yv4dJp3wXqZkq1e"
+
+
+def _ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+def _cum_weights(weights: Dict[Any, float]) -> tuple[list, list]:
+    return list(weights), list(itertools.accumulate(weights.values()))
+
+
+def load_workflow_steps(workflow_file: Path = WORKFLOW_FILE) -> List[Dict[str, Any]]:
+    """读取当前工作流配置的步骤，文件不存在或损坏时使用默认四步流程"""
+    try:
+        steps = json.loads(workflow_file.read_text(encoding="utf-8"))["steps"]
+    except (OSError, ValueError, KeyError):
+        return DEFAULT_STEPS
+    return steps if steps and steps[0]["id"] == "report" else DEFAULT_STEPS
+
+
+# ---------------------------------------------------------------------------
+# 生成器：部门、用户
+# ---------------------------------------------------------------------------
+
+class SeedContext:
+    """一次生成中共享的随机源、ID 前缀与已生成的部门/用户，供隐患及子表引用"""
+
+    def __init__(self, seed: Optional[int], now_ms: int, steps: List[Dict[str, Any]]):
+        self.rng = random.Random(seed)
+        # 同一库多次生成时用标签区分 ID 与用户名，避免主键/唯一键冲突
+        self.tag = "".join(self.rng.choices(string.ascii_lowercase + string.digits, k=5))
+        self.now_ms = now_ms
+        self.steps = steps
+        self.departments: List[tuple] = []  # (id, name, managerId)
+        self.users: List[tuple] = []  # (id, name, departmentIndex)
+        # 库中每天已占用的最大编号序号（隐患与编号池），本次生成的编号接在其后
+        self.code_offsets: Dict[str, int] = {}
+
+    def make_id(self, kind: str, n: int) -> str:
+        # 与 cuid 同为 25 位，索引页大小接近真实数据
+        return f"c{self.tag}{kind}{n:018x}"
+
+
+def generate_departments(ctx: SeedContext, count: int) -> List[tuple]:
+    """三级部门树：公司 -> 部门 -> 车间/班组，每个部门的负责人是该部门生成的第一个用户"""
+    rows = []
+    created = ctx.now_ms - 3 * 365 * DAY_MS
+    second_level = max(1, round(math.sqrt(count)))
+    for i in range(count):
+        if i == 0:
+            parent, level, name = None, 1, "总公司"
+        elif i <= second_level:
+            parent, level = 0, 2
+            name = f"{DEPARTMENT_NAMES[(i - 1) % len(DEPARTMENT_NAMES)]}部{(i - 1) // len(DEPARTMENT_NAMES) or ''}"
+        else:
+            parent = 1 + (i - second_level - 1) % second_level
+            level, name = 3, f"{rows[parent][1]}{(i - second_level - 1) // second_level + 1}班"
+        dept_id = ctx.make_id("d", i)
+        manager_id = ctx.make_id("u", i)
+        rows.append((
+            dept_id, name, rows[parent][0] if parent is not None else None, manager_id, level, i, created, created,
+        ))
+        ctx.departments.append((dept_id, name, manager_id))
+    return rows
+
+
+def generate_users(ctx: SeedContext, count: int) -> List[tuple]:
+    """部门人数按幂律分布（少数大车间），前 N 个用户依次是各部门负责人，其余按人数权重分到部门"""
+    rng = ctx.rng
+    dept_count = len(ctx.departments)
+    dept_weights = list(itertools.accumulate(1 / (k + 1) ** 0.8 for k in range(dept_count)))
+    dept_order = list(range(dept_count))
+    rng.shuffle(dept_order)
+    titles, title_weights = _cum_weights(JOB_TITLES)
+    created_from = ctx.now_ms - 3 * 365 * DAY_MS
+
+    rows = []
+    for i in range(count):
+        if i < dept_count:
+            dept_index, title = i, "经理"
+        else:
+            dept_index = dept_order[rng.choices(range(dept_count), cum_weights=dept_weights)[0]]
+            title = rng.choices(titles, cum_weights=title_weights)[0]
+        dept_id, _, manager_id = ctx.departments[dept_index]
+        user_id = ctx.make_id("u", i)
+        name = rng.choice(SURNAMES) + "".join(rng.choices(GIVEN, k=rng.choice((1, 2, 2))))
+        role = "admin" if i % 200 == 0 else "user"
+        created = created_from + rng.randrange(2 * 365) * DAY_MS
+        rows.append((
+            user_id, f"seed_{ctx.tag}_{i}", name, PASSWORD_HASH, role, dept_id, title,
+            manager_id if manager_id != user_id else None, REPORTER_PERMISSIONS,
+            int(rng.random() < 0.95), created, created,
+        ))
+        ctx.users.append((user_id, name, dept_index))
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# 生成器：隐患及其子表
+# ---------------------------------------------------------------------------
+
+def _daily_counts(ctx: SeedContext, hazards: int, days: int) -> list[tuple[int, int]]:
+    """把隐患数按工作日 1.0 / 周末 0.3 的权重分配到最近 days 天，返回 [(当天 0 点毫秒, 数量)]"""
+    now = datetime.fromtimestamp(ctx.now_ms / 1000, tz=timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    starts = [today - timedelta(days=days - d) for d in range(days)]
+    weights = list(itertools.accumulate(1.0 if s.weekday() < 5 else 0.3 for s in starts))
+    counts = Counter(ctx.rng.choices(range(days), cum_weights=weights, k=hazards))
+    return [(_ms(starts[d]), counts[d]) for d in range(days) if counts[d]]
+
+
+def hazard_batches(ctx: SeedContext, hazards: int, days: int, batch: int = SEED_BATCH):
+    """
+    按时间顺序逐天生成隐患，每积累约 batch 行产出一次各表的行:
+    {"HazardRecord": [...], "HazardWorkflowStep": [...], "HazardVisibility": [...], "Notification": [...]}
+    """
+    rng = ctx.rng
+    steps = ctx.steps
+    last_index = len(steps) - 1
+    step_statuses = [status_for_step(step["id"], i, steps) for i, step in enumerate(steps)]
+    user_count = len(ctx.users)
+    # 帕累托权重：约 20% 的用户贡献大部分上报
+    reporter_weights = list(itertools.accumulate(1 / (k + 1) ** 1.1 for k in range(user_count)))
+    reporter_order = list(range(user_count))
+    rng.shuffle(reporter_order)
+    # 安环部门的几位用户作为 fixed 步骤的执行人/验收人
+    ehs_users = [ctx.users[k] for k in rng.sample(range(user_count), min(5, user_count))]
+    # 每一步由谁处理：上报人 / 整改责任人 / 固定执行人（验收人） / 上报人部门负责人
+    step_roles = [
+        "reporter" if step["id"] == "report"
+        else "leader" if step["id"] == "rectify"
+        else "verifier" if step["id"] == "verify" or step["handlerStrategy"].get("type") == "fixed"
+        else "manager"
+        for step in steps
+    ]
+    # 步骤表中的执行人 JSON 数组按用户缓存，避免每行 json.dumps
+    handler_json = {
+        user_id: (json.dumps([user_id]), json.dumps([name], ensure_ascii=False)) for user_id, name, _ in ctx.users
+    }
+    risks, risk_weights = _cum_weights(RISK_LEVELS)
+    check_types, check_weights = _cum_weights(CHECK_TYPES)
+    hazard_types, type_weights = _cum_weights(HAZARD_TYPES)
+    areas, area_weights = _cum_weights(AREAS)
+
+    out = {table: [] for table in SEED_TABLES[2:]}
+    n = step_n = vis_n = notice_n = 0
+    for day_ms, count in _daily_counts(ctx, hazards, days):
+        day = datetime.fromtimestamp(day_ms / 1000, tz=timezone.utc).strftime("%Y%m%d")
+        # 工作时间 8:00-18:00 内上报，按时间排序让 id/编号随时间递增
+        offsets = sorted(rng.randrange(8 * 3_600_000, 18 * 3_600_000) for _ in range(count))
+        age_days = (ctx.now_ms - day_ms) / DAY_MS
+        closed_probability = 0.97 * (1 - math.exp(-age_days / 10))
+        first_seq = ctx.code_offsets.get(day, 0) + 1
+        for seq, offset in enumerate(offsets, first_seq):
+            hazard_id = ctx.make_id("h", n)
+            created = day_ms + offset
+            reporter_id, reporter_name, reporter_dept = ctx.users[
+                reporter_order[rng.choices(range(user_count), cum_weights=reporter_weights)[0]]
+            ]
+            leader_id, leader_name, leader_dept = ctx.users[rng.randrange(user_count)]
+            manager_id = ctx.departments[reporter_dept][2]
+            manager_name = ctx.users[reporter_dept][1]
+            verifier_id, verifier_name, _ = rng.choice(ehs_users)
+            people = {
+                "reporter": (reporter_id, reporter_name),
+                "leader": (leader_id, leader_name),
+                "verifier": (verifier_id, verifier_name),
+                "manager": (manager_id, manager_name),
+            }
+            handlers = [people[role] for role in step_roles]
+
+            closed = rng.random() < closed_probability
+            step_index = last_index if closed else min(int(rng.expovariate(1.2)), last_index)
+            status = "closed" if closed else step_statuses[step_index]
+            # 每一步处理 0.5~3 天
+            step_times = [min(at, ctx.now_ms) for at in itertools.accumulate(
+                [created] + [rng.randrange(DAY_MS // 2, 3 * DAY_MS) for _ in range(step_index + 1)]
+            )]
+            updated = step_times[-1] if closed else step_times[step_index]
+            executor_id, executor_name = (None, None) if closed else handlers[step_index]
+            rectified = closed or steps[step_index]["id"] == "verify"
+            voided = rng.random() < 0.02
+            risk = rng.choices(risks, cum_weights=risk_weights)[0]
+            location = rng.choices(areas, cum_weights=area_weights)[0]
+
+            out["HazardRecord"].append((
+                hazard_id,
+                f"Hazard{day}{seq:03d}" if seq <= MAX_CODES_PER_DAY else None,
+                status,
+                risk,
+                rng.choices(check_types, cum_weights=check_weights)[0],
+                "immediate" if risk == "low" and rng.random() < 0.4 else "scheduled",
+                rng.choices(hazard_types, cum_weights=type_weights)[0],
+                location,
+                rng.choice(DESCRIPTIONS),
+                reporter_id, reporter_name, ctx.departments[reporter_dept][1], created,
+                leader_id, leader_name, leader_id, leader_name,
+                ctx.departments[leader_dept][0], ctx.departments[leader_dept][1],
+                created + (7 if risk in ("low", "medium") else 3) * DAY_MS,
+                "已按要求完成整改" if rectified else None,
+                step_times[-2] if rectified else None,
+                verifier_id if closed else None, verifier_name if closed else None,
+                step_times[-1] if closed else None, "验收通过" if closed else None,
+                executor_id, executor_name, executor_id, executor_name,
+                step_index, steps[step_index]["id"],
+                int(voided), "重复上报" if voided else None, updated if voided else None,
+                created, updated,
+            ))
+
+            cc_users = [ctx.users[k] for k in rng.sample(range(user_count), min(rng.choice((0, 0, 1, 2)), user_count))]
+            cc_ids = json.dumps([u[0] for u in cc_users]) if cc_users else None
+            cc_names = json.dumps([u[1] for u in cc_users], ensure_ascii=False) if cc_users else None
+            for index in range(step_index + 1):
+                step = steps[index]
+                handler_ids, handler_names = handler_json[handlers[index][0]]
+                out["HazardWorkflowStep"].append((
+                    ctx.make_id("w", step_n), hazard_id, index, step["id"], step.get("name", step["id"]),
+                    handler_ids, handler_names,
+                    step["handlerStrategy"].get("type"), cc_ids if index == 0 else None,
+                    cc_names if index == 0 else None, step["handlerStrategy"].get("approvalMode"),
+                    step_times[index], step_times[index],
+                ))
+                step_n += 1
+
+            visible = [(reporter_id, "creator"), (leader_id, "responsible")]
+            visible += [(u[0], "cc") for u in cc_users]
+            if executor_id:
+                visible.append((executor_id, "executor"))
+            if closed:
+                visible.append((verifier_id, "verifier"))
+            for user_id, role in visible:
+                out["HazardVisibility"].append((ctx.make_id("v", vis_n), hazard_id, user_id, role, created, updated))
+                vis_n += 1
+
+            notices = [(u[0], "hazard_cc", "隐患抄送", created) for u in cc_users]
+            if step_index >= 1:
+                notices.append((leader_id, "hazard_assigned", "隐患已指派", step_times[1]))
+            if rectified:
+                notices.append((verifier_id, "hazard_rectified", "隐患整改完成，待验收", step_times[-2]))
+            if closed:
+                notices.append((reporter_id, "hazard_closed", "隐患已闭环", step_times[-1]))
+            for user_id, kind, title, at in notices:
+                if at > ctx.now_ms:
+                    continue
+                read = rng.random() < min(0.98, 0.3 + (ctx.now_ms - at) / (7 * DAY_MS))
+                out["Notification"].append((
+                    ctx.make_id("n", notice_n), user_id, kind, title,
+                    f"{title}：{reporter_name} 上报的{location}隐患", "hazard", hazard_id,
+                    int(read), at, at,
+                ))
+                notice_n += 1
+
+            n += 1
+            if len(out["HazardRecord"]) >= batch:
+                yield out
+                out = {table: [] for table in SEED_TABLES[2:]}
+    if out["HazardRecord"]:
+        yield out
+
+
+# ---------------------------------------------------------------------------
+# 写入
+# ---------------------------------------------------------------------------
+
+INSERT_SQL = {
+    "Department": (
+        'INSERT INTO "Department" ("id", "name", "parentId", "managerId", "level", "sortOrder", "createdAt", '
+        '"updatedAt") VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+    ),
+    "User": (
+        'INSERT INTO "User" ("id", "username", "name", "password", "role", "departmentId", "jobTitle", '
+        '"directManagerId", "permissions", "isActive", "createdAt", "updatedAt") '
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    "HazardRecord": (
+        'INSERT INTO "HazardRecord" ("id", "code", "status", "riskLevel", "checkType", "rectificationType", '
+        '"type", "location", "desc", "reporterId", "reporterName", "reporterDeptName", "reportTime", '
+        '"responsibleId", "responsibleName", "rectificationLeaderId", "rectificationLeaderName", '
+        '"rectificationDeptId", "rectificationDeptName", "deadline", "rectificationNotes", "rectificationTime", '
+        '"verifierId", "verifierName", "verificationTime", "verificationNotes", "dopersonal_ID", '
+        '"dopersonal_Name", "currentExecutorId", "currentExecutorName", "currentStepIndex", "currentStepId", '
+        '"isVoided", "voidReason", "voidedAt", "createdAt", "updatedAt") '
+        f"VALUES ({', '.join('?' * 37)})"
+    ),
+    "HazardWorkflowStep": (
+        'INSERT INTO "HazardWorkflowStep" ("id", "hazardId", "stepIndex", "stepId", "stepName", "handlerUserIds", '
+        '"handlerUserNames", "matchedBy", "ccUserIds", "ccUserNames", "approvalMode", "createdAt", "updatedAt") '
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    ),
+    "HazardVisibility": (
+        'INSERT INTO "HazardVisibility" ("id", "hazardId", "userId", "role", "createdAt", "updatedAt") '
+        "VALUES (?, ?, ?, ?, ?, ?)"
+    ),
+    "Notification": (
+        'INSERT INTO "Notification" ("id", "userId", "type", "title", "content", "relatedType", "relatedId", '
+        '"isRead", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    ),
+}
+
+
+USED_CODES_SQL = """
+SELECT substr("code", 7, 8), MAX(CAST(substr("code", 15) AS INTEGER)) FROM (
+    SELECT "code" FROM "HazardRecord" UNION ALL SELECT "code" FROM "HazardCodePool"
+)
+WHERE "code" GLOB 'Hazard[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]'
+GROUP BY 1
+"""
+
+
+def used_code_offsets(conn: sqlite3.Connection) -> Dict[str, int]:
+    """{YYYYMMDD: 当天已占用的最大序号}，唯一索引删除之前查询，仍可走索引"""
+    return dict(conn.execute(USED_CODES_SQL).fetchall())
+
+
+def drop_indexes(conn: sqlite3.Connection, tables: List[str]) -> List[tuple[str, str]]:
+    """删除这些表上的二级索引（含唯一索引），返回 [(索引名, 建索引 SQL)] 供写入后重建"""
+    placeholders = ", ".join("?" * len(tables))
+    indexes = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({placeholders}) ORDER BY name",
+        tables,
+    ).fetchall()
+    for name, _ in indexes:
+        conn.execute(f'DROP INDEX "{name}"')
+    return indexes
+
+
+@traced("db.seed")
+def seed_database(
+    db_file: Path,
+    users: int = 2000,
+    departments: int = 60,
+    hazards: int = 100_000,
+    days: Optional[int] = None,
+    seed: Optional[int] = None,
+    batch: int = SEED_BATCH,
+    defer_indexes: bool = True,
+    now_ms: Optional[int] = None,
+    workflow_file: Path = WORKFLOW_FILE,
+) -> dict:
+    """
+    向已迁移的数据库追加一批测试数据，返回各表行数与耗时
+    days 默认让每天的隐患数不超过编号上限（至少一年）
+    """
+    if users < departments:
+        raise ValueError("用户数不能少于部门数（每个部门需要一名负责人）")
+    now_ms = now_ms if now_ms is not None else _ms(datetime.now(timezone.utc))
+    days = days or max(365, math.ceil(hazards / 500))
+    ctx = SeedContext(seed, now_ms, load_workflow_steps(workflow_file))
+    report: dict = {"db": str(db_file), "tag": ctx.tag, "days": days, "tables": {t: 0 for t in SEED_TABLES}}
+    started = time.perf_counter()
+
+    with closing(connect(db_file)) as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -262144")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ctx.code_offsets = used_code_offsets(conn)
+            indexes = drop_indexes(conn, SEED_TABLES) if defer_indexes else []
+            for table, rows in (
+                ("Department", generate_departments(ctx, departments)),
+                ("User", generate_users(ctx, users)),
+            ):
+                conn.executemany(INSERT_SQL[table], rows)
+                report["tables"][table] += len(rows)
+            for chunk in hazard_batches(ctx, hazards, days, batch):
+                for table, rows in chunk.items():
+                    conn.executemany(INSERT_SQL[table], rows)
+                    report["tables"][table] += len(rows)
+            report["load_seconds"] = time.perf_counter() - started
+
+            index_started = time.perf_counter()
+            for _, sql in indexes:
+                conn.execute(sql)
+            report["index_seconds"] = time.perf_counter() - index_started
+            report["indexes"] = len(indexes)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    report["duration"] = time.perf_counter() - started
+    report["rows"] = sum(report["tables"].values())
+    report["rows_per_minute"] = report["rows"] / report["duration"] * 60 if report["duration"] else 0.0
+    annotate(rows=report["rows"])
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 输出与命令行
+# ---------------------------------------------------------------------------
+
+def print_seed_report(report: dict):
+    print(f"\n🌱 测试数据已写入: {report['db']}（标签 {report['tag']}，覆盖最近 {report['days']} 天）")
+    for table, rows in report["tables"].items():
+        print(f"      {table:<24}{rows:>12,} 行")
+    print(f"   共 {report['rows']:,} 行，耗时 {report['duration']:.2f}s（{report['rows_per_minute']:,.0f} 行/分钟）")
+    if report["indexes"]:
+        print(f"   写入 {report['load_seconds']:.2f}s，重建 {report['indexes']} 个索引 {report['index_seconds']:.2f}s")
+
+
+def run(args: argparse.Namespace) -> int:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库（请先执行 prisma migrate deploy 创建表结构），或通过 --db 指定")
+        return 1
+    try:
+        report = seed_database(
+            db_file,
+            users=args.users,
+            departments=args.departments,
+            hazards=args.hazards,
+            days=args.days,
+            seed=args.seed,
+            batch=args.batch,
+            defer_indexes=not args.keep_indexes,
+        )
+    except (sqlite3.DatabaseError, ValueError) as e:
+        print(f"❌ 生成失败，已回滚: {e}")
+        return 1
+    print_seed_report(report)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db seed 子命令"""
+    parser = subparsers.add_parser("seed", help="批量生成大规模测试数据（部门/用户/隐患/可见性/通知）")
+    parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    parser.add_argument("--hazards", type=int, default=100_000, help="隐患数量 (默认: 100000)")
+    parser.add_argument("--users", type=int, default=2000, help="用户数量 (默认: 2000)")
+    parser.add_argument("--departments", type=int, default=60, help="部门数量 (默认: 60)")
+    parser.add_argument("--days", type=int, help="隐患分布的天数 (默认: 至少 365 天，且每天不超过 500 条)")
+    parser.add_argument("--seed", type=int, help="随机种子，相同种子生成相同数据")
+    parser.add_argument("--batch", type=int, default=SEED_BATCH, help=f"每批隐患数 (默认: {SEED_BATCH})")
+    parser.add_argument("--keep-indexes", action="store_true", help="写入时保留索引（默认先删除，写完后重建）")
+    parser.set_defaults(func=run)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+EHS 系统测试数据库快照 (copy-on-write)
+集成测试不再改写 DATABASE_URL 指向的真实库：先建好一份"黄金库"（迁移 + 测试用户 + 可选的批量种子数据），
+每个测试会话/worker 从黄金库克隆出自己的副本
+- 克隆优先使用 reflink（FICLONE，btrfs/xfs 等支持写时复制的文件系统上与文件大小无关，毫秒级），
+  不支持时回退到 SQLite backup API 按页复制
+- 黄金库按迁移文件、测试用户与种子参数计算指纹缓存，内容不变时直接复用；
+  并行 worker 各自写临时文件后原子替换，不需要加锁
+"""
+
+from __future__ import annotations
+
+import argparse
+import errno
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+from db_query_plans import MIGRATIONS_DIR, apply_migrations
+from hazard_lifecycle import TEST_USERS, ensure_users
+from ops_trace import annotate, traced
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+_REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EBADF}
+
+
+# ---------------------------------------------------------------------------
+# 克隆
+# ---------------------------------------------------------------------------
+
+def reflink(src: Path, dst: Path) -> bool:
+    """尝试以 FICLONE 创建写时复制副本，文件系统不支持时返回 False（不留下目标文件）"""
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        return False
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError as e:
+            if e.errno not in _REFLINK_UNSUPPORTED:
+                raise
+    dst.unlink()
+    return False
+
+
+def backup_copy(src: Path, dst: Path):
+    """用 SQLite backup API 复制，源库正在被写入时也能得到一致的副本"""
+    with closing(sqlite3.connect(f"{src.resolve().as_uri()}?mode=ro", uri=True)) as source, closing(sqlite3.connect(dst)) as target:
+        source.backup(target)
+
+
+@traced("db.snapshot.clone")
+def clone_database(src: Path, dst: Path, method: str = "auto") -> str:
+    """
+    把 src 克隆到 dst（覆盖已有文件及其 -wal/-shm），返回实际使用的方式: reflink / backup
+    reflink 直接复制文件，要求源库没有未检查点的 WAL（黄金库构建时已切换为 DELETE 日志模式）
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    for path in (dst, Path(f"{dst}-wal"), Path(f"{dst}-shm"), Path(f"{dst}-journal")):
+        path.unlink(missing_ok=True)
+    if method in ("auto", "reflink") and not Path(f"{src}-wal").exists() and reflink(src, dst):
+        used = "reflink"
+    elif method == "reflink":
+        raise OSError(errno.EOPNOTSUPP, "文件系统不支持 reflink", str(dst))
+    else:
+        backup_copy(src, dst)
+        used = "backup"
+    annotate(bytes=dst.stat().st_size)
+    return used
+
+
+# ---------------------------------------------------------------------------
+# 黄金库
+# ---------------------------------------------------------------------------
+
+def golden_fingerprint(
+    seed_options: Optional[dict] = None, test_users: bool = True, migrations_dir: Path = MIGRATIONS_DIR
+) -> str:
+    """迁移文件、测试用户与种子参数的指纹；任何一项变化都会重建黄金库"""
+    digest = hashlib.sha256()
+    for migration in sorted(migrations_dir.glob("*/migration.sql")):
+        digest.update(migration.parent.name.encode())
+        digest.update(migration.read_bytes())
+    digest.update(json.dumps(TEST_USERS if test_users else [], sort_keys=True).encode())
+    digest.update(json.dumps(seed_options or {}, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def build_golden(
+    db_file: Path, seed_options: Optional[dict] = None, test_users: bool = True, migrations_dir: Path = MIGRATIONS_DIR
+):
+    """
+    建立黄金库：执行全部迁移、写入 hazard_lifecycle 的测试用户（test_users=False 时只有表结构），
+    seed_options 不为空时再用 db_seed 生成对应规模的数据（需指定 seed 以保证可复现）
+    """
+    with closing(sqlite3.connect(db_file)) as conn:
+        apply_migrations(conn, migrations_dir)
+        if test_users:
+            ensure_users(conn, TEST_USERS)
+        conn.commit()
+    if seed_options:
+        import db_seed
+
+        db_seed.seed_database(db_file, **seed_options)
+    with closing(sqlite3.connect(db_file, isolation_level=None)) as conn:
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("VACUUM")
+
+
+@traced("db.snapshot.golden")
+def golden_database(
+    cache_dir: Path, seed_options: Optional[dict] = None, test_users: bool = True, migrations_dir: Path = MIGRATIONS_DIR
+) -> Path:
+    """返回缓存目录中与当前指纹一致的黄金库，不存在时构建；并行构建时后完成的一方原子替换，内容相同"""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    golden = cache_dir / f"golden-{golden_fingerprint(seed_options, test_users, migrations_dir)}.db"
+    if golden.exists():
+        return golden
+    building = cache_dir / f".{golden.name}.{os.getpid()}.tmp"
+    building.unlink(missing_ok=True)
+    try:
+        build_golden(building, seed_options, test_users, migrations_dir)
+        os.replace(building, golden)
+    finally:
+        building.unlink(missing_ok=True)
+    annotate(bytes=golden.stat().st_size)
+    return golden
+
+
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+def run_build(args: argparse.Namespace) -> int:
+    seed_options = None
+    if args.hazards:
+        seed_options = {"hazards": args.hazards, "users": args.users, "departments": args.departments, "seed": args.seed}
+    started = time.perf_counter()
+    golden = golden_database(Path(args.cache_dir), seed_options)
+    print(f"🥇 黄金库: {golden}（{golden.stat().st_size / 1024 / 1024:.1f} MB，{time.perf_counter() - started:.2f}s）")
+    return 0
+
+
+def run_clone(args: argparse.Namespace) -> int:
+    src, dst = Path(args.source), Path(args.target)
+    if not src.exists():
+        print(f"❌ 找不到源数据库: {src}")
+        return 1
+    started = time.perf_counter()
+    try:
+        method = clone_database(src, dst, args.method)
+    except (OSError, sqlite3.DatabaseError) as e:
+        print(f"❌ 克隆失败: {e}")
+        return 1
+    print(f"📑 已克隆到 {dst}（{method}，{(time.perf_counter() - started) * 1000:.1f}ms）")
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db snapshot 子命令"""
+    parser = subparsers.add_parser("snapshot", help="测试用黄金库构建与写时复制克隆")
+    commands = parser.add_subparsers(dest="snapshot_command", help="命令")
+
+    build_parser = commands.add_parser("build", help="按 prisma/migrations 与种子参数构建（或复用）黄金库")
+    build_parser.add_argument("--cache-dir", type=str, default=".pytest_cache/d/ehs-golden", help="黄金库缓存目录")
+    build_parser.add_argument("--hazards", type=int, default=0, help="额外生成的隐患数量 (默认: 0，只有测试用户)")
+    build_parser.add_argument("--users", type=int, default=200, help="生成的用户数量 (默认: 200)")
+    build_parser.add_argument("--departments", type=int, default=20, help="生成的部门数量 (默认: 20)")
+    build_parser.add_argument("--seed", type=int, default=1, help="随机种子 (默认: 1)")
+    build_parser.set_defaults(func=run_build)
+
+    clone_parser = commands.add_parser("clone", help="把数据库克隆为独立副本（reflink 或 backup API）")
+    clone_parser.add_argument("source", type=str, help="源数据库")
+    clone_parser.add_argument("target", type=str, help="目标文件（已存在时覆盖）")
+    clone_parser.add_argument(
+        "--method", choices=["auto", "reflink", "backup"], default="auto", help="克隆方式 (默认: auto)"
+    )
+    clone_parser.set_defaults(func=run_clone)
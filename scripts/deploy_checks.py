@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+EHS 系统部署后检查
+- 预热：健康检查通过后对热点接口并发预热，直到延迟稳定，并输出冷/热 p50、p95 对比
+- 性能门禁：回放请求组合，与上一版本的基线比较 p50/p95/吞吐量，判断是否出现性能回退
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from ops_trace import traced
+
+DEFAULT_USER_ID = "88888888"
+BENCH_BASELINE_FILE = Path("backups/bench/baseline.json")
+
+# 性能门禁阈值：相对基线的倍数，以及避免毫秒级噪声误判的绝对差值下限
+DEFAULT_THRESHOLDS = {
+    "p50_ratio": 1.5,
+    "p50_min_delta_ms": 20.0,
+    "p95_ratio": 2.0,
+    "p95_min_delta_ms": 50.0,
+    "throughput_ratio": 0.7,
+    "max_error_rate": 0.01,
+}
+
+# 默认预热计划：首屏最常访问、冷启动最慢的接口
+DEFAULT_WARMUP_PLAN = [
+    {"name": "hazard-list", "path": "/api/hazards?page=1&limit=50"},
+    {"name": "my-tasks", "path": "/api/hazards?viewMode=my_tasks&userId={userId}&page=1&limit=50"},
+    {"name": "dashboard-stats", "path": "/api/dashboard/stats"},
+    {"name": "notifications", "path": "/api/notifications?userId={userId}"},
+]
+
+
+def load_plan(plan_file: Optional[Path]) -> list[dict]:
+    """读取预热计划（JSON 数组，元素包含 path，可选 name/method，name 默认为 path），未指定时使用默认计划"""
+    if not plan_file:
+        return DEFAULT_WARMUP_PLAN
+    plan = json.loads(plan_file.read_text(encoding="utf-8"))
+    if not isinstance(plan, list) or not all(isinstance(item, dict) and "path" in item for item in plan):
+        raise ValueError(f"预热计划格式错误: {plan_file}")
+    for item in plan:
+        item.setdefault("name", item["path"])
+    return plan
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法百分位，空列表返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def timed_request(
+    base_url: str,
+    path: str,
+    user_id: str,
+    method: str = "GET",
+    timeout: float = 30.0,
+) -> tuple[int, float]:
+    """发送一次带 x-user-id 的请求，返回 (状态码, 耗时秒)；连接失败时状态码为 0"""
+    request = urllib.request.Request(
+        base_url.rstrip("/") + path.format(userId=user_id),
+        method=method,
+        headers={"x-user-id": user_id},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError, OSError):
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def run_round(
+    pool: ThreadPoolExecutor,
+    base_url: str,
+    plan: list[dict],
+    user_id: str,
+    concurrency: int,
+) -> dict[str, dict]:
+    """对计划中每个接口并发发出 concurrency 个请求，返回每个接口的延迟与错误数"""
+    futures = {
+        item["name"]: [
+            pool.submit(timed_request, base_url, item["path"], user_id, item.get("method", "GET"))
+            for _ in range(concurrency)
+        ]
+        for item in plan
+    }
+    results = {}
+    for name, items in futures.items():
+        outcomes = [f.result() for f in items]
+        results[name] = {
+            "latencies": [latency for status, latency in outcomes if 200 <= status < 400],
+            "errors": sum(1 for status, _ in outcomes if not 200 <= status < 400),
+        }
+    return results
+
+
+@traced("checks.warmup")
+def run_warmup(
+    base_url: str,
+    plan: Optional[list[dict]] = None,
+    user_id: str = DEFAULT_USER_ID,
+    concurrency: int = 4,
+    min_rounds: int = 2,
+    max_rounds: int = 10,
+    settle_ratio: float = 0.1,
+) -> dict:
+    """
+    多轮预热直到各接口 p50 相对上一轮的变化不超过 settle_ratio：
+    - 第一轮视为冷启动延迟，最后一轮视为预热后延迟
+    - 返回每个接口的冷/热 p50、p95、轮数和错误数
+    """
+    plan = plan or DEFAULT_WARMUP_PLAN
+    print(f"\n🔥 预热热点接口 ({len(plan)} 个，并发 {concurrency})...")
+
+    rounds: list[dict[str, dict]] = []
+    with ThreadPoolExecutor(max_workers=concurrency * len(plan)) as pool:
+        while len(rounds) < max_rounds:
+            rounds.append(run_round(pool, base_url, plan, user_id, concurrency))
+            if len(rounds) < max(min_rounds, 2):
+                continue
+            previous, current = rounds[-2], rounds[-1]
+            settled = all(
+                current[name]["latencies"] and previous[name]["latencies"]
+                and abs(percentile(current[name]["latencies"], 50) - percentile(previous[name]["latencies"], 50))
+                <= settle_ratio * max(percentile(previous[name]["latencies"], 50), 1e-3)
+                for name in current
+            )
+            if settled:
+                break
+
+    report = {"rounds": len(rounds), "routes": {}}
+    for item in plan:
+        name = item["name"]
+        cold, warm = rounds[0][name], rounds[-1][name]
+        report["routes"][name] = {
+            "cold_p50_ms": percentile(cold["latencies"], 50) * 1000,
+            "cold_p95_ms": percentile(cold["latencies"], 95) * 1000,
+            "warm_p50_ms": percentile(warm["latencies"], 50) * 1000,
+            "warm_p95_ms": percentile(warm["latencies"], 95) * 1000,
+            "errors": sum(r[name]["errors"] for r in rounds),
+            "healthy": bool(warm["latencies"]),
+        }
+    report["ok"] = all(route["healthy"] for route in report["routes"].values())
+    print_warmup_report(report)
+    return report
+
+
+def print_warmup_report(report: dict):
+    """打印冷/热延迟对比表"""
+    print(f"\n📊 预热结果 (共 {report['rounds']} 轮):")
+    print(f"   {'接口':<18}{'冷 p50':>10}{'冷 p95':>10}{'热 p50':>10}{'热 p95':>10}{'错误':>6}")
+    for name, route in report["routes"].items():
+        print(
+            f"   {name:<18}"
+            f"{route['cold_p50_ms']:>8.0f}ms{route['cold_p95_ms']:>8.0f}ms"
+            f"{route['warm_p50_ms']:>8.0f}ms{route['warm_p95_ms']:>8.0f}ms"
+            f"{route['errors']:>6}"
+        )
+    if report["ok"]:
+        print("✅ 预热完成")
+    else:
+        failed = [name for name, route in report["routes"].items() if not route["healthy"]]
+        print(f"❌ 以下接口预热后仍无法正常响应: {', '.join(failed)}")
+
+
+def load_mix(mix_file: Optional[Path]) -> list[dict]:
+    """
+    读取请求组合：
+    - JSON 数组：[{"name", "path", "method", "weight"}]
+    - NDJSON 录制文件：每行一个 {"method", "path"}，按出现次数折算权重
+    未指定时使用预热计划，各接口权重相同
+    """
+    if not mix_file:
+        return [dict(item, weight=1) for item in DEFAULT_WARMUP_PLAN]
+
+    text = mix_file.read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        mix = json.loads(text)
+    else:
+        counts = Counter()
+        for line in text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                if not isinstance(record, dict) or "path" not in record:
+                    raise ValueError(f"请求组合格式错误: {mix_file}")
+                counts[(record.get("method", "GET").upper(), record["path"])] += 1
+        mix = [
+            {"name": f"{method} {path}", "method": method, "path": path, "weight": count}
+            for (method, path), count in counts.most_common()
+        ]
+    if not isinstance(mix, list) or not mix or not all(isinstance(item, dict) and "path" in item for item in mix):
+        raise ValueError(f"请求组合格式错误: {mix_file}")
+    for item in mix:
+        item.setdefault("name", item["path"])
+    return mix
+
+
+def run_benchmark(
+    base_url: str,
+    mix: Optional[list[dict]] = None,
+    user_id: str = DEFAULT_USER_ID,
+    total_requests: int = 200,
+    concurrency: int = 8,
+) -> dict:
+    """按权重回放请求组合，返回每个接口的 p50/p95、错误数以及整体吞吐量"""
+    mix = mix or load_mix(None)
+    total_weight = sum(item.get("weight", 1) for item in mix)
+    schedule = []
+    for item in mix:
+        count = max(1, round(total_requests * item.get("weight", 1) / total_weight))
+        schedule.extend([item] * count)
+    # 固定种子打乱顺序，避免同一接口的请求扎堆，同时保证每次回放顺序一致
+    random.Random(0).shuffle(schedule)
+
+    print(f"\n🏁 性能基准: {len(schedule)} 个请求，{len(mix)} 个接口，并发 {concurrency}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(
+            lambda item: (item["name"], *timed_request(base_url, item["path"], user_id, item.get("method", "GET"))),
+            schedule,
+        ))
+    elapsed = time.perf_counter() - start
+
+    routes: dict[str, dict] = {}
+    for item in mix:
+        latencies = [lat for name, status, lat in outcomes if name == item["name"] and 200 <= status < 400]
+        requests = sum(1 for name, _, _ in outcomes if name == item["name"])
+        routes[item["name"]] = {
+            "requests": requests,
+            "errors": requests - len(latencies),
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+        }
+    succeeded = sum(1 for _, status, _ in outcomes if 200 <= status < 400)
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "requests": len(outcomes),
+        "errors": len(outcomes) - succeeded,
+        "elapsed_s": elapsed,
+        "throughput_rps": succeeded / elapsed if elapsed > 0 else 0.0,
+        "routes": routes,
+    }
+
+
+def compare_with_baseline(result: dict, baseline: Optional[dict], thresholds: Optional[dict] = None) -> list[str]:
+    """与基线比较，返回可读的回退说明列表；为空表示通过"""
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+
+    if result["requests"] and result["errors"] / result["requests"] > thresholds["max_error_rate"]:
+        regressions.append(f"错误率 {result['errors']}/{result['requests']} 超过 {thresholds['max_error_rate']:.0%}")
+
+    if not baseline:
+        return regressions
+
+    base_rps = baseline.get("throughput_rps", 0)
+    if base_rps and result["throughput_rps"] < base_rps * thresholds["throughput_ratio"]:
+        regressions.append(
+            f"整体吞吐量 {result['throughput_rps']:.1f} req/s，低于基线 {base_rps:.1f} req/s "
+            f"的 {thresholds['throughput_ratio']:.0%}"
+        )
+
+    for name, route in result["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if not base:
+            continue
+        for key, label in (("p50", "p50"), ("p95", "p95")):
+            current, previous = route[f"{key}_ms"], base[f"{key}_ms"]
+            if (
+                current > previous * thresholds[f"{key}_ratio"]
+                and current - previous > thresholds[f"{key}_min_delta_ms"]
+            ):
+                regressions.append(
+                    f"{name} {label} {current:.0f}ms，基线 {previous:.0f}ms "
+                    f"({current / max(previous, 1e-3):.1f}x)"
+                )
+    return regressions
+
+
+def load_baseline(baseline_file: Path = BENCH_BASELINE_FILE) -> Optional[dict]:
+    """读取上一版本的性能基线"""
+    if not baseline_file.exists():
+        return None
+    return json.loads(baseline_file.read_text(encoding="utf-8"))
+
+
+def save_baseline(result: dict, baseline_file: Path = BENCH_BASELINE_FILE):
+    """保存本次结果作为下一次部署的基线"""
+    baseline_file.parent.mkdir(parents=True, exist_ok=True)
+    baseline_file.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def print_benchmark_report(result: dict, baseline: Optional[dict]):
+    """打印本次与基线的对比表"""
+    base_routes = (baseline or {}).get("routes", {})
+    print(f"\n📊 性能基准结果 (吞吐量 {result['throughput_rps']:.1f} req/s，错误 {result['errors']}):")
+    print(f"   {'接口':<24}{'p50':>9}{'基线':>9}{'p95':>9}{'基线':>9}")
+    for name, route in result["routes"].items():
+        base = base_routes.get(name, {})
+        base_p50 = f"{base['p50_ms']:.0f}ms" if base else "-"
+        base_p95 = f"{base['p95_ms']:.0f}ms" if base else "-"
+        print(
+            f"   {name:<24}{route['p50_ms']:>7.0f}ms{base_p50:>9}"
+            f"{route['p95_ms']:>7.0f}ms{base_p95:>9}"
+        )
+
+
+@traced("checks.latency_gate")
+def run_latency_gate(
+    base_url: str,
+    mix: Optional[list[dict]] = None,
+    user_id: str = DEFAULT_USER_ID,
+    baseline_file: Path = BENCH_BASELINE_FILE,
+    thresholds: Optional[dict] = None,
+    label: Optional[str] = None,
+) -> list[str]:
+    """运行性能门禁；通过时把结果写为新基线，返回回退说明列表"""
+    baseline = load_baseline(baseline_file)
+    result = run_benchmark(base_url, mix, user_id=user_id)
+    print_benchmark_report(result, baseline)
+
+    regressions = compare_with_baseline(result, baseline, thresholds)
+    if regressions:
+        print("\n❌ 性能门禁未通过:")
+        for line in regressions:
+            print(f"   - {line}")
+        return regressions
+
+    if baseline is None:
+        print("ℹ️  尚无基线，本次结果将作为基线")
+    else:
+        print("✅ 性能门禁通过")
+    result["label"] = label
+    save_baseline(result, baseline_file)
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统部署后检查")
+    parser.add_argument("--base-url", default="http://localhost:3000", help="服务地址 (默认: http://localhost:3000)")
+    parser.add_argument("--user-id", default=DEFAULT_USER_ID, help=f"请求使用的 x-user-id (默认: {DEFAULT_USER_ID})")
+    subparsers = parser.add_subparsers(dest="command", help="命令")
+
+    warmup_parser = subparsers.add_parser("warmup", help="预热热点接口")
+    warmup_parser.add_argument("--plan", type=str, help="预热计划 JSON 文件")
+    warmup_parser.add_argument("--concurrency", type=int, default=4, help="每个接口每轮并发数 (默认: 4)")
+    warmup_parser.add_argument("--max-rounds", type=int, default=10, help="最多预热轮数 (默认: 10)")
+
+    bench_parser = subparsers.add_parser("bench", help="回放请求组合并与基线比较")
+    bench_parser.add_argument("--mix", type=str, help="请求组合文件 (JSON 数组或录制的 NDJSON)")
+    bench_parser.add_argument("--baseline", type=str, default=str(BENCH_BASELINE_FILE), help=f"基线文件 (默认: {BENCH_BASELINE_FILE})")
+
+    args = parser.parse_args()
+
+    if args.command == "warmup":
+        plan = load_plan(Path(args.plan) if args.plan else None)
+        report = run_warmup(
+            args.base_url, plan,
+            user_id=args.user_id,
+            concurrency=args.concurrency,
+            max_rounds=args.max_rounds,
+        )
+        sys.exit(0 if report["ok"] else 1)
+    elif args.command == "bench":
+        mix = load_mix(Path(args.mix) if args.mix else None)
+        regressions = run_latency_gate(args.base_url, mix, user_id=args.user_id, baseline_file=Path(args.baseline))
+        sys.exit(1 if regressions else 0)
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
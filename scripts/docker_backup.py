@@ -8,18 +8,16 @@ from __future__ import annotations
 
 import argparse
 import os
-import subprocess
 import sys
 from datetime import datetime
 from pathlib import Path
 
-
-def run_command(cmd: list[str], check: bool = True) -> subprocess.CompletedProcess:
-    """执行命令并返回结果"""
-    print(f"+ {' '.join(cmd)}")
-    return subprocess.run(cmd, check=check, capture_output=True, text=True)
+from minio_s3 import DEFAULT_WORKERS, backup_objects, client_from_env, find_previous_index
+from ops_runner import print_command_summary, run_command, run_parallel
+from ops_trace import add_trace_arguments, annotate, setup_tracing, traced
 
 
+@traced("backup.database")
 def backup_database(backup_dir: Path, container_name: str = "ehs-app") -> Path:
     """备份数据库文件"""
     print("\n📦 备份数据库...")
@@ -44,10 +42,12 @@ def backup_database(backup_dir: Path, container_name: str = "ehs-app") -> Path:
             print("❌ 错误: 找不到数据库文件")
             sys.exit(1)
 
+    annotate(bytes=db_backup_file.stat().st_size)
     print(f"✅ 数据库已备份到: {db_backup_file}")
     return db_backup_file
 
 
+@traced("backup.minio")
 def backup_minio_data(backup_dir: Path) -> Path:
     """备份 MinIO 数据"""
     print("\n📦 备份 MinIO 数据...")
@@ -66,10 +66,33 @@ def backup_minio_data(backup_dir: Path) -> Path:
         "-C", "./data", "minio-data"
     ])
 
+    annotate(bytes=minio_backup_file.stat().st_size)
     print(f"✅ MinIO 数据已备份到: {minio_backup_file}")
     return minio_backup_file
 
 
+def backup_minio_objects(backup_dir: Path, workers: int = DEFAULT_WORKERS) -> Path:
+    """通过 S3 接口按对象增量备份 MinIO，未变化的对象从上一次备份硬链接"""
+    print("\n📦 按对象增量备份 MinIO（S3 接口）...")
+
+    client = client_from_env(find_env_file())
+    previous = find_previous_index(backup_dir.parent, exclude=backup_dir)
+    report = backup_objects(client, backup_dir, workers=workers, previous_index=previous)
+
+    size_mb = report["bytes"] / (1024 * 1024)
+    downloaded_mb = report["downloaded_bytes"] / (1024 * 1024)
+    print(f"✅ MinIO 对象已备份: {report['objects']} 个（{size_mb:.2f} MB），"
+          f"下载 {report['downloaded']} 个（{downloaded_mb:.2f} MB），沿用上次备份 {report['linked']} 个")
+    if previous is None:
+        print("   没有找到上一次对象备份，本次为全量")
+    for failed in report["failed"]:
+        print(f"⚠️  警告: 备份失败 {failed['object']}: {failed['error']}")
+    for skipped in report["skipped"]:
+        print(f"⚠️  警告: 跳过无法保存为文件的对象 {skipped}")
+    return Path(report["index"])
+
+
+@traced("backup.uploads")
 def backup_uploads(backup_dir: Path) -> Path:
     """备份上传文件"""
     print("\n📦 备份上传文件...")
@@ -88,10 +111,17 @@ def backup_uploads(backup_dir: Path) -> Path:
         "-C", "./public", "uploads"
     ])
 
+    annotate(bytes=uploads_backup_file.stat().st_size)
     print(f"✅ 上传文件已备份到: {uploads_backup_file}")
     return uploads_backup_file
 
 
+def find_env_file() -> Path:
+    env_file = Path(".env.docker.local")
+    return env_file if env_file.exists() else Path(".env.docker")
+
+
+@traced("backup.env")
 def backup_env_config(backup_dir: Path) -> Path:
     """备份环境配置文件"""
     print("\n📦 备份环境配置...")
@@ -99,10 +129,7 @@ def backup_env_config(backup_dir: Path) -> Path:
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     env_backup_file = backup_dir / f"env-config-{timestamp}.txt"
 
-    env_file = Path(".env.docker.local")
-    if not env_file.exists():
-        env_file = Path(".env.docker")
-
+    env_file = find_env_file()
     if env_file.exists():
         import shutil
         shutil.copy2(env_file, env_backup_file)
@@ -113,6 +140,7 @@ def backup_env_config(backup_dir: Path) -> Path:
         return None
 
 
+@traced("backup.manifest")
 def create_backup_manifest(backup_dir: Path, files: dict[str, Path]) -> Path:
     """创建备份清单文件"""
     manifest_file = backup_dir / "backup-manifest.txt"
@@ -154,13 +182,27 @@ def main():
         action="store_true",
         help="跳过 MinIO 数据备份"
     )
+    parser.add_argument(
+        "--minio-mode",
+        choices=["tar", "s3"],
+        default="tar",
+        help="MinIO 备份方式: tar (打包 data/minio-data 目录) 或 s3 (通过 S3 接口按对象增量备份) (默认: tar)"
+    )
+    parser.add_argument(
+        "--minio-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"s3 方式的并发连接数 (默认: {DEFAULT_WORKERS})"
+    )
     parser.add_argument(
         "--skip-uploads",
         action="store_true",
         help="跳过上传文件备份"
     )
 
+    add_trace_arguments(parser)
     args = parser.parse_args()
+    setup_tracing(args)
 
     # 创建备份目录
     backup_dir = Path(args.backup_dir)
@@ -182,23 +224,21 @@ def main():
         print(f"❌ 数据库备份失败: {e}")
         sys.exit(1)
 
-    # 备份 MinIO 数据
-    if not args.skip_minio:
-        try:
-            minio_file = backup_minio_data(backup_session_dir)
-            if minio_file:
-                backup_files["MinIO 数据"] = minio_file
-        except Exception as e:
-            print(f"⚠️  MinIO 数据备份失败: {e}")
-
-    # 备份上传文件
+    # MinIO 数据与上传文件互不依赖，并发打包
+    archive_steps = []
+    if not args.skip_minio and args.minio_mode == "s3":
+        archive_steps.append(("MinIO 对象", lambda: backup_minio_objects(backup_session_dir, args.minio_workers)))
+    elif not args.skip_minio:
+        archive_steps.append(("MinIO 数据", lambda: backup_minio_data(backup_session_dir)))
     if not args.skip_uploads:
-        try:
-            uploads_file = backup_uploads(backup_session_dir)
-            if uploads_file:
-                backup_files["上传文件"] = uploads_file
-        except Exception as e:
-            print(f"⚠️  上传文件备份失败: {e}")
+        archive_steps.append(("上传文件", lambda: backup_uploads(backup_session_dir)))
+
+    results = run_parallel(*(step for _, step in archive_steps))
+    for (name, _), result in zip(archive_steps, results):
+        if isinstance(result, Exception):
+            print(f"⚠️  {name}备份失败: {result}")
+        elif result:
+            backup_files[name] = result
 
     # 备份环境配置
     try:
@@ -210,6 +250,7 @@ def main():
 
     # 创建备份清单
     create_backup_manifest(backup_session_dir, backup_files)
+    print_command_summary()
 
     print("\n" + "=" * 60)
     print("✅ 备份完成！")
@@ -7,18 +7,17 @@ EHS 系统 Docker 镜像导出/导入脚本
 from __future__ import annotations
 
 import argparse
-import subprocess
+import gzip
 import sys
 from datetime import datetime
 from pathlib import Path
+from typing import Iterator
 
-
-def run_command(cmd: list[str], check: bool = True) -> subprocess.CompletedProcess:
-    """执行命令并返回结果"""
-    print(f"+ {' '.join(cmd)}")
-    return subprocess.run(cmd, check=check, capture_output=True, text=True)
+from ops_runner import CHUNK_SIZE, print_command_summary, run_command
+from ops_trace import add_trace_arguments, annotate, setup_tracing, traced
 
 
+@traced("image.export")
 def export_image(image_name: str, output_dir: Path):
     """导出 Docker 镜像"""
     print(f"\n📦 导出 Docker 镜像: {image_name}")
@@ -40,56 +39,47 @@ def export_image(image_name: str, output_dir: Path):
     # 生成文件名
     timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
     safe_name = image_name.replace(":", "-").replace("/", "-")
-    output_file = output_dir / f"{safe_name}-{timestamp}.tar"
-
-    print(f"📁 输出文件: {output_file}")
-
-    # 导出镜像
-    print("⏳ 导出中，请稍候...")
-    with open(output_file, "wb") as f:
-        result = run_command([
-            "docker", "save", image_name
-        ], check=False)
-        f.write(result.stdout.encode() if isinstance(result.stdout, str) else result.stdout)
-
-    # 使用正确的方式导出
-    run_command([
-        "docker", "save",
-        "-o", str(output_file),
-        image_name
-    ])
-
-    # 获取文件大小
-    size_bytes = output_file.stat().st_size
-    size_mb = size_bytes / (1024 * 1024)
-
-    print(f"✅ 镜像已导出")
-    print(f"   文件: {output_file}")
-    print(f"   大小: {size_mb:.2f} MB")
-
-    # 压缩镜像文件
-    print("\n🗜️  压缩镜像文件...")
-    compressed_file = output_file.with_suffix(".tar.gz")
-    run_command([
-        "gzip", "-f", str(output_file)
-    ])
-
-    # 重命名为 .tar.gz
-    gzipped_file = Path(str(output_file) + ".gz")
-    if gzipped_file.exists():
-        gzipped_file.rename(compressed_file)
+    compressed_file = output_dir / f"{safe_name}-{timestamp}.tar.gz"
+
+    print(f"📁 输出文件: {compressed_file}")
+
+    # docker save 的输出按块直接写入 gzip，不落地中间 tar 文件，也不在内存中缓存
+    print("⏳ 导出并压缩中，请稍候...")
+    with gzip.open(compressed_file, "wb", compresslevel=6) as f:
+        def write_chunk(stream_name: str, chunk: bytes):
+            if stream_name == "stdout":
+                f.write(chunk)
+            else:
+                sys.stderr.buffer.write(chunk)
+
+        result = run_command(["docker", "save", image_name], binary=True, capture=False, on_output=write_chunk)
 
+    annotate(bytes=result.bytes_out, bytes_compressed=compressed_file.stat().st_size)
+    size_mb = result.bytes_out / (1024 * 1024)
     compressed_size_mb = compressed_file.stat().st_size / (1024 * 1024)
-    compression_ratio = (1 - compressed_size_mb / size_mb) * 100
+    compression_ratio = (1 - compressed_size_mb / size_mb) * 100 if size_mb else 0.0
 
-    print(f"✅ 压缩完成")
+    print(f"✅ 镜像已导出 ({result.duration:.1f}s)")
     print(f"   文件: {compressed_file}")
-    print(f"   大小: {compressed_size_mb:.2f} MB")
+    print(f"   原始大小: {size_mb:.2f} MB")
+    print(f"   压缩后大小: {compressed_size_mb:.2f} MB")
     print(f"   压缩率: {compression_ratio:.1f}%")
 
     return compressed_file
 
 
+def read_chunks(image_file: Path) -> Iterator[bytes]:
+    """按块读取镜像文件，.gz 文件边读边解压"""
+    opener = gzip.open if image_file.suffix == ".gz" else open
+    with opener(image_file, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+@traced("image.import")
 def import_image(image_file: Path):
     """导入 Docker 镜像"""
     print(f"\n📥 导入 Docker 镜像: {image_file}")
@@ -98,33 +88,16 @@ def import_image(image_file: Path):
         print(f"❌ 错误: 文件不存在: {image_file}")
         sys.exit(1)
 
-    # 如果是压缩文件，先解压
-    if image_file.suffix == ".gz":
-        print("🗜️  解压镜像文件...")
-        decompressed_file = image_file.with_suffix("")
-        run_command([
-            "gunzip", "-c", str(image_file)
-        ])
-        # 使用管道解压并导入
-        print("⏳ 导入中，请稍候...")
-        subprocess.run(
-            f"gunzip -c {image_file} | docker load",
-            shell=True,
-            check=True
-        )
-    else:
-        # 直接导入
-        print("⏳ 导入中，请稍候...")
-        run_command([
-            "docker", "load",
-            "-i", str(image_file)
-        ])
+    annotate(bytes=image_file.stat().st_size)
+    # 压缩文件边解压边写入 docker load 的标准输入，无需临时文件
+    print("⏳ 导入中，请稍候...")
+    run_command(["docker", "load"], stdin_chunks=read_chunks(image_file), stream=True)
 
     print("✅ 镜像已导入")
 
     # 显示导入的镜像
     print("\n📋 已导入的镜像:")
-    run_command(["docker", "images"], check=False)
+    run_command(["docker", "images"], check=False, stream=True)
 
 
 def list_images():
@@ -167,7 +140,9 @@ def main():
     # 列表命令
     subparsers.add_parser("list", help="列出本地镜像")
 
+    add_trace_arguments(parser)
     args = parser.parse_args()
+    setup_tracing(args)
 
     if not args.command:
         parser.print_help()
@@ -195,6 +170,8 @@ def main():
     elif args.command == "list":
         list_images()
 
+    print_command_summary()
+
 
 if __name__ == "__main__":
     main()
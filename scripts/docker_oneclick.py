@@ -1,17 +1,34 @@
 #!/usr/bin/env python3
 from __future__ import annotations
 
+import argparse
 import os
 import shutil
-import subprocess
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, Optional
+
+from db_preflight import preflight_database
+from docker_update import backoff_delays, wait_for_healthy
+from ops_runner import BackgroundCommand, print_command_summary, run_command, run_parallel
+from ops_trace import add_trace_arguments, setup_tracing, span
 
 
 ROOT = Path(__file__).resolve().parents[1]
 COMPOSE_FILE = ROOT / "docker-compose.prod.yml"
 ENV_FILE = ROOT / ".env.docker"
 
+APP_CONTAINER = "ehs-app"
+MINIO_CONTAINER = "ehs-minio"
+DEFAULT_MIN_FREE_GB = 5.0
+
+# docker-entrypoint.sh prints these around `prisma migrate deploy`
+MIGRATION_START_MARKER = "Running database migrations"
+MIGRATION_END_MARKER = "Starting Next.js application"
+
 REQUIRED_DIRS = [
     "data",
     "data/db",
@@ -24,21 +41,74 @@ REQUIRED_DIRS = [
 ]
 
 
-def run(cmd: list[str], env: dict[str, str]) -> None:
-    print("+ " + " ".join(cmd))
-    subprocess.run(cmd, cwd=ROOT, env=env, check=True)
+class StartupTimeline:
+    """Thread-safe record of startup stages, printed as a timeline at the end."""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.stages: list[tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self.stages.append((name, start - self.origin, end - self.origin))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.monotonic()
+        with span(f"oneclick.{name.lower().replace(' ', '_')}"):
+            try:
+                yield
+            finally:
+                self.add(name, start, time.monotonic())
+
+    def print(self, width: int = 40) -> None:
+        if not self.stages:
+            return
+        total = max(end for _, _, end in self.stages) or 1.0
+        print(f"\nStartup timeline (total {total:.1f}s):")
+        for name, start, end in sorted(self.stages, key=lambda s: s[1]):
+            offset = int(start / total * width)
+            length = max(1, int((end - start) / total * width))
+            bar = " " * offset + "#" * min(length, width - offset)
+            print(f"  {name:<18} {start:>7.1f}s +{end - start:>6.1f}s  |{bar:<{width}}|")
+
+
+class MigrationWatcher:
+    """Follows app logs and records when the entrypoint's migration step starts and ends."""
+
+    def __init__(self, container: str = APP_CONTAINER):
+        self.container = container
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.done = threading.Event()
+        self._command: Optional[BackgroundCommand] = None
+
+    def start(self) -> "MigrationWatcher":
+        self._command = BackgroundCommand(["docker", "logs", "-f", self.container], self.on_output).start()
+        return self
+
+    def on_output(self, stream_name: str, line: str) -> None:
+        if MIGRATION_START_MARKER in line and self.started is None:
+            self.started = time.monotonic()
+        elif MIGRATION_END_MARKER in line and self.started is not None and self.finished is None:
+            self.finished = time.monotonic()
+            self.done.set()
+
+    def stop(self) -> None:
+        if self._command:
+            self._command.stop()
+
+
+def run(cmd: list[str], env: dict[str, str], stream: bool = True) -> None:
+    run_command(cmd, cwd=ROOT, env=env, stream=stream, capture=False)
 
 
 def detect_compose() -> list[str]:
     if shutil.which("docker") is None:
         sys.exit("ERROR: docker not found in PATH.")
     try:
-        subprocess.run(
-            ["docker", "compose", "version"],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        run_command(["docker", "compose", "version"], echo=False)
         return ["docker", "compose"]
     except Exception:
         if shutil.which("docker-compose"):
@@ -54,21 +124,161 @@ def ensure_dirs() -> None:
         path.mkdir(parents=True, exist_ok=True)
 
 
+def check_free_disk(path: Path, min_free_gb: float) -> float:
+    """Returns free space in GB at path (or its nearest existing parent); exits if below min_free_gb."""
+    while not path.exists():
+        path = path.parent
+    free_gb = shutil.disk_usage(path).free / (1024 ** 3)
+    if free_gb < min_free_gb:
+        sys.exit(f"ERROR: Only {free_gb:.1f} GB free at {path}, need at least {min_free_gb:.1f} GB.")
+    return free_gb
+
+
+def read_env_value(env_file: Path, key: str) -> Optional[str]:
+    for line in env_file.read_text(encoding="utf-8").splitlines():
+        name, sep, value = line.strip().partition("=")
+        if sep and name.strip() == key:
+            return value.strip().strip("\"'")
+    return None
+
+
+def container_health(container: str) -> Optional[str]:
+    result = run_command(
+        ["docker", "inspect", "-f", "{{.State.Health.Status}}", container],
+        check=False,
+        echo=False,
+    )
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def wait_for_container_healthy(container: str, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    for delay in backoff_delays(initial=0.2, cap=2.0):
+        status = container_health(container)
+        if status == "healthy":
+            return True
+        if status == "unhealthy" or time.monotonic() + delay > deadline:
+            return False
+        time.sleep(delay)
+    return False
+
+
+def prepare(min_free_gb: float, timeline: StartupTimeline) -> list[str]:
+    """Creates data dirs, checks free disk and detects compose concurrently."""
+
+    def dirs():
+        with timeline.stage("Data dirs"):
+            ensure_dirs()
+
+    def disk():
+        with timeline.stage("Disk check"):
+            free_gb = check_free_disk(ROOT / "data", min_free_gb)
+        print(f"Free disk: {free_gb:.1f} GB")
+
+    def compose():
+        with timeline.stage("Detect compose"):
+            return detect_compose()
+
+    results = run_parallel(dirs, disk, compose)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results[2]
+
+
+def start_minio(base_cmd: list[str], env: dict[str, str], timeout: float, timeline: StartupTimeline) -> None:
+    """Pulls the MinIO image, starts it and waits until its healthcheck passes."""
+    with timeline.stage("Pull MinIO"):
+        try:
+            run(base_cmd + ["pull", "minio"], env=env, stream=False)
+        except Exception as e:
+            # offline sites fall back to whatever image is already present
+            print(f"WARNING: minio pull failed, using local image: {e}")
+    with timeline.stage("MinIO ready"):
+        run(base_cmd + ["up", "-d", "minio"], env=env)
+        if not wait_for_container_healthy(MINIO_CONTAINER, timeout):
+            raise RuntimeError(f"{MINIO_CONTAINER} did not become healthy within {timeout:.0f}s")
+
+
+def start_app(base_cmd: list[str], env: dict[str, str], health_url: str, timeout: float,
+              timeline: StartupTimeline) -> bool:
+    """Starts the app on the freshly built image and times migrations and health."""
+    watcher = None
+    try:
+        with timeline.stage("Start app"):
+            run(base_cmd + ["up", "-d", "--no-build", "app"], env=env)
+        watcher = MigrationWatcher().start()
+        with timeline.stage("App healthy"):
+            healthy = wait_for_healthy(APP_CONTAINER, int(timeout), health_url)
+        # the log follower may lag behind the health probe by a moment
+        watcher.done.wait(2)
+    finally:
+        if watcher:
+            watcher.stop()
+    if watcher and watcher.started is not None:
+        timeline.add("Migrations", watcher.started, watcher.finished or time.monotonic())
+    return healthy
+
+
 def main() -> None:
+    parser = argparse.ArgumentParser(description="One-click EHS startup with docker compose")
+    parser.add_argument("--min-free-gb", type=float, default=DEFAULT_MIN_FREE_GB,
+                        help=f"minimum free disk space in GB (default: {DEFAULT_MIN_FREE_GB})")
+    parser.add_argument("--health-timeout", type=float, default=300,
+                        help="seconds to wait for MinIO and the app to become healthy (default: 300)")
+    parser.add_argument("--skip-db-preflight", action="store_true",
+                        help="skip the read-only SQLite pre-flight check")
+    parser.add_argument("--db-maintenance", action="store_true",
+                        help="also switch to WAL, ANALYZE and checkpoint during the pre-flight "
+                             "(default: read-only integrity and migration checks)")
+    parser.add_argument("--db-path", help="SQLite database file (default: data/db/ehs.db)")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    setup_tracing(args)
+
     if not COMPOSE_FILE.exists():
         sys.exit(f"ERROR: Missing {COMPOSE_FILE}")
     if not ENV_FILE.exists():
         sys.exit(f"ERROR: Missing {ENV_FILE}")
 
-    ensure_dirs()
-    compose_cmd = detect_compose()
+    timeline = StartupTimeline()
+    compose_cmd = prepare(args.min_free_gb, timeline)
 
     env = os.environ.copy()
     env.setdefault("COMPOSE_PROJECT_NAME", "ehs")
+    app_port = env.get("APP_PORT") or read_env_value(ENV_FILE, "APP_PORT") or "3000"
+    health_url = f"http://localhost:{app_port}/api/health"
 
     base_cmd = compose_cmd + ["--env-file", str(ENV_FILE), "-f", str(COMPOSE_FILE)]
-    run(base_cmd + ["up", "-d", "--build"], env=env)
+
+    def build():
+        with timeline.stage("Build app"):
+            run(base_cmd + ["build", "app"], env=env)
+
+    def db_preflight():
+        if args.skip_db_preflight:
+            return
+        with timeline.stage("DB preflight"):
+            if not preflight_database(args.db_path, read_only=not args.db_maintenance):
+                raise RuntimeError("SQLite pre-flight failed, fix the database before starting the app")
+
+    # the app build is the long pole; MinIO and the DB pre-flight run alongside it
+    results = run_parallel(
+        build,
+        lambda: start_minio(base_cmd, env, args.health_timeout, timeline),
+        db_preflight,
+    )
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if failures:
+        timeline.print()
+        sys.exit(f"ERROR: {failures[0]}")
+
+    healthy = start_app(base_cmd, env, health_url, args.health_timeout, timeline)
     run(base_cmd + ["ps"], env=env)
+    timeline.print()
+    print_command_summary()
+    if not healthy:
+        sys.exit(f"ERROR: {APP_CONTAINER} is not healthy, check: docker logs {APP_CONTAINER}")
 
 
 if __name__ == "__main__":
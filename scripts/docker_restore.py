@@ -8,15 +8,13 @@ from __future__ import annotations
 
 import argparse
 import os
-import subprocess
 import sys
 from pathlib import Path
 
-
-def run_command(cmd: list[str], check: bool = True) -> subprocess.CompletedProcess:
-    """执行命令并返回结果"""
-    print(f"+ {' '.join(cmd)}")
-    return subprocess.run(cmd, check=check, capture_output=True, text=True)
+from docker_backup import find_env_file
+from minio_s3 import DEFAULT_WORKERS, INDEX_FILE, OBJECTS_DIR, client_from_env, restore_objects, wait_until_ready
+from ops_runner import print_command_summary, run_command
+from ops_trace import add_trace_arguments, annotate, setup_tracing, traced
 
 
 def confirm_action(message: str) -> bool:
@@ -25,6 +23,7 @@ def confirm_action(message: str) -> bool:
     return response in ["yes", "y"]
 
 
+@traced("restore.stop_services")
 def stop_services(compose_file: Path, env_file: Path):
     """停止 Docker 服务"""
     print("\n🛑 停止 Docker 服务...")
@@ -33,10 +32,11 @@ def stop_services(compose_file: Path, env_file: Path):
         "--env-file", str(env_file),
         "-f", str(compose_file),
         "down"
-    ])
+    ], stream=True, capture=False)
     print("✅ 服务已停止")
 
 
+@traced("restore.database")
 def restore_database(backup_file: Path, container_name: str = "ehs-app"):
     """恢复数据库文件"""
     print(f"\n📥 恢复数据库: {backup_file.name}")
@@ -52,9 +52,11 @@ def restore_database(backup_file: Path, container_name: str = "ehs-app"):
 
     import shutil
     shutil.copy2(backup_file, local_db)
+    annotate(bytes=local_db.stat().st_size)
     print(f"✅ 数据库已恢复到: {local_db}")
 
 
+@traced("restore.minio")
 def restore_minio_data(backup_file: Path):
     """恢复 MinIO 数据"""
     print(f"\n📥 恢复 MinIO 数据: {backup_file.name}")
@@ -72,6 +74,7 @@ def restore_minio_data(backup_file: Path):
             print("✅ 已删除现有 MinIO 数据")
 
     # 解压备份文件
+    annotate(bytes=backup_file.stat().st_size)
     run_command([
         "tar", "-xzf", str(backup_file),
         "-C", "./data"
@@ -79,6 +82,50 @@ def restore_minio_data(backup_file: Path):
     print(f"✅ MinIO 数据已恢复")
 
 
+def restore_minio_objects(backup_dir: Path, env_file: Path, workers: int = DEFAULT_WORKERS) -> dict:
+    """通过 S3 接口把按对象备份的文件并发上传回 MinIO（需要 MinIO 已启动），返回恢复报告"""
+    print(f"\n📥 恢复 MinIO 对象: {backup_dir / OBJECTS_DIR}")
+
+    client = client_from_env(env_file)
+    wait_until_ready(client)
+    report = restore_objects(client, backup_dir, workers=workers)
+
+    size_mb = report["uploaded_bytes"] / (1024 * 1024)
+    print(f"✅ MinIO 对象已恢复: 上传 {report['uploaded']} 个（{size_mb:.2f} MB），已存在相同内容 {report['unchanged']} 个")
+    for failed in report["failed"]:
+        print(f"⚠️  警告: 上传失败 {failed['object']}: {failed['error']}")
+    return report
+
+
+def minio_objects_command(backup_dir: Path, workers: int = DEFAULT_WORKERS) -> str:
+    """只恢复 MinIO 对象的命令，供服务未启动或上传失败时补做"""
+    command = f"python3 scripts/docker_restore.py --backup-dir {backup_dir} --only-minio-objects"
+    if workers != DEFAULT_WORKERS:
+        command += f" --minio-workers {workers}"
+    return command
+
+
+def restore_minio_objects_only(backup_dir: Path, env_file: Path, workers: int = DEFAULT_WORKERS) -> int:
+    """--only-minio-objects：不停止服务、不动数据库和其他文件，只把对象上传回运行中的 MinIO"""
+    if not (backup_dir / OBJECTS_DIR / INDEX_FILE).exists():
+        print(f"❌ 错误: 备份中没有按对象备份的 MinIO 数据: {backup_dir / OBJECTS_DIR / INDEX_FILE}")
+        return 1
+    if not confirm_action("确认要把备份中的 MinIO 对象上传回 MinIO 吗？同名且内容不同的对象将被覆盖"):
+        print("❌ 操作已取消")
+        return 0
+    try:
+        report = restore_minio_objects(backup_dir, env_file, workers)
+    except Exception as e:
+        print(f"❌ MinIO 对象恢复失败: {e}")
+        return 1
+    print_command_summary()
+    if report["failed"]:
+        print(f"\n⚠️  {len(report['failed'])} 个对象上传失败，可再次执行: {minio_objects_command(backup_dir, workers)}")
+        return 1
+    return 0
+
+
+@traced("restore.uploads")
 def restore_uploads(backup_file: Path):
     """恢复上传文件"""
     print(f"\n📥 恢复上传文件: {backup_file.name}")
@@ -97,6 +144,7 @@ def restore_uploads(backup_file: Path):
 
     # 解压备份文件
     uploads_dir.parent.mkdir(parents=True, exist_ok=True)
+    annotate(bytes=backup_file.stat().st_size)
     run_command([
         "tar", "-xzf", str(backup_file),
         "-C", "./public"
@@ -104,6 +152,7 @@ def restore_uploads(backup_file: Path):
     print(f"✅ 上传文件已恢复")
 
 
+@traced("restore.env")
 def restore_env_config(backup_file: Path):
     """恢复环境配置文件"""
     print(f"\n📥 恢复环境配置: {backup_file.name}")
@@ -123,6 +172,7 @@ def restore_env_config(backup_file: Path):
     print(f"✅ 环境配置已恢复到: {target_file}")
 
 
+@traced("restore.start_services")
 def start_services(compose_file: Path, env_file: Path):
     """启动 Docker 服务"""
     print("\n🚀 启动 Docker 服务...")
@@ -131,7 +181,7 @@ def start_services(compose_file: Path, env_file: Path):
         "--env-file", str(env_file),
         "-f", str(compose_file),
         "up", "-d"
-    ])
+    ], stream=True, capture=False)
     print("✅ 服务已启动")
 
 
@@ -154,6 +204,17 @@ def main():
         action="store_true",
         help="跳过 MinIO 数据恢复"
     )
+    parser.add_argument(
+        "--minio-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"按对象恢复 MinIO 时的并发连接数 (默认: {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "--only-minio-objects",
+        action="store_true",
+        help="只把按对象备份的 MinIO 数据上传回运行中的 MinIO，不停止服务、不恢复数据库与其他文件"
+    )
     parser.add_argument(
         "--skip-uploads",
         action="store_true",
@@ -170,13 +231,20 @@ def main():
         help="不自动重启服务"
     )
 
+    add_trace_arguments(parser)
     args = parser.parse_args()
+    setup_tracing(args)
 
     backup_dir = Path(args.backup_dir)
     if not backup_dir.exists():
         print(f"❌ 错误: 备份目录不存在: {backup_dir}")
         sys.exit(1)
 
+    compose_file = Path("docker-compose.prod.yml")
+    env_file = find_env_file()
+    if args.only_minio_objects:
+        sys.exit(restore_minio_objects_only(backup_dir, env_file, args.minio_workers))
+
     print(f"\n🚀 开始恢复 EHS 系统数据")
     print(f"📁 备份目录: {backup_dir}")
     print("=" * 60)
@@ -196,11 +264,6 @@ def main():
         sys.exit(0)
 
     # 停止服务
-    compose_file = Path("docker-compose.prod.yml")
-    env_file = Path(".env.docker.local")
-    if not env_file.exists():
-        env_file = Path(".env.docker")
-
     if not args.no_restart:
         try:
             stop_services(compose_file, env_file)
@@ -210,6 +273,7 @@ def main():
     # 查找备份文件
     db_files = list(backup_dir.glob("ehs-db-*.db"))
     minio_files = list(backup_dir.glob("minio-data-*.tar.gz"))
+    minio_index = backup_dir / OBJECTS_DIR / INDEX_FILE
     uploads_files = list(backup_dir.glob("uploads-*.tar.gz"))
     env_files = list(backup_dir.glob("env-config-*.txt"))
 
@@ -246,7 +310,25 @@ def main():
             "--env-file", str(env_file),
             "-f", str(compose_file),
             "ps"
-        ], check=False)
+        ], check=False, stream=True, capture=False)
+
+    # 按对象备份的 MinIO 数据通过 S3 接口上传，需要在服务启动后进行
+    if not args.skip_minio and minio_index.exists():
+        follow_up = minio_objects_command(backup_dir, args.minio_workers)
+        if args.no_restart:
+            print("\n⚠️  未启动服务（--no-restart），MinIO 对象尚未恢复；启动服务后执行:")
+            print(f"   {follow_up}")
+        else:
+            try:
+                report = restore_minio_objects(backup_dir, env_file, args.minio_workers)
+                if report["failed"]:
+                    print(f"   可再次执行以重试失败的对象: {follow_up}")
+            except Exception as e:
+                print(f"❌ MinIO 对象恢复失败: {e}")
+                print("   数据库等其他数据已恢复；MinIO 就绪后只需补做对象恢复（已存在相同内容的对象会跳过）:")
+                print(f"   {follow_up}")
+
+    print_command_summary()
 
     print("\n" + "=" * 60)
     print("✅ 恢复完成！")
@@ -7,16 +7,46 @@ EHS 系统服务更新脚本
 from __future__ import annotations
 
 import argparse
+import json
+import os
+import re
+import signal
+import socket
+import statistics
 import subprocess
 import sys
+import threading
 import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
 from pathlib import Path
-
-
-def run_command(cmd: list[str], check: bool = True) -> subprocess.CompletedProcess:
-    """执行命令并返回结果"""
-    print(f"+ {' '.join(cmd)}")
-    return subprocess.run(cmd, check=check, capture_output=True, text=True)
+from typing import Callable, Iterator, Optional
+
+from db_preflight import preflight_database
+from deploy_checks import (
+    BENCH_BASELINE_FILE,
+    DEFAULT_USER_ID,
+    load_mix,
+    load_plan,
+    run_latency_gate,
+    run_warmup,
+)
+from ops_runner import BackgroundCommand, print_command_summary, run_command, run_commands
+from ops_trace import add_trace_arguments, setup_tracing, traced
+
+
+HEALTH_URL = "http://localhost:3000/api/health"
+IMAGE_REPOSITORY = "ehs-system"
+APP_IMAGE = f"{IMAGE_REPOSITORY}:prod"
+# 每次部署的镜像都会额外打上 <git 提交>-<时间戳> 标签，用于秒级回滚
+RELEASE_TAG_PATTERN = re.compile(r"^(?P<commit>[0-9A-Za-z]+)-(?P<timestamp>\d{8}-\d{6})$")
+DEFAULT_KEEP_IMAGES = 5
+DEPLOY_HISTORY_FILE = Path("backups/deploy-history.jsonl")
+BLUEGREEN_STATE_FILE = Path("backups/bluegreen.json")
+BLUEGREEN_PORTS = {"blue": 3001, "green": 3002}
+PROXY_SCRIPT = Path(__file__).resolve().with_name("ops_proxy.py")
 
 
 def confirm_action(message: str) -> bool:
@@ -33,6 +63,7 @@ def check_docker_running():
         sys.exit(1)
 
 
+@traced("update.backup")
 def backup_before_update(backup_script: Path):
     """更新前自动备份"""
     print("\n📦 更新前自动备份...")
@@ -40,7 +71,7 @@ def backup_before_update(backup_script: Path):
         result = run_command([
             "python3", str(backup_script),
             "--backup-dir", "./backups"
-        ], check=False)
+        ], check=False, stream=True, capture=False)
         if result.returncode == 0:
             print("✅ 备份完成")
             return True
@@ -52,6 +83,7 @@ def backup_before_update(backup_script: Path):
         return False
 
 
+@traced("update.pull")
 def pull_latest_code():
     """拉取最新代码"""
     print("\n📥 拉取最新代码...")
@@ -65,10 +97,91 @@ def pull_latest_code():
             sys.exit(0)
 
     # 拉取代码
-    run_command(["git", "pull"])
+    run_command(["git", "pull"], stream=True)
     print("✅ 代码已更新")
 
 
+def image_id(image: str) -> Optional[str]:
+    """返回镜像的完整 ID，不存在时返回 None"""
+    result = run_command(["docker", "image", "inspect", "--format", "{{.Id}}", image], check=False)
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+def list_release_images(repository: str = IMAGE_REPOSITORY) -> list[dict]:
+    """列出带发布标签的镜像，按时间戳从新到旧排序"""
+    result = run_command([
+        "docker", "images", repository,
+        "--no-trunc",
+        "--format", "{{.Tag}}\t{{.ID}}"
+    ], check=False)
+
+    releases = []
+    for line in result.stdout.splitlines():
+        tag, _, image = line.partition("\t")
+        match = RELEASE_TAG_PATTERN.match(tag.strip())
+        if match:
+            releases.append({
+                "tag": tag.strip(),
+                "id": image.strip(),
+                "commit": match["commit"],
+                "timestamp": match["timestamp"],
+            })
+    return sorted(releases, key=lambda r: r["timestamp"], reverse=True)
+
+
+@traced("update.tag_release")
+def tag_release_image(commit: str, image: str = APP_IMAGE, repository: str = IMAGE_REPOSITORY) -> Optional[str]:
+    """给镜像打上 <提交>-<时间戳> 发布标签；同一镜像已有发布标签时直接复用"""
+    current = image_id(image)
+    if current is None:
+        return None
+    for release in list_release_images(repository):
+        if release["id"] == current:
+            return release["tag"]
+
+    tag = f"{commit}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    run_command(["docker", "tag", image, f"{repository}:{tag}"])
+    print(f"🏷️  已保留镜像: {repository}:{tag}")
+    return tag
+
+
+def previous_release(image: str = APP_IMAGE, repository: str = IMAGE_REPOSITORY) -> Optional[dict]:
+    """当前运行镜像之前最近的一个发布版本"""
+    current = image_id(image)
+    for release in list_release_images(repository):
+        if release["id"] != current:
+            return release
+    return None
+
+
+@traced("update.prune_images")
+def prune_release_images(keep: int = DEFAULT_KEEP_IMAGES, image: str = APP_IMAGE, repository: str = IMAGE_REPOSITORY):
+    """只保留最近 keep 个发布版本，当前运行的镜像永远不会被清理"""
+    current = image_id(image)
+    kept_ids = set()
+    for release in list_release_images(repository):
+        if release["id"] in kept_ids:
+            continue
+        if release["id"] == current or len(kept_ids) < keep:
+            kept_ids.add(release["id"])
+            continue
+        run_command(["docker", "rmi", f"{repository}:{release['tag']}"], check=False)
+        print(f"🗑️  已清理旧镜像: {repository}:{release['tag']}")
+
+
+def show_release_images(image: str = APP_IMAGE, repository: str = IMAGE_REPOSITORY):
+    """列出保留的发布镜像"""
+    current = image_id(image)
+    releases = list_release_images(repository)
+    print(f"\n📋 保留的发布镜像 ({len(releases)} 个):")
+    for release in releases:
+        marker = "  ← 当前" if release["id"] == current else ""
+        print(f"   {repository}:{release['tag']}{marker}")
+
+
+@traced("update.build")
 def build_new_image(compose_file: Path, env_file: Path, no_cache: bool = False):
     """构建新的 Docker 镜像"""
     print("\n🔨 构建新的 Docker 镜像...")
@@ -85,10 +198,11 @@ def build_new_image(compose_file: Path, env_file: Path, no_cache: bool = False):
 
     cmd.append("app")  # 只构建 app 服务
 
-    run_command(cmd)
+    run_command(cmd, stream=True, capture=False)
     print("✅ 镜像构建完成")
 
 
+@traced("update.deploy.rolling")
 def update_service_rolling(compose_file: Path, env_file: Path):
     """滚动更新服务（最小停机时间）"""
     print("\n🔄 执行滚动更新...")
@@ -99,11 +213,12 @@ def update_service_rolling(compose_file: Path, env_file: Path):
         "--env-file", str(env_file),
         "-f", str(compose_file),
         "up", "-d", "--no-deps", "app"
-    ])
+    ], stream=True, capture=False)
 
     print("✅ 服务已更新")
 
 
+@traced("update.deploy.recreate")
 def update_service_recreate(compose_file: Path, env_file: Path):
     """重新创建服务（完全停机更新）"""
     print("\n🔄 停止并重新创建服务...")
@@ -115,7 +230,7 @@ def update_service_recreate(compose_file: Path, env_file: Path):
         "--env-file", str(env_file),
         "-f", str(compose_file),
         "down"
-    ])
+    ], stream=True, capture=False)
 
     # 启动服务
     print("🚀 启动服务...")
@@ -124,64 +239,536 @@ def update_service_recreate(compose_file: Path, env_file: Path):
         "--env-file", str(env_file),
         "-f", str(compose_file),
         "up", "-d"
-    ])
+    ], stream=True, capture=False)
 
     print("✅ 服务已重新创建")
 
 
-def wait_for_healthy(container_name: str = "ehs-app", timeout: int = 60):
-    """等待容器健康"""
-    print(f"\n⏳ 等待容器 {container_name} 健康检查...")
+def probe_health(url: str = HEALTH_URL, timeout: float = 2.0) -> bool:
+    """直接请求健康检查端点，返回 200 视为就绪"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status == 200
+    except (urllib.error.URLError, ConnectionError, TimeoutError, OSError):
+        return False
 
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        result = run_command([
-            "docker", "inspect",
-            "--format", "{{.State.Health.Status}}",
-            container_name
-        ], check=False)
 
-        if result.returncode == 0:
-            status = result.stdout.strip()
-            if status == "healthy":
-                print(f"✅ 容器 {container_name} 已健康")
+def backoff_delays(initial: float = 0.02, factor: float = 2.0, cap: float = 1.0) -> Iterator[float]:
+    """指数退避间隔：从数十毫秒开始翻倍，达到上限后保持不变"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, cap)
+
+
+class HealthEventWatcher:
+    """订阅 docker events 中容器的 health_status / die 事件，事件到达时立即唤醒等待方"""
+
+    def __init__(self, container_name: str):
+        self.container_name = container_name
+        self.status: Optional[str] = None
+        self.changed = threading.Event()
+        self._command: Optional[BackgroundCommand] = None
+
+    def start(self) -> "HealthEventWatcher":
+        # 无法订阅事件（如 docker 不可用）时命令会立即结束，等待逻辑退化为纯 HTTP 探测
+        self._command = BackgroundCommand(
+            [
+                "docker", "events",
+                "--filter", f"container={self.container_name}",
+                "--filter", "event=health_status",
+                "--filter", "event=die",
+                "--format", "{{json .}}",
+            ],
+            self._on_output,
+        ).start()
+        return self
+
+    def _on_output(self, stream_name: str, line: str):
+        if stream_name != "stdout":
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        action = event.get("status") or event.get("Action") or ""
+        if action == "die":
+            self.status = "died"
+        elif action.startswith("health_status:"):
+            self.status = action.split(":", 1)[1].strip()
+        else:
+            return
+        self.changed.set()
+
+    def wait(self, timeout: float) -> Optional[str]:
+        """最多等待 timeout 秒，有新事件时立即返回最新状态"""
+        if self.changed.wait(timeout):
+            self.changed.clear()
+        return self.status
+
+    def stop(self):
+        if self._command:
+            self._command.stop()
+
+
+@traced("update.wait_healthy")
+def wait_for_healthy(
+    container_name: str = "ehs-app",
+    timeout: int = 60,
+    health_url: str = HEALTH_URL,
+) -> bool:
+    """等待容器就绪：直接探测健康端点，同时监听 docker 健康事件以便提前结束等待"""
+    print(f"\n⏳ 等待容器 {container_name} 就绪 ({health_url})...")
+
+    watcher = HealthEventWatcher(container_name).start()
+    start_time = time.monotonic()
+    deadline = start_time + timeout
+    attempts = 0
+    try:
+        for delay in backoff_delays():
+            attempts += 1
+            if probe_health(health_url):
+                elapsed = time.monotonic() - start_time
+                print(f"✅ 容器 {container_name} 已就绪 (等待 {elapsed:.2f}s，探测 {attempts} 次)")
                 return True
-            elif status == "unhealthy":
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            status = watcher.wait(min(delay, remaining))
+            if status == "unhealthy":
                 print(f"❌ 容器 {container_name} 不健康")
                 return False
-            else:
-                print(f"⏳ 当前状态: {status}，等待中...")
-
-        time.sleep(5)
+            if status == "died":
+                print(f"❌ 容器 {container_name} 已退出")
+                return False
+    finally:
+        watcher.stop()
 
     print(f"⚠️  超时: 容器 {container_name} 未在 {timeout} 秒内变为健康")
     return False
 
 
-def check_service_health(env_file: Path):
+def current_commit() -> str:
+    """当前代码的 git 提交（短哈希），获取失败时返回 unknown"""
+    result = run_command(["git", "rev-parse", "--short", "HEAD"], check=False, echo=False)
+    return result.stdout.strip() if result.returncode == 0 else "unknown"
+
+
+def record_deploy_timing(history_file: Path, entry: dict, window: int = 10):
+    """追加一条部署耗时记录，并与最近几次部署的中位数比较"""
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+
+    previous = []
+    if history_file.exists():
+        for line in history_file.read_text(encoding="utf-8").splitlines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("healthy") and record.get("time_to_ready_s") is not None:
+                previous.append(record["time_to_ready_s"])
+
+    with open(history_file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    print(f"\n⏱️  就绪耗时: {entry['time_to_ready_s']:.2f}s (已记录到 {history_file})")
+    recent = previous[-window:]
+    if recent and entry.get("healthy"):
+        median = statistics.median(recent)
+        print(f"   最近 {len(recent)} 次部署中位数: {median:.2f}s")
+        if median > 0 and entry["time_to_ready_s"] > median * 1.5:
+            print("⚠️  警告: 本次启动明显慢于历史水平，请检查启动回归")
+
+
+def load_bluegreen_state(state_file: Path) -> dict:
+    """读取蓝绿部署状态（当前活跃颜色与上游地址）"""
+    if not state_file.exists():
+        return {}
+    return json.loads(state_file.read_text(encoding="utf-8"))
+
+
+def save_bluegreen_state(state_file: Path, state: dict):
+    """原子写入蓝绿部署状态，代理在下一个新连接时生效"""
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = state_file.with_name(state_file.name + ".tmp")
+    tmp.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, state_file)
+
+
+def start_color_container(compose_file: Path, env_file: Path, color: str, port: int) -> str:
+    """以 compose 中 app 服务的配置启动一个新颜色的容器，仅绑定到本机备用端口"""
+    container_name = f"ehs-app-{color}"
+    run_command(["docker", "rm", "-f", container_name], check=False)
+    run_command([
+        "docker", "compose",
+        "--env-file", str(env_file),
+        "-f", str(compose_file),
+        "run", "-d", "--no-deps",
+        "--name", container_name,
+        "-p", f"127.0.0.1:{port}:3000",
+        "app"
+    ])
+    run_command(["docker", "update", "--restart", "unless-stopped", container_name], check=False)
+    return container_name
+
+
+def proxy_running(pid_file: Path) -> bool:
+    """检查前置代理进程是否存活"""
+    if not pid_file.exists():
+        return False
+    try:
+        os.kill(int(pid_file.read_text().strip()), 0)
+        return True
+    except (ValueError, ProcessLookupError, PermissionError):
+        return False
+
+
+def ensure_proxy(public_port: int, state_file: Path, timeout: float = 10, host: str = "0.0.0.0",
+                 pid_file: Optional[Path] = None) -> bool:
+    """确保前置代理在对外端口上运行；端口尚未释放时重试直到超时"""
+    pid_file = pid_file or state_file.with_name("bluegreen-proxy.pid")
+    if proxy_running(pid_file):
+        return True
+
+    print(f"\n🔀 启动前置代理 (端口 {public_port})...")
+    deadline = time.monotonic() + timeout
+    with open(state_file.with_name("bluegreen-proxy.log"), "a") as log_file:
+        while time.monotonic() < deadline:
+            process = subprocess.Popen(
+                [
+                    sys.executable, str(PROXY_SCRIPT),
+                    "--listen", f"{host}:{public_port}",
+                    "--state-file", str(state_file),
+                    "--pid-file", str(pid_file),
+                ],
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True,
+            )
+            for delay in backoff_delays(initial=0.01, cap=0.2):
+                if proxy_running(pid_file):
+                    print(f"✅ 前置代理已启动 (PID {process.pid})")
+                    return True
+                if process.poll() is not None or time.monotonic() >= deadline:
+                    break
+                time.sleep(delay)
+
+    print("❌ 错误: 前置代理启动失败，请查看 bluegreen-proxy.log")
+    return False
+
+
+def stop_proxy(pid_file: Path, timeout: float = 5):
+    """停止代理进程；代理退出时会删除自己的 PID 文件"""
+    if not proxy_running(pid_file):
+        return
+    os.kill(int(pid_file.read_text().strip()), signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    for delay in backoff_delays(initial=0.01, cap=0.2):
+        if not proxy_running(pid_file) or time.monotonic() >= deadline:
+            return
+        time.sleep(delay)
+
+
+def wait_for_endpoint(url: str, timeout: float = 10) -> bool:
+    """在超时内反复探测健康检查地址，直到返回成功"""
+    deadline = time.monotonic() + timeout
+    for delay in backoff_delays(initial=0.05, cap=0.5):
+        if probe_health(url):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(delay)
+
+
+def check_proxy(state_file: Path, timeout: float = 10) -> bool:
+    """
+    首次接管对外端口前的演练：对外端口仍被旧容器占用，先在本机临时端口上按同一份状态文件
+    启动代理，经代理访问新容器的健康检查，确认代理能启动并转发后才停旧容器
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    pid_file = state_file.with_name("bluegreen-proxy-check.pid")
+    if not ensure_proxy(port, state_file, timeout, host="127.0.0.1", pid_file=pid_file):
+        return False
+    try:
+        return wait_for_endpoint(f"http://127.0.0.1:{port}/api/health", timeout)
+    finally:
+        stop_proxy(pid_file)
+
+
+def restore_bluegreen_state(state_file: Path, previous: dict):
+    """切换失败时恢复原来的状态文件（首次部署时原本没有状态文件）"""
+    if previous:
+        save_bluegreen_state(state_file, previous)
+    else:
+        state_file.unlink(missing_ok=True)
+
+
+def wait_for_drain(status_file: Path, upstream: str, timeout: float = 30) -> int:
+    """等待旧上游上的活动连接排空，返回超时时仍未关闭的连接数"""
+    print(f"\n⏳ 等待旧容器连接排空 ({upstream})...")
+    deadline = time.monotonic() + timeout
+    remaining = 0
+    while time.monotonic() < deadline:
+        try:
+            status = json.loads(status_file.read_text(encoding="utf-8"))
+            remaining = status.get("connections", {}).get(upstream, 0)
+        except (OSError, json.JSONDecodeError):
+            remaining = 0
+        if remaining == 0:
+            print("✅ 旧容器连接已排空")
+            return 0
+        time.sleep(0.2)
+
+    print(f"⚠️  警告: 排空超时，仍有 {remaining} 个连接")
+    return remaining
+
+
+class DowntimeMonitor:
+    """切换期间持续探测对外端点，统计最长不可用窗口"""
+
+    def __init__(self, url: str, interval: float = 0.05):
+        self.url = url
+        self.interval = interval
+        self.failures = 0
+        self.probes = 0
+        self.longest_outage = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        outage_start = None
+        while not self._stop.is_set():
+            now = time.monotonic()
+            self.probes += 1
+            if probe_health(self.url, timeout=1.0):
+                if outage_start is not None:
+                    self.longest_outage = max(self.longest_outage, now - outage_start)
+                    outage_start = None
+            else:
+                self.failures += 1
+                if outage_start is None:
+                    outage_start = now
+            self._stop.wait(self.interval)
+        if outage_start is not None:
+            self.longest_outage = max(self.longest_outage, time.monotonic() - outage_start)
+
+    def start(self) -> "DowntimeMonitor":
+        self._thread.start()
+        return self
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return self.longest_outage
+
+
+@traced("update.deploy.bluegreen")
+def update_service_bluegreen(
+    compose_file: Path,
+    env_file: Path,
+    public_port: int = 3000,
+    state_file: Path = BLUEGREEN_STATE_FILE,
+    ports: Optional[dict[str, int]] = None,
+    health_timeout: int = 60,
+    drain_timeout: float = 30,
+    verify: Optional[Callable[[str], bool]] = None,
+    proxy_timeout: float = 10,
+) -> Optional[str]:
+    """
+    蓝绿更新：新容器在备用端口就绪并通过部署后检查后切换代理，排空并移除旧容器，返回新容器名
+    - verify 接收新容器的服务地址，执行预热与性能门禁，返回 False 时放弃切换
+    - 首次部署先在临时端口演练代理再停旧容器；代理未能接管对外端口时重启旧容器并恢复状态文件
+    """
+    print("\n🔄 执行蓝绿更新...")
+    ports = ports or BLUEGREEN_PORTS
+
+    state = load_bluegreen_state(state_file)
+    old_color = state.get("active")
+    new_color = "green" if old_color == "blue" else "blue"
+    new_port = ports[new_color]
+    old_container = state.get("container") or "ehs-app"
+
+    # 1. 在备用端口启动新容器，等待就绪并执行部署后检查
+    new_container = start_color_container(compose_file, env_file, new_color, new_port)
+    new_health_url = f"http://127.0.0.1:{new_port}/api/health"
+    if not wait_for_healthy(new_container, timeout=health_timeout, health_url=new_health_url):
+        print(f"❌ 新容器 {new_container} 未就绪，保留 {old_container} 继续服务")
+        run_command(["docker", "rm", "-f", new_container], check=False)
+        return None
+    if verify is not None and not verify(f"http://127.0.0.1:{new_port}"):
+        print(f"❌ 新容器 {new_container} 未通过部署后检查，保留 {old_container} 继续服务")
+        run_command(["docker", "rm", "-f", new_container], check=False)
+        return None
+
+    # 2. 切换代理上游，同时统计对外端点的不可用时间
+    monitor = DowntimeMonitor(f"http://127.0.0.1:{public_port}/api/health").start()
+    save_bluegreen_state(state_file, {
+        "active": new_color,
+        "upstream": f"127.0.0.1:{new_port}",
+        "container": new_container,
+        "previous": old_container,
+        "switchedAt": datetime.now().isoformat(timespec="seconds"),
+    })
+
+    def abandon(reason: str) -> None:
+        monitor.stop()
+        restore_bluegreen_state(state_file, state)
+        if old_color is None:
+            stop_proxy(state_file.with_name("bluegreen-proxy.pid"))
+            run_command(["docker", "start", old_container], check=False)
+        run_command(["docker", "rm", "-f", new_container], check=False)
+        print(f"❌ {reason}，已恢复原状态，{old_container} 继续服务")
+
+    if old_color is None:
+        # 首次蓝绿部署：先演练代理，再停掉 compose 管理的 ehs-app 以释放对外端口，由代理接管
+        if not check_proxy(state_file, proxy_timeout):
+            abandon("前置代理演练失败")
+            return None
+        run_command(["docker", "stop", old_container], check=False)
+    if not ensure_proxy(public_port, state_file, proxy_timeout):
+        abandon("前置代理启动失败")
+        return None
+    if not wait_for_endpoint(f"http://127.0.0.1:{public_port}/api/health", proxy_timeout):
+        abandon(f"对外端口 {public_port} 经代理访问健康检查失败")
+        return None
+
+    # 3. 排空并移除旧容器
+    if old_color is not None:
+        status_file = state_file.with_name(state_file.name + ".status")
+        wait_for_drain(status_file, f"127.0.0.1:{ports[old_color]}", timeout=drain_timeout)
+    run_command(["docker", "stop", old_container], check=False)
+    run_command(["docker", "rm", old_container], check=False)
+
+    downtime = monitor.stop()
+    print(f"✅ 已切换到 {new_container} ({new_color}, 端口 {new_port})")
+    print(f"   切换期间最长不可用: {downtime * 1000:.0f} ms "
+          f"(探测 {monitor.probes} 次，失败 {monitor.failures} 次)")
+    print("⚠️  注意: 前置代理是本脚本启动的后台进程，不受 compose/systemd 监管，"
+          "主机重启或代理退出后对外端口无人监听；")
+    print(f"   届时执行 python3 scripts/{PROXY_SCRIPT.name} --listen 0.0.0.0:{public_port} "
+          f"--state-file {state_file} --pid-file {state_file.with_name('bluegreen-proxy.pid')} 重新启动代理")
+    return new_container
+
+
+def leave_bluegreen(state_file: Path = BLUEGREEN_STATE_FILE) -> bool:
+    """
+    滚动/重建更新前退出蓝绿模式：停止前置代理、移除当前颜色的容器并删除状态文件，
+    让 compose 管理的 ehs-app 重新绑定对外端口；代理无法停止时返回 False
+    """
+    state = load_bluegreen_state(state_file)
+    if not state.get("active"):
+        return True
+
+    container = state.get("container") or f"ehs-app-{state['active']}"
+    print(f"\n⚠️  当前处于蓝绿模式 ({container})，需要先交还对外端口，切换期间服务不可用")
+    pid_file = state_file.with_name("bluegreen-proxy.pid")
+    stop_proxy(pid_file)
+    if proxy_running(pid_file):
+        print(f"❌ 错误: 前置代理未能停止 (PID 文件 {pid_file})，{container} 继续服务")
+        return False
+    run_command(["docker", "rm", "-f", container], check=False)
+    state_file.unlink()
+    state_file.with_name(state_file.name + ".status").unlink(missing_ok=True)
+    print("✅ 已退出蓝绿模式，对外端口交还给 compose 管理的 ehs-app")
+    return True
+
+
+@traced("update.rollback")
+def rollback_to_image(
+    compose_file: Path,
+    env_file: Path,
+    tag: Optional[str] = None,
+    health_url: str = HEALTH_URL,
+    health_timeout: int = 60,
+    public_port: int = 3000,
+    image: str = APP_IMAGE,
+    repository: str = IMAGE_REPOSITORY,
+) -> bool:
+    """把 app 服务重新指向保留的发布镜像（默认上一版本），并等待就绪"""
+    if tag is None:
+        release = previous_release(image, repository)
+        if release is None:
+            print("❌ 错误: 没有可回滚的历史镜像")
+            return False
+        tag = release["tag"]
+
+    target = f"{repository}:{tag}"
+    print(f"\n⏪ 回滚到 {target}...")
+    if image_id(target) is None:
+        print(f"❌ 错误: 找不到镜像 {target}")
+        show_release_images(image, repository)
+        return False
+
+    started = time.monotonic()
+    run_command(["docker", "tag", target, image])
+    if load_bluegreen_state(BLUEGREEN_STATE_FILE).get("active"):
+        healthy = update_service_bluegreen(
+            compose_file, env_file,
+            public_port=public_port,
+            health_timeout=health_timeout,
+        ) is not None
+    else:
+        update_service_rolling(compose_file, env_file)
+        healthy = wait_for_healthy("ehs-app", timeout=health_timeout, health_url=health_url)
+
+    if healthy:
+        print(f"✅ 已回滚到 {target} (耗时 {time.monotonic() - started:.1f}s)")
+    return healthy
+
+
+def build_post_deploy_checks(args) -> Optional[Callable[[str], bool]]:
+    """根据命令行参数组装部署后检查：预热 + 性能门禁，返回接收服务地址的检查函数"""
+    if args.skip_warmup and args.skip_bench_gate:
+        return None
+
+    plan = load_plan(Path(args.warmup_plan) if args.warmup_plan else None)
+    mix = load_mix(Path(args.bench_mix) if args.bench_mix else None)
+
+    def checks(base_url: str) -> bool:
+        if not args.skip_warmup:
+            report = run_warmup(base_url, plan, user_id=args.warmup_user, concurrency=args.warmup_concurrency)
+            if not report["ok"]:
+                return False
+        if not args.skip_bench_gate:
+            regressions = run_latency_gate(
+                base_url, mix,
+                user_id=args.warmup_user,
+                baseline_file=Path(args.bench_baseline),
+                label=current_commit(),
+            )
+            if regressions:
+                return False
+        return True
+
+    return checks
+
+
+@traced("update.check_health")
+def check_service_health(env_file: Path, health_url: str = HEALTH_URL):
     """检查服务健康状态"""
     print("\n🏥 检查服务健康状态...")
 
-    # 检查容器状态
-    result = run_command([
-        "docker", "ps",
-        "--filter", "name=ehs-",
-        "--format", "table {{.Names}}\t{{.Status}}\t{{.Ports}}"
+    # 容器状态与健康检查端点互不依赖，并发查询
+    ps_result, curl_result = run_commands([
+        [
+            "docker", "ps",
+            "--filter", "name=ehs-",
+            "--format", "table {{.Names}}\t{{.Status}}\t{{.Ports}}"
+        ],
+        ["curl", "-f", "-s", health_url],
     ], check=False)
 
-    if result.returncode == 0:
-        print(result.stdout)
+    if ps_result.returncode == 0:
+        print(ps_result.stdout)
 
-    # 尝试访问健康检查端点
     print("\n🔍 测试健康检查端点...")
-    result = run_command([
-        "curl", "-f", "-s",
-        "http://localhost:3000/api/health"
-    ], check=False)
-
-    if result.returncode == 0:
+    if curl_result.returncode == 0:
         print("✅ 健康检查端点正常")
-        print(result.stdout)
+        print(curl_result.stdout)
     else:
         print("⚠️  警告: 健康检查端点无响应")
 
@@ -193,16 +780,29 @@ def show_logs(container_name: str = "ehs-app", lines: int = 50):
         "docker", "logs",
         "--tail", str(lines),
         container_name
-    ], check=False)
+    ], check=False, stream=True, capture=False)
 
 
 def main():
     parser = argparse.ArgumentParser(description="更新 EHS 系统 Docker 服务")
     parser.add_argument(
         "--mode",
-        choices=["rolling", "recreate"],
+        choices=["rolling", "recreate", "bluegreen"],
         default="rolling",
-        help="更新模式: rolling (滚动更新，最小停机) 或 recreate (重新创建，完全停机)"
+        help="更新模式: rolling (滚动更新，最小停机)、recreate (重新创建，完全停机) "
+             "或 bluegreen (蓝绿切换，零停机)"
+    )
+    parser.add_argument(
+        "--public-port",
+        type=int,
+        default=3000,
+        help="蓝绿模式下前置代理监听的对外端口 (默认: 3000)"
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=30,
+        help="蓝绿模式下等待旧容器连接排空的秒数 (默认: 30)"
     )
     parser.add_argument(
         "--no-backup",
@@ -229,8 +829,102 @@ def main():
         action="store_true",
         help="更新后显示日志"
     )
+    parser.add_argument(
+        "--health-timeout",
+        type=int,
+        default=60,
+        help="等待服务就绪的超时秒数 (默认: 60)"
+    )
+    parser.add_argument(
+        "--health-url",
+        type=str,
+        default=HEALTH_URL,
+        help=f"健康检查端点 (默认: {HEALTH_URL})"
+    )
+    parser.add_argument(
+        "--history-file",
+        type=str,
+        default=str(DEPLOY_HISTORY_FILE),
+        help=f"部署就绪耗时记录文件 (默认: {DEPLOY_HISTORY_FILE})"
+    )
+    parser.add_argument(
+        "--skip-warmup",
+        action="store_true",
+        help="跳过部署后热点接口预热"
+    )
+    parser.add_argument(
+        "--warmup-plan",
+        type=str,
+        help="预热计划 JSON 文件 (默认: 隐患列表/我的任务/首页统计/通知)"
+    )
+    parser.add_argument(
+        "--warmup-user",
+        type=str,
+        default=DEFAULT_USER_ID,
+        help=f"预热与性能门禁请求使用的 x-user-id (默认: {DEFAULT_USER_ID})"
+    )
+    parser.add_argument(
+        "--warmup-concurrency",
+        type=int,
+        default=4,
+        help="预热时每个接口每轮的并发数 (默认: 4)"
+    )
+    parser.add_argument(
+        "--skip-bench-gate",
+        action="store_true",
+        help="跳过部署后性能门禁"
+    )
+    parser.add_argument(
+        "--bench-mix",
+        type=str,
+        help="性能门禁回放的请求组合 (JSON 数组或录制的 NDJSON，默认同预热计划)"
+    )
+    parser.add_argument(
+        "--bench-baseline",
+        type=str,
+        default=str(BENCH_BASELINE_FILE),
+        help=f"性能基线文件 (默认: {BENCH_BASELINE_FILE})"
+    )
+    parser.add_argument(
+        "--no-rollback",
+        action="store_true",
+        help="部署后检查失败时不自动回滚"
+    )
+    parser.add_argument(
+        "--skip-db-preflight",
+        action="store_true",
+        help="跳过部署前的 SQLite 只读检查"
+    )
+    parser.add_argument(
+        "--db-maintenance",
+        action="store_true",
+        help="部署前同时执行 WAL 切换、ANALYZE 与 WAL 检查点（默认只做只读的完整性与迁移检查）"
+    )
+    parser.add_argument(
+        "--db-path",
+        type=str,
+        help="SQLite 数据库文件 (默认: data/db/ehs.db)"
+    )
+    parser.add_argument(
+        "--keep-images",
+        type=int,
+        default=DEFAULT_KEEP_IMAGES,
+        help=f"保留的历史发布镜像数量 (默认: {DEFAULT_KEEP_IMAGES})"
+    )
+
+    add_trace_arguments(parser)
+
+    subparsers = parser.add_subparsers(dest="command", help="命令 (不指定时执行更新)")
+    rollback_parser = subparsers.add_parser("rollback", help="回滚到保留的发布镜像")
+    rollback_parser.add_argument(
+        "--to",
+        type=str,
+        help="目标镜像标签 (默认: 上一个发布版本)"
+    )
+    subparsers.add_parser("images", help="列出保留的发布镜像")
 
     args = parser.parse_args()
+    setup_tracing(args)
 
     print("🚀 EHS 系统服务更新工具")
     print("=" * 60)
@@ -254,6 +948,20 @@ def main():
         print(f"❌ 错误: 找不到环境配置文件")
         sys.exit(1)
 
+    if args.command == "images":
+        show_release_images()
+        return
+
+    if args.command == "rollback":
+        if not rollback_to_image(
+            compose_file, env_file, args.to,
+            health_url=args.health_url,
+            health_timeout=args.health_timeout,
+            public_port=args.public_port,
+        ):
+            sys.exit(1)
+        return
+
     # 显示更新信息
     print(f"\n📋 更新配置:")
     print(f"   - 更新模式: {args.mode}")
@@ -268,33 +976,94 @@ def main():
     if not args.no_backup:
         backup_before_update(backup_script)
 
-    # 2. 拉取最新代码
+    # 2. 保留当前运行的镜像，然后拉取最新代码
+    running_tag = tag_release_image(current_commit())
     if not args.no_pull:
         pull_latest_code()
 
-    # 3. 构建新镜像
+    # 3. 构建新镜像并打上发布标签
     build_new_image(compose_file, env_file, args.no_cache)
+    release_tag = tag_release_image(current_commit())
+
+    post_deploy_checks = build_post_deploy_checks(args)
+
+    # 数据库检查：完整性与迁移状态（只读）；--db-maintenance 时同时执行 ANALYZE 与 WAL 检查点
+    if not args.skip_db_preflight and not preflight_database(args.db_path, read_only=not args.db_maintenance):
+        print("\n❌ 数据库检查失败，已中止更新，旧版本仍在服务")
+        if running_tag:
+            run_command(["docker", "tag", f"{IMAGE_REPOSITORY}:{running_tag}", APP_IMAGE])
+        sys.exit(1)
 
     # 4. 更新服务
-    if args.mode == "rolling":
-        update_service_rolling(compose_file, env_file)
+    deploy_started = time.monotonic()
+    app_container = "ehs-app"
+    if args.mode == "bluegreen":
+        app_container = update_service_bluegreen(
+            compose_file, env_file,
+            public_port=args.public_port,
+            health_timeout=args.health_timeout,
+            drain_timeout=args.drain_timeout,
+            verify=post_deploy_checks,
+        )
+        if not app_container:
+            print("\n⚠️  警告: 蓝绿更新失败，旧版本仍在服务")
+            if running_tag:
+                run_command(["docker", "tag", f"{IMAGE_REPOSITORY}:{running_tag}", APP_IMAGE])
+            sys.exit(1)
     else:
-        update_service_recreate(compose_file, env_file)
+        # 蓝绿部署后对外端口由前置代理占用，compose 的 ehs-app 无法绑定
+        if not leave_bluegreen(BLUEGREEN_STATE_FILE):
+            print("\n❌ 无法退出蓝绿模式，已中止更新；可继续使用 --mode bluegreen 更新")
+            if running_tag:
+                run_command(["docker", "tag", f"{IMAGE_REPOSITORY}:{running_tag}", APP_IMAGE])
+            sys.exit(1)
+        if args.mode == "rolling":
+            update_service_rolling(compose_file, env_file)
+        else:
+            update_service_recreate(compose_file, env_file)
 
     # 5. 等待健康检查
     if not args.skip_health_check:
-        if not wait_for_healthy("ehs-app", timeout=60):
+        healthy = wait_for_healthy(app_container, timeout=args.health_timeout, health_url=args.health_url)
+        record_deploy_timing(Path(args.history_file), {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": current_commit(),
+            "image_tag": release_tag,
+            "mode": args.mode,
+            "healthy": healthy,
+            "time_to_ready_s": round(time.monotonic() - deploy_started, 3),
+        })
+        if not healthy:
             print("\n⚠️  警告: 服务可能未正常启动")
             if args.show_logs:
-                show_logs("ehs-app", lines=100)
+                show_logs(app_container, lines=100)
             sys.exit(1)
 
-    # 6. 检查服务健康
-    check_service_health(env_file)
+    # 6. 预热与性能门禁（蓝绿模式已在切换前完成）
+    if post_deploy_checks is not None and args.mode != "bluegreen":
+        base = urllib.parse.urlsplit(args.health_url)
+        if not post_deploy_checks(f"{base.scheme}://{base.netloc}"):
+            print("\n⚠️  警告: 部署后检查未通过")
+            if args.show_logs:
+                show_logs(app_container, lines=100)
+            if not args.no_rollback:
+                rollback_to_image(
+                    compose_file, env_file,
+                    health_url=args.health_url,
+                    health_timeout=args.health_timeout,
+                )
+            sys.exit(1)
 
-    # 7. 显示日志
+    # 7. 检查服务健康
+    check_service_health(env_file, args.health_url)
+
+    # 8. 显示日志
     if args.show_logs:
-        show_logs("ehs-app", lines=50)
+        show_logs(app_container, lines=50)
+
+    # 9. 清理超出保留数量的旧镜像
+    prune_release_images(args.keep_images)
+    print_command_summary()
 
     print("\n" + "=" * 60)
     print("✅ 服务更新完成！")
@@ -302,6 +1071,7 @@ def main():
     print("   - 查看日志: docker logs -f ehs-app")
     print("   - 检查状态: docker ps")
     print("   - 访问应用: http://YOUR_IP:3000")
+    print("   - 快速回滚: python3 scripts/docker_update.py rollback [--to <标签>]")
     print("   - 如有问题，可使用备份恢复: python3 scripts/docker_restore.py --backup-dir ./backups/backup-XXXXXX")
 
 
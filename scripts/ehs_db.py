@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 SQLite 运维命令 (ehs-db)
+用法: python3 scripts/ehs_db.py <子命令> [参数]  或  npm run ehs-db -- <子命令> [参数]
+各子命令在独立模块中实现，并通过 register(subparsers) 注册到这里
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+
+import db_archive_logs
+import db_dashboard
+import db_file_reconcile
+import db_hazard_analytics
+import db_maintain
+import db_ndjson
+import db_preflight
+import db_query_plans
+import db_salvage
+import db_seed
+import db_snapshot
+import hazard_code_pool
+import hazard_workflow
+from ops_trace import add_trace_arguments, setup_tracing
+
+
+COMMAND_MODULES = [
+    db_preflight,
+    db_maintain,
+    db_query_plans,
+    db_salvage,
+    db_archive_logs,
+    db_file_reconcile,
+    db_ndjson,
+    db_hazard_analytics,
+    db_dashboard,
+    db_seed,
+    db_snapshot,
+    hazard_workflow,
+    hazard_code_pool,
+]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="ehs-db", description="EHS 系统 SQLite 运维命令")
+    add_trace_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command", help="命令")
+    for module in COMMAND_MODULES:
+        module.register(subparsers)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+    setup_tracing(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
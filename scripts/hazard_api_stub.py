@@ -0,0 +1,716 @@
+#!/usr/bin/env python3
+"""
+EHS 系统隐患接口本地替身 (stand-in)
+不启动 Node/Next.js，直接在同一套 SQLite 表结构上实现隐患生命周期用到的接口：
+- POST  /api/hazards            上报（需要 hidden_danger.report 权限），分配编号、解析全部步骤并派发到第二步
+- PATCH /api/hazards            流转/闭环：执行人校验、步骤回退校验、日志、候选人、抄送与可见性
+- GET   /api/hazards/workflow   读取工作流配置（不存在时写入默认配置）
+- POST  /api/hazards/workflow   保存工作流配置（管理员）
+- POST  /api/hazards/void       作废并释放编号到编号池
+认证与后端一致使用 x-user-id 请求头；处理人/抄送解析复用 hazard_workflow 的编译模型
+返回的 JSON 覆盖生命周期测试与压测读取的字段（status、currentStepId/Index、currentExecutorId 等），
+不是 mapHazard 的完整复刻；权限、编号与错误码按 src/app/api/hazards 下的路由实现
+用法:
+  python3 scripts/hazard_api_stub.py --port 3000               # DATABASE_URL + ./data/hazard-workflow.json
+  EHS_APP_CMD="python3 {root}/scripts/hazard_api_stub.py --port {port}" pytest test_hazard_lifecycle.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import hazard_code_pool
+import hazard_workflow
+from db_preflight import BUSY_TIMEOUT_MS
+from hazard_lifecycle import load_database_url, sqlite_path
+
+
+ADMIN_ROLES = ("admin", "super_admin")
+# 需要校验当前步骤执行人的动作（与 PATCH 路由一致）
+GUARDED_ACTIONS = {"提交整改", "rectify", "验收通过", "verify_pass", "验收驳回", "verify_reject", "驳回", "reject"}
+# 会标记候选处理人已操作的动作
+OPERATED_ACTIONS = {"提交整改", "验收通过", "驳回", "指派整改", "提交上报", "审批通过", "通过"}
+# 请求体中不写入 HazardRecord 的字段
+POST_IGNORED = {
+    "dopersonal_ID", "dopersonal_Name", "responsibleDeptId", "responsibleDeptName", "reporterDepartmentId",
+    "reporterDepartment", "isExtensionRequested", "rejectReason", "ccUserNames",
+}
+PATCH_IGNORED = {
+    "id", "operatorId", "operatorName", "actionName", "notifications", "dispatchResult", "responsibleDeptId",
+    "responsibleDeptName", "isExtensionRequested", "rejectReason", "ccUserNames", "signature", "signerId",
+    "signerName",
+}
+JSON_FIELDS = {
+    "photos", "rectifyPhotos", "rectificationPhotos", "verifyPhotos", "verificationPhotos", "ccDepts", "ccUsers",
+    "ccDeptIds", "ccUserIds", "logs", "old_personal_ID", "historicalHandlerIds", "candidateHandlers",
+}
+
+DEFAULT_WORKFLOW = {
+    "version": 1,
+    "updatedBy": "system",
+    "steps": [
+        {"id": "report", "name": "上报并指派", "description": "隐患上报，执行人强制为发起人",
+         "handlerStrategy": {"type": "fixed", "description": "执行人：上报人（系统自动）", "fixedUsers": []},
+         "ccRules": []},
+        {"id": "assign", "name": "开始整改", "description": "指派整改责任人，默认为管理员",
+         "handlerStrategy": {"type": "role", "description": "默认：管理员角色", "roleName": "管理员"}, "ccRules": []},
+        {"id": "rectify", "name": "提交整改", "description": "整改责任人提交整改结果",
+         "handlerStrategy": {"type": "fixed", "description": "执行人：整改责任人（系统自动）", "fixedUsers": []},
+         "ccRules": []},
+        {"id": "verify", "name": "验收闭环", "description": "验收整改结果，默认为管理员",
+         "handlerStrategy": {"type": "role", "description": "默认：管理员角色", "roleName": "管理员"}, "ccRules": []},
+    ],
+}
+
+
+class ApiError(Exception):
+    """以 {error: ...} 响应的错误，未指定状态码时与 withErrorHandling 一致返回 500"""
+
+    def __init__(self, message: str, status: int = 500, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra} if status != 500 else {"error": message, "details": message}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _iso(ms: Optional[int]) -> Optional[str]:
+    if ms is None:
+        return None
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def _new_id() -> str:
+    # 与 cuid 同为 25 位
+    return "c" + secrets.token_hex(12)
+
+
+def _json_list(value) -> list:
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def _to_ms(value: Any, end_of_day: bool = False) -> Any:
+    """ISO 日期字符串转为 Prisma 在 SQLite 中的存储格式（毫秒时间戳）；deadline 取当天 23:59:59.999"""
+    if not isinstance(value, str):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ApiError(f"无效的日期: {value}")
+    if end_of_day:
+        parsed = datetime.combine(parsed.date(), datetime.max.time()).astimezone()
+    return int(parsed.timestamp() * 1000)
+
+
+class HazardApiStub:
+    """
+    接口实现本身，handle() 不经过 HTTP 也可直接调用
+    所有请求共用一个连接，按请求加锁串行执行、每个写请求一个事务（与 SQLite 单写者一致）
+    """
+
+    def __init__(self, db_file: Path, workflow_file: Path):
+        self.db_file = Path(db_file)
+        self.workflow_file = Path(workflow_file)
+        self.conn = sqlite3.connect(
+            str(self.db_file), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        # 替身只服务测试与压测，WAL 下 NORMAL 不会损坏数据库，省掉每次提交的 fsync
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.lock = threading.Lock()
+        columns = self.conn.execute("SELECT name, type FROM pragma_table_info('HazardRecord')").fetchall()
+        if not columns:
+            raise RuntimeError(f"{self.db_file} 中没有 HazardRecord 表，请先执行迁移")
+        self.columns = {name: kind.upper() for name, kind in columns}
+        self._directory: Optional[hazard_workflow.Directory] = None
+        self._directory_version = None
+        self.routes = {
+            ("POST", "/api/hazards"): self.create_hazard,
+            ("PATCH", "/api/hazards"): self.update_hazard,
+            ("GET", "/api/hazards/workflow"): self.get_workflow,
+            ("POST", "/api/hazards/workflow"): self.save_workflow,
+            ("POST", "/api/hazards/void"): self.void_hazard,
+        }
+
+    def close(self):
+        self.conn.close()
+
+    # -- 请求分发 -------------------------------------------------------------
+
+    def handle(self, method: str, path: str, user_id: Optional[str], body: Any = None) -> tuple[int, Any]:
+        """返回 (状态码, JSON 响应体)"""
+        route = self.routes.get((method.upper(), urlsplit(path).path.rstrip("/")))
+        if route is None:
+            return 404, {"error": "Not Found"}
+        with self.lock:
+            try:
+                user = self._user(user_id)
+                if user is None:
+                    raise ApiError("未授权访问，请先登录", 401)
+                return 200, route(user, body if body is not None else {})
+            except ApiError as e:
+                return e.status, e.body
+            except sqlite3.Error as e:
+                return 500, {"error": "数据库操作失败", "details": str(e)}
+            except Exception as e:
+                return 500, {"error": str(e) or "服务器内部错误", "details": str(e)}
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _user(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not user_id:
+            return None
+        row = self.conn.execute(
+            'SELECT "id", "name", "role", "permissions" FROM "User" WHERE "id" = ?', (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            permissions = json.loads(row[3]) if row[3] else {}
+        except ValueError:
+            permissions = {}
+        return {"id": row[0], "name": row[1], "role": row[2], "permissions": permissions if isinstance(permissions, dict) else {}}
+
+    @staticmethod
+    def _has_permission(user: Dict[str, Any], module: str, permission: str) -> bool:
+        if user["role"] == "admin":
+            return True
+        granted = user["permissions"].get(module)
+        return isinstance(granted, list) and permission in granted
+
+    def _directory_snapshot(self) -> hazard_workflow.Directory:
+        """组织架构按 data_version 缓存：只有其他连接改过库（如导入用户）时才重新加载"""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._directory is None or version != self._directory_version:
+            self._directory = hazard_workflow.Directory.from_sqlite(self.conn)
+            self._directory_version = version
+        return self._directory
+
+    def _ensure_workflow_file(self) -> Path:
+        """与 ensureWorkflowFile 一致：配置文件不存在时写入默认四步流程"""
+        if not self.workflow_file.exists():
+            self.workflow_file.parent.mkdir(parents=True, exist_ok=True)
+            config = dict(DEFAULT_WORKFLOW, updatedAt=_iso(_now_ms()))
+            self.workflow_file.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+        return self.workflow_file
+
+    # -- 行读写 ---------------------------------------------------------------
+
+    def _column_value(self, column: str, value: Any) -> Any:
+        if column not in self.columns:
+            raise ApiError(f"Unknown argument `{column}`")
+        kind = self.columns[column]
+        if kind == "DATETIME":
+            return _to_ms(value, end_of_day=(column == "deadline"))
+        if kind == "BOOLEAN" and isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+    def _hazard_row(self, hazard_id: str) -> Optional[Dict[str, Any]]:
+        cursor = self.conn.execute('SELECT * FROM "HazardRecord" WHERE "id" = ?', (hazard_id,))
+        row = cursor.fetchone()
+        return dict(zip((c[0] for c in cursor.description), row)) if row else None
+
+    def _render(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """HazardRecord 行转为接口 JSON：JSON 字段解析为数组、时间转为 ISO 字符串"""
+        hazard = {}
+        for key, value in row.items():
+            if key in JSON_FIELDS:
+                value = _json_list(value)
+            elif self.columns.get(key) == "DATETIME":
+                value = _iso(value)
+            elif self.columns.get(key) == "BOOLEAN":
+                value = bool(value)
+            hazard[key] = value
+        hazard["ccUsers"] = [
+            r[0] for r in self.conn.execute('SELECT "userId" FROM "HazardCC" WHERE "hazardId" = ?', (row["id"],))
+        ] or hazard.get("ccUsers") or []
+        return hazard
+
+    def _sync_visibility(self, hazard_id: str):
+        """与 syncHazardVisibility 相同：按当前字段重算可见性角色后整体替换"""
+        row = self._hazard_row(hazard_id)
+        roles: Dict[tuple, None] = {}
+        if row["reporterId"]:
+            roles[(row["reporterId"], "creator")] = None
+        executor = row["currentExecutorId"] or row["dopersonal_ID"]
+        if executor:
+            roles[(executor, "executor")] = None
+        for user_id in _json_list(row["historicalHandlerIds"] or row["old_personal_ID"]):
+            if user_id:
+                roles[(user_id, "executor")] = None
+        for (user_id,) in self.conn.execute('SELECT "userId" FROM "HazardCC" WHERE "hazardId" = ?', (hazard_id,)):
+            roles[(user_id, "cc")] = None
+        if row["responsibleId"]:
+            roles[(row["responsibleId"], "responsible")] = None
+        if row["verifierId"]:
+            roles[(row["verifierId"], "verifier")] = None
+        for (user_id,) in self.conn.execute(
+            'SELECT "userId" FROM "HazardCandidateHandler" WHERE "hazardId" = ?', (hazard_id,)
+        ):
+            roles[(user_id, "candidate")] = None
+        now = _now_ms()
+        self.conn.execute('DELETE FROM "HazardVisibility" WHERE "hazardId" = ?', (hazard_id,))
+        self.conn.executemany(
+            'INSERT INTO "HazardVisibility" ("id", "hazardId", "userId", "role", "createdAt", "updatedAt") '
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(_new_id(), hazard_id, user_id, role, now, now) for user_id, role in roles],
+        )
+
+    def _notify(self, user_ids, kind: str, title: str, content: str, hazard_id: str):
+        now = _now_ms()
+        self.conn.executemany(
+            'INSERT INTO "Notification" ("id", "userId", "type", "title", "content", "relatedType", "relatedId", '
+            '"isRead", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, \'hazard\', ?, 0, ?, ?)',
+            [(_new_id(), user_id, kind, title, content, hazard_id, now, now) for user_id in user_ids],
+        )
+
+    # -- 编号 -----------------------------------------------------------------
+
+    def _acquire_code(self, operator_id: str) -> str:
+        """与 HazardCodePoolService.acquireCode 相同：编号池中当天可用的最小序号，否则当天第一个未使用的序号"""
+        try:
+            return hazard_code_pool.acquire_code(self.conn, operator_id)
+        except hazard_code_pool.CodePoolExhausted as exc:
+            raise ApiError(str(exc)) from exc
+
+    def _release_code(self, code: str, operator_id: str):
+        hazard_code_pool.release_code(self.conn, code, operator_id)
+
+    # -- 路由 -----------------------------------------------------------------
+
+    def get_workflow(self, user, body):
+        return {"success": True, "data": json.loads(self._ensure_workflow_file().read_text(encoding="utf-8"))}
+
+    def save_workflow(self, user, body):
+        if user["role"] != "admin":
+            raise ApiError("需要管理员权限", 403)
+        config = body.get("config")
+        if not config or not config.get("steps"):
+            raise ApiError("Invalid workflow configuration", 400, success=False)
+        saved = {
+            "version": (config.get("version") or 0) + 1,
+            "updatedAt": _iso(_now_ms()),
+            "updatedBy": user["name"] or user["id"],
+            "steps": [
+                {
+                    "id": step.get("id"),
+                    "name": step.get("name"),
+                    "description": step.get("description") or "",
+                    "handlerStrategy": step.get("handlerStrategy"),
+                    "ccRules": step.get("ccRules") or [],
+                }
+                for step in config["steps"]
+            ],
+        }
+        self.workflow_file.parent.mkdir(parents=True, exist_ok=True)
+        self.workflow_file.write_text(json.dumps(saved, ensure_ascii=False, indent=2), encoding="utf-8")
+        return {"success": True, "data": saved, "message": "工作流配置已保存"}
+
+    def create_hazard(self, user, body):
+        if not self._has_permission(user, "hidden_danger", "report"):
+            raise ApiError("权限不足", 403, details="需要 hidden_danger.report 权限", module="hidden_danger",
+                           permission="report")
+        now = _now_ms()
+        data = {k: v for k, v in body.items() if k not in POST_IGNORED}
+        initial_log = {
+            "operatorId": user["id"],
+            "operatorName": user["name"],
+            "action": "上报隐患",
+            "time": _iso(now),
+            "changes": f"创建隐患记录 - 类型: {data.get('type')}, 位置: {data.get('location')}, 风险等级: {data.get('riskLevel')}",
+        }
+        data["logs"] = [initial_log] + (data.get("logs") if isinstance(data.get("logs"), list) else [])
+        for legacy, current in (("ccDepts", "ccDeptIds"), ("ccUsers", "ccUserIds"), ("old_personal_ID", "historicalHandlerIds")):
+            if data.get(legacy):
+                data[current] = data[legacy]
+
+        with self._transaction() as conn:
+            if not data.get("code") or not str(data["code"]).strip() or conn.execute(
+                'SELECT 1 FROM "HazardRecord" WHERE "code" = ?', (data["code"],)
+            ).fetchone():
+                data["code"] = self._acquire_code(user["id"])
+            hazard_id = _new_id()
+            row = {"id": hazard_id, "createdAt": now, "updatedAt": now, "reportTime": now}
+            row.update({k: self._column_value(k, v) for k, v in data.items()})
+            names = ", ".join(f'"{k}"' for k in row)
+            conn.execute(f'INSERT INTO "HazardRecord" ({names}) VALUES ({", ".join("?" * len(row))})', list(row.values()))
+            self._dispatch_new_hazard(hazard_id, user, now)
+        return self._render(self._hazard_row(hazard_id))
+
+    def _dispatch_new_hazard(self, hazard_id: str, user, now: int):
+        """解析全部步骤写入 HazardWorkflowStep，并像派发引擎的 SUBMIT 一样把隐患推进到第二步"""
+        # 编译结果按文件 mtime 缓存，配置被修改后下一次上报即生效（与后端每次读取文件的效果相同）
+        workflow = hazard_workflow.load_workflow(self._ensure_workflow_file())
+        if not workflow.steps:
+            return
+        directory = self._directory_snapshot()
+        record = self._hazard_row(hazard_id)
+        responsible = directory.user(record["responsibleId"])
+        hazard = dict(record, assignedDepartmentId=responsible.get("departmentId") if responsible else None)
+
+        resolved = []
+        for step in workflow.steps:
+            handlers, cc_ids = step.resolve(hazard, directory)
+            cc_names = [(directory.user(u) or {}).get("name") or "" for u in cc_ids]
+            resolved.append((handlers, cc_ids, cc_names))
+        self.conn.executemany(
+            'INSERT INTO "HazardWorkflowStep" ("id", "hazardId", "stepIndex", "stepId", "stepName", "handlerUserIds", '
+            '"handlerUserNames", "matchedBy", "ccUserIds", "ccUserNames", "approvalMode", "success", "error", '
+            '"createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [
+                (
+                    _new_id(), hazard_id, step.index, step.id, step.name,
+                    json.dumps([u["id"] for u in handlers]), json.dumps([u["name"] for u in handlers], ensure_ascii=False),
+                    step.strategy, json.dumps(cc_ids), json.dumps(cc_names, ensure_ascii=False), step.approval_mode,
+                    int(bool(handlers)), None if handlers else "未匹配到处理人", now, now,
+                )
+                for step, (handlers, cc_ids, cc_names) in zip(workflow.steps, resolved)
+            ],
+        )
+
+        next_index = 1 if len(workflow.steps) > 1 else 0
+        if len(workflow.steps) == 1:
+            status, step_id = "closed", workflow.steps[0].id
+        else:
+            status, step_id = workflow.statuses[next_index], workflow.steps[next_index].id
+        handlers, cc_ids, cc_names = resolved[next_index]
+        step = workflow.steps[next_index]
+        executor = handlers[0] if handlers else {"id": None, "name": None}
+        log = {
+            "operatorId": user["id"],
+            "operatorName": user["name"],
+            "action": "提交上报",
+            "time": _iso(now),
+            "changes": f"流转至【{step.name}】，处理人: {'、'.join(u['name'] for u in handlers) or '无'}",
+        }
+        updates = {
+            "status": status,
+            "currentStepIndex": next_index,
+            "currentStepId": step_id,
+            "dopersonal_ID": executor["id"],
+            "dopersonal_Name": executor["name"],
+            "currentExecutorId": executor["id"],
+            "currentExecutorName": executor["name"],
+            "logs": json.dumps(_json_list(record["logs"]) + [log], ensure_ascii=False),
+            "updatedAt": now,
+        }
+        if step.approval_mode:
+            updates["approvalMode"] = step.approval_mode
+        candidates = handlers if len(handlers) > 1 else []
+        if candidates:
+            updates["candidateHandlers"] = json.dumps(
+                [{"userId": u["id"], "userName": u["name"], "hasOperated": False} for u in candidates], ensure_ascii=False
+            )
+        if cc_ids:
+            updates["ccUsers"] = updates["ccUserIds"] = json.dumps(cc_ids)
+        self.conn.execute(
+            f'UPDATE "HazardRecord" SET {", ".join(f"{chr(34)}{k}{chr(34)} = ?" for k in updates)} WHERE "id" = ?',
+            [*updates.values(), hazard_id],
+        )
+        self.conn.executemany(
+            'INSERT INTO "HazardCandidateHandler" ("id", "hazardId", "userId", "userName", "stepIndex", "stepId", '
+            '"hasOperated", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)',
+            [(_new_id(), hazard_id, u["id"], u["name"], next_index, step_id, now, now) for u in candidates],
+        )
+        self.conn.executemany(
+            'INSERT INTO "HazardCC" ("id", "hazardId", "userId", "userName", "createdAt") VALUES (?, ?, ?, ?, ?)',
+            [(_new_id(), hazard_id, u, n or None, now) for u, n in zip(cc_ids, cc_names)],
+        )
+        self._notify([u["id"] for u in handlers], "hazard_assigned", "隐患待处理", f"您有新的隐患待处理: {step.name}", hazard_id)
+        self._notify(cc_ids, "hazard_cc", "隐患抄送", f"隐患已流转至【{step.name}】", hazard_id)
+        self._sync_visibility(hazard_id)
+
+    def _check_executor(self, user, old: Dict[str, Any], step_index: int):
+        """与 PATCH 路由的权限检查一致：优先按步骤记录的处理人/候选人，没有步骤记录时回退到当前执行人/责任人"""
+        if user["role"] in ADMIN_ROLES:
+            return
+        step = self.conn.execute(
+            'SELECT "handlerUserIds" FROM "HazardWorkflowStep" WHERE "hazardId" = ? AND "stepIndex" = ?',
+            (old["id"], step_index),
+        ).fetchone()
+        candidates = self.conn.execute(
+            'SELECT "userId", "hasOperated" FROM "HazardCandidateHandler" WHERE "hazardId" = ? AND "stepIndex" = ?',
+            (old["id"], step_index),
+        ).fetchall()
+        if step is not None:
+            mode = old["approvalMode"]
+            if candidates and mode:
+                mine = next((c for c in candidates if c[0] == user["id"]), None)
+                if mine is None:
+                    allowed = False
+                elif mode == "OR":
+                    allowed = not mine[1] and not any(c[1] for c in candidates)
+                elif mode == "AND":
+                    allowed = not mine[1]
+                else:
+                    allowed = True
+            else:
+                handler_ids = _json_list(step[0])
+                allowed = user["id"] in handler_ids if handler_ids else old["dopersonal_ID"] == user["id"]
+        else:
+            allowed = (
+                user["role"] == "admin"
+                or old["dopersonal_ID"] == user["id"]
+                or any(c[0] == user["id"] for c in candidates)
+                or old["responsibleId"] == user["id"]
+            )
+        if not allowed:
+            raise ApiError("权限不足：您没有权限执行此操作")
+
+    def update_hazard(self, user, body):
+        hazard_id = body.get("id")
+        action = body.get("actionName")
+        updates = {k: v for k, v in body.items() if k not in PATCH_IGNORED}
+        for legacy, current in (("dopersonal_ID", "currentExecutorId"), ("dopersonal_Name", "currentExecutorName")):
+            if legacy in updates:
+                value = None if updates[legacy] is None else str(updates[legacy])
+                updates[legacy] = updates[current] = value
+        for legacy, current in (("ccDepts", "ccDeptIds"), ("ccUsers", "ccUserIds"), ("old_personal_ID", "historicalHandlerIds")):
+            if legacy in updates:
+                updates[current] = updates[legacy]
+        if "rectifyPhotos" in updates or "rectificationPhotos" in updates:
+            photos = updates.pop("rectificationPhotos", updates.get("rectifyPhotos"))
+            updates["rectifyPhotos"] = updates["rectificationPhotos"] = photos
+        if "rectificationNotes" in updates:
+            updates["rectifyDesc"] = updates["rectificationNotes"]
+        if "verifyDesc" in updates:
+            updates["verificationNotes"] = updates["verifyDesc"]
+        if "verifyPhotos" in updates:
+            updates["verificationPhotos"] = updates["verifyPhotos"]
+        cc_input = body.get("ccUsers")
+
+        with self._transaction() as conn:
+            old = self._hazard_row(hazard_id) if hazard_id else None
+            if old is None:
+                raise ApiError("隐患记录不存在")
+            old_index = old["currentStepIndex"] or 0
+            if action in GUARDED_ACTIONS:
+                self._check_executor(user, old, old_index)
+            if "currentStepIndex" in updates and updates["currentStepIndex"] < old_index and action != "驳回":
+                raise ApiError(
+                    f"并发冲突：当前步骤索引已变更为 {old_index}，无法回退到 {updates['currentStepIndex']}。请刷新页面后重试。"
+                )
+
+            now = _now_ms()
+            changed = [k for k in ("status", "currentStepId", "dopersonal_Name") if k in updates and updates[k] != old[k]]
+            log = {
+                "operatorId": body.get("operatorId") or "system",
+                "operatorName": body.get("operatorName") or "系统",
+                "action": action or "更新记录",
+                "time": _iso(now),
+                "changes": "；".join(f"{k}: {old[k]} → {updates[k]}" for k in changed) or "无关键字段变更",
+            }
+            if isinstance(cc_input, list) and cc_input:
+                log["ccUsers"] = cc_input
+                log["ccUserNames"] = body.get("ccUserNames") or []
+            updates["logs"] = [log] + _json_list(old["logs"])
+            row = {k: self._column_value(k, v) for k, v in updates.items()}
+            row["updatedAt"] = now
+            conn.execute(
+                f'UPDATE "HazardRecord" SET {", ".join(f"{chr(34)}{k}{chr(34)} = ?" for k in row)} WHERE "id" = ?',
+                [*row.values(), hazard_id],
+            )
+
+            step_index = updates.get("currentStepIndex", old_index)
+            dispatch = body.get("dispatchResult") or {}
+            if isinstance(dispatch.get("candidateHandlers"), list):
+                conn.execute(
+                    'DELETE FROM "HazardCandidateHandler" WHERE "hazardId" = ? AND "stepIndex" = ?', (hazard_id, step_index)
+                )
+                conn.executemany(
+                    'INSERT INTO "HazardCandidateHandler" ("id", "hazardId", "userId", "userName", "stepIndex", '
+                    '"stepId", "hasOperated", "createdAt", "updatedAt") VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)',
+                    [
+                        (_new_id(), hazard_id, c["userId"], c["userName"], step_index,
+                         updates.get("currentStepId", old["currentStepId"]), now, now)
+                        for c in dispatch["candidateHandlers"]
+                    ],
+                )
+            operator_id = body.get("operatorId")
+            mode = updates.get("approvalMode", old["approvalMode"])
+            if operator_id and mode in ("OR", "AND") and action and (
+                action in OPERATED_ACTIONS or "审批" in action or "通过" in action
+            ):
+                conn.execute(
+                    'UPDATE "HazardCandidateHandler" SET "hasOperated" = 1, "operatedAt" = ?, "opinion" = ?, '
+                    '"updatedAt" = ? WHERE "hazardId" = ? AND "userId" = ? AND "stepIndex" = ?',
+                    (now, body.get("rejectReason") if "驳回" in action else None, now, hazard_id, operator_id, step_index),
+                )
+            if isinstance(cc_input, list) and cc_input:
+                conn.execute('DELETE FROM "HazardCC" WHERE "hazardId" = ?', (hazard_id,))
+                directory = self._directory_snapshot()
+                conn.executemany(
+                    'INSERT INTO "HazardCC" ("id", "hazardId", "userId", "userName", "createdAt") VALUES (?, ?, ?, ?, ?)',
+                    [(_new_id(), hazard_id, u, (directory.user(u) or {}).get("name"), now) for u in cc_input],
+                )
+            notifications = body.get("notifications")
+            if isinstance(notifications, list) and notifications:
+                invalid = next((n for n in notifications if not all(n.get(k) for k in ("userId", "type", "title", "content"))), None)
+                if invalid is not None:
+                    raise ApiError(f"通知数据缺少必要字段: {json.dumps(invalid, ensure_ascii=False)}")
+                for n in notifications:
+                    self._notify([n["userId"]], n["type"], n["title"], n["content"], n.get("relatedId") or hazard_id)
+            if any(k in updates for k in (
+                "responsibleId", "verifierId", "dopersonal_ID", "currentExecutorId", "status", "historicalHandlerIds",
+                "old_personal_ID", "ccUsers", "candidateHandlers",
+            )):
+                self._sync_visibility(hazard_id)
+        return self._render(self._hazard_row(hazard_id))
+
+    def void_hazard(self, user, body):
+        hazard_id, reason = body.get("hazardId"), body.get("reason")
+        if not hazard_id or not reason:
+            raise ApiError("缺少必要参数：hazardId 和 reason", 400)
+        with self._transaction() as conn:
+            old = self._hazard_row(hazard_id)
+            if old is None:
+                raise ApiError("隐患记录不存在", 404)
+            if old["isVoided"]:
+                raise ApiError("该隐患已被作废，无需重复操作", 400)
+            now = _now_ms()
+            voided_by = json.dumps({"id": user["id"], "name": user["name"], "role": user["role"], "timestamp": _iso(now)},
+                                   ensure_ascii=False)
+            log = {
+                "operatorId": user["id"],
+                "operatorName": user["name"],
+                "action": "作废隐患",
+                "time": _iso(now),
+                "changes": f"作废原因：{reason}；原编号：{old['code']}",
+            }
+            conn.execute(
+                'UPDATE "HazardRecord" SET "isVoided" = 1, "voidReason" = ?, "voidedAt" = ?, "voidedBy" = ?, '
+                '"code" = NULL, "logs" = ?, "updatedAt" = ? WHERE "id" = ?',
+                (reason, now, voided_by, json.dumps([log] + _json_list(old["logs"]), ensure_ascii=False), now, hazard_id),
+            )
+            if old["code"]:
+                self._release_code(old["code"], user["id"])
+        return {
+            "success": True,
+            "message": "隐患已作废，编号已释放可重用",
+            "data": {
+                "id": hazard_id,
+                "originalCode": old["code"],
+                "code": None,
+                "isVoided": True,
+                "voidReason": reason,
+                "voidedAt": _iso(now),
+            },
+        }
+
+
+# ---------------------------------------------------------------------------
+# HTTP 服务
+# ---------------------------------------------------------------------------
+
+def make_handler(api: HazardApiStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _serve(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            try:
+                body = json.loads(raw) if raw else None
+            except ValueError:
+                status, payload = 500, {"error": "请求体JSON格式错误", "details": "请求体JSON格式错误"}
+            else:
+                status, payload = api.handle(self.command, self.path, self.headers.get("x-user-id"), body)
+            data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_POST = do_PATCH = _serve
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve(db_file: Path, workflow_file: Path, host: str = "127.0.0.1", port: int = 0):
+    """在后台线程启动替身服务，yield base URL；退出时关闭服务与数据库连接"""
+    api = HazardApiStub(db_file, workflow_file)
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="hazard-api-stub", daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+        api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统隐患接口本地替身（生命周期测试/压测用）")
+    parser.add_argument("--port", type=int, default=3000, help="监听端口 (默认: 3000)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--db", type=str, help="数据库文件 (默认: DATABASE_URL 或 .env)")
+    parser.add_argument(
+        "--workflow", type=str, default="data/hazard-workflow.json",
+        help="工作流配置文件，相对路径以当前目录为准，与应用的 process.cwd() 一致 (默认: data/hazard-workflow.json)"
+    )
+    args = parser.parse_args()
+
+    db_file = Path(args.db) if args.db else None
+    if db_file is None:
+        db_url = load_database_url(Path.cwd())
+        db_file = sqlite_path(db_url, Path.cwd()) if db_url else None
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 或 DATABASE_URL 指定")
+        sys.exit(1)
+
+    api = HazardApiStub(db_file, Path(args.workflow))
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f"🧪 隐患接口替身: http://{args.host}:{args.port}（数据库 {db_file}）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        api.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+EHS 系统隐患编号池管理
+上报隐患时 hazardCodePool.service 先按 (datePrefix, status) 查当天可用编号，查不到才扫描当天全部 HazardRecord
+生成新序号；编号回收靠几个逐行处理的 TS 脚本。这里集中维护编号池：
+- fill:    在一个事务里为今天起 N 天各预生成到指定深度的可用编号（按最小的空闲序号），
+           expiresAt 为空，上报时 acquireCode 的第一条查询（永久有效编号）一次索引读取即可命中
+- recycle: 按集合分批处理，每批一个短事务：
+           纠正仍标记可用、实际已被隐患占用的编号（编号冲突回滚时会误释放）；
+           当天及以后的可用编号去掉 expiresAt（只在当天有效，30 天过期没有意义，也让它们参与第一条查询）；
+           创建失败又没回滚的"已使用"编号，当天及以后的重新置为可用，过去的删除；
+           删除过去日期与已过期的可用编号、超过保留期的已使用记录
+- stats:   按日期输出编号池深度
+
+编号格式 Hazard{YYYYMMDD}{序号:03d}，日期前缀按服务器本地时间（与 getDatePrefix 一致），每天最多 999 个。
+acquire_code / release_code 与服务的逻辑相同，供 hazard_api_stub 等 Python 工具复用
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+CODE_PREFIX = "Hazard"
+CODE_PATTERN = re.compile(r"^Hazard(\d{8})(\d{3})$")
+MAX_DAILY_CODES = 999
+CODE_EXPIRY_DAYS = 30  # releaseCode 的默认过期天数
+USED_RETENTION_DAYS = 90  # 与 clean-used-hazard-codes.ts 一致
+STALE_USED_GRACE_MS = 10 * 60 * 1000  # 取号后还没写入隐患的正常窗口
+PREFILL_OPERATOR = "system:prefill"  # 预生成编号的 releasedBy
+DEFAULT_DAYS = 7
+DEFAULT_DEPTH = 50
+DEFAULT_BATCH = 500
+DAY_MS = 86_400_000
+
+
+class CodePoolExhausted(RuntimeError):
+    """当天 999 个编号已全部占用"""
+
+
+def date_prefix(day: Optional[date] = None) -> str:
+    return (day or datetime.now().date()).strftime("%Y%m%d")
+
+
+def parse_code(code: Optional[str]) -> Optional[tuple[str, int]]:
+    """Hazard20250202001 -> ("20250202", 1)"""
+    match = CODE_PATTERN.match(code or "")
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _new_id_sql() -> str:
+    return "'c' || lower(hex(randomblob(12)))"
+
+
+# ---------------------------------------------------------------------------
+# 取号与释放（调用方负责事务）
+# ---------------------------------------------------------------------------
+
+def acquire_code(conn: sqlite3.Connection, operator_id: str, now_ms: Optional[int] = None,
+                 today: Optional[date] = None) -> str:
+    """
+    与 HazardCodePoolService.acquireCode 相同的顺序：永久有效的可用编号 → 未过期的可用编号 → 当天第一个未使用的序号。
+    编号池预生成后第一条查询即可命中
+    """
+    now_ms = now_ms if now_ms is not None else _now_ms()
+    prefix_date = date_prefix(today)
+    pooled = conn.execute(
+        'SELECT "id", "code" FROM "HazardCodePool" WHERE "datePrefix" = ? AND "status" = \'available\' '
+        'AND "expiresAt" IS NULL ORDER BY "sequence" LIMIT 1',
+        (prefix_date,),
+    ).fetchone() or conn.execute(
+        'SELECT "id", "code" FROM "HazardCodePool" WHERE "datePrefix" = ? AND "status" = \'available\' '
+        'AND "expiresAt" > ? ORDER BY "sequence" LIMIT 1',
+        (prefix_date, now_ms),
+    ).fetchone()
+    if pooled:
+        conn.execute(
+            'UPDATE "HazardCodePool" SET "status" = \'used\', "usedAt" = ?, "usedBy" = ?, "updatedAt" = ? '
+            'WHERE "id" = ?',
+            (now_ms, operator_id, now_ms, pooled[0]),
+        )
+        return pooled[1]
+    prefix = f"{CODE_PREFIX}{prefix_date}"
+    used = {
+        int(code[-3:]) for (code,) in conn.execute(
+            'SELECT "code" FROM "HazardRecord" WHERE "code" >= ? AND "code" < ?', (prefix, prefix + "~")
+        ) if code[-3:].isdigit()
+    }
+    sequence = next((n for n in range(1, MAX_DAILY_CODES + 1) if n not in used), None)
+    if sequence is None:
+        raise CodePoolExhausted(
+            f"当天隐患编号已用尽（最大{MAX_DAILY_CODES}条），日期: {prefix_date}。请联系管理员检查是否有异常数据。"
+        )
+    return f"{prefix}{sequence:03d}"
+
+
+def release_code(conn: sqlite3.Connection, code: str, operator_id: str, expiry_days: int = CODE_EXPIRY_DAYS,
+                 now_ms: Optional[int] = None) -> bool:
+    """把编号放回编号池（作废或创建失败时），格式不对时返回 False"""
+    parsed = parse_code(code)
+    if parsed is None:
+        return False
+    now_ms = now_ms if now_ms is not None else _now_ms()
+    conn.execute(
+        f'INSERT INTO "HazardCodePool" ("id", "code", "datePrefix", "sequence", "status", "releasedBy", '
+        f'"releasedAt", "expiresAt", "createdAt", "updatedAt") VALUES ({_new_id_sql()}, ?, ?, ?, \'available\', ?, '
+        '?, ?, ?, ?) '
+        'ON CONFLICT("code") DO UPDATE SET "status" = \'available\', "releasedBy" = excluded."releasedBy", '
+        '"releasedAt" = excluded."releasedAt", "expiresAt" = excluded."expiresAt", "usedAt" = NULL, '
+        '"usedBy" = NULL, "updatedAt" = excluded."updatedAt"',
+        (code, *parsed, operator_id, now_ms, now_ms + expiry_days * DAY_MS, now_ms, now_ms),
+    )
+    return True
+
+
+# ---------------------------------------------------------------------------
+# 预生成
+# ---------------------------------------------------------------------------
+
+FILL_SQL = f"""
+INSERT INTO "HazardCodePool" ("id", "code", "datePrefix", "sequence", "status", "releasedBy", "releasedAt",
+                              "expiresAt", "createdAt", "updatedAt")
+WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < {MAX_DAILY_CODES})
+SELECT {_new_id_sql()}, :prefix || printf('%03d', n), :day, n, 'available', :operator, :now, NULL, :now, :now
+FROM seq
+WHERE NOT EXISTS (SELECT 1 FROM "HazardRecord" h WHERE h."code" = :prefix || printf('%03d', n))
+  AND NOT EXISTS (SELECT 1 FROM "HazardCodePool" p WHERE p."code" = :prefix || printf('%03d', n))
+ORDER BY n
+LIMIT max(0, :depth - (SELECT COUNT(*) FROM "HazardCodePool"
+                       WHERE "datePrefix" = :day AND "status" = 'available' AND "expiresAt" IS NULL))
+"""
+
+
+@traced("code_pool.fill")
+def fill(db_file: Path, days: int = DEFAULT_DAYS, depth: int = DEFAULT_DEPTH, today: Optional[date] = None,
+         now_ms: Optional[int] = None) -> dict:
+    """在一个 BEGIN IMMEDIATE 事务里把今天起 days 天的永久可用编号补到 depth 个，返回每天新增数"""
+    today = today or datetime.now().date()
+    now_ms = now_ms if now_ms is not None else _now_ms()
+    depth = max(0, min(depth, MAX_DAILY_CODES))
+    report: dict = {"db": str(db_file), "depth": depth, "added": {}}
+    started = time.perf_counter()
+    with closing(connect(db_file)) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for offset in range(days):
+                day = date_prefix(today + timedelta(days=offset))
+                cursor = conn.execute(FILL_SQL, {
+                    "prefix": f"{CODE_PREFIX}{day}", "day": day, "operator": PREFILL_OPERATOR,
+                    "now": now_ms, "depth": depth,
+                })
+                report["added"][day] = cursor.rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        report["depth_by_day"] = pool_depth(conn, today)
+    report["duration"] = time.perf_counter() - started
+    annotate(codes=sum(report["added"].values()))
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 回收
+# ---------------------------------------------------------------------------
+
+def _batched(conn: sqlite3.Connection, statement: str, selector: str, params: dict, batch: int) -> int:
+    """statement 作用于 selector 选出的前 batch 行（rowid），循环到没有匹配行为止，每批一个短事务"""
+    total = 0
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(
+                f'{statement} WHERE rowid IN (SELECT rowid FROM "HazardCodePool" p WHERE {selector} LIMIT :batch)',
+                {**params, "batch": batch},
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        total += cursor.rowcount
+        if cursor.rowcount < batch:
+            return total
+
+
+RECYCLE_STEPS = [
+    (
+        "occupied",
+        "仍可用但已被隐患占用",
+        'UPDATE "HazardCodePool" SET "status" = \'used\', "usedAt" = :now, "updatedAt" = :now',
+        "p.\"status\" = 'available' AND EXISTS (SELECT 1 FROM \"HazardRecord\" h WHERE h.\"code\" = p.\"code\")",
+    ),
+    (
+        "made_permanent",
+        "当天及以后的可用编号去掉过期时间",
+        'UPDATE "HazardCodePool" SET "expiresAt" = NULL, "updatedAt" = :now',
+        "p.\"status\" = 'available' AND p.\"datePrefix\" >= :today AND p.\"expiresAt\" IS NOT NULL",
+    ),
+    (
+        "reclaimed",
+        "已使用但没有对应隐患，重新置为可用",
+        'UPDATE "HazardCodePool" SET "status" = \'available\', "usedAt" = NULL, "usedBy" = NULL, '
+        '"expiresAt" = NULL, "updatedAt" = :now',
+        "p.\"status\" = 'used' AND p.\"datePrefix\" >= :today AND p.\"usedAt\" < :grace "
+        'AND NOT EXISTS (SELECT 1 FROM "HazardRecord" h WHERE h."code" = p."code")',
+    ),
+    (
+        "expired",
+        "删除过去日期或已过期的可用编号",
+        'DELETE FROM "HazardCodePool"',
+        "p.\"status\" = 'available' AND (p.\"datePrefix\" < :today OR p.\"expiresAt\" < :now)",
+    ),
+    (
+        "purged_used",
+        "删除超过保留期或没有对应隐患的已使用记录",
+        'DELETE FROM "HazardCodePool"',
+        "p.\"status\" = 'used' AND (p.\"usedAt\" < :retention OR (p.\"datePrefix\" < :today AND p.\"usedAt\" < :grace "
+        'AND NOT EXISTS (SELECT 1 FROM "HazardRecord" h WHERE h."code" = p."code")))',
+    ),
+]
+
+
+@traced("code_pool.recycle")
+def recycle(db_file: Path, batch: int = DEFAULT_BATCH, used_retention_days: int = USED_RETENTION_DAYS,
+            today: Optional[date] = None, now_ms: Optional[int] = None) -> dict:
+    """按 RECYCLE_STEPS 的顺序分批处理，返回每一步影响的行数"""
+    today = today or datetime.now().date()
+    now_ms = now_ms if now_ms is not None else _now_ms()
+    params = {
+        "now": now_ms,
+        "today": date_prefix(today),
+        "grace": now_ms - STALE_USED_GRACE_MS,
+        "retention": now_ms - used_retention_days * DAY_MS,
+    }
+    report: dict = {"db": str(db_file), "steps": {}}
+    started = time.perf_counter()
+    with closing(connect(db_file)) as conn:
+        for name, _, statement, selector in RECYCLE_STEPS:
+            report["steps"][name] = _batched(conn, statement, selector, params, batch)
+        report["depth_by_day"] = pool_depth(conn, today)
+    report["duration"] = time.perf_counter() - started
+    annotate(rows=sum(report["steps"].values()))
+    return report
+
+
+# ---------------------------------------------------------------------------
+# 统计
+# ---------------------------------------------------------------------------
+
+def pool_depth(conn: sqlite3.Connection, today: Optional[date] = None, past_days: int = 0) -> dict[str, dict]:
+    """按日期统计编号池（只看 today - past_days 之后）：可用（其中预生成）、已使用"""
+    since = date_prefix((today or datetime.now().date()) - timedelta(days=past_days))
+    depth: dict[str, dict] = {}
+    rows = conn.execute(
+        'SELECT "datePrefix", "status", "releasedBy" = ? AS prefilled, COUNT(*) FROM "HazardCodePool" '
+        'WHERE "datePrefix" >= ? GROUP BY 1, 2, 3 ORDER BY 1',
+        (PREFILL_OPERATOR, since),
+    )
+    for day, status, prefilled, count in rows:
+        entry = depth.setdefault(day, {"available": 0, "prefilled": 0, "used": 0})
+        if status == "available":
+            entry["available"] += count
+            if prefilled:
+                entry["prefilled"] += count
+        elif status == "used":
+            entry["used"] += count
+    return depth
+
+
+def print_depth(depth_by_day: dict[str, dict], low_water: int):
+    if not depth_by_day:
+        print("   （编号池为空，上报隐患时会扫描当天的 HazardRecord 生成编号）")
+        return
+    print(f"   {'日期':<12}{'可用':>6}{'预生成':>8}{'已使用':>8}")
+    for day, entry in depth_by_day.items():
+        warn = "  ⚠️  深度不足" if entry["available"] < low_water else ""
+        print(f"   {day:<12}{entry['available']:>8}{entry['prefilled']:>10}{entry['used']:>10}{warn}")
+
+
+def _database(args: argparse.Namespace) -> Optional[Path]:
+    db_file = find_database(args.db)
+    if db_file is None or not db_file.exists():
+        print("❌ 未找到 SQLite 数据库，请通过 --db 指定")
+        return None
+    return db_file
+
+
+def run_fill(args: argparse.Namespace) -> int:
+    db_file = _database(args)
+    if db_file is None:
+        return 1
+    report = fill(db_file, days=args.days, depth=args.depth)
+    print(f"\n🔢 隐患编号预生成: {report['db']}（每天补到 {report['depth']} 个）")
+    print(f"   新增 {sum(report['added'].values())} 个编号，耗时 {report['duration'] * 1000:.1f}ms")
+    print_depth(report["depth_by_day"], report["depth"])
+    return 0
+
+
+def run_recycle(args: argparse.Namespace) -> int:
+    db_file = _database(args)
+    if db_file is None:
+        return 1
+    report = recycle(db_file, batch=args.batch, used_retention_days=args.retention_days)
+    print(f"\n♻️  隐患编号回收: {report['db']}")
+    for name, label, _, _ in RECYCLE_STEPS:
+        print(f"   {label}: {report['steps'][name]}")
+    print(f"   耗时 {report['duration'] * 1000:.1f}ms")
+    print_depth(report["depth_by_day"], 1)
+    return 0
+
+
+def run_stats(args: argparse.Namespace) -> int:
+    db_file = _database(args)
+    if db_file is None:
+        return 1
+    with closing(connect(db_file)) as conn:
+        depth = pool_depth(conn, past_days=args.past_days)
+    print(f"\n📊 隐患编号池深度: {db_file}")
+    print_depth(depth, args.low_water)
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db code-pool 子命令"""
+    parser = subparsers.add_parser("code-pool", help="隐患编号池：批量预生成、分批回收与深度统计")
+    commands = parser.add_subparsers(dest="code_pool_command", help="命令")
+
+    fill_parser = commands.add_parser("fill", help="在一个事务里为今天起 N 天预生成可用编号")
+    fill_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    fill_parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help=f"预生成的天数 (默认: {DEFAULT_DAYS})")
+    fill_parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help=f"每天的可用编号数 (默认: {DEFAULT_DEPTH})")
+    fill_parser.set_defaults(func=run_fill)
+
+    recycle_parser = commands.add_parser("recycle", help="分批纠正、回收并清理过期编号")
+    recycle_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    recycle_parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help=f"每个事务处理的行数 (默认: {DEFAULT_BATCH})")
+    recycle_parser.add_argument(
+        "--retention-days",
+        type=int,
+        default=USED_RETENTION_DAYS,
+        help=f"已使用记录的保留天数 (默认: {USED_RETENTION_DAYS})"
+    )
+    recycle_parser.set_defaults(func=run_recycle)
+
+    stats_parser = commands.add_parser("stats", help="按日期输出编号池深度")
+    stats_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    stats_parser.add_argument("--past-days", type=int, default=0, help="同时显示过去多少天 (默认: 0)")
+    stats_parser.add_argument("--low-water", type=int, default=10, help="可用编号低于此数时提示 (默认: 10)")
+    stats_parser.set_defaults(func=run_stats)
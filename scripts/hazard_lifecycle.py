@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+隐患生命周期共用定义
+test_hazard_lifecycle.py（功能测试）与 load_hazard_lifecycle.py（压测）共用：
+测试用户、测试工作流配置、后端状态推导，以及每一步流转的请求体
+流程: A 提报 -> C 确认 -> D 审批 -> B 整改 -> E 验收
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shlex
+import socket
+import sqlite3
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import hazard_workflow
+
+
+# ------------------------------
+# 测试用户定义
+# ------------------------------
+
+USER_A = {
+    "id": "test-user-a",
+    "username": "test_user_a",
+    "name": "User A",
+    "role": "user",
+    # 上报权限必须存在，否则 /api/hazards POST 会被拒绝
+    "permissions": {"hidden_danger": ["report"]},
+}
+
+USER_B = {
+    "id": "test-user-b",
+    "username": "test_user_b",
+    "name": "User B",
+    "role": "user",
+    "permissions": {},
+}
+
+USER_C = {
+    "id": "test-user-c",
+    "username": "test_user_c",
+    "name": "User C",
+    "role": "user",
+    "permissions": {},
+}
+
+USER_D = {
+    "id": "test-user-d",
+    "username": "test_user_d",
+    "name": "User D",
+    "role": "user",
+    "permissions": {},
+}
+
+USER_E = {
+    "id": "test-user-e",
+    "username": "test_user_e",
+    "name": "User E",
+    "role": "user",
+    "permissions": {},
+}
+
+ADMIN = {
+    "id": "test-admin",
+    "username": "test_admin",
+    "name": "Test Admin",
+    "role": "admin",
+    "permissions": {},
+}
+
+TEST_USERS = [USER_A, USER_B, USER_C, USER_D, USER_E, ADMIN]
+
+
+# ------------------------------
+# 数据库/工作流配置
+# ------------------------------
+
+def load_database_url(repo_root: Path) -> Optional[str]:
+    """优先读取环境变量，其次读取 .env 文件。"""
+    if os.getenv("DATABASE_URL"):
+        return os.getenv("DATABASE_URL")
+
+    env_path = repo_root / ".env"
+    if not env_path.exists():
+        return None
+
+    for line in env_path.read_text(encoding="utf-8").splitlines():
+        if line.startswith("DATABASE_URL="):
+            return line.split("=", 1)[1].strip().strip("\"")
+
+    return None
+
+
+def sqlite_path(db_url: str, repo_root: Path) -> Optional[Path]:
+    """仅支持 SQLite（file:/sqlite:），其他数据库返回 None。"""
+    if db_url.startswith("file:"):
+        relative = db_url.replace("file:", "", 1)
+        return (repo_root / relative).resolve()
+
+    if db_url.startswith("sqlite:"):
+        # 可能是 sqlite:./dev.db 或 sqlite:///abs/path
+        cleaned = db_url.replace("sqlite:", "", 1)
+        cleaned = cleaned.lstrip("/") if cleaned.startswith("///") else cleaned
+        return (repo_root / cleaned).resolve()
+
+    return None
+
+
+@contextmanager
+def sqlite_conn(db_path: Path):
+    """打开 SQLite 连接并确保外键约束。"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA foreign_keys = ON;")
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def ensure_users(conn: sqlite3.Connection, users: Iterable[Dict[str, Any]]) -> None:
+    """写入测试用户，若已存在则更新角色/权限（单条 executemany upsert，不逐个查询）。"""
+    conn.executemany(
+        """
+        INSERT INTO User (id, username, name, password, role, permissions, isActive, createdAt, updatedAt)
+        VALUES (?, ?, ?, 'test-password', ?, ?, 1, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name, role = excluded.role, permissions = excluded.permissions, isActive = 1
+        """,
+        [
+            (
+                user["id"],
+                user["username"],
+                user["name"],
+                user["role"],
+                json.dumps(user.get("permissions") or {}, ensure_ascii=False),
+            )
+            for user in users
+        ],
+    )
+
+
+def _fixed_step(step_id: str, name: str, description: str, handler: str, user: Optional[Dict[str, Any]]):
+    return {
+        "id": step_id,
+        "name": name,
+        "description": description,
+        "handlerStrategy": {
+            "type": "fixed",
+            "description": handler,
+            "fixedUsers": [{"userId": user["id"], "userName": user["name"]}] if user else [],
+        },
+        "ccRules": [],
+    }
+
+
+def build_workflow_config() -> Dict[str, Any]:
+    """构造测试专用工作流：Report -> Confirm -> Approve -> Rectify -> Verify。"""
+    return {
+        "version": 1,
+        "updatedAt": "2026-01-01T00:00:00Z",
+        "updatedBy": "pytest",
+        "steps": [
+            _fixed_step("report", "上报", "隐患上报", "执行人：上报人（系统自动）", None),
+            _fixed_step("confirm", "确认", "确认隐患信息", "执行人：确认人", USER_C),
+            _fixed_step("approve", "审批", "审批隐患", "执行人：审批人", USER_D),
+            _fixed_step("rectify", "整改", "整改责任人提交整改结果", "执行人：整改责任人（系统自动）", None),
+            _fixed_step("verify", "验收", "验收整改结果", "执行人：验收人", USER_E),
+        ],
+    }
+
+
+@contextmanager
+def temporary_workflow_config(repo_root: Path, config: Dict[str, Any]):
+    """写入测试工作流，结束后恢复原配置。"""
+    workflow_file = repo_root / "data" / "hazard-workflow.json"
+    workflow_file.parent.mkdir(parents=True, exist_ok=True)
+
+    original_content = workflow_file.read_text(encoding="utf-8") if workflow_file.exists() else None
+
+    try:
+        workflow_file.write_text(
+            json.dumps(config, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+        yield workflow_file
+    finally:
+        if original_content is None:
+            if workflow_file.exists():
+                workflow_file.unlink()
+        else:
+            workflow_file.write_text(original_content, encoding="utf-8")
+
+
+APP_START_TIMEOUT = 120
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def app_command(repo_root: Path, port: int) -> Optional[list]:
+    """应用启动命令：EHS_APP_CMD 可覆盖（支持 {port}/{root} 占位），默认 next start（需先 npm run build）"""
+    custom = os.getenv("EHS_APP_CMD")
+    if custom:
+        return shlex.split(custom.format(port=port, root=repo_root))
+    next_bin = repo_root / "node_modules" / ".bin" / "next"
+    if not next_bin.exists() or not (repo_root / ".next").exists():
+        return None
+    return [str(next_bin), "start", str(repo_root), "-p", str(port)]
+
+
+@contextmanager
+def isolated_app(
+    repo_root: Path, work_dir: Path, db_file: Path, config: Dict[str, Any], timeout: float = APP_START_TIMEOUT
+):
+    """
+    以 work_dir 为工作目录启动独立的应用实例，yield 其 base URL；无法启动（未构建）时 yield None
+    - DATABASE_URL 指向 db_file（通常是从黄金库克隆的副本）
+    - 应用按 process.cwd() 读取 data/hazard-workflow.json，测试工作流写在 work_dir 下，不改仓库里的配置
+    """
+    port = _free_port()
+    command = app_command(repo_root, port)
+    if command is None:
+        yield None
+        return
+
+    workflow_file = work_dir / "data" / "hazard-workflow.json"
+    workflow_file.parent.mkdir(parents=True, exist_ok=True)
+    workflow_file.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+    env = dict(os.environ, DATABASE_URL=f"file:{db_file.resolve()}", PORT=str(port))
+    log_file = work_dir / "app.log"
+    with open(log_file, "wb") as log:
+        process = subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"应用实例启动失败（退出码 {process.returncode}），日志: {log_file}")
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError(f"应用实例 {timeout:.0f}s 内未监听端口 {port}，日志: {log_file}")
+                    time.sleep(0.2)
+            yield f"http://127.0.0.1:{port}"
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+
+# ------------------------------
+# 业务状态/请求体
+# ------------------------------
+
+def status_for_step(step_id: str, step_index: int, steps: Iterable[Dict[str, Any]]) -> str:
+    """复刻后端 getStatusByStepId 逻辑，保证状态断言一致（状态表由 hazard_workflow 按步骤 ID 序列缓存）。"""
+    return hazard_workflow.status_for_step(step_id, step_index, tuple(step["id"] for step in steps))
+
+
+def create_payload(desc: str = "pytest 集成测试 - 隐患生命周期") -> Dict[str, Any]:
+    """A 提报隐患，并指定整改责任人 B"""
+    return {
+        "type": "安全隐患",
+        "location": "测试地点",
+        "desc": desc,
+        "riskLevel": "low",
+        "reporterId": USER_A["id"],
+        "reporterName": USER_A["name"],
+        "responsibleId": USER_B["id"],
+        "responsibleName": USER_B["name"],
+        "rectificationLeaderId": USER_B["id"],
+        "rectificationLeaderName": USER_B["name"],
+    }
+
+
+def advance_payload(
+    hazard: Dict[str, Any],
+    operator: Dict[str, Any],
+    next_step_id: str,
+    next_step_index: int,
+    steps: Iterable[Dict[str, Any]],
+    assignee: Optional[Dict[str, Any]],
+    action_name: str,
+    extra_updates: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """推进到指定步骤的 PATCH /api/hazards 请求体：更新 status/currentStep/currentAssignee"""
+    payload = {
+        "id": hazard["id"],
+        "operatorId": operator["id"],
+        "operatorName": operator["name"],
+        "actionName": action_name,
+        "status": status_for_step(next_step_id, next_step_index, steps),
+        "currentStepIndex": next_step_index,
+        "currentStepId": next_step_id,
+        "dopersonal_ID": assignee["id"] if assignee else None,
+        "dopersonal_Name": assignee["name"] if assignee else None,
+    }
+
+    if extra_updates:
+        payload.update(extra_updates)
+    return payload
+
+
+def close_payload(hazard: Dict[str, Any]) -> Dict[str, Any]:
+    """E 验收通过，隐患闭环"""
+    return {
+        "id": hazard["id"],
+        "operatorId": USER_E["id"],
+        "operatorName": USER_E["name"],
+        "actionName": "验收通过",
+        "status": "closed",
+        "currentStepIndex": 4,
+        "currentStepId": "verify",
+        "dopersonal_ID": None,
+        "dopersonal_Name": None,
+        "verifyDesc": "验收通过，流程闭环",
+        "verifyPhotos": [],
+    }
+
+
+def void_payload(hazard: Dict[str, Any], reason: str = "pytest 集成测试清理") -> Dict[str, Any]:
+    return {"hazardId": hazard["id"], "reason": reason}
+
+
+# 提报之后的流转：(名称, 操作者, 下一步, 下一步索引, 下一步处理人, 动作, 附加字段, 期望状态)
+TRANSITIONS = [
+    ("confirm", USER_C, "approve", 2, USER_D, "确认", None, "assigned"),
+    ("approve", USER_D, "rectify", 3, USER_B, "审批通过", None, "rectifying"),
+    (
+        "rectify", USER_B, "verify", 4, USER_E, "提交整改",
+        {"rectifyDesc": "已完成整改并上传现场照片", "rectifyPhotos": []}, "verified",
+    ),
+]
+
+
+def state_mismatch(
+    hazard: Dict[str, Any], status: str, assignee: Optional[Dict[str, Any]], step_id: str, step_index: int
+) -> Optional[str]:
+    """与期望状态不符时返回描述，否则返回 None"""
+    expected = {
+        "status": status,
+        "currentStepId": step_id,
+        "currentStepIndex": step_index,
+        "currentExecutorId": assignee["id"] if assignee else None,
+    }
+    for key, value in expected.items():
+        if hazard.get(key) != value:
+            return f"{key}={hazard.get(key)!r}，期望 {value!r}"
+    return None
@@ -0,0 +1,706 @@
+#!/usr/bin/env python3
+"""
+隐患工作流编译模型与流转模拟器
+把 data/hazard-workflow.json 编译为预先计算好的"步骤 -> 状态 / 处理人解析 / 抄送解析"表（按文件 mtime 缓存），
+语义与后端一致：
+- 状态推导: hazardDispatchEngine.getStatusByStepId
+- 处理人策略: hidden-danger/_utils/handler-matcher.ts
+- 抄送规则: hidden-danger/_utils/cc-matcher.ts
+- 主管查找: utils/departmentUtils.ts（getUserSupervisor / getDepartmentManager / getDepartmentUsers）
+组织架构在内存中建索引（Directory）；LinearDirectory 按前端实现逐个扫描，用于对比解析开销
+- check: 离线校验配置，并用组织架构回放大量合成隐患的完整流转（含驳回）
+- bench: 测量处理人/抄送解析开销随步骤数、规则数的增长
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import itertools
+import json
+import random
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from db_preflight import connect, find_database
+from ops_trace import annotate, traced
+
+
+WORKFLOW_FILE = Path(__file__).resolve().parents[1] / "data" / "hazard-workflow.json"
+
+STANDARD_STATUSES = {"report": "reported", "assign": "assigned", "rectify": "rectifying", "verify": "verified"}
+STATUS_RANK = {"reported": 0, "assigned": 1, "rectifying": 2, "verified": 3, "closed": 4}
+HANDLER_STRATEGIES = {
+    "fixed", "reporter", "reporter_manager", "department_manager", "assigned_department_manager", "responsible",
+    "responsible_manager", "dept_manager", "role", "location_match", "type_match", "risk_match",
+}
+CC_RULE_TYPES = {
+    "fixed_users", "reporter_manager", "responsible_manager", "handler_manager", "dept_by_location",
+    "dept_by_type", "role_match", "responsible", "reporter",
+}
+APPROVAL_MODES = {"OR", "AND"}
+
+
+# ---------------------------------------------------------------------------
+# 状态推导
+# ---------------------------------------------------------------------------
+
+def _status_at(step_index: int, report: int, assign: int, rectify: int, verify: int) -> str:
+    """自定义步骤按与标准步骤的相对位置推导状态（索引为 -1 表示流程中没有该标准步骤）"""
+    if report >= 0 and step_index <= report:
+        return "reported"
+    if assign >= 0 and step_index <= assign:
+        return "assigned"
+    if rectify >= 0 and step_index < rectify:
+        return "assigned"
+    if rectify >= 0 and step_index <= rectify:
+        return "rectifying"
+    if verify >= 0 and step_index < verify:
+        return "rectifying"
+    if verify >= 0:
+        return "verified"
+    return "assigned"
+
+
+@functools.lru_cache(maxsize=256)
+def _reference_indices(step_ids: tuple) -> tuple:
+    return tuple(step_ids.index(s) if s in step_ids else -1 for s in ("report", "assign", "rectify", "verify"))
+
+
+@functools.lru_cache(maxsize=256)
+def step_statuses(step_ids: tuple) -> tuple:
+    """每个步骤索引对应的隐患状态，只依赖步骤 ID 序列"""
+    refs = _reference_indices(step_ids)
+    return tuple(STANDARD_STATUSES.get(step_id) or _status_at(i, *refs) for i, step_id in enumerate(step_ids))
+
+
+def status_for_step(step_id: str, step_index: int, step_ids: tuple) -> str:
+    """与后端 getStatusByStepId 一致；step_index 可以超出步骤范围（按相对位置兜底）"""
+    if step_id in STANDARD_STATUSES:
+        return STANDARD_STATUSES[step_id]
+    if 0 <= step_index < len(step_ids):
+        return step_statuses(step_ids)[step_index]
+    return _status_at(step_index, *_reference_indices(step_ids))
+
+
+# ---------------------------------------------------------------------------
+# 组织架构
+# ---------------------------------------------------------------------------
+
+class Directory:
+    """
+    用户/部门的内存索引，查找语义与 departmentUtils 一致
+    users: {id, name, departmentId, jobTitle}；职位匹配使用 jobTitle
+    departments: {id, name, parentId, managerId}
+    """
+
+    def __init__(self, users: List[Dict[str, Any]], departments: List[Dict[str, Any]]):
+        self.user_list = users
+        self.department_list = departments
+        self.users = {u["id"]: u for u in users}
+        self.departments = {d["id"]: d for d in departments}
+        self.children: Dict[str, List[str]] = {}
+        for dept in departments:
+            if dept.get("parentId"):
+                self.children.setdefault(dept["parentId"], []).append(dept["id"])
+        self.members: Dict[str, List[Dict[str, Any]]] = {}
+        for user in users:
+            if user.get("departmentId"):
+                self.members.setdefault(user["departmentId"], []).append(user)
+        self._supervisors: Dict[str, Optional[Dict[str, Any]]] = {}
+        self._subtree_users: Dict[str, List[Dict[str, Any]]] = {}
+
+    @classmethod
+    def from_sqlite(cls, conn: sqlite3.Connection) -> "Directory":
+        """与后端派发时加载的数据一致：在职用户 + 全部部门"""
+        users = [
+            {"id": r[0], "name": r[1], "departmentId": r[2], "jobTitle": r[3]}
+            for r in conn.execute('SELECT "id", "name", "departmentId", "jobTitle" FROM "User" WHERE "isActive" = 1')
+        ]
+        departments = [
+            {"id": r[0], "name": r[1], "parentId": r[2], "managerId": r[3]}
+            for r in conn.execute('SELECT "id", "name", "parentId", "managerId" FROM "Department"')
+        ]
+        return cls(users, departments)
+
+    def user(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.users.get(user_id) if user_id else None
+
+    def department(self, dept_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self.departments.get(dept_id) if dept_id else None
+
+    def department_manager(self, dept_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        dept = self.department(dept_id)
+        return self.user(dept.get("managerId")) if dept else None
+
+    def supervisor(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """用户是本部门负责人时返回上级部门负责人，否则返回本部门负责人"""
+        if user_id not in self._supervisors:
+            self._supervisors[user_id] = self._find_supervisor(user_id)
+        return self._supervisors[user_id]
+
+    def _find_supervisor(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        user = self.user(user_id)
+        dept = self.department(user.get("departmentId")) if user else None
+        if dept is None:
+            return None
+        if dept.get("managerId") == user_id:
+            return self.department_manager(dept.get("parentId"))
+        return self.department_manager(dept["id"])
+
+    def department_users(self, dept_id: Optional[str]) -> List[Dict[str, Any]]:
+        """部门及其全部下级部门的用户"""
+        if not dept_id:
+            return []
+        if dept_id not in self._subtree_users:
+            users, stack = [], [dept_id]
+            while stack:
+                current = stack.pop()
+                users.extend(self.members.get(current, []))
+                stack.extend(self.children.get(current, []))
+            self._subtree_users[dept_id] = users
+        return self._subtree_users[dept_id]
+
+    def direct_members(self, dept_id: Optional[str]) -> List[Dict[str, Any]]:
+        """只属于该部门本身的用户（抄送规则的部门匹配不含下级部门）"""
+        return self.members.get(dept_id, []) if dept_id else []
+
+
+class LinearDirectory(Directory):
+    """按前端实现逐个扫描 allUsers / departments（Array.find / filter），用于对比解析开销"""
+
+    def user(self, user_id):
+        return next((u for u in self.user_list if u["id"] == user_id), None) if user_id else None
+
+    def department(self, dept_id):
+        return next((d for d in self.department_list if d["id"] == dept_id), None) if dept_id else None
+
+    def supervisor(self, user_id):
+        return self._find_supervisor(user_id)
+
+    def department_users(self, dept_id):
+        if not dept_id:
+            return []
+        targets, frontier = {dept_id}, [dept_id]
+        while frontier:
+            frontier = [d["id"] for d in self.department_list if d.get("parentId") in frontier]
+            targets.update(frontier)
+        return [u for u in self.user_list if u.get("departmentId") in targets]
+
+    def direct_members(self, dept_id):
+        return [u for u in self.user_list if u.get("departmentId") == dept_id] if dept_id else []
+
+
+# ---------------------------------------------------------------------------
+# 编译
+# ---------------------------------------------------------------------------
+
+Resolver = Callable[[Dict[str, Any], Directory], List[Dict[str, Any]]]
+CCResolver = Callable[[Dict[str, Any], Directory, Optional[Dict[str, Any]]], List[Dict[str, Any]]]
+
+
+def _present(*users) -> list:
+    return [u for u in users if u]
+
+
+def _first_rule(rules: list, key: str, matches: Callable[[str, str], bool]):
+    """按配置顺序返回第一条命中的规则的部门 ID"""
+    def pick(value: Optional[str]) -> Optional[str]:
+        if not value:
+            return None
+        for rule in rules:
+            if rule.get(key) and matches(value, rule[key]):
+                return rule.get("deptId")
+        return None
+
+    return pick
+
+
+def compile_handler(config: Dict[str, Any]) -> Resolver:
+    """把 handlerStrategy 编译为 (hazard, directory) -> 处理人列表"""
+    strategy = config.get("type")
+
+    if strategy == "fixed":
+        fixed_ids = [fu.get("userId") for fu in config.get("fixedUsers") or []]
+        legacy_id = config.get("userId")
+        description = config.get("description") or ""
+        to_reporter = legacy_id == "auto_reporter" or "上报人" in description or "发起人" in description
+        to_responsible = legacy_id == "auto_assigned" or "责任人" in description or "整改" in description
+
+        def fixed(hazard, d):
+            users = _present(*(d.user(user_id) for user_id in fixed_ids))
+            if users:
+                return users
+            if legacy_id and d.user(legacy_id):
+                return [d.user(legacy_id)]
+            if to_reporter and d.user(hazard.get("reporterId")):
+                return [d.user(hazard["reporterId"])]
+            if to_responsible and d.user(hazard.get("responsibleId")):
+                return [d.user(hazard["responsibleId"])]
+            return []
+
+        return fixed
+    if strategy == "reporter":
+        return lambda hazard, d: _present(d.user(hazard.get("reporterId")))
+    if strategy in ("reporter_manager", "department_manager"):
+        return lambda hazard, d: _present(d.supervisor(hazard.get("reporterId")))
+    if strategy == "assigned_department_manager":
+        return lambda hazard, d: _present(d.department_manager(hazard.get("assignedDepartmentId")))
+    if strategy == "responsible":
+        return lambda hazard, d: _present(d.user(hazard.get("responsibleId")))
+    if strategy == "responsible_manager":
+        return lambda hazard, d: _present(d.supervisor(hazard.get("responsibleId")))
+    if strategy == "dept_manager":
+        target = config.get("targetDeptId")
+        return lambda hazard, d: _present(d.department_manager(target))
+    if strategy == "role":
+        target, role_name = config.get("targetDeptId"), config.get("roleName")
+        if not target or not role_name:
+            return lambda hazard, d: []
+        return lambda hazard, d: [u for u in d.department_users(target) if role_name in (u.get("jobTitle") or "")]
+
+    # 区域/类型/风险匹配：handler-matcher 读取的是 config.rules
+    rules = config.get("rules") or []
+    field_name, pick = {
+        "location_match": ("location", _first_rule(rules, "location", lambda value, rule: rule in value)),
+        "type_match": ("type", _first_rule(rules, "type", lambda value, rule: value == rule or rule in value)),
+        "risk_match": ("riskLevel", _first_rule(rules, "riskLevel", lambda value, rule: value == rule)),
+    }.get(strategy, (None, None))
+    if pick is None:
+        return lambda hazard, d: []
+    return lambda hazard, d: _present(d.department_manager(pick(hazard.get(field_name))))
+
+
+def compile_cc_rule(rule: Dict[str, Any]) -> CCResolver:
+    """把单条抄送规则编译为 (hazard, directory, 当前处理人) -> 抄送人列表"""
+    kind = rule.get("type")
+    config = rule.get("config") or {}
+    dept_id, role_name = config.get("deptId"), config.get("roleName")
+
+    if kind == "fixed_users":
+        ids, names = config.get("userIds") or [], config.get("userNames") or []
+        if ids and len(names) == len(ids):
+            named = [{"id": str(i), "name": n} for i, n in zip(ids, names)]
+            return lambda hazard, d, handler: named
+        return lambda hazard, d, handler: _present(*(d.user(str(i)) for i in ids))
+    if kind == "reporter_manager":
+        return lambda hazard, d, handler: _present(d.supervisor(hazard.get("reporterId")))
+    if kind == "responsible_manager":
+        return lambda hazard, d, handler: (
+            _present(d.supervisor(hazard["responsibleId"]))
+            if hazard.get("responsibleId") and hazard.get("responsibleName") else []
+        )
+    if kind == "handler_manager":
+        return lambda hazard, d, handler: _present(d.supervisor(handler["id"])) if handler else []
+    if kind in ("dept_by_location", "dept_by_type"):
+        expected = config.get("locationMatch" if kind == "dept_by_location" else "typeMatch")
+        if not expected or not dept_id:
+            return lambda hazard, d, handler: []
+        if kind == "dept_by_location":
+            return lambda hazard, d, handler: d.direct_members(dept_id) if expected in (hazard.get("location") or "") else []
+        return lambda hazard, d, handler: d.direct_members(dept_id) if hazard.get("type") == expected else []
+    if kind == "role_match":
+        if not dept_id or not role_name:
+            return lambda hazard, d, handler: []
+        return lambda hazard, d, handler: [
+            u for u in d.direct_members(dept_id) if role_name in (u.get("jobTitle") or "")
+        ]
+    if kind in ("responsible", "reporter"):
+        id_key, name_key = ("responsibleId", "responsibleName") if kind == "responsible" else ("reporterId", "reporterName")
+        return lambda hazard, d, handler: (
+            [{"id": hazard[id_key], "name": hazard[name_key]}]
+            if hazard.get(id_key) and hazard.get(name_key) and d.user(hazard[id_key]) else []
+        )
+    return lambda hazard, d, handler: []
+
+
+@dataclass
+class CompiledStep:
+    index: int
+    id: str
+    name: str
+    status: str
+    strategy: str
+    approval_mode: Optional[str]
+    resolve_handlers: Resolver
+    cc_rules: List[CCResolver]
+
+    def resolve(self, hazard: Dict[str, Any], directory: Directory) -> tuple[list, list]:
+        """返回 (处理人列表, 去重后的抄送人 ID 列表)；抄送的 handler_manager 以第一个处理人为准"""
+        handlers = self.resolve_handlers(hazard, directory)
+        handler = handlers[0] if handlers else None
+        cc: Dict[str, None] = {}
+        for rule in self.cc_rules:
+            for user in rule(hazard, directory, handler):
+                cc[user["id"]] = None
+        return handlers, list(cc)
+
+
+@dataclass
+class CompiledWorkflow:
+    steps: List[CompiledStep]
+    version: Any = None
+    step_ids: tuple = ()
+    index_by_id: Dict[str, int] = field(default_factory=dict)
+    statuses: tuple = ()
+
+    def status(self, step_id: str, step_index: int) -> str:
+        return status_for_step(step_id, step_index, self.step_ids)
+
+
+@traced("workflow.compile")
+def compile_workflow(config: Dict[str, Any]) -> CompiledWorkflow:
+    steps = config.get("steps") or []
+    step_ids = tuple(step.get("id") for step in steps)
+    statuses = step_statuses(step_ids)
+    compiled = []
+    for index, step in enumerate(steps):
+        strategy = step.get("handlerStrategy") or {}
+        mode = strategy.get("approvalMode")
+        compiled.append(CompiledStep(
+            index=index,
+            id=step.get("id"),
+            name=step.get("name") or step.get("id"),
+            status=statuses[index],
+            strategy=strategy.get("type"),
+            approval_mode=mode if mode in APPROVAL_MODES else None,
+            resolve_handlers=compile_handler(strategy),
+            cc_rules=[compile_cc_rule(rule) for rule in step.get("ccRules") or []],
+        ))
+    return CompiledWorkflow(
+        steps=compiled,
+        version=config.get("version"),
+        step_ids=step_ids,
+        index_by_id={step_id: i for i, step_id in enumerate(step_ids)},
+        statuses=statuses,
+    )
+
+
+_COMPILED: Dict[Path, tuple] = {}
+
+
+def load_workflow(path: Path = WORKFLOW_FILE) -> CompiledWorkflow:
+    """读取并编译工作流配置；文件 mtime/大小未变时直接返回上次的编译结果"""
+    path = Path(path)
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _COMPILED.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+    workflow = compile_workflow(json.loads(path.read_text(encoding="utf-8")))
+    _COMPILED[path] = (key, workflow)
+    return workflow
+
+
+# ---------------------------------------------------------------------------
+# 离线校验
+# ---------------------------------------------------------------------------
+
+def validate_workflow(config: Dict[str, Any], directory: Optional[Directory] = None) -> List[Dict[str, str]]:
+    """
+    静态校验配置，返回 [{level: error|warning, step, message}]
+    给出 directory 时同时检查配置引用的用户/部门是否存在、部门是否设置了负责人
+    """
+    issues: List[Dict[str, str]] = []
+
+    def add(level: str, step: str, message: str):
+        issues.append({"level": level, "step": step, "message": message})
+
+    steps = config.get("steps") or []
+    if not steps:
+        add("error", "-", "没有任何步骤")
+        return issues
+    ids = [step.get("id") for step in steps]
+    if ids[0] != "report":
+        add("warning", ids[0] or "-", "第一步不是 report，上报后的初始状态与执行人可能不符合预期")
+    for step_id in {i for i in ids if ids.count(i) > 1}:
+        add("error", step_id, "步骤 ID 重复")
+    for required in ("rectify", "verify"):
+        if required not in ids:
+            add("warning", "-", f"缺少 {required} 步骤，状态推导无法进入 {STANDARD_STATUSES[required]}")
+
+    def check_dept(step_id: str, dept_id: Optional[str], what: str):
+        if directory is None or not dept_id:
+            return
+        dept = directory.departments.get(dept_id)
+        if dept is None:
+            add("error", step_id, f"{what}引用的部门不存在: {dept_id}")
+        elif not dept.get("managerId") or dept["managerId"] not in directory.users:
+            add("warning", step_id, f"{what}引用的部门 {dept.get('name')} 没有在职负责人")
+
+    def check_users(step_id: str, user_ids: list, what: str):
+        if directory is None:
+            return
+        missing = [str(u) for u in user_ids if str(u) not in directory.users]
+        if missing:
+            add("warning", step_id, f"{what}中的用户不存在或已离职: {', '.join(missing)}")
+
+    for step in steps:
+        step_id = step.get("id") or "-"
+        strategy = step.get("handlerStrategy") or {}
+        kind = strategy.get("type")
+        if kind not in HANDLER_STRATEGIES:
+            add("error", step_id, f"未知的处理人策略: {kind}")
+        elif kind == "fixed":
+            fixed_ids = [fu.get("userId") for fu in strategy.get("fixedUsers") or []]
+            description = strategy.get("description") or ""
+            inferable = any(k in description for k in ("上报人", "发起人", "责任人", "整改")) or strategy.get("userId")
+            if not fixed_ids and not inferable:
+                add("error", step_id, "fixed 策略没有配置人员，描述中也无法推断上报人/责任人")
+            check_users(step_id, fixed_ids, "固定处理人")
+        elif kind == "dept_manager":
+            if not strategy.get("targetDeptId"):
+                add("error", step_id, "dept_manager 策略缺少 targetDeptId")
+            check_dept(step_id, strategy.get("targetDeptId"), "处理人策略")
+        elif kind == "role":
+            if not strategy.get("targetDeptId") or not strategy.get("roleName"):
+                add("error", step_id, "role 策略缺少 targetDeptId 或 roleName")
+            check_dept(step_id, strategy.get("targetDeptId"), "处理人策略")
+        elif kind in ("location_match", "type_match", "risk_match"):
+            if not strategy.get("rules"):
+                legacy = {"location_match": "locationMatches", "type_match": "typeMatches", "risk_match": "riskMatches"}[kind]
+                hint = f"（配置了 {legacy}，但处理人匹配读取的是 rules）" if strategy.get(legacy) else ""
+                add("error", step_id, f"{kind} 策略没有匹配规则{hint}")
+            for rule in strategy.get("rules") or []:
+                check_dept(step_id, rule.get("deptId"), "匹配规则")
+        if strategy.get("approvalMode") and strategy["approvalMode"] not in APPROVAL_MODES:
+            add("warning", step_id, f"审批模式 {strategy['approvalMode']} 不受支持，按单人处理")
+
+        for rule in step.get("ccRules") or []:
+            rule_type = rule.get("type")
+            rule_config = rule.get("config") or {}
+            label = f"抄送规则 {rule.get('id') or rule_type}"
+            if rule_type not in CC_RULE_TYPES:
+                add("error", step_id, f"{label}: 未知类型 {rule_type}")
+            elif rule_type == "fixed_users":
+                if not rule_config.get("userIds"):
+                    add("warning", step_id, f"{label}: 未配置抄送人员")
+                check_users(step_id, rule_config.get("userIds") or [], label)
+            elif rule_type in ("dept_by_location", "dept_by_type", "role_match"):
+                needed = {"dept_by_location": "locationMatch", "dept_by_type": "typeMatch", "role_match": "roleName"}[rule_type]
+                if not rule_config.get("deptId") or not rule_config.get(needed):
+                    add("warning", step_id, f"{label}: 缺少 deptId 或 {needed}，永远不会匹配")
+                if directory is not None and rule_config.get("deptId") not in (None, *directory.departments):
+                    add("warning", step_id, f"{label}: 引用的部门不存在: {rule_config['deptId']}")
+    return issues
+
+
+# ---------------------------------------------------------------------------
+# 模拟
+# ---------------------------------------------------------------------------
+
+def synthetic_hazards(directory: Directory, seed: Optional[int] = None):
+    """按生产分布无限生成合成隐患（上报人/责任人/区域/类型/风险等级）"""
+    from db_seed import AREAS, HAZARD_TYPES, RISK_LEVELS
+
+    rng = random.Random(seed)
+    users = directory.user_list
+    if not users:
+        raise ValueError("组织架构中没有在职用户")
+    areas, area_weights = list(AREAS), list(itertools.accumulate(AREAS.values()))
+    types, type_weights = list(HAZARD_TYPES), list(itertools.accumulate(HAZARD_TYPES.values()))
+    risks, risk_weights = list(RISK_LEVELS), list(itertools.accumulate(RISK_LEVELS.values()))
+    while True:
+        reporter, responsible = rng.choice(users), rng.choice(users)
+        yield {
+            "reporterId": reporter["id"],
+            "reporterName": reporter["name"],
+            "responsibleId": responsible["id"],
+            "responsibleName": responsible["name"],
+            "assignedDepartmentId": responsible.get("departmentId"),
+            "location": rng.choices(areas, cum_weights=area_weights)[0],
+            "type": rng.choices(types, cum_weights=type_weights)[0],
+            "riskLevel": rng.choices(risks, cum_weights=risk_weights)[0],
+        }
+
+
+@traced("workflow.simulate")
+def simulate(
+    workflow: CompiledWorkflow,
+    directory: Directory,
+    hazards: int = 10_000,
+    seed: Optional[int] = None,
+    reject_rate: float = 0.05,
+) -> dict:
+    """
+    回放 hazards 条合成隐患从上报到验收闭环的完整流转；每进入一步都像派发引擎那样解析处理人与抄送人
+    verify 步骤以 reject_rate 的概率驳回到上一步；某一步解析不到处理人时流程卡住（与后端派发失败一致）
+    """
+    rng = random.Random(seed)
+    steps = workflow.steps
+    stats = [{"step": s.id, "status": s.status, "entered": 0, "no_handler": 0, "handlers": 0, "cc": 0} for s in steps]
+    report = {"hazards": hazards, "transitions": 0, "closed": 0, "stuck": 0, "rejections": 0, "status_regressions": 0}
+    ranks = [STATUS_RANK[status] for status in workflow.statuses]
+    started = time.perf_counter()
+    for hazard in itertools.islice(synthetic_hazards(directory, seed), hazards):
+        index = 0
+        while True:
+            step = steps[index]
+            handlers, cc = step.resolve(hazard, directory)
+            entry = stats[index]
+            entry["entered"] += 1
+            entry["handlers"] += len(handlers)
+            entry["cc"] += len(cc)
+            report["transitions"] += 1
+            if not handlers:
+                entry["no_handler"] += 1
+                report["stuck"] += 1
+                break
+            if step.id == "verify" and index > 0 and rng.random() < reject_rate:
+                report["rejections"] += 1
+                index -= 1
+                continue
+            if index + 1 == len(steps):
+                report["closed"] += 1
+                break
+            if ranks[index + 1] < ranks[index]:
+                report["status_regressions"] += 1
+            index += 1
+    report["seconds"] = time.perf_counter() - started
+    report["transitions_per_s"] = report["transitions"] / report["seconds"] if report["seconds"] else 0.0
+    report["steps"] = stats
+    annotate(rows=report["transitions"])
+    return report
+
+
+def synthetic_workflow(step_count: int, rule_count: int) -> Dict[str, Any]:
+    """report -> assign -> 自定义审批步骤 ... -> rectify -> verify，每步 rule_count 条抄送规则"""
+    middle = [
+        {"id": f"step_{i}", "name": f"审批{i}", "handlerStrategy": {"type": kind}}
+        for i, kind in zip(range(max(0, step_count - 4)), itertools.cycle(("responsible_manager", "reporter_manager")))
+    ]
+    steps = (
+        [{"id": "report", "name": "上报", "handlerStrategy": {"type": "fixed", "description": "执行人：上报人"}}]
+        + [{"id": "assign", "name": "指派", "handlerStrategy": {"type": "reporter_manager"}}]
+        + middle
+        + [{"id": "rectify", "name": "整改", "handlerStrategy": {"type": "responsible"}}]
+        + [{"id": "verify", "name": "验收", "handlerStrategy": {"type": "reporter"}}]
+    )
+    cc_kinds = itertools.cycle(("reporter_manager", "responsible_manager", "handler_manager", "reporter", "responsible"))
+    for step in steps:
+        step["ccRules"] = [{"id": f"cc_{i}", "type": next(cc_kinds), "config": {}} for i in range(rule_count)]
+    return {"version": 1, "steps": steps}
+
+
+def synthetic_directory(users: int, departments: int, seed: int = 1, linear: bool = False) -> Directory:
+    """用 db_seed 的部门树与人员分布构造组织架构"""
+    from db_seed import SeedContext, generate_departments, generate_users
+
+    ctx = SeedContext(seed, int(time.time() * 1000), [])
+    dept_rows = generate_departments(ctx, departments)
+    user_rows = generate_users(ctx, users)
+    cls = LinearDirectory if linear else Directory
+    return cls(
+        [{"id": r[0], "name": r[2], "departmentId": r[5], "jobTitle": r[6]} for r in user_rows],
+        [{"id": r[0], "name": r[1], "parentId": r[2], "managerId": r[3]} for r in dept_rows],
+    )
+
+
+def benchmark(
+    step_counts=(5, 10, 20, 40),
+    rule_counts=(0, 4, 16),
+    users: int = 2000,
+    departments: int = 60,
+    transitions: int = 200_000,
+    linear: bool = False,
+) -> List[dict]:
+    """每种 (步骤数, 规则数) 组合回放约 transitions 次流转，返回每次流转的平均解析耗时"""
+    directory = synthetic_directory(users, departments, linear=linear)
+    results = []
+    for step_count in step_counts:
+        for rule_count in rule_counts:
+            workflow = compile_workflow(synthetic_workflow(step_count, rule_count))
+            report = simulate(workflow, directory, hazards=max(1, transitions // step_count), seed=1, reject_rate=0)
+            results.append({
+                "steps": step_count,
+                "rules": rule_count,
+                "transitions": report["transitions"],
+                "us_per_transition": report["seconds"] / report["transitions"] * 1e6,
+            })
+    return results
+
+
+# ---------------------------------------------------------------------------
+# 输出与命令行
+# ---------------------------------------------------------------------------
+
+def print_check_report(issues: List[dict], report: Optional[dict]):
+    errors = [i for i in issues if i["level"] == "error"]
+    print(f"\n🧭 工作流配置校验: {len(errors)} 个错误，{len(issues) - len(errors)} 个警告")
+    for issue in issues:
+        icon = "❌" if issue["level"] == "error" else "⚠️ "
+        print(f"   {icon} [{issue['step']}] {issue['message']}")
+    if report is None:
+        return
+    print(f"\n🔁 模拟 {report['hazards']:,} 条隐患: {report['transitions']:,} 次流转，"
+          f"{report['transitions_per_s']:,.0f} 次/秒；闭环 {report['closed']:,}，卡住 {report['stuck']:,}，"
+          f"驳回 {report['rejections']:,}")
+    print(f"   {'步骤':<22}{'状态':<12}{'进入':>10}{'无处理人':>10}{'平均处理人':>10}{'平均抄送':>10}")
+    for entry in report["steps"]:
+        entered = entry["entered"] or 1
+        print(f"   {entry['step']:<24}{entry['status']:<14}{entry['entered']:>10,}{entry['no_handler']:>12,}"
+              f"{entry['handlers'] / entered:>14.2f}{entry['cc'] / entered:>12.2f}")
+    if report["status_regressions"]:
+        print(f"   ⚠️  {report['status_regressions']:,} 次流转后状态倒退")
+
+
+def run_check(args: argparse.Namespace) -> int:
+    workflow_file = Path(args.file)
+    try:
+        config = json.loads(workflow_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        print(f"❌ 无法读取工作流配置 {workflow_file}: {e}")
+        return 1
+    directory = None
+    db_file = find_database(args.db)
+    if db_file is not None and db_file.exists():
+        with closing(connect(db_file)) as conn:
+            directory = Directory.from_sqlite(conn)
+    issues = validate_workflow(config, directory)
+    has_errors = any(i["level"] == "error" for i in issues)
+    report = None
+    if has_errors or not config.get("steps"):
+        # 配置有错误时编译/模拟结果没有意义，空步骤还会直接出错
+        if args.hazards:
+            print("⚠️  配置校验未通过，跳过流转模拟")
+    elif directory is not None and directory.user_list and args.hazards:
+        report = simulate(compile_workflow(config), directory, args.hazards, seed=args.seed)
+    elif directory is None or not directory.user_list:
+        print("⚠️  未找到可用的组织架构（数据库或在职用户），只做静态校验")
+    print_check_report(issues, report)
+    return 1 if has_errors else 0
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    print(f"\n⏱️  处理人/抄送解析开销（{args.users} 用户，{args.departments} 部门，"
+          f"{'逐个扫描' if args.linear else '内存索引'}）")
+    print(f"   {'步骤数':>6}{'规则数/步':>10}{'流转次数':>12}{'µs/次':>10}")
+    for row in benchmark(args.steps, args.rules, args.users, args.departments, args.transitions, args.linear):
+        print(f"   {row['steps']:>8}{row['rules']:>12}{row['transitions']:>14,}{row['us_per_transition']:>10.2f}")
+    return 0
+
+
+def register(subparsers):
+    """注册 ehs-db workflow 子命令"""
+    parser = subparsers.add_parser("workflow", help="隐患工作流配置校验与流转模拟")
+    commands = parser.add_subparsers(dest="workflow_command", help="命令")
+
+    check_parser = commands.add_parser("check", help="校验 hazard-workflow.json，并用数据库中的组织架构模拟流转")
+    check_parser.add_argument("--file", type=str, default=str(WORKFLOW_FILE), help="工作流配置文件")
+    check_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    check_parser.add_argument("--hazards", type=int, default=100_000, help="模拟的隐患数量，0 为不模拟 (默认: 100000)")
+    check_parser.add_argument("--seed", type=int, default=1, help="随机种子 (默认: 1)")
+    check_parser.set_defaults(func=run_check)
+
+    bench_parser = commands.add_parser("bench", help="测量解析开销随步骤数、抄送规则数的增长")
+    bench_parser.add_argument("--steps", type=int, nargs="+", default=[5, 10, 20, 40], help="步骤数")
+    bench_parser.add_argument("--rules", type=int, nargs="+", default=[0, 4, 16], help="每步抄送规则数")
+    bench_parser.add_argument("--users", type=int, default=2000, help="组织架构用户数 (默认: 2000)")
+    bench_parser.add_argument("--departments", type=int, default=60, help="组织架构部门数 (默认: 60)")
+    bench_parser.add_argument("--transitions", type=int, default=200_000, help="每种组合的流转次数 (默认: 200000)")
+    bench_parser.add_argument("--linear", action="store_true", help="按前端实现逐个扫描用户/部门，作为对照")
+    bench_parser.set_defaults(func=run_bench)
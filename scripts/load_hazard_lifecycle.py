@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+EHS 系统隐患生命周期压测
+复用 test_hazard_lifecycle.py 的测试用户、工作流与每一步的请求体（hazard_lifecycle 模块），
+按设定的到达速率并发跑成千上万条 "A 提报 -> C 确认 -> D 审批 -> B 整改 -> E 验收" 流程：
+- asyncio + 连接池复用 keep-alive 连接（标准库实现，不依赖 aiohttp）
+- 开环到达：按计划时间发起流程，记录因并发上限导致的启动延迟
+- 输出吞吐量、每个流转步骤的 p50/p95/p99 延迟与错误率（终端摘要 + JSON）
+- --stub: 不连接真实服务，在临时库上启动进程内的接口替身（hazard_api_stub），离线验证流程与压测脚本本身
+用法: python3 scripts/load_hazard_lifecycle.py --count 2000 --rate 50 --json backups/bench/lifecycle.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+from hazard_lifecycle import (
+    ADMIN,
+    TEST_USERS,
+    TRANSITIONS,
+    USER_A,
+    USER_C,
+    USER_E,
+    advance_payload,
+    build_workflow_config,
+    close_payload,
+    create_payload,
+    ensure_users,
+    load_database_url,
+    sqlite_conn,
+    sqlite_path,
+    state_mismatch,
+    temporary_workflow_config,
+    void_payload,
+)
+import hazard_api_stub
+from deploy_checks import percentile
+from ops_trace import add_trace_arguments, setup_tracing
+
+
+ROOT = Path(__file__).resolve().parents[1]
+TRANSITION_NAMES = ["report"] + [t[0] for t in TRANSITIONS] + ["close", "void"]
+
+
+# ---------------------------------------------------------------------------
+# keep-alive 连接池
+# ---------------------------------------------------------------------------
+
+class HttpError(Exception):
+    pass
+
+
+class HttpResponse:
+    def __init__(self, status: int, headers: dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ConnectionPool:
+    """
+    最多 size 个连接；空闲连接后进先出复用（最近用过的连接最不可能已被服务端关闭）
+    - 取出的空闲连接已收到服务端 FIN 时直接丢弃，换下一个或新建连接
+    - 复用的连接写请求时出错（服务端已关闭，请求未送达）时换新连接重试一次；
+      请求已发出、读响应时断开的，只有幂等方法才重试，POST/PATCH 可能已被处理，直接报错以免重复创建隐患
+    """
+
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+    def __init__(self, base_url: str, size: int = 64, timeout: float = 15.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == "https" else None
+        self.host_header = parts.netloc
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(size)
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self.opened = 0
+        self.retries = 0
+
+    async def _connect(self):
+        self.opened += 1
+        return await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+
+    def _take_idle(self):
+        """取一个仍然可用的空闲连接，没有时返回 None"""
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if reader.at_eof() or writer.is_closing():
+                writer.close()
+                continue
+            return reader, writer
+        return None
+
+    async def request(self, method: str, path: str, headers: Optional[dict] = None, json_body: Any = None):
+        body = b"" if json_body is None else json.dumps(json_body, ensure_ascii=False).encode("utf-8")
+        lines = [
+            f"{method} {path} HTTP/1.1",
+            f"Host: {self.host_header}",
+            "Connection: keep-alive",
+            "Accept: application/json",
+            f"Content-Length: {len(body)}",
+        ]
+        if json_body is not None:
+            lines.append("Content-Type: application/json")
+        lines += [f"{key}: {value}" for key, value in (headers or {}).items()]
+        raw = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+        async with self._slots:
+            return await asyncio.wait_for(self._send_and_receive(method, raw), self.timeout)
+
+    async def _send_and_receive(self, method: str, raw: bytes) -> HttpResponse:
+        conn = self._take_idle()
+        reused = conn is not None
+        if conn is None:
+            conn = await self._connect()
+        try:
+            sent = False
+            try:
+                await self._send(conn, raw)
+                sent = True
+                response, keep = await self._receive(conn)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                conn[1].close()
+                # 已发出的非幂等请求不重试：服务端可能已经处理
+                if not reused or (sent and method.upper() not in self.IDEMPOTENT_METHODS):
+                    raise HttpError(f"连接失败: {e}") from e
+                self.retries += 1
+                conn = await self._connect()
+                try:
+                    await self._send(conn, raw)
+                    response, keep = await self._receive(conn)
+                except (ConnectionError, asyncio.IncompleteReadError) as e2:
+                    conn[1].close()
+                    raise HttpError(f"连接失败: {e2}") from e2
+        except ValueError as e:
+            conn[1].close()
+            raise HttpError(f"无效的响应: {e}") from e
+        except BaseException:
+            conn[1].close()
+            raise
+        if keep:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+        return response
+
+    @staticmethod
+    async def _send(conn, raw: bytes):
+        writer = conn[1]
+        writer.write(raw)
+        await writer.drain()
+
+    async def _receive(self, conn) -> tuple[HttpResponse, bool]:
+        reader = conn[0]
+        status_line = await reader.readuntil(b"\r\n")
+        parts = status_line.decode("latin-1").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/") or not parts[1].isdigit():
+            raise HttpError(f"无效的响应行: {status_line!r}")
+        status = int(parts[1])
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        keep = headers.get("connection", "").lower() != "close" and parts[0] != "HTTP/1.0"
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    # 跳过 trailer
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep = False
+        return HttpResponse(status, headers, body), keep
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+# ---------------------------------------------------------------------------
+# 统计
+# ---------------------------------------------------------------------------
+
+def latency_summary(values: list[float]) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter] = defaultdict(Counter)
+        self.lifecycles: list[float] = []
+        self.start_delays: list[float] = []
+        self.completed = 0
+        self.failed = 0
+        self.requests = 0
+
+    def record(self, transition: str, seconds: float, error: Optional[str] = None):
+        self.requests += 1
+        self.latencies[transition].append(seconds)
+        if error:
+            self.errors[transition][error] += 1
+
+    def report(self, duration: float, config: dict, connections: int) -> dict:
+        transitions = {}
+        for name in TRANSITION_NAMES:
+            if name not in self.latencies:
+                continue
+            count = len(self.latencies[name])
+            errors = sum(self.errors[name].values())
+            transitions[name] = {
+                **latency_summary(self.latencies[name]),
+                "errors": errors,
+                "error_rate": round(errors / count, 4) if count else 0.0,
+                "error_kinds": dict(self.errors[name]),
+            }
+        return {
+            "config": config,
+            "duration_s": round(duration, 3),
+            "lifecycles": {
+                "started": self.completed + self.failed,
+                "completed": self.completed,
+                "failed": self.failed,
+            },
+            "throughput": {
+                "lifecycles_per_s": round(self.completed / duration, 2) if duration else 0.0,
+                "requests_per_s": round(self.requests / duration, 2) if duration else 0.0,
+            },
+            "transitions": transitions,
+            "lifecycle": latency_summary(self.lifecycles),
+            "start_delay": latency_summary(self.start_delays),
+            "connections_opened": connections,
+        }
+
+
+# ---------------------------------------------------------------------------
+# 单条生命周期
+# ---------------------------------------------------------------------------
+
+class TransitionFailed(Exception):
+    pass
+
+
+async def _call(pool: ConnectionPool, recorder: Recorder, transition: str, method: str, path: str,
+                user: Dict[str, Any], payload: Dict[str, Any], expect: Optional[tuple] = None) -> dict:
+    """发出一次流转请求并记录延迟；HTTP 错误或状态不符合预期时记错误并中止该流程"""
+    started = time.perf_counter()
+    try:
+        response = await pool.request(method, path, {"x-user-id": user["id"]}, payload)
+    except asyncio.TimeoutError:
+        recorder.record(transition, time.perf_counter() - started, "timeout")
+        raise TransitionFailed(transition)
+    except (HttpError, OSError):
+        recorder.record(transition, time.perf_counter() - started, "connection")
+        raise TransitionFailed(transition)
+    elapsed = time.perf_counter() - started
+    if response.status != 200:
+        recorder.record(transition, elapsed, f"http_{response.status}")
+        raise TransitionFailed(transition)
+    try:
+        hazard = response.json()
+    except ValueError:
+        recorder.record(transition, elapsed, "invalid_json")
+        raise TransitionFailed(transition)
+    if expect and state_mismatch(hazard, *expect):
+        recorder.record(transition, elapsed, "state")
+        raise TransitionFailed(transition)
+    recorder.record(transition, elapsed)
+    return hazard
+
+
+async def run_lifecycle(pool: ConnectionPool, steps: list, recorder: Recorder, seq: int, cleanup: bool = True):
+    """与 test_hazard_lifecycle_end_to_end 相同的五步流转，每步校验状态与当前处理人"""
+    started = time.perf_counter()
+    hazard = None
+    try:
+        hazard = await _call(
+            pool, recorder, "report", "POST", "/api/hazards", USER_A,
+            create_payload(f"压测隐患 #{seq}"), ("assigned", USER_C, "confirm", 1),
+        )
+        for name, operator, next_step_id, index, assignee, action, extra, status in TRANSITIONS:
+            hazard = await _call(
+                pool, recorder, name, "PATCH", "/api/hazards", operator,
+                advance_payload(hazard, operator, next_step_id, index, steps, assignee, action, extra),
+                (status, assignee, next_step_id, index),
+            )
+        await _call(
+            pool, recorder, "close", "PATCH", "/api/hazards", USER_E,
+            close_payload(hazard), ("closed", None, "verify", 4),
+        )
+        recorder.completed += 1
+        recorder.lifecycles.append(time.perf_counter() - started)
+    except TransitionFailed:
+        recorder.failed += 1
+    finally:
+        if cleanup and hazard is not None:
+            try:
+                await _call(pool, recorder, "void", "POST", "/api/hazards/void", ADMIN,
+                            void_payload(hazard, "压测数据清理"))
+            except TransitionFailed:
+                pass
+
+
+# ---------------------------------------------------------------------------
+# 到达调度
+# ---------------------------------------------------------------------------
+
+async def run_load(
+    base_url: str,
+    count: int = 1000,
+    rate: float = 50.0,
+    concurrency: int = 200,
+    connections: int = 64,
+    timeout: float = 15.0,
+    poisson: bool = False,
+    cleanup: bool = True,
+    seed: Optional[int] = None,
+) -> dict:
+    """按 rate 条/秒发起 count 条生命周期，最多 concurrency 条同时进行"""
+    config = {
+        "base_url": base_url, "count": count, "rate": rate, "concurrency": concurrency,
+        "connections": connections, "arrival": "poisson" if poisson else "constant", "cleanup": cleanup,
+    }
+    steps = build_workflow_config()["steps"]
+    pool = ConnectionPool(base_url, connections, timeout)
+    recorder = Recorder()
+    rng = random.Random(seed)
+    in_flight = asyncio.Semaphore(concurrency)
+
+    try:
+        ping = await pool.request("GET", "/api/hazards/workflow", {"x-user-id": ADMIN["id"]})
+        if ping.status != 200:
+            raise HttpError(f"服务不可用: GET /api/hazards/workflow 返回 {ping.status}")
+
+        async def launch(seq: int, scheduled: float):
+            async with in_flight:
+                recorder.start_delays.append(max(0.0, time.perf_counter() - scheduled))
+                await run_lifecycle(pool, steps, recorder, seq, cleanup)
+
+        started = time.perf_counter()
+        tasks = []
+        scheduled = started
+        for seq in range(count):
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(launch(seq, scheduled)))
+            scheduled += rng.expovariate(rate) if poisson else 1 / rate
+        await asyncio.gather(*tasks)
+        duration = time.perf_counter() - started
+    finally:
+        await pool.close()
+    return recorder.report(duration, config, pool.opened)
+
+
+# ---------------------------------------------------------------------------
+# 输出与命令行
+# ---------------------------------------------------------------------------
+
+def print_load_report(report: dict):
+    cycles, throughput = report["lifecycles"], report["throughput"]
+    print(f"\n🚦 隐患生命周期压测: {report['config']['base_url']}")
+    print(f"   {cycles['started']} 条流程（完成 {cycles['completed']}，失败 {cycles['failed']}），"
+          f"耗时 {report['duration_s']:.1f}s")
+    print(f"   吞吐: {throughput['lifecycles_per_s']:.1f} 流程/秒, {throughput['requests_per_s']:.1f} 请求/秒，"
+          f"建立连接 {report['connections_opened']} 个")
+    print(f"   {'步骤':<10}{'请求数':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'最大':>10}{'错误率':>9}")
+    for name, stats in report["transitions"].items():
+        print(f"   {name:<12}{stats['count']:>8}{stats['p50_ms']:>9.1f}ms{stats['p95_ms']:>8.1f}ms"
+              f"{stats['p99_ms']:>8.1f}ms{stats['max_ms']:>8.1f}ms{stats['error_rate']:>9.1%}")
+        if stats["error_kinds"]:
+            kinds = ", ".join(f"{kind} ×{n}" for kind, n in stats["error_kinds"].items())
+            print(f"   {'':<12}⚠️  {kinds}")
+    lifecycle, delay = report["lifecycle"], report["start_delay"]
+    print(f"   整条流程: p50 {lifecycle['p50_ms']:.0f}ms, p95 {lifecycle['p95_ms']:.0f}ms, "
+          f"p99 {lifecycle['p99_ms']:.0f}ms")
+    if delay["p99_ms"] > 100:
+        print(f"   ⚠️  启动延迟 p99 {delay['p99_ms']:.0f}ms：并发上限不足以维持目标到达速率")
+
+
+def _prepared_environment(prepare: bool):
+    """--prepare: 与 test_context 相同，写入测试用户并临时替换工作流配置"""
+    if not prepare:
+        return nullcontext()
+    db_url = load_database_url(ROOT)
+    db_path = sqlite_path(db_url, ROOT) if db_url else None
+    if not db_path or not db_path.exists():
+        raise SystemExit("❌ --prepare 需要可访问的 SQLite DATABASE_URL")
+    with sqlite_conn(db_path) as conn:
+        ensure_users(conn, TEST_USERS)
+    return temporary_workflow_config(ROOT, build_workflow_config())
+
+
+@contextmanager
+def stub_server():
+    """在临时目录建库（迁移 + 测试用户）并启动进程内接口替身，yield 其 base URL"""
+    from db_snapshot import build_golden
+
+    with tempfile.TemporaryDirectory(prefix="ehs-stub-") as work_dir:
+        db_file = Path(work_dir) / "ehs.db"
+        build_golden(db_file)
+        workflow_file = Path(work_dir) / "data" / "hazard-workflow.json"
+        workflow_file.parent.mkdir()
+        workflow_file.write_text(json.dumps(build_workflow_config(), ensure_ascii=False, indent=2), encoding="utf-8")
+        with hazard_api_stub.serve(db_file, workflow_file) as base_url:
+            yield base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统隐患生命周期压测")
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        default=os.getenv("EHS_BASE_URL", "http://localhost:3000"),
+        help="应用地址 (默认: EHS_BASE_URL 或 http://localhost:3000)"
+    )
+    parser.add_argument("--count", type=int, default=1000, help="生命周期条数 (默认: 1000)")
+    parser.add_argument("--rate", type=float, default=50.0, help="每秒发起的流程数 (默认: 50)")
+    parser.add_argument("--concurrency", type=int, default=200, help="同时进行的流程上限 (默认: 200)")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive 连接池大小 (默认: 64)")
+    parser.add_argument("--timeout", type=float, default=15.0, help="单个请求超时秒数 (默认: 15)")
+    parser.add_argument("--poisson", action="store_true", help="按泊松过程到达（默认匀速）")
+    parser.add_argument("--seed", type=int, help="泊松到达的随机种子")
+    parser.add_argument("--no-cleanup", action="store_true", help="流程结束后不作废隐患")
+    parser.add_argument("--prepare", action="store_true", help="写入测试用户并临时使用测试工作流（同 pytest 的 test_context）")
+    parser.add_argument("--stub", action="store_true", help="改为压测进程内的接口替身（临时库，忽略 --base-url/--prepare）")
+    parser.add_argument("--json", type=str, help="把结果写入 JSON 文件")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    setup_tracing(args)
+
+    with stub_server() if args.stub else _prepared_environment(args.prepare) as stub_url:
+        try:
+            report = asyncio.run(run_load(
+                stub_url if args.stub else args.base_url,
+                count=args.count,
+                rate=args.rate,
+                concurrency=args.concurrency,
+                connections=args.connections,
+                timeout=args.timeout,
+                poisson=args.poisson,
+                cleanup=not args.no_cleanup,
+                seed=args.seed,
+            ))
+        except (HttpError, OSError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    print_load_report(report)
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"   结果已写入: {args.json}")
+    sys.exit(0 if report["lifecycles"]["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
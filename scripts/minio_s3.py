@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 MinIO 对象级增量备份
+打包 data/minio-data 会把 .minio.sys、xl.meta 与数据分片等 MinIO 内部文件一起带上，
+备份比实际对象大，恢复也绑定同一版本的 MinIO。这里改为通过 S3 接口按对象备份：
+- 列出 ehs-private / ehs-public 中的对象，与上一次备份的对象索引比较 ETag 与大小，
+  只下载新增或变化的对象；未变化的对象从上一次备份硬链接，每个备份目录都是完整的，可以单独恢复、单独删除
+- 恢复时并发上传回对应的桶，目标中已有相同内容的对象跳过
+- 下载与上传使用固定大小的线程池，每个线程复用自己的 keep-alive 连接
+
+S3 客户端只用标准库实现（SigV4 签名），可对接 MinIO 或任意 S3 兼容服务；测试使用 s3_stub 替身。
+备份目录结构: backup-*/minio-objects/<桶>/<对象键>，以及最后写入的 minio-objects/index.json
+"""
+
+from __future__ import annotations
+
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Union
+from xml.etree import ElementTree
+
+from ops_trace import annotate, traced
+
+
+DEFAULT_BUCKETS = ("ehs-private", "ehs-public")
+DEFAULT_WORKERS = 8
+OBJECTS_DIR = "minio-objects"
+INDEX_FILE = "index.json"
+REGION = "us-east-1"
+CHUNK_SIZE = 1024 * 1024
+EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+PART_SUFFIX = ".ehs-part"
+
+
+class S3Error(RuntimeError):
+    def __init__(self, status: int, code: str, message: str = ""):
+        super().__init__(f"S3 {status} {code}: {message}".rstrip(": "))
+        self.status = status
+        self.code = code
+
+
+@dataclass(frozen=True)
+class S3Object:
+    key: str
+    etag: str
+    size: int
+    last_modified: str = ""
+
+
+# ---------------------------------------------------------------------------
+# SigV4 签名
+# ---------------------------------------------------------------------------
+
+def quote_path(path: str) -> str:
+    return urllib.parse.quote(path, safe="/-_.~")
+
+
+def canonical_query(query: dict[str, str]) -> str:
+    return "&".join(
+        f"{urllib.parse.quote(k, safe='-_.~')}={urllib.parse.quote(v, safe='-_.~')}" for k, v in sorted(query.items())
+    )
+
+
+def signature(secret_key: str, method: str, path: str, query_string: str, headers: dict[str, str],
+              signed_headers: list[str], payload_hash: str, amz_date: str, region: str = REGION) -> str:
+    """AWS Signature Version 4；path 是编码后的路径，headers 的键为小写，signed_headers 已排序"""
+    canonical = "\n".join([
+        method,
+        path,
+        query_string,
+        "".join(f"{name}:{' '.join(headers[name].split())}\n" for name in signed_headers),
+        ";".join(signed_headers),
+        payload_hash,
+    ])
+    scope = f"{amz_date[:8]}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode()).hexdigest()])
+    key = ("AWS4" + secret_key).encode()
+    for part in (amz_date[:8], region, "s3", "aws4_request"):
+        key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+    return hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+
+def _error_details(raw: bytes) -> tuple[str, str]:
+    try:
+        root = ElementTree.fromstring(raw)
+    except ElementTree.ParseError:
+        return "UnknownError", raw[:200].decode("utf-8", "replace")
+    return root.findtext("{*}Code") or root.findtext("Code") or "UnknownError", \
+        root.findtext("{*}Message") or root.findtext("Message") or ""
+
+
+# ---------------------------------------------------------------------------
+# S3 客户端
+# ---------------------------------------------------------------------------
+
+class S3Client:
+    """路径风格（/桶/键）的最小 S3 客户端，线程安全：每个线程一个 keep-alive 连接，断开时重连重试一次"""
+
+    def __init__(self, endpoint: str, access_key: str, secret_key: str, region: str = REGION, timeout: float = 60.0):
+        parts = urllib.parse.urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self, fresh: bool = False) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and fresh:
+            conn.close()
+            conn = None
+        if conn is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = self._local.conn = factory(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _signed_headers(self, method: str, path: str, query: dict, payload_hash: str, extra: dict) -> dict:
+        amz_date = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        headers = {
+            "host": self.host_header,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+            **{name.lower(): value for name, value in extra.items()},
+        }
+        signed = sorted(headers)
+        sig = signature(self.secret_key, method, path, canonical_query(query), headers, signed, payload_hash,
+                        amz_date, self.region)
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{amz_date[:8]}/{self.region}/s3/aws4_request, "
+            f"SignedHeaders={';'.join(signed)}, Signature={sig}"
+        )
+        return headers
+
+    def request(self, method: str, bucket: str = "", key: str = "", query: Optional[dict] = None,
+                body: Union[bytes, BinaryIO, None] = None, headers: Optional[dict] = None,
+                payload_hash: str = EMPTY_SHA256) -> http.client.HTTPResponse:
+        """返回状态码 < 300 的响应（调用方负责读完响应体），否则读取错误信息并抛出 S3Error"""
+        query = query or {}
+        path = quote_path("/" + "/".join(part for part in (bucket, key) if part))
+        url = path + ("?" + canonical_query(query) if query else "")
+        for attempt in range(2):
+            if hasattr(body, "seek"):
+                body.seek(0)
+            conn = self._connection(fresh=attempt > 0)
+            try:
+                conn.request(method, url, body=body,
+                             headers=self._signed_headers(method, path, query, payload_hash, headers or {}))
+                response = conn.getresponse()
+                break
+            except (ConnectionError, http.client.HTTPException):
+                conn.close()
+                if attempt:
+                    raise
+        if response.status >= 300:
+            raise S3Error(response.status, *_error_details(response.read()))
+        return response
+
+    def list_buckets(self) -> list[str]:
+        root = ElementTree.fromstring(self.request("GET").read())
+        return [name.text for name in root.findall("{*}Buckets/{*}Bucket/{*}Name")]
+
+    def ensure_bucket(self, bucket: str):
+        try:
+            self.request("PUT", bucket).read()
+        except S3Error as e:
+            if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                raise
+
+    def list_objects(self, bucket: str, prefix: str = "") -> Iterator[S3Object]:
+        """ListObjectsV2 分页列出对象（按键的字节序）"""
+        token = None
+        while True:
+            query = {"list-type": "2", "max-keys": "1000"}
+            if prefix:
+                query["prefix"] = prefix
+            if token:
+                query["continuation-token"] = token
+            root = ElementTree.fromstring(self.request("GET", bucket, query=query).read())
+            for item in root.findall("{*}Contents"):
+                yield S3Object(
+                    key=item.findtext("{*}Key"),
+                    etag=(item.findtext("{*}ETag") or "").strip('"'),
+                    size=int(item.findtext("{*}Size") or 0),
+                    last_modified=item.findtext("{*}LastModified") or "",
+                )
+            token = root.findtext("{*}NextContinuationToken")
+            if root.findtext("{*}IsTruncated") != "true" or not token:
+                return
+
+    def download(self, bucket: str, key: str, dest: Path) -> tuple[int, str, str]:
+        """流式写入临时文件后改名为 dest，返回 (字节数, MD5, Content-Type)"""
+        response = self.request("GET", bucket, key)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + PART_SUFFIX)
+        md5 = hashlib.md5()
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                while chunk := response.read(CHUNK_SIZE):
+                    md5.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        return size, md5.hexdigest(), response.getheader("Content-Type") or ""
+
+    def upload(self, bucket: str, key: str, src: Path, content_type: str = "") -> str:
+        """单次 PUT 上传文件（内容不计算签名哈希），返回 ETag"""
+        headers = {"Content-Length": str(src.stat().st_size)}
+        if content_type:
+            headers["Content-Type"] = content_type
+        with open(src, "rb") as f:
+            response = self.request("PUT", bucket, key, body=f, headers=headers, payload_hash=UNSIGNED_PAYLOAD)
+            response.read()
+        return (response.getheader("ETag") or "").strip('"')
+
+    def delete(self, bucket: str, key: str = ""):
+        self.request("DELETE", bucket, key).read()
+
+
+def _env_file_values(env_file: Optional[Path]) -> dict[str, str]:
+    values = {}
+    if env_file is not None and env_file.exists():
+        for line in env_file.read_text(encoding="utf-8").splitlines():
+            name, sep, value = line.strip().partition("=")
+            if sep and not name.startswith("#"):
+                values[name.strip()] = value.split(" #")[0].strip().strip("\"'")
+    return values
+
+
+def client_from_env(env_file: Optional[Path] = None) -> S3Client:
+    """与 src/lib/minio.ts 相同的变量；进程环境变量优先于 env 文件，优先使用 MINIO_PRIMARY_ENDPOINT"""
+    values = {**_env_file_values(env_file), **os.environ}
+    endpoint = values.get("MINIO_PRIMARY_ENDPOINT")
+    if not endpoint:
+        scheme = "https" if values.get("MINIO_USE_SSL") == "true" else "http"
+        endpoint = f"{scheme}://{values.get('MINIO_ENDPOINT') or 'localhost'}:{values.get('MINIO_PORT') or '9000'}"
+    return S3Client(
+        endpoint,
+        values.get("MINIO_ACCESS_KEY") or values.get("MINIO_ROOT_USER") or "admin",
+        values.get("MINIO_SECRET_KEY") or values.get("MINIO_ROOT_PASSWORD") or "",
+    )
+
+
+def wait_until_ready(client: S3Client, timeout: float = 60.0, interval: float = 1.0):
+    """等待服务可用（例如恢复时 MinIO 刚启动）；认证失败等 S3 错误直接抛出"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.list_buckets()
+            return
+        except (OSError, http.client.HTTPException):
+            if time.monotonic() + interval > deadline:
+                raise
+            time.sleep(interval)
+
+
+# ---------------------------------------------------------------------------
+# 备份与恢复
+# ---------------------------------------------------------------------------
+
+def object_path(root: Path, bucket: str, key: str) -> Path:
+    """对象在备份目录中的路径；拒绝会逃出备份目录或无法作为文件保存的键"""
+    parts = key.split("/")
+    if not key or key.endswith("/") or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"无法保存为文件的对象键: {bucket}/{key}")
+    return root.joinpath(bucket, *parts)
+
+
+def load_index(index_file: Path) -> dict[str, dict[str, dict]]:
+    """{桶: {键: {etag, size, md5, contentType, lastModified}}}"""
+    return json.loads(index_file.read_text(encoding="utf-8"))["buckets"]
+
+
+def find_previous_index(backup_root: Path, exclude: Optional[Path] = None) -> Optional[Path]:
+    """backup_root 下最近一次完成（已写入 index.json）的对象备份"""
+    candidates = sorted(
+        path for path in backup_root.glob(f"backup-*/{OBJECTS_DIR}/{INDEX_FILE}")
+        if exclude is None or path.parent.parent.resolve() != exclude.resolve()
+    )
+    return candidates[-1] if candidates else None
+
+
+def _link_or_copy(source: Path, dest: Path):
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(source, dest)
+    except OSError:  # 跨文件系统或不支持硬链接
+        shutil.copy2(source, dest)
+
+
+def _bounded_map(workers: int, func, items: Iterable) -> Iterator[tuple]:
+    """线程池执行 func(*item)，同时在途的任务不超过 workers * 4，边列出边下载；按完成顺序产出 (item, 结果或异常)"""
+    semaphore = threading.BoundedSemaphore(workers * 4)
+    results: list[tuple] = []
+    lock = threading.Lock()
+
+    def run(item):
+        try:
+            outcome = func(*item)
+        except Exception as e:  # 单个对象失败不影响其他对象
+            outcome = e
+        finally:
+            semaphore.release()
+        with lock:
+            results.append((item, outcome))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3") as pool:
+        for item in items:
+            semaphore.acquire()
+            pool.submit(run, item)
+            with lock:
+                done, results[:] = results[:], []
+            yield from done
+    yield from results
+
+
+@traced("backup.minio_objects")
+def backup_objects(client: S3Client, session_dir: Path, buckets: Iterable[str] = DEFAULT_BUCKETS,
+                   workers: int = DEFAULT_WORKERS, previous_index: Optional[Path] = None) -> dict:
+    """
+    把各桶的对象备份到 session_dir/minio-objects：ETag 与大小和上一次索引相同且文件仍在的对象硬链接，
+    其余下载（非分段上传的对象校验 MD5）。失败的对象不写入索引，下次备份会重新下载
+    """
+    target = session_dir / OBJECTS_DIR
+    previous = load_index(previous_index) if previous_index else {}
+    previous_root = previous_index.parent if previous_index else None
+    report = {"previous": str(previous_index) if previous_index else None, "objects": 0, "bytes": 0,
+              "downloaded": 0, "downloaded_bytes": 0, "linked": 0, "failed": [], "skipped": []}
+    index: dict[str, dict[str, dict]] = {}
+    started = time.perf_counter()
+
+    def fetch(bucket: str, obj: S3Object) -> tuple[dict, bool]:
+        dest = object_path(target, bucket, obj.key)
+        old = previous.get(bucket, {}).get(obj.key)
+        if old and old["etag"] == obj.etag and old["size"] == obj.size:
+            source = object_path(previous_root, bucket, obj.key)
+            if source.is_file() and source.stat().st_size == obj.size:
+                _link_or_copy(source, dest)
+                return {**old, "lastModified": obj.last_modified}, False
+        size, md5, content_type = client.download(bucket, obj.key, dest)
+        if size != obj.size or ("-" not in obj.etag and md5 != obj.etag):
+            dest.unlink(missing_ok=True)
+            raise ValueError(f"下载内容与列表不一致（{size} 字节，MD5 {md5}）")
+        return {"etag": obj.etag, "size": size, "md5": md5, "contentType": content_type,
+                "lastModified": obj.last_modified}, True
+
+    def listed() -> Iterator[tuple[str, S3Object]]:
+        for bucket in buckets:
+            index[bucket] = {}
+            for obj in client.list_objects(bucket):
+                try:
+                    object_path(target, bucket, obj.key)
+                except ValueError:
+                    report["skipped"].append(f"{bucket}/{obj.key}")
+                    continue
+                yield bucket, obj
+
+    for (bucket, obj), outcome in _bounded_map(workers, fetch, listed()):
+        if isinstance(outcome, Exception):
+            report["failed"].append({"object": f"{bucket}/{obj.key}", "error": str(outcome)})
+            continue
+        entry, downloaded = outcome
+        index[bucket][obj.key] = entry
+        report["objects"] += 1
+        report["bytes"] += entry["size"]
+        if downloaded:
+            report["downloaded"] += 1
+            report["downloaded_bytes"] += entry["size"]
+        else:
+            report["linked"] += 1
+
+    target.mkdir(parents=True, exist_ok=True)
+    index_file = target / INDEX_FILE
+    tmp = index_file.with_name(INDEX_FILE + ".tmp")
+    tmp.write_text(json.dumps({
+        "createdAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "endpoint": client.endpoint,
+        "buckets": {bucket: dict(sorted(objects.items())) for bucket, objects in index.items()},
+    }, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, index_file)
+    report["index"] = str(index_file)
+    report["duration"] = time.perf_counter() - started
+    annotate(bytes=report["downloaded_bytes"], objects=report["objects"])
+    return report
+
+
+@traced("restore.minio_objects")
+def restore_objects(client: S3Client, session_dir: Path, buckets: Optional[Iterable[str]] = None,
+                    workers: int = DEFAULT_WORKERS) -> dict:
+    """把备份目录中的对象并发上传回各桶；目标中大小相同且 ETag 等于原 ETag 或内容 MD5 的对象跳过"""
+    index = load_index(session_dir / OBJECTS_DIR / INDEX_FILE)
+    wanted = set(buckets) if buckets is not None else set(index)
+    report = {"uploaded": 0, "uploaded_bytes": 0, "unchanged": 0, "failed": []}
+    started = time.perf_counter()
+
+    def pending() -> Iterator[tuple[str, str, dict]]:
+        for bucket, objects in index.items():
+            if bucket not in wanted:
+                continue
+            client.ensure_bucket(bucket)
+            existing = {obj.key: obj for obj in client.list_objects(bucket)}
+            for key, entry in objects.items():
+                current = existing.get(key)
+                if current and current.size == entry["size"] and current.etag in (entry["etag"], entry.get("md5")):
+                    report["unchanged"] += 1
+                    continue
+                yield bucket, key, entry
+
+    def upload(bucket: str, key: str, entry: dict) -> int:
+        client.upload(bucket, key, object_path(session_dir / OBJECTS_DIR, bucket, key), entry.get("contentType", ""))
+        return entry["size"]
+
+    for (bucket, key, _), outcome in _bounded_map(workers, upload, pending()):
+        if isinstance(outcome, Exception):
+            report["failed"].append({"object": f"{bucket}/{key}", "error": str(outcome)})
+        else:
+            report["uploaded"] += 1
+            report["uploaded_bytes"] += outcome
+    report["duration"] = time.perf_counter() - started
+    annotate(bytes=report["uploaded_bytes"], objects=report["uploaded"])
+    return report
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+EHS 系统运行指标采集
+compose 与 check_service_health 只看 /api/health 能否返回，这里作为旁路进程按各自的间隔采样：
+- 健康检查端点延迟与成功率
+- docker stats 中 ehs-app、ehs-minio 的 CPU 与内存
+- ehs.db 与 WAL 文件大小、MinIO 数据目录大小、距最近一次完整备份的时间
+- 采集器自身（含子进程）的 CPU 占用
+
+样本写入固定大小的内存映射环形缓冲文件，文件大小不随运行时间增长，写入只是一次内存拷贝；
+status 只映射并读取最近窗口内的槽位，不需要解析日志即可输出分位数与趋势。
+
+python3 scripts/ops_metrics.py collect            # 常驻采集（--once 只采一次，适合 cron）
+python3 scripts/ops_metrics.py status --minutes 60
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import mmap
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+
+from db_preflight import find_database, wal_file
+from deploy_checks import percentile
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只统计本进程 CPU
+    resource = None
+
+
+HEALTH_URL = "http://localhost:3000/api/health"
+CONTAINERS = {"app": "ehs-app", "minio": "ehs-minio"}
+RING_FILE = Path("data/ops-metrics.ring")
+MINIO_DATA_DIR = Path("data/minio-data")
+BACKUP_DIR = Path("backups")
+DEFAULT_CAPACITY = 40_320  # 15 秒一个样本约 7 天
+CPU_BUDGET_PCT = 1.0
+BACKUP_MAX_AGE_H = 26  # 每日备份，允许晚一点
+TICK_SLACK = 0.5  # 即将到期的采样合并到本次，避免几毫秒后再唤醒一次
+
+MAGIC = b"EHSRING1"
+VERSION = 1
+HEADER_SIZE = 1024
+# magic, version, 字段数, 容量, 已写入样本数；其后是 JSON 格式的字段名（用 NUL 补齐到 HEADER_SIZE）
+HEADER = struct.Struct("<8sIIIxxxxQ")
+MISSING = float("nan")
+
+
+@dataclass(frozen=True)
+class Metric:
+    name: str
+    label: str
+    unit: str
+    kind: str = "gauge"  # gauge: 比较前后半段均值；growth: 按小时增长率
+
+
+METRICS = [
+    Metric("health_ms", "健康检查延迟", "ms"),
+    Metric("health_ok", "健康检查成功", ""),
+    Metric("app_cpu", "ehs-app CPU", "%"),
+    Metric("app_mem_mb", "ehs-app 内存", "MB"),
+    Metric("minio_cpu", "ehs-minio CPU", "%"),
+    Metric("minio_mem_mb", "ehs-minio 内存", "MB"),
+    Metric("db_mb", "ehs.db", "MB", "growth"),
+    Metric("wal_mb", "ehs.db-wal", "MB"),
+    Metric("minio_data_mb", "MinIO 数据目录", "MB", "growth"),
+    Metric("backup_age_h", "距上次备份", "h"),
+    Metric("collector_cpu", "采集器 CPU", "%"),
+]
+FIELDS = [metric.name for metric in METRICS]
+
+
+# ---------------------------------------------------------------------------
+# 环形缓冲文件
+# ---------------------------------------------------------------------------
+
+class MetricsRing:
+    """
+    固定大小的内存映射环形缓冲：头部 + capacity 个槽位，每个槽位是 (序号, 时间戳, 各字段值)。
+    写入时先把槽位序号清零、写数据、最后写序号并更新头部计数，
+    读取方按序号校验槽位，读到正在被覆盖的槽位时直接跳过，不需要加锁
+    """
+
+    def __init__(self, path: Path, fields: list[str], capacity: int, writable: bool):
+        self.path = path
+        self.fields = fields
+        self.capacity = capacity
+        self.slot = struct.Struct(f"<Qd{len(fields)}d")
+        self._file = open(path, "r+b" if writable else "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+    @classmethod
+    def create(cls, path: Path, fields: list[str] = FIELDS, capacity: int = DEFAULT_CAPACITY) -> "MetricsRing":
+        names = json.dumps(fields).encode()
+        if HEADER.size + len(names) > HEADER_SIZE:
+            raise ValueError("字段名过长，无法写入环形缓冲头部")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        slot_size = struct.calcsize(f"<Qd{len(fields)}d")
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(fields), capacity, 0) + names)
+            f.truncate(HEADER_SIZE + slot_size * capacity)
+        os.replace(tmp, path)
+        return cls(path, fields, capacity, writable=True)
+
+    @classmethod
+    def open(cls, path: Path, writable: bool = False) -> "MetricsRing":
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+            raise ValueError(f"不是指标环形缓冲文件: {path}")
+        _, version, field_count, capacity, _ = HEADER.unpack_from(header)
+        if version != VERSION:
+            raise ValueError(f"不支持的环形缓冲版本: {version}")
+        fields = json.loads(header[HEADER.size:].rstrip(b"\0"))
+        if len(fields) != field_count:
+            raise ValueError(f"环形缓冲头部损坏: {path}")
+        return cls(path, fields, capacity, writable)
+
+    @classmethod
+    def open_for_writing(cls, path: Path, capacity: int = DEFAULT_CAPACITY) -> "MetricsRing":
+        """字段或容量与现有文件不同时把旧文件改名为 .old 后重建"""
+        if path.exists():
+            try:
+                ring = cls.open(path, writable=True)
+                if ring.fields == FIELDS and ring.capacity == capacity:
+                    return ring
+                ring.close()
+            except ValueError:
+                pass
+            os.replace(path, path.with_name(path.name + ".old"))
+        return cls.create(path, FIELDS, capacity)
+
+    @property
+    def written(self) -> int:
+        return HEADER.unpack_from(self._map)[4]
+
+    def _offset(self, seq: int) -> int:
+        return HEADER_SIZE + ((seq - 1) % self.capacity) * self.slot.size
+
+    def append(self, timestamp: float, values: dict[str, float]):
+        seq = self.written + 1
+        offset = self._offset(seq)
+        struct.pack_into("<Q", self._map, offset, 0)
+        self.slot.pack_into(self._map, offset, 0, timestamp, *(values.get(name, MISSING) for name in self.fields))
+        struct.pack_into("<Q", self._map, offset, seq)
+        struct.pack_into("<Q", self._map, HEADER.size - 8, seq)
+
+    def samples(self, since: Optional[float] = None, limit: Optional[int] = None) -> list[tuple[float, dict]]:
+        """按时间顺序返回 since 之后的样本，从最新的槽位往回读，遇到更早的样本就停止"""
+        written = self.written
+        oldest = max(1, written - self.capacity + 1)
+        if limit is not None:
+            oldest = max(oldest, written - limit + 1)
+        found = []
+        for seq in range(written, oldest - 1, -1):
+            slot_seq, timestamp, *values = self.slot.unpack_from(self._map, self._offset(seq))
+            if slot_seq != seq:
+                continue
+            if since is not None and timestamp < since:
+                break
+            found.append((timestamp, dict(zip(self.fields, values))))
+        found.reverse()
+        return found
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "MetricsRing":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------------------
+# 采样
+# ---------------------------------------------------------------------------
+
+def sample_health(url: str, timeout: float = 5.0) -> dict[str, float]:
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            response.read()
+            ok = 200 <= response.status < 300
+    except (urllib.error.URLError, OSError, ValueError):
+        return {"health_ms": MISSING, "health_ok": 0.0}
+    return {"health_ms": (time.perf_counter() - started) * 1000, "health_ok": float(ok)}
+
+
+_SIZE_UNITS = {"b": 1, "kb": 1e3, "mb": 1e6, "gb": 1e9, "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3}
+
+
+def parse_size(text: str) -> float:
+    """docker stats 的 "123.4MiB" -> 字节数"""
+    text = text.strip()
+    number = text.rstrip("BbKkMmGgIi")
+    return float(number) * _SIZE_UNITS.get(text[len(number):].lower(), 1)
+
+
+def parse_docker_stats(output: str, containers: dict[str, str] = CONTAINERS) -> dict[str, float]:
+    """解析 docker stats --format '{{json .}}' 的输出，容器不存在时对应字段为 NaN"""
+    by_name = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if line:
+            entry = json.loads(line)
+            by_name[entry.get("Name")] = entry
+    values = {}
+    for key, name in containers.items():
+        entry = by_name.get(name)
+        if entry is None:
+            values[f"{key}_cpu"] = values[f"{key}_mem_mb"] = MISSING
+            continue
+        values[f"{key}_cpu"] = float(entry["CPUPerc"].rstrip("%") or "nan")
+        values[f"{key}_mem_mb"] = parse_size(entry["MemUsage"].split("/")[0]) / 1024 ** 2
+    return values
+
+
+def sample_docker(containers: dict[str, str] = CONTAINERS, timeout: float = 30.0) -> dict[str, float]:
+    # 常驻进程不经过 ops_runner：它会把每条命令记入 COMMAND_HISTORY，长时间运行会一直增长
+    if shutil.which("docker") is None:
+        return parse_docker_stats("", containers)
+    try:
+        result = subprocess.run(
+            ["docker", "stats", "--no-stream", "--format", "{{json .}}", *containers.values()],
+            capture_output=True, text=True, timeout=timeout,
+        )
+    except (subprocess.TimeoutExpired, OSError):
+        return parse_docker_stats("", containers)
+    # 某个容器不存在时 docker stats 返回非零，但仍会输出存在的容器
+    return parse_docker_stats(result.stdout, containers)
+
+
+def sample_database(db_file: Optional[Path]) -> dict[str, float]:
+    if db_file is None or not db_file.exists():
+        return {"db_mb": MISSING, "wal_mb": MISSING}
+    wal = wal_file(db_file)
+    return {
+        "db_mb": db_file.stat().st_size / 1024 ** 2,
+        "wal_mb": wal.stat().st_size / 1024 ** 2 if wal.exists() else 0.0,
+    }
+
+
+def directory_size(root: Path) -> int:
+    total = 0
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+def sample_minio_data(minio_data: Path) -> dict[str, float]:
+    if not minio_data.is_dir():
+        return {"minio_data_mb": MISSING}
+    return {"minio_data_mb": directory_size(minio_data) / 1024 ** 2}
+
+
+def sample_backup_age(backup_dir: Path, now: Optional[float] = None) -> dict[str, float]:
+    """docker_backup.py 最后写 backup-manifest.txt，以最新一份清单的时间作为最近一次完整备份"""
+    manifests = [path.stat().st_mtime for path in backup_dir.glob("backup-*/backup-manifest.txt")]
+    if not manifests:
+        return {"backup_age_h": MISSING}
+    return {"backup_age_h": ((now or time.time()) - max(manifests)) / 3600}
+
+
+def cpu_seconds() -> float:
+    """本进程与已回收子进程（docker stats）的 CPU 时间"""
+    total = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+@dataclass
+class Sampler:
+    name: str
+    interval: float
+    sample: Callable[[], dict[str, float]]
+    next_due: float = 0.0
+
+
+def build_samplers(args: argparse.Namespace) -> list[Sampler]:
+    db_file = find_database(args.db)
+    minio_data, backup_dir = Path(args.minio_data), Path(args.backup_dir)
+    return [
+        Sampler("health", args.health_interval, lambda: sample_health(args.health_url)),
+        Sampler("docker", args.docker_interval, sample_docker),
+        Sampler("database", args.file_interval, lambda: sample_database(db_file)),
+        Sampler("backup", args.file_interval, lambda: sample_backup_age(backup_dir)),
+        Sampler("minio", args.minio_interval, lambda: sample_minio_data(minio_data)),
+    ]
+
+
+def collect(ring: MetricsRing, samplers: list[Sampler], once: bool = False,
+            sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+    """
+    每次有采样到期就写一个样本，只包含到期的字段，其余为 NaN。
+    采集器 CPU = 上一次写入到这一次写入之间（含休眠）本进程与子进程的 CPU 时间 / 墙钟时间，第一个样本没有该字段
+    """
+    last_wall = last_cpu = None
+    while True:
+        now = clock()
+        values: dict[str, float] = {}
+        for sampler in samplers:
+            if sampler.next_due <= now + TICK_SLACK:
+                try:
+                    values.update(sampler.sample())
+                except Exception as e:  # 单个采样失败不影响其他指标
+                    print(f"⚠️  采样 {sampler.name} 失败: {e}", file=sys.stderr)
+                sampler.next_due = now + sampler.interval
+        wall, cpu = clock(), cpu_seconds()
+        if last_wall is not None and wall > last_wall:
+            values["collector_cpu"] = (cpu - last_cpu) / (wall - last_wall) * 100
+        last_wall, last_cpu = wall, cpu
+        ring.append(time.time(), values)
+        if once:
+            return
+        sleep(max(0.0, min(s.next_due for s in samplers) - clock()))
+
+
+# ---------------------------------------------------------------------------
+# 状态输出
+# ---------------------------------------------------------------------------
+
+SPARK = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(points: list[tuple[float, float]], since: float, until: float, width: int = 12) -> str:
+    """把窗口等分成 width 段，每段取均值；没有样本的段留空"""
+    buckets: list[list[float]] = [[] for _ in range(width)]
+    span = max(until - since, 1e-9)
+    for timestamp, value in points:
+        buckets[min(width - 1, max(0, int((timestamp - since) / span * width)))].append(value)
+    means = [sum(b) / len(b) if b else None for b in buckets]
+    present = [m for m in means if m is not None]
+    if not present:
+        return ""
+    low, high = min(present), max(present)
+    scale = (len(SPARK) - 1) / (high - low) if high > low else 0
+    return "".join(" " if m is None else SPARK[round((m - low) * scale)] for m in means)
+
+
+def summarize(samples: list[tuple[float, dict]], since: float, until: float) -> dict[str, dict]:
+    """每个字段的样本数、最新值、p50/p95/max 与趋势（gauge: 后半段相对前半段的变化；growth: 每小时增量）"""
+    summary = {}
+    for metric in METRICS:
+        points = [(ts, values[metric.name]) for ts, values in samples
+                  if metric.name in values and not math.isnan(values[metric.name])]
+        if not points:
+            continue
+        ordered = sorted(value for _, value in points)
+        entry = {
+            "count": len(points),
+            "last": points[-1][1],
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "max": ordered[-1],
+            "spark": sparkline(points, since, until),
+            "trend": None,
+        }
+        if metric.kind == "growth":
+            hours = (points[-1][0] - points[0][0]) / 3600
+            if hours > 0:
+                entry["trend"] = (points[-1][1] - points[0][1]) / hours
+        elif len(points) >= 4:
+            half = len(points) // 2
+            before = sum(v for _, v in points[:half]) / half
+            after = sum(v for _, v in points[half:]) / (len(points) - half)
+            if before:
+                entry["trend"] = (after - before) / abs(before)
+        summary[metric.name] = entry
+    return summary
+
+
+def _format(value: float) -> str:
+    return f"{value:.0f}" if abs(value) >= 100 else f"{value:.2f}"
+
+
+def print_status(ring_path: Path, minutes: float, now: Optional[float] = None) -> int:
+    if not ring_path.exists():
+        print(f"❌ 未找到指标文件: {ring_path}，请先运行 collect")
+        return 1
+    now = now or time.time()
+    since = now - minutes * 60
+    with closing(MetricsRing.open(ring_path)) as ring:
+        samples = ring.samples(since=since)
+    print(f"\n📈 运行指标: {ring_path}（最近 {minutes:g} 分钟，{len(samples)} 个样本）")
+    if not samples:
+        print("   （窗口内没有样本，采集器是否在运行？）")
+        return 0
+    summary = summarize(samples, since, now)
+    print(f"   {'指标':<16}{'最新':>10}{'p50':>10}{'p95':>10}{'max':>10}  {'趋势':<12}{'变化':>10}")
+    for metric in METRICS:
+        entry = summary.get(metric.name)
+        if entry is None:
+            continue
+        label = f"{metric.label} ({metric.unit})" if metric.unit else metric.label
+        if entry["trend"] is None:
+            change = "-"
+        elif metric.kind == "growth":
+            change = f"{entry['trend']:+.2f}/h"
+        else:
+            change = f"{entry['trend']:+.0%}"
+        print(f"   {label:<18}{_format(entry['last']):>10}{_format(entry['p50']):>10}{_format(entry['p95']):>10}"
+              f"{_format(entry['max']):>10}  {entry['spark']:<12}{change:>10}")
+
+    warnings = []
+    failed = sum(1 for _, values in samples if values.get("health_ok") == 0)
+    if failed:
+        last_failed = summary["health_ok"]["last"] < 1
+        warnings.append(f"健康检查失败 {failed} 次{'，最近一次失败' if last_failed else ''}")
+    backup = summary.get("backup_age_h")
+    if backup and backup["last"] > BACKUP_MAX_AGE_H:
+        warnings.append(f"最近一次备份在 {backup['last']:.0f} 小时前")
+    collector = summary.get("collector_cpu")
+    if collector and collector["p50"] > CPU_BUDGET_PCT:
+        warnings.append(f"采集器 CPU p50 {collector['p50']:.2f}% 超过 {CPU_BUDGET_PCT:g}%，请调大采样间隔")
+    for warning in warnings:
+        print(f"   ⚠️  {warning}")
+    return 0
+
+
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+def run_collect(args: argparse.Namespace) -> int:
+    ring_path = Path(args.ring)
+    samplers = build_samplers(args)
+    with MetricsRing.open_for_writing(ring_path, capacity=args.capacity) as ring:
+        if not args.once:
+            print(f"📡 开始采集运行指标: {ring_path}（{ring.capacity} 个槽位，已写入 {ring.written} 个样本）")
+        try:
+            collect(ring, samplers, once=args.once)
+        except KeyboardInterrupt:
+            print("\n⏹️  采集已停止")
+    return 0
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="EHS 系统运行指标采集与状态")
+    parser.add_argument("--ring", type=str, default=str(RING_FILE), help=f"环形缓冲文件 (默认: {RING_FILE})")
+    subparsers = parser.add_subparsers(dest="command", help="命令")
+
+    collect_parser = subparsers.add_parser("collect", help="按间隔采样并写入环形缓冲")
+    collect_parser.add_argument("--once", action="store_true", help="所有指标各采一次后退出")
+    collect_parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY,
+                                help=f"槽位数，与现有文件不同时重建 (默认: {DEFAULT_CAPACITY})")
+    collect_parser.add_argument("--health-url", type=str, default=HEALTH_URL, help=f"健康检查地址 (默认: {HEALTH_URL})")
+    collect_parser.add_argument("--health-interval", type=float, default=15, help="健康检查间隔秒数 (默认: 15)")
+    collect_parser.add_argument("--docker-interval", type=float, default=60, help="docker stats 间隔秒数 (默认: 60)")
+    collect_parser.add_argument("--file-interval", type=float, default=60, help="数据库与备份检查间隔秒数 (默认: 60)")
+    collect_parser.add_argument("--minio-interval", type=float, default=900, help="MinIO 目录统计间隔秒数 (默认: 900)")
+    collect_parser.add_argument("--db", type=str, help="数据库文件路径 (默认: data/db/ehs.db)")
+    collect_parser.add_argument("--minio-data", type=str, default=str(MINIO_DATA_DIR),
+                                help=f"MinIO 数据目录 (默认: {MINIO_DATA_DIR})")
+    collect_parser.add_argument("--backup-dir", type=str, default=str(BACKUP_DIR), help=f"备份目录 (默认: {BACKUP_DIR})")
+    collect_parser.set_defaults(func=run_collect)
+
+    status_parser = subparsers.add_parser("status", help="输出最近窗口内各指标的分位数与趋势")
+    status_parser.add_argument("--minutes", type=float, default=60, help="统计窗口分钟数 (默认: 60)")
+    status_parser.set_defaults(func=lambda args: print_status(Path(args.ring), args.minutes))
+
+    args = parser.parse_args(argv)
+    if not getattr(args, "func", None):
+        parser.print_help()
+        return 1
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+EHS 系统蓝绿部署前置代理
+监听对外端口，将新连接转发到状态文件中记录的活跃容器；
+切换状态文件后，新连接立即进入新容器，旧连接在原容器上自然排空
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from pathlib import Path
+from typing import Optional
+
+
+STATUS_INTERVAL = 0.5
+
+
+def parse_address(value: str) -> tuple[str, int]:
+    """解析 host:port（仅端口时默认监听所有地址）"""
+    host, _, port = value.rpartition(":")
+    return (host or "0.0.0.0", int(port))
+
+
+def write_json_atomic(path: Path, data: dict):
+    """先写临时文件再替换，保证读取方不会看到半截内容"""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class UpstreamSelector:
+    """按状态文件的修改时间懒加载当前上游，每个新连接只做一次 stat"""
+
+    def __init__(self, state_file: Path):
+        self.state_file = state_file
+        self.upstream: Optional[str] = None
+        self._mtime: Optional[int] = None
+
+    def current(self) -> Optional[str]:
+        try:
+            mtime = self.state_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self.upstream
+        if mtime != self._mtime:
+            try:
+                state = json.loads(self.state_file.read_text(encoding="utf-8"))
+            except (OSError, json.JSONDecodeError):
+                return self.upstream
+            self._mtime = mtime
+            if state.get("upstream") != self.upstream:
+                print(f"🔀 上游切换: {self.upstream} -> {state.get('upstream')}", flush=True)
+            self.upstream = state.get("upstream")
+        return self.upstream
+
+
+class ConnectionTracker:
+    """统计每个上游的活动连接数，并定期写入状态文件供部署脚本判断排空"""
+
+    def __init__(self, status_file: Path):
+        self.status_file = status_file
+        self.active: dict[str, int] = {}
+        self.total = 0
+        self._dirty = True
+
+    def opened(self, upstream: str):
+        self.active[upstream] = self.active.get(upstream, 0) + 1
+        self.total += 1
+        self._dirty = True
+
+    def closed(self, upstream: str):
+        self.active[upstream] -= 1
+        self._dirty = True
+
+    def flush(self, current: Optional[str]):
+        if not self._dirty:
+            return
+        self._dirty = False
+        write_json_atomic(self.status_file, {
+            "pid": os.getpid(),
+            "upstream": current,
+            "connections": {k: v for k, v in self.active.items() if v > 0},
+            "total": self.total,
+        })
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def handle_client(
+    client_reader: asyncio.StreamReader,
+    client_writer: asyncio.StreamWriter,
+    selector: UpstreamSelector,
+    tracker: ConnectionTracker,
+):
+    upstream = selector.current()
+    if not upstream:
+        client_writer.close()
+        return
+
+    host, port = parse_address(upstream)
+    try:
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+    except OSError:
+        client_writer.close()
+        return
+
+    tracker.opened(upstream)
+    try:
+        await asyncio.gather(
+            _pipe(client_reader, upstream_writer),
+            _pipe(upstream_reader, client_writer),
+        )
+    finally:
+        tracker.closed(upstream)
+        for writer in (upstream_writer, client_writer):
+            writer.close()
+
+
+async def serve(listen: str, state_file: Path, status_file: Path, pid_file: Optional[Path]):
+    selector = UpstreamSelector(state_file)
+    tracker = ConnectionTracker(status_file)
+    host, port = parse_address(listen)
+
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(r, w, selector, tracker),
+        host, port, reuse_address=True,
+    )
+    if pid_file:
+        pid_file.write_text(str(os.getpid()), encoding="utf-8")
+    print(f"🚀 代理已启动: {listen} -> {selector.current()}", flush=True)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    async with server:
+        while not stop.is_set():
+            tracker.flush(selector.current())
+            try:
+                await asyncio.wait_for(stop.wait(), STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    if pid_file and pid_file.exists():
+        pid_file.unlink()
+    print("🛑 代理已停止", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统蓝绿部署前置代理")
+    parser.add_argument("--listen", default="0.0.0.0:3000", help="监听地址 (默认: 0.0.0.0:3000)")
+    parser.add_argument("--state-file", required=True, help="记录当前上游的状态文件")
+    parser.add_argument("--status-file", help="连接统计输出文件 (默认: <state-file>.status)")
+    parser.add_argument("--pid-file", help="PID 文件路径")
+    args = parser.parse_args()
+
+    state_file = Path(args.state_file)
+    status_file = Path(args.status_file) if args.status_file else state_file.with_name(state_file.name + ".status")
+    pid_file = Path(args.pid_file) if args.pid_file else None
+
+    try:
+        asyncio.run(serve(args.listen, state_file, status_file, pid_file))
+    except OSError as e:
+        sys.exit(f"ERROR: 代理启动失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+EHS 运维脚本公共命令执行器
+基于 asyncio 的子进程执行：按行或按字节块流式输出、并发执行互不依赖的命令、
+超时与取消，并记录每条命令的耗时与退出码
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+from ops_trace import subprocess_span
+
+Output = Union[str, bytes]
+OutputHandler = Callable[[str, Output], None]
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class CommandResult:
+    """命令执行结果，字段与 subprocess.CompletedProcess 保持兼容"""
+
+    args: list[str]
+    returncode: Optional[int] = None
+    stdout: Output = ""
+    stderr: Output = ""
+    duration: float = 0.0
+    bytes_out: int = 0
+    bytes_err: int = 0
+    timed_out: bool = False
+    cancelled: bool = False
+    started_at: float = field(default_factory=time.time)
+
+    def check_returncode(self):
+        if self.returncode != 0:
+            raise subprocess.CalledProcessError(self.returncode, self.args, self.stdout, self.stderr)
+
+
+# 本进程内执行过的所有命令，供脚本结束时汇总耗时
+COMMAND_HISTORY: list[CommandResult] = []
+
+
+class _LineSplitter:
+    """把字节块增量解码并切分成完整的行，残留部分留到下一块"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def feed(self, chunk: bytes) -> list[str]:
+        self._pending += self._decoder.decode(chunk)
+        *lines, self._pending = self._pending.split("\n")
+        return [line + "\n" for line in lines]
+
+    def flush(self) -> list[str]:
+        tail = self._pending + self._decoder.decode(b"", final=True)
+        self._pending = ""
+        return [tail] if tail else []
+
+
+async def _pump(
+    stream: asyncio.StreamReader,
+    name: str,
+    result: CommandResult,
+    on_output: Optional[OutputHandler],
+    capture: bool,
+    binary: bool,
+    chunk_size: int,
+):
+    captured: list[Output] = []
+    splitter = None if binary else _LineSplitter()
+    while True:
+        chunk = await stream.read(chunk_size)
+        if not chunk:
+            break
+        if name == "stdout":
+            result.bytes_out += len(chunk)
+        else:
+            result.bytes_err += len(chunk)
+        pieces = [chunk] if binary else splitter.feed(chunk)
+        for piece in pieces:
+            if on_output:
+                on_output(name, piece)
+            if capture:
+                captured.append(piece)
+    if splitter:
+        for piece in splitter.flush():
+            if on_output:
+                on_output(name, piece)
+            if capture:
+                captured.append(piece)
+
+    if capture:
+        setattr(result, name, (b"" if binary else "").join(captured))
+
+
+async def _feed_stdin(process: asyncio.subprocess.Process, chunks: Iterable[bytes]):
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk)
+            await process.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        pass
+    finally:
+        process.stdin.close()
+
+
+async def _terminate(process: asyncio.subprocess.Process, grace: float = 5.0):
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), grace)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def stream_command(
+    cmd: list[str],
+    *,
+    on_output: Optional[OutputHandler] = None,
+    capture: bool = True,
+    binary: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+    timeout: Optional[float] = None,
+    cwd: Optional[Union[str, Path]] = None,
+    env: Optional[dict[str, str]] = None,
+) -> CommandResult:
+    """
+    执行命令并流式处理输出：
+    - on_output(stream_name, piece) 在每一行（文本模式）或每个字节块（binary=True）到达时调用
+    - capture=False 时不在内存中保留输出，适合 docker logs / docker save 这类大输出
+    - stdin_chunks 可逐块写入标准输入，例如边解压边 docker load
+    - 超时或被取消时先 SIGTERM，宽限期后 SIGKILL
+    """
+    result = CommandResult(args=[str(part) for part in cmd])
+    COMMAND_HISTORY.append(result)
+    with subprocess_span(result.args) as trace_args:
+        try:
+            await _execute(result, on_output, capture, binary, chunk_size, stdin_chunks, timeout, cwd, env)
+        finally:
+            trace_args.update(
+                returncode=result.returncode,
+                bytes=result.bytes_out,
+                bytes_err=result.bytes_err,
+                timed_out=result.timed_out,
+            )
+    return result
+
+
+async def _execute(
+    result: CommandResult,
+    on_output: Optional[OutputHandler],
+    capture: bool,
+    binary: bool,
+    chunk_size: int,
+    stdin_chunks: Optional[Iterable[bytes]],
+    timeout: Optional[float],
+    cwd: Optional[Union[str, Path]],
+    env: Optional[dict[str, str]],
+):
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *result.args,
+        stdin=subprocess.PIPE if stdin_chunks is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+
+    tasks = [
+        asyncio.ensure_future(_pump(process.stdout, "stdout", result, on_output, capture, binary, chunk_size)),
+        asyncio.ensure_future(_pump(process.stderr, "stderr", result, on_output, capture, binary, chunk_size)),
+    ]
+    if stdin_chunks is not None:
+        tasks.append(asyncio.ensure_future(_feed_stdin(process, stdin_chunks)))
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks, process.wait()), timeout)
+    except asyncio.TimeoutError:
+        result.timed_out = True
+        await _terminate(process)
+    except asyncio.CancelledError:
+        result.cancelled = True
+        await _terminate(process)
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+        result.returncode = process.returncode
+        result.duration = time.perf_counter() - started
+
+
+def echo_output(stream_name: str, piece: Output):
+    """把子进程输出原样转发到当前终端"""
+    target = sys.stderr if stream_name == "stderr" else sys.stdout
+    if isinstance(piece, bytes):
+        target.buffer.write(piece)
+    else:
+        target.write(piece)
+    target.flush()
+
+
+def _check(result: CommandResult, check: bool, timeout: Optional[float]):
+    if result.timed_out:
+        raise subprocess.TimeoutExpired(result.args, timeout, result.stdout, result.stderr)
+    if check:
+        result.check_returncode()
+
+
+def run_command(
+    cmd: list[str],
+    check: bool = True,
+    *,
+    echo: bool = True,
+    stream: bool = False,
+    capture: bool = True,
+    timeout: Optional[float] = None,
+    on_output: Optional[OutputHandler] = None,
+    **kwargs,
+) -> CommandResult:
+    """
+    同步执行单条命令（各运维脚本的统一入口）
+    - echo: 执行前打印命令
+    - stream: 实时把输出转发到终端，而不是等命令结束
+    - 其余参数同 stream_command
+    """
+    if echo:
+        print(f"+ {' '.join(str(part) for part in cmd)}", flush=True)
+    handler = on_output or (echo_output if stream else None)
+    result = asyncio.run(stream_command(cmd, on_output=handler, capture=capture, timeout=timeout, **kwargs))
+    _check(result, check, timeout)
+    return result
+
+
+def run_commands(
+    cmds: list[list[str]],
+    check: bool = True,
+    *,
+    limit: Optional[int] = None,
+    timeout: Optional[float] = None,
+    echo: bool = True,
+    **kwargs,
+) -> list[CommandResult]:
+    """
+    并发执行多条互不依赖的命令，按输入顺序返回结果
+    - limit: 同时运行的最大命令数
+    - check=True 时任一命令失败会取消其余仍在运行的命令并抛出异常
+    """
+
+    async def _run_all() -> list[CommandResult]:
+        semaphore = asyncio.Semaphore(limit or len(cmds) or 1)
+
+        async def _one(cmd: list[str]) -> CommandResult:
+            async with semaphore:
+                if echo:
+                    print(f"+ {' '.join(str(part) for part in cmd)}", flush=True)
+                result = await stream_command(cmd, timeout=timeout, **kwargs)
+                _check(result, check, timeout)
+                return result
+
+        tasks = [asyncio.ensure_future(_one(cmd)) for cmd in cmds]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    return asyncio.run(_run_all())
+
+
+def run_parallel(*funcs: Callable[[], object]) -> list[object]:
+    """在线程中并发执行多个互不依赖的步骤函数，返回结果或异常对象（按输入顺序）"""
+
+    async def _run_all():
+        return await asyncio.gather(*(asyncio.to_thread(func) for func in funcs), return_exceptions=True)
+
+    return asyncio.run(_run_all())
+
+
+class BackgroundCommand:
+    """在后台线程中持续运行命令（如 docker events），stop() 时取消并结束子进程"""
+
+    def __init__(self, cmd: list[str], on_output: OutputHandler):
+        self.cmd = cmd
+        self.on_output = on_output
+        self.result: Optional[CommandResult] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        async def _main():
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.ensure_future(
+                stream_command(self.cmd, on_output=self.on_output, capture=False)
+            )
+            self._ready.set()
+            try:
+                self.result = await self._task
+            except (asyncio.CancelledError, OSError):
+                pass
+
+        try:
+            asyncio.run(_main())
+        finally:
+            self._ready.set()
+
+    def start(self) -> "BackgroundCommand":
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        if self._loop and self._task and not self._task.done():
+            self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join(timeout)
+
+
+def print_command_summary(limit: int = 5):
+    """打印本次执行的命令数量、总耗时与最慢的几条命令"""
+    if not COMMAND_HISTORY:
+        return
+    total = sum(r.duration for r in COMMAND_HISTORY)
+    failed = sum(1 for r in COMMAND_HISTORY if r.returncode not in (0, None) or r.timed_out)
+    print(f"\n⏱️  共执行 {len(COMMAND_HISTORY)} 条命令，累计 {total:.1f}s，失败 {failed} 条")
+    for r in sorted(COMMAND_HISTORY, key=lambda r: r.duration, reverse=True)[:limit]:
+        status = "超时" if r.timed_out else f"退出码 {r.returncode}"
+        print(f"   {r.duration:>7.2f}s  {status:<8} {' '.join(r.args)[:80]}")
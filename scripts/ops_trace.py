@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+EHS 运维脚本阶段耗时追踪
+- 各脚本通过 --trace <文件> 输出 Chrome trace (JSON) 格式的嵌套计时区间，
+  可直接在 chrome://tracing 或 Perfetto 中打开
+- 每个阶段、每条子进程都是一个区间，附带处理字节数与 CPU 时间
+- --profile <文件> 额外输出 Python 侧的 cProfile 统计
+- python3 scripts/ops_trace.py compare a.json b.json 对比两次运行（或两台主机）的阶段耗时
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import cProfile
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不统计子进程 CPU
+    resource = None
+
+
+# 子进程区间放在独立的泳道中，避免并发命令在同一线程上相互重叠
+SUBPROCESS_LANE_BASE = 1_000_000
+
+
+def _children_cpu() -> Optional[float]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Tracer:
+    """收集 Chrome trace 的 complete ("X") 事件"""
+
+    def __init__(self, trace_file: Path):
+        self.trace_file = trace_file
+        self.events: list[dict] = []
+        self.origin = time.perf_counter()
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self._lock = threading.Lock()
+        self._stacks = threading.local()
+        self._busy_lanes: set[int] = set()
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def _stack(self) -> list[dict]:
+        if not hasattr(self._stacks, "items"):
+            self._stacks.items = []
+        return self._stacks.items
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage", **args) -> Iterator[dict]:
+        """记录一个嵌套计时区间；yield 出的字典可在区间内追加参数（如 bytes）"""
+        stack = self._stack()
+        event_args = dict(args)
+        if stack:
+            event_args.setdefault("parent", stack[-1]["name"])
+        stack.append({"name": name, "args": event_args})
+        start = self._now_us()
+        cpu_start = time.thread_time()
+        children_start = _children_cpu()
+        try:
+            yield event_args
+        except BaseException as e:
+            event_args["error"] = repr(e)
+            raise
+        finally:
+            stack.pop()
+            event_args["cpu_s"] = round(time.thread_time() - cpu_start, 6)
+            children_end = _children_cpu()
+            if children_start is not None and children_end is not None:
+                event_args["children_cpu_s"] = round(children_end - children_start, 6)
+            self._add({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": start,
+                "dur": self._now_us() - start,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": event_args,
+            })
+
+    @contextmanager
+    def subprocess_span(self, cmd: list[str]) -> Iterator[dict]:
+        """子进程区间：分配一个空闲泳道，结束后释放"""
+        with self._lock:
+            lane = SUBPROCESS_LANE_BASE
+            while lane in self._busy_lanes:
+                lane += 1
+            self._busy_lanes.add(lane)
+        name = " ".join(cmd[:3])
+        event_args = {"cmd": " ".join(cmd)}
+        stack = self._stack()
+        if stack:
+            event_args["parent"] = stack[-1]["name"]
+        start = self._now_us()
+        children_start = _children_cpu()
+        try:
+            yield event_args
+        finally:
+            children_end = _children_cpu()
+            if children_start is not None and children_end is not None:
+                # 并发执行多条命令时该值为同一时间段内所有子进程的合计
+                event_args["children_cpu_s"] = round(children_end - children_start, 6)
+            self._add({
+                "name": name,
+                "cat": "subprocess",
+                "ph": "X",
+                "ts": start,
+                "dur": self._now_us() - start,
+                "pid": os.getpid(),
+                "tid": lane,
+                "args": event_args,
+            })
+            with self._lock:
+                self._busy_lanes.discard(lane)
+
+    def _add(self, event: dict):
+        with self._lock:
+            self.events.append(event)
+
+    def write(self):
+        lanes = sorted({e["tid"] for e in self.events if e["tid"] >= SUBPROCESS_LANE_BASE})
+        metadata_events = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": lane,
+             "args": {"name": f"subprocess #{lane - SUBPROCESS_LANE_BASE + 1}"}}
+            for lane in lanes
+        ]
+        self.trace_file.parent.mkdir(parents=True, exist_ok=True)
+        self.trace_file.write_text(json.dumps({
+            "traceEvents": metadata_events + sorted(self.events, key=lambda e: e["ts"]),
+            "displayTimeUnit": "ms",
+            "metadata": {
+                "script": Path(sys.argv[0]).name,
+                "argv": sys.argv[1:],
+                "host": platform.node(),
+                "python": platform.python_version(),
+                "started_at": self.started_at,
+            },
+        }, ensure_ascii=False), encoding="utf-8")
+        print(f"\n🧭 追踪文件已写入: {self.trace_file} ({len(self.events)} 个区间)")
+
+
+TRACER: Optional[Tracer] = None
+
+
+def enable_tracing(trace_file: Optional[Path] = None, profile_file: Optional[Path] = None):
+    """开启追踪/性能分析，进程退出时自动写出文件"""
+    global TRACER
+    if trace_file:
+        TRACER = Tracer(trace_file)
+        atexit.register(TRACER.write)
+    if profile_file:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def _dump():
+            profiler.disable()
+            profile_file.parent.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(profile_file))
+            print(f"🧪 cProfile 统计已写入: {profile_file} (python3 -m pstats {profile_file})")
+
+        atexit.register(_dump)
+
+
+def add_trace_arguments(parser: argparse.ArgumentParser):
+    """为脚本添加 --trace / --profile 参数"""
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="输出阶段耗时追踪文件 (Chrome trace JSON 格式)"
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="输出 Python 侧 cProfile 统计文件"
+    )
+
+
+def setup_tracing(args: argparse.Namespace):
+    """根据 --trace / --profile 参数开启追踪"""
+    enable_tracing(
+        Path(args.trace) if getattr(args, "trace", None) else None,
+        Path(args.profile) if getattr(args, "profile", None) else None,
+    )
+
+
+@contextmanager
+def span(name: str, **args) -> Iterator[dict]:
+    """未开启追踪时为空操作的阶段区间"""
+    if TRACER is None:
+        yield {}
+        return
+    with TRACER.span(name, **args) as event_args:
+        yield event_args
+
+
+@contextmanager
+def subprocess_span(cmd: list[str]) -> Iterator[dict]:
+    """未开启追踪时为空操作的子进程区间"""
+    if TRACER is None:
+        yield {}
+        return
+    with TRACER.subprocess_span(cmd) as event_args:
+        yield event_args
+
+
+def traced(name: str) -> Callable:
+    """把整个函数记录为一个阶段区间的装饰器"""
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def annotate(**args):
+    """向当前线程最内层的阶段区间追加参数，例如 annotate(bytes=size)"""
+    if TRACER is None:
+        return
+    stack = TRACER._stack()
+    if stack:
+        stack[-1]["args"].update(args)
+
+
+def load_stage_totals(trace_file: Path) -> dict[str, dict]:
+    """按区间名称汇总耗时（毫秒）与字节数"""
+    data = json.loads(trace_file.read_text(encoding="utf-8"))
+    totals: dict[str, dict] = {}
+    for event in data.get("traceEvents", []):
+        if event.get("ph") != "X":
+            continue
+        entry = totals.setdefault(event["name"], {"ms": 0.0, "count": 0, "bytes": 0})
+        entry["ms"] += event["dur"] / 1000
+        entry["count"] += 1
+        entry["bytes"] += event.get("args", {}).get("bytes", 0) or 0
+    return totals
+
+
+def compare_traces(baseline_file: Path, current_file: Path):
+    """对比两份追踪文件中各区间的总耗时"""
+    baseline, current = load_stage_totals(baseline_file), load_stage_totals(current_file)
+    names = sorted(set(baseline) | set(current), key=lambda n: -max(
+        baseline.get(n, {}).get("ms", 0), current.get(n, {}).get("ms", 0)))
+
+    print(f"\n📊 阶段耗时对比: {baseline_file.name} → {current_file.name}")
+    print(f"   {'区间':<40}{'基准':>12}{'本次':>12}{'变化':>10}")
+    for name in names:
+        before = baseline.get(name, {}).get("ms")
+        after = current.get(name, {}).get("ms")
+        before_text = f"{before:.0f}ms" if before is not None else "-"
+        after_text = f"{after:.0f}ms" if after is not None else "-"
+        if before and after is not None:
+            change = f"{(after - before) / before:+.0%}"
+        else:
+            change = "新增" if before is None else "消失"
+        print(f"   {name[:39]:<40}{before_text:>12}{after_text:>12}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 运维脚本追踪文件工具")
+    subparsers = parser.add_subparsers(dest="command", help="命令")
+    compare_parser = subparsers.add_parser("compare", help="对比两份追踪文件的阶段耗时")
+    compare_parser.add_argument("baseline", type=str, help="基准追踪文件")
+    compare_parser.add_argument("current", type=str, help="本次追踪文件")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        compare_traces(Path(args.baseline), Path(args.current))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+EHS 系统 S3 接口本地替身 (stand-in)
+在内存中实现 minio_s3 备份与恢复用到的 S3 接口，不需要启动 MinIO：
+- GET    /                            ListBuckets
+- PUT    /<桶>                        创建桶（已存在时 409 BucketAlreadyOwnedByYou）
+- DELETE /<桶>                        删除空桶
+- GET    /<桶>?list-type=2            ListObjectsV2（prefix、max-keys、continuation-token）
+- GET/PUT/DELETE /<桶>/<键>           读取、写入（ETag 为内容 MD5）、删除对象
+每个请求按服务端收到的方法、路径、查询与请求头重新计算 SigV4 签名并校验；
+记录各类请求次数与建立的连接数，供测试断言增量备份与连接池的行为
+用法:
+  python3 scripts/s3_stub.py --port 9000 --access-key admin --secret-key secret
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from minio_s3 import canonical_query, quote_path, signature
+
+
+AUTH_PATTERN = re.compile(
+    r"AWS4-HMAC-SHA256 Credential=(?P<key>[^/]+)/(?P<date>\d{8})/(?P<region>[^/]+)/s3/aws4_request, "
+    r"SignedHeaders=(?P<signed>[^,]+), Signature=(?P<sig>[0-9a-f]{64})"
+)
+XMLNS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+@dataclass
+class StoredObject:
+    data: bytes
+    etag: str
+    content_type: str
+    last_modified: datetime
+
+
+class S3Stub:
+    def __init__(self, access_key: str = "admin", secret_key: str = "stub-secret", page_size: int = 1000):
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.page_size = page_size
+        self.buckets: dict[str, dict[str, StoredObject]] = {}
+        self.requests: Counter = Counter()
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, bucket: str, key: str, data: bytes, content_type: str = "application/octet-stream",
+                   etag: Optional[str] = None):
+        """直接写入对象；etag 可指定为分段上传形式（如 "<md5>-2"）"""
+        with self._lock:
+            self.buckets.setdefault(bucket, {})[key] = StoredObject(
+                data, etag or hashlib.md5(data).hexdigest(), content_type, datetime.now(timezone.utc)
+            )
+
+    # -- 认证 ---------------------------------------------------------------
+
+    def authorize(self, method: str, raw_path: str, raw_query: str, headers) -> Optional[str]:
+        """返回错误码，通过时返回 None"""
+        match = AUTH_PATTERN.fullmatch(headers.get("Authorization") or "")
+        if match is None:
+            return "AccessDenied"
+        if match["key"] != self.access_key:
+            return "InvalidAccessKeyId"
+        signed = match["signed"].split(";")
+        lower = {name.lower(): value for name, value in headers.items()}
+        if "host" not in signed or any(name not in lower for name in signed):
+            return "SignatureDoesNotMatch"
+        amz_date = lower.get("x-amz-date", "")
+        expected = signature(
+            self.secret_key, method, quote_path(unquote(raw_path)), canonical_query(dict(parse_qsl(raw_query, True))),
+            lower, signed, lower.get("x-amz-content-sha256", ""), amz_date, match["region"],
+        )
+        if amz_date[:8] != match["date"] or expected != match["sig"]:
+            return "SignatureDoesNotMatch"
+        return None
+
+    # -- 路由 ---------------------------------------------------------------
+
+    def handle(self, method: str, target: str, headers, body: bytes) -> tuple[int, dict, bytes]:
+        parts = urlsplit(target)
+        error = self.authorize(method, parts.path, parts.query, headers)
+        if error:
+            return _error(403, error)
+        bucket, _, key = unquote(parts.path).lstrip("/").partition("/")
+        query = dict(parse_qsl(parts.query, True))
+        with self._lock:
+            self.requests[(method, "object" if key else "bucket" if bucket else "service")] += 1
+            if not bucket:
+                return 200, {}, _xml("ListAllMyBucketsResult", "<Buckets>" + "".join(
+                    f"<Bucket><Name>{escape(name)}</Name></Bucket>" for name in sorted(self.buckets)) + "</Buckets>")
+            if not key:
+                return self._bucket(method, bucket, query)
+            objects = self.buckets.get(bucket)
+            if objects is None:
+                return _error(404, "NoSuchBucket")
+            if method == "PUT":
+                obj = objects[key] = StoredObject(
+                    body, hashlib.md5(body).hexdigest(), headers.get("Content-Type") or "binary/octet-stream",
+                    datetime.now(timezone.utc),
+                )
+                return 200, {"ETag": f'"{obj.etag}"'}, b""
+            if method == "DELETE":
+                objects.pop(key, None)
+                return 204, {}, b""
+            obj = objects.get(key)
+            if obj is None:
+                return _error(404, "NoSuchKey")
+            return 200, {
+                "ETag": f'"{obj.etag}"',
+                "Content-Type": obj.content_type,
+                "Last-Modified": formatdate(obj.last_modified.timestamp(), usegmt=True),
+            }, obj.data
+
+    def _bucket(self, method: str, bucket: str, query: dict) -> tuple[int, dict, bytes]:
+        if method == "PUT":
+            if bucket in self.buckets:
+                return _error(409, "BucketAlreadyOwnedByYou")
+            self.buckets[bucket] = {}
+            return 200, {}, b""
+        objects = self.buckets.get(bucket)
+        if objects is None:
+            return _error(404, "NoSuchBucket")
+        if method == "DELETE":
+            if objects:
+                return _error(409, "BucketNotEmpty")
+            del self.buckets[bucket]
+            return 204, {}, b""
+        prefix = query.get("prefix", "")
+        start = query.get("continuation-token") or query.get("start-after", "")
+        limit = min(int(query.get("max-keys", 1000)), self.page_size)
+        # S3 按 UTF-8 字节序列出
+        keys = sorted((k for k in objects if k.startswith(prefix) and k > start), key=lambda k: k.encode())
+        page, truncated = keys[:limit], len(keys) > limit
+        contents = "".join(
+            f"<Contents><Key>{escape(k)}</Key>"
+            f"<LastModified>{objects[k].last_modified.isoformat(timespec='milliseconds').replace('+00:00', 'Z')}"
+            f"</LastModified><ETag>&quot;{objects[k].etag}&quot;</ETag><Size>{len(objects[k].data)}</Size>"
+            "<StorageClass>STANDARD</StorageClass></Contents>"
+            for k in page
+        )
+        token = f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>" if truncated else ""
+        return 200, {}, _xml(
+            "ListBucketResult",
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+            f"<MaxKeys>{limit}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{token}{contents}",
+        )
+
+
+def _xml(root: str, inner: str) -> bytes:
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<{root} xmlns="{XMLNS}">{inner}</{root}>'.encode("utf-8")
+
+
+def _error(status: int, code: str) -> tuple[int, dict, bytes]:
+    return status, {}, f"<Error><Code>{code}</Code><Message>{code}</Message></Error>".encode()
+
+
+# ---------------------------------------------------------------------------
+# HTTP 服务
+# ---------------------------------------------------------------------------
+
+def make_handler(stub: S3Stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with stub._lock:
+                stub.connections += 1
+
+        def _serve(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            status, headers, data = stub.handle(self.command, self.path, self.headers, body)
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if "Content-Type" not in headers:
+                self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        do_GET = do_PUT = do_DELETE = _serve
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@contextmanager
+def serve(stub: S3Stub, host: str = "127.0.0.1", port: int = 0):
+    """在后台线程启动替身服务，yield 端点地址"""
+    server = ThreadingHTTPServer((host, port), make_handler(stub))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="s3-stub", daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EHS 系统 S3 接口本地替身（对象备份测试用）")
+    parser.add_argument("--port", type=int, default=9000, help="监听端口 (默认: 9000)")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="监听地址 (默认: 127.0.0.1)")
+    parser.add_argument("--access-key", type=str, default="admin", help="访问密钥 (默认: admin)")
+    parser.add_argument("--secret-key", type=str, default="stub-secret", help="私有密钥 (默认: stub-secret)")
+    args = parser.parse_args()
+
+    stub = S3Stub(args.access_key, args.secret_key)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(stub))
+    server.daemon_threads = True
+    print(f"🧪 S3 接口替身: http://{args.host}:{args.port}（内存存储）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+db_archive_logs SystemLog 分批归档测试（pytest）
+
+写入跨多个月份的日志后归档，验证按月分区、归档内容完整、
+只删除截止时间之前的记录，并且删除按小事务进行。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+
+import db_archive_logs
+import ehs_db
+
+
+def _ms(*date) -> int:
+    return int(datetime(*date, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _fill_logs(db_file, per_month=1500, recent=100):
+    rows = []
+    for month in (10, 11, 12):
+        base = _ms(2025, month, 1)
+        rows += [(f"log-{month}-{i:05d}", "hazard", "update", base + i * 1000) for i in range(per_month)]
+    rows += [(f"log-new-{i:05d}", "hazard", "create", _ms(2026, 2, 1) + i) for i in range(recent)]
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "createdAt") VALUES (?, ?, ?, ?)', rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def _log_ids(db_file) -> set[str]:
+    conn = sqlite3.connect(db_file)
+    try:
+        return {row[0] for row in conn.execute('SELECT "id" FROM "SystemLog"')}
+    finally:
+        conn.close()
+
+
+def test_archive_partitions_by_month_and_deletes_in_small_transactions(migrated_db, tmp_path):
+    _fill_logs(migrated_db)
+    out = tmp_path / "archives"
+
+    report = db_archive_logs.archive_logs(
+        migrated_db, out, db_archive_logs.cutoff_ms("2026-01-01"), batch=700, pause_ms=0
+    )
+
+    assert report["archived"] == report["deleted"] == 4500
+    assert report["partitions"] == {"2025-10": 1500, "2025-11": 1500, "2025-12": 1500}
+    # 每批至少一次删除事务，且首批从小事务开始
+    assert len(report["lock_ms"]) > 4500 // 700
+    assert report["rows_per_sec"] > 0
+    assert _log_ids(migrated_db) == {f"log-new-{i:05d}" for i in range(100)}
+
+    november = list(db_archive_logs.read_partition(out / "systemlog-2025-11.cols.jsonl.gz"))
+    assert len(november) == 1500
+    assert november[0]["id"] == "log-11-00000"
+    assert november[0]["createdAt"] == _ms(2025, 11, 1)
+    assert november[-1]["module"] == "hazard"
+
+    again = db_archive_logs.archive_logs(migrated_db, out, db_archive_logs.cutoff_ms("2026-01-01"))
+    assert again["archived"] == 0
+
+
+def test_no_delete_keeps_rows_and_rerun_is_deduplicated(migrated_db, tmp_path):
+    _fill_logs(migrated_db, per_month=300)
+    out = tmp_path / "archives"
+    cutoff = db_archive_logs.cutoff_ms("2025-11-01")
+
+    for _ in range(2):
+        report = db_archive_logs.archive_logs(migrated_db, out, cutoff, delete=False)
+        assert report["archived"] == 300
+        assert report["deleted"] == 0
+
+    assert len(_log_ids(migrated_db)) == 1000
+    assert [p.name for p in out.iterdir()] == ["systemlog-2025-10.cols.jsonl.gz"]
+    assert len(list(db_archive_logs.read_partition(out / "systemlog-2025-10.cols.jsonl.gz"))) == 300
+
+
+def test_ehs_db_cli_runs_archive(migrated_db, tmp_path, capsys):
+    _fill_logs(migrated_db, per_month=200)
+    out = tmp_path / "archives"
+
+    code = ehs_db.main([
+        "archive-logs", "--db", str(migrated_db), "--out", str(out), "--before", "2026-01-01", "--pause-ms", "0",
+    ])
+
+    assert code == 0
+    output = capsys.readouterr().out
+    assert "归档 600 行" in output and "写锁持有" in output
+    assert len(_log_ids(migrated_db)) == 100
+    assert sorted(p.name for p in out.iterdir()) == [
+        "systemlog-2025-10.cols.jsonl.gz", "systemlog-2025-11.cols.jsonl.gz", "systemlog-2025-12.cols.jsonl.gz",
+    ]
@@ -0,0 +1,173 @@
+"""
+db_dashboard Dashboard 预聚合测试（pytest）
+
+验证增量刷新只处理水位线之后变更的行、更新/作废/硬删除后计数与全量重建一致，
+逾期整改按读取日期计算，以及 ehs-db dashboard 命令行。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import db_dashboard
+import db_snapshot
+import ehs_db
+from conftest import MIGRATIONS_DIR
+
+DAY_MS = 86_400_000
+# 种子数据的 updatedAt 可能就是构建黄金库的时刻，刷新时把"现在"放到一天后，越过安全滞后窗口
+LATER = int(time.time() * 1000) + DAY_MS
+
+
+def _ms(date: str) -> int:
+    """UTC 当天中午的毫秒时间戳"""
+    return int(datetime.strptime(date, "%Y-%m-%d").replace(hour=12, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+@pytest.fixture
+def dashboard_db(golden_cache_dir, tmp_path):
+    golden = db_snapshot.golden_database(
+        golden_cache_dir, {"hazards": 300, "users": 40, "departments": 6, "seed": 3}, migrations_dir=MIGRATIONS_DIR
+    )
+    db_file = tmp_path / "ehs.db"
+    db_snapshot.clone_database(golden, db_file)
+    past = int(time.time() * 1000) - DAY_MS
+    with sqlite3.connect(db_file) as conn:
+        users = [row[0] for row in conn.execute('SELECT "id" FROM "User" WHERE "departmentId" IS NOT NULL LIMIT 10')]
+        depts = [row[0] for row in conn.execute('SELECT "id" FROM "Department" LIMIT 3')]
+        conn.executemany(
+            'INSERT INTO "Incident" ("id", "type", "severity", "occurredAt", "location", "description", "reporterId", '
+            '"reporterName", "reportTime", "departmentId", "status", "createdAt", "updatedAt") '
+            "VALUES (?, 'injury', ?, ?, '车间', '描述', ?, '上报人', ?, ?, ?, ?, ?)",
+            [(f"inc{i}", ["minor", "serious"][i % 2], _ms(f"2026-0{1 + i % 3}-10"), users[0], past,
+              depts[i % len(depts)], ["reported", "closed"][i % 2], past, past) for i in range(12)],
+        )
+        conn.execute(
+            'INSERT INTO "TrainingTask" ("id", "title", "materialId", "startDate", "endDate", "publisherId", '
+            '"targetType", "targetConfig", "createdAt", "updatedAt") '
+            "VALUES ('task1', '安全培训', 'm1', ?, ?, ?, 'all', '[]', ?, ?)",
+            (past, past, users[0], past, past),
+        )
+        conn.executemany(
+            'INSERT INTO "TrainingAssignment" ("id", "taskId", "userId", "status", "progress", "isPassed", '
+            '"createdAt", "updatedAt") VALUES (?, \'task1\', ?, ?, 0, ?, ?, ?)',
+            [(f"ta{i}", user, "passed" if i % 3 == 0 else "assigned", int(i % 3 == 0), past, past)
+             for i, user in enumerate(users)],
+        )
+    return db_file
+
+
+def _counters(db_file) -> dict:
+    with sqlite3.connect(db_file) as conn:
+        return {row[:5]: row[5] for row in conn.execute(
+            'SELECT "metric", "departmentId", "period", "status", "level", "count" FROM "DashboardCounter"'
+        )}
+
+
+def _rebuilt(db_file, tmp_path) -> dict:
+    copy = tmp_path / "rebuilt.db"
+    db_snapshot.clone_database(db_file, copy, method="backup")
+    db_dashboard.refresh(copy, full=True, now_ms=LATER)
+    return _counters(copy)
+
+
+def test_initial_refresh_counts_every_row(dashboard_db):
+    report = db_dashboard.refresh(dashboard_db, now_ms=LATER)
+
+    assert {s: stats["changed"] for s, stats in report["sources"].items()} == {
+        "HazardRecord": 300, "Incident": 12, "TrainingAssignment": 10,
+    }
+    counters = _counters(dashboard_db)
+    with sqlite3.connect(dashboard_db) as conn:
+        live = conn.execute('SELECT COUNT(*) FROM "HazardRecord" WHERE "isVoided" = 0').fetchone()[0]
+        open_with_deadline = conn.execute(
+            'SELECT COUNT(*) FROM "HazardRecord" WHERE "isVoided" = 0 AND "status" <> \'closed\' '
+            'AND "deadline" IS NOT NULL'
+        ).fetchone()[0]
+    assert sum(c for key, c in counters.items() if key[0] == "hazard") == live
+    assert sum(c for key, c in counters.items() if key[0] == "hazard_open_deadline") == open_with_deadline
+    assert sum(c for key, c in counters.items() if key[0] == "incident") == 12
+    assert sum(c for key, c in counters.items() if (key[0], key[3]) == ("training", "completed")) == 4
+    # 计数桶远少于记录数
+    assert report["counters"] < 322
+
+    again = db_dashboard.refresh(dashboard_db, now_ms=LATER)
+    assert all(stats["changed"] == 0 and stats["deleted"] == 0 for stats in again["sources"].values())
+    assert _counters(dashboard_db) == counters
+
+
+def test_incremental_refresh_matches_full_rebuild(dashboard_db, tmp_path):
+    db_dashboard.refresh(dashboard_db, now_ms=LATER)
+    now = int(time.time() * 1000) + 1000
+    with sqlite3.connect(dashboard_db) as conn:
+        ids = [row[0] for row in conn.execute('SELECT "id" FROM "HazardRecord" ORDER BY "id" LIMIT 6')]
+        conn.execute('UPDATE "HazardRecord" SET "status" = \'closed\', "updatedAt" = ? WHERE "id" IN (?, ?)',
+                     (now, ids[0], ids[1]))
+        conn.execute('UPDATE "HazardRecord" SET "riskLevel" = \'major\', "deadline" = ?, "updatedAt" = ? '
+                     'WHERE "id" = ?', (now - 10 * DAY_MS, now, ids[2]))
+        conn.execute('UPDATE "HazardRecord" SET "isVoided" = 1, "updatedAt" = ? WHERE "id" = ?', (now, ids[3]))
+        conn.execute('DELETE FROM "HazardRecord" WHERE "id" IN (?, ?)', (ids[4], ids[5]))
+        conn.execute('UPDATE "Incident" SET "status" = \'closed\', "updatedAt" = ? WHERE "id" = \'inc0\'', (now,))
+        conn.execute('DELETE FROM "Incident" WHERE "id" = \'inc2\'')
+        conn.execute('UPDATE "TrainingAssignment" SET "isPassed" = 1, "updatedAt" = ? WHERE "id" = \'ta1\'', (now,))
+
+    report = db_dashboard.refresh(dashboard_db, now_ms=LATER)
+
+    assert report["sources"]["HazardRecord"]["changed"] == 4
+    assert report["sources"]["HazardRecord"]["deleted"] == 2
+    assert (report["sources"]["Incident"]["changed"], report["sources"]["Incident"]["deleted"]) == (1, 1)
+    assert report["sources"]["TrainingAssignment"]["changed"] == 1
+    assert _counters(dashboard_db) == _rebuilt(dashboard_db, tmp_path)
+    assert all(count > 0 for count in _counters(dashboard_db).values())
+
+
+def test_rows_committed_after_the_safety_lag_are_picked_up_next_time(dashboard_db):
+    db_dashboard.refresh(dashboard_db, now_ms=LATER)
+    with sqlite3.connect(dashboard_db) as conn:
+        conn.execute('UPDATE "Incident" SET "severity" = \'critical\', "updatedAt" = ? WHERE "id" = \'inc1\'',
+                     (LATER - 1000,))
+
+    assert db_dashboard.refresh(dashboard_db, now_ms=LATER)["sources"]["Incident"]["changed"] == 0
+    assert db_dashboard.refresh(dashboard_db, now_ms=LATER + 10_000)["sources"]["Incident"]["changed"] == 1
+    assert any(key[0] == "incident" and key[4] == "critical" for key in _counters(dashboard_db))
+
+
+def test_summary_reads_only_buckets(dashboard_db):
+    with sqlite3.connect(dashboard_db) as conn:
+        dept = conn.execute('SELECT "id" FROM "Department" LIMIT 1').fetchone()[0]
+        conn.execute('UPDATE "HazardRecord" SET "isVoided" = 1')
+        conn.executemany(
+            'UPDATE "HazardRecord" SET "isVoided" = 0, "status" = ?, "rectificationDeptId" = ?, "deadline" = ?, '
+            '"reportTime" = ? WHERE "id" = (SELECT "id" FROM "HazardRecord" ORDER BY "id" LIMIT 1 OFFSET ?)',
+            [("rectifying", dept, _ms("2026-10-01"), _ms("2026-10-02"), 0),
+             ("assigned", dept, _ms("2026-10-30"), _ms("2026-10-03"), 1),
+             ("closed", dept, _ms("2026-09-01"), _ms("2026-09-05"), 2)],
+        )
+    db_dashboard.refresh(dashboard_db, now_ms=LATER)
+
+    with sqlite3.connect(dashboard_db) as conn:
+        summary = db_dashboard.dashboard_summary(conn, today="2026-10-19")
+
+    assert summary["hazards_this_month"] == 2
+    assert summary["hazards_this_month_by_status"] == {"rectifying": 1, "assigned": 1}
+    assert summary["overdue_by_department"] == {dept: 1}
+    assert summary["incidents_by_month"] == {"2026-01": 4, "2026-02": 4, "2026-03": 4}
+    assert sum(entry["completed"] for entry in summary["training_by_department"].values()) == 4
+    assert sum(entry["total"] for entry in summary["training_by_department"].values()) == 10
+
+
+def test_ehs_db_cli_dashboard(dashboard_db, capsys):
+    assert ehs_db.main(["dashboard", "refresh", "--db", str(dashboard_db), "--batch", "50"]) == 0
+    assert ehs_db.main(["dashboard", "refresh", "--db", str(dashboard_db), "--full"]) == 0
+    assert ehs_db.main(["dashboard", "show", "--db", str(dashboard_db), "--today", "2026-10-19"]) == 0
+    assert ehs_db.main(["dashboard", "show", "--db", str(dashboard_db.parent / "missing.db")]) == 1
+
+    output = capsys.readouterr().out
+    assert "增量刷新" in output and "全量重建" in output
+    assert "HazardRecord" in output and "计数桶" in output
+    assert "培训完成率" in output
+    assert "未找到 SQLite 数据库" in output
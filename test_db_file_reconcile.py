@@ -0,0 +1,175 @@
+"""
+db_file_reconcile 存储孤儿文件对账测试（pytest）
+
+验证有序目录遍历的键顺序、引用解析与 parseFileRecordFromDb 一致、归并结果中的孤儿/悬空/保留期统计，
+以及孤儿对象分批写入 FileDeletionQueue 且重跑不会重复入队。
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import sqlite3
+import time
+
+import pytest
+
+import db_file_reconcile as reconcile
+import ehs_db
+
+
+OLD = time.time() - 7 * 86400
+
+
+def _file(path, data=b"x"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    os.utime(path, (OLD, OLD))
+
+
+def _minio_object(bucket_dir, key, size):
+    """xl-single 格式：对象键是目录，里面是 xl.meta 与数据分片"""
+    _file(bucket_dir / key / "xl.meta", b"m" * 10)
+    _file(bucket_dir / key / "5c7a" / "part.1", b"d" * size)
+
+
+def _file_metadata(conn, file_path, n):
+    conn.execute(
+        'INSERT INTO "FileMetadata" ("id", "filePath", "fileName", "fileType", "fileSize", "md5Hash", "category", '
+        '"uploadedAt", "isArchived", "createdAt", "updatedAt") VALUES (?, ?, ?, \'pdf\', 1, ?, \'docs\', 0, 0, 0, 0)',
+        (f"fm{n}", file_path, file_path, f"md5-{n}"),
+    )
+
+
+def _archive_file(conn, file_path, n):
+    conn.execute(
+        'INSERT INTO "ArchiveFile" ("id", "name", "fileType", "isDynamic", "filePath", "originalName", "mimeType", '
+        '"fileSize", "category", "createdAt", "updatedAt") VALUES (?, ?, \'证照\', 0, ?, ?, \'application/pdf\', 1, '
+        '\'enterprise\', 0, 0)',
+        (f"af{n}", file_path, file_path, file_path),
+    )
+
+
+@pytest.fixture
+def storage(snapshot_db, tmp_path):
+    minio = tmp_path / "minio-data"
+    uploads = tmp_path / "uploads"
+    (minio / ".minio.sys" / "config").mkdir(parents=True)
+    _minio_object(minio / "ehs-private", "hazards/2024/a.jpg", 100)
+    _minio_object(minio / "ehs-private", "hazards/2024/orphan.jpg", 200)
+    _minio_object(minio / "ehs-public", "docs/report.pdf", 300)
+    _minio_object(minio / "ehs-public", "docs/legacy.pdf", 50)
+    _file(minio / "ehs-public" / "docs" / "old-fs-mode.pdf", b"f" * 400)
+    _minio_object(minio / "ehs-public", "temp/fresh.pdf", 10)
+    os.utime(minio / "ehs-public" / "temp" / "fresh.pdf" / "xl.meta")
+    _file(uploads / "avatars" / "u1.png", b"p" * 30)
+    _file(uploads / "avatars" / "stray.png", b"p" * 40)
+
+    with sqlite3.connect(snapshot_db) as conn:
+        _file_metadata(conn, "private:hazards/2024/a.jpg", 1)
+        _file_metadata(conn, "public:docs/report.pdf", 2)
+        _file_metadata(conn, "/uploads/avatars/u1.png", 3)
+        _file_metadata(conn, "/uploads/docs/legacy.pdf", 4)
+        _file_metadata(conn, "private:hazards/2024/missing.jpg", 5)
+        _archive_file(conn, "public:archives/gone.pdf", 1)
+        conn.execute('UPDATE "User" SET "avatar" = \'private:hazards/2024/missing.jpg\'')
+    return snapshot_db, minio, uploads
+
+
+def test_walk_sorted_matches_lexicographic_order(tmp_path):
+    names = ["a", "a-b", "a.txt", "a/b", "a/b/c", "a/b-c", "ab", "b/中文.pdf", "b/x y", "Z", "_"]
+    rng = random.Random(3)
+    keys = set()
+    for name in names:
+        if any(other.startswith(name + "/") for other in names):
+            continue
+        keys.add(name)
+        _file(tmp_path / name)
+    for n in range(300):
+        key = "/".join(rng.choice(["d1", "d1-x", "d2", "e"]) for _ in range(rng.randint(1, 3))) + f"/{n}"
+        keys.add(key)
+        _file(tmp_path / key)
+    _minio_object(tmp_path, "obj/key", 5)
+    keys.add("obj/key")
+
+    walked = [key for key, _, _ in reconcile.walk_sorted(tmp_path, workers=3)]
+
+    assert walked == sorted(keys)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("private:hazards/a.jpg", ("private", "hazards/a.jpg")),
+    ("public:docs/a:b.pdf", ("public", "docs/a:b.pdf")),
+    ('{"bucket": "private", "key": "x/y"}', ("private", "x/y")),
+    ("/uploads/avatars/u.png", ("uploads", "avatars/u.png")),
+    ("other:thing", ("public", "other:thing")),
+    ("docs/plain.pdf", ("public", "docs/plain.pdf")),
+    ("", None),
+    (None, None),
+])
+def test_parse_file_record(value, expected):
+    assert reconcile.parse_file_record(value) == expected
+
+
+def test_reconcile_reports_orphans_dangling_and_young(storage):
+    db_file, minio, uploads = storage
+
+    report = reconcile.reconcile(db_file, minio, uploads, workers=2)
+    private, public, local = (report["by_store"][s] for s in ("private", "public", "uploads"))
+
+    assert (private["objects"], private["referenced"], private["orphans"], private["orphan_bytes"]) == (2, 1, 1, 210)
+    # legacy.pdf 被旧格式 /uploads/docs/legacy.pdf 保护；old-fs-mode.pdf 是孤儿；temp/fresh.pdf 未满 24 小时
+    assert (public["objects"], public["referenced"], public["orphans"], public["young"]) == (4, 2, 1, 1)
+    assert public["orphan_bytes"] == 400
+    assert (local["objects"], local["referenced"], local["orphans"]) == (2, 1, 1)
+    # User.avatar 只保护对象不报告悬空；/uploads/docs/legacy.pdf 在本地目录中不存在
+    assert report["dangling_by_table"] == {"FileMetadata": 2, "ArchiveFile": 1}
+    assert report["totals"]["orphan_bytes"] == 210 + 400 + 40
+    assert {s["key"] for s in report["orphan_samples"]} == {"hazards/2024/orphan.jpg", "docs/old-fs-mode.pdf",
+                                                           "avatars/stray.png"}
+    assert report["enqueued"] == 0
+
+
+def test_enqueue_is_batched_and_idempotent(storage):
+    db_file, minio, uploads = storage
+
+    first = reconcile.reconcile(db_file, minio, uploads, enqueue=True, batch=1)
+    second = reconcile.reconcile(db_file, minio, uploads, enqueue=True, batch=1)
+
+    assert first["enqueued"] == 2
+    assert second["enqueued"] == 0
+    assert second["totals"]["queued"] == 2 and second["totals"]["orphans"] == 1
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute(
+            'SELECT "filePath", "bucket", "objectName", "status", "retryCount" FROM "FileDeletionQueue" ORDER BY 1'
+        ).fetchall()
+    assert rows == [
+        ("private:hazards/2024/orphan.jpg", "private", "hazards/2024/orphan.jpg", "pending", 0),
+        ("public:docs/old-fs-mode.pdf", "public", "docs/old-fs-mode.pdf", "pending", 0),
+    ]
+
+
+def test_enqueue_skips_files_registered_after_scan(storage):
+    db_file, _, _ = storage
+
+    with sqlite3.connect(db_file) as conn:
+        conn.execute("CREATE TEMP TABLE reconcile_orphans (store TEXT, key TEXT)")
+        conn.executemany("INSERT INTO temp.reconcile_orphans VALUES (?, ?)",
+                         [("public", "docs/report.pdf"), ("public", "docs/new.pdf")])
+        conn.isolation_level = None
+        assert reconcile.enqueue_orphans(conn, batch=10, now_ms=1) == (1, 1)
+
+
+def test_ehs_db_cli_reconcile_files(storage, capsys):
+    db_file, minio, uploads = storage
+    argv = ["reconcile-files", "--db", str(db_file), "--minio-data", str(minio), "--uploads", str(uploads)]
+
+    assert ehs_db.main(argv) == 0
+    assert ehs_db.main(argv + ["--enqueue"]) == 0
+    assert ehs_db.main(["reconcile-files", "--db", str(db_file.parent / "missing.db")]) == 1
+
+    output = capsys.readouterr().out
+    assert "孤儿 3 个" in output
+    assert "悬空: ArchiveFile af1 -> public:archives/gone.pdf" in output
+    assert "已写入 FileDeletionQueue: 2 条" in output
+    assert "public/uploads 中的孤儿文件不入队" in output
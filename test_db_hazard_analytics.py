@@ -0,0 +1,130 @@
+"""
+db_hazard_analytics 隐患列存增量导出测试（pytest）
+
+验证按 updatedAt 水位线只拉取变更行、按 id 合并更新、按月分区，
+以及统计只读取列存文件。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+
+import db_hazard_analytics
+import ehs_db
+
+
+NOW = int(datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _ms(*date) -> int:
+    return int(datetime(*date, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _insert_hazards(db_file, hazards):
+    conn = sqlite3.connect(db_file)
+    conn.execute(
+        'INSERT OR IGNORE INTO "User" ("id", "username", "name", "password", "updatedAt") '
+        "VALUES ('u1', 'reporter', '上报人', 'x', 0)"
+    )
+    conn.executemany(
+        'INSERT INTO "HazardRecord" ("id", "riskLevel", "status", "type", "location", "desc", "reporterId", '
+        '"reporterName", "rectificationDeptName", "isVoided", "createdAt", "updatedAt") '
+        "VALUES (?, ?, ?, '设备', '车间', '描述', 'u1', '上报人', ?, ?, ?, ?)",
+        hazards,
+    )
+    conn.commit()
+    conn.close()
+
+
+def _seed(db_file):
+    hazards = []
+    for i in range(300):
+        created = _ms(2026, 1 + i % 2, 1 + i % 28)
+        hazards.append((
+            f"hz-{i:04d}", ("low", "medium", "high")[i % 3], "reported", f"部门{i % 4}", int(i == 0),
+            created, created + 1000,
+        ))
+    _insert_hazards(db_file, hazards)
+
+
+def test_incremental_export_merges_updates_by_id(migrated_db, tmp_path):
+    _seed(migrated_db)
+    store = tmp_path / "hazards"
+
+    first = db_hazard_analytics.export_incremental(migrated_db, store, batch=64, now_ms=NOW)
+
+    assert first["fetched"] == first["added"] == 300
+    assert first["months"] == {"2026-01": 150, "2026-02": 150}
+    assert [month for month, _ in db_hazard_analytics.partitions(store)] == ["2026-01", "2026-02"]
+
+    # 没有变更时不拉取任何行
+    assert db_hazard_analytics.export_incremental(migrated_db, store, now_ms=NOW)["fetched"] == 0
+
+    conn = sqlite3.connect(migrated_db)
+    conn.execute(
+        'UPDATE "HazardRecord" SET "status" = \'closed\', "updatedAt" = ? WHERE "id" IN (\'hz-0001\', \'hz-0002\')',
+        (_ms(2026, 2, 28, 12),),
+    )
+    conn.commit()
+    conn.close()
+    changed = _ms(2026, 2, 28, 12)
+    _insert_hazards(migrated_db, [("hz-new", "high", "reported", "部门9", 0, changed, changed)])
+
+    second = db_hazard_analytics.export_incremental(migrated_db, store, now_ms=NOW)
+
+    assert (second["fetched"], second["added"], second["updated"]) == (3, 1, 2)
+    january = db_hazard_analytics.read_partition(store / "month=2026-01", ["id", "status", "updatedAt"])
+    assert len(january["id"]) == 150
+    assert january["status"][january["id"].index("hz-0002")] == "closed"
+    assert january["updatedAt"][january["id"].index("hz-0002")] == _ms(2026, 2, 28, 12)
+    assert len(db_hazard_analytics.read_partition(store / "month=2026-02", ["id"])["id"]) == 151
+
+
+def test_rows_inside_safety_lag_wait_for_next_export(migrated_db, tmp_path):
+    _insert_hazards(migrated_db, [("hz-late", "low", "reported", None, 0, NOW - 1000, NOW - 1000)])
+
+    report = db_hazard_analytics.export_incremental(migrated_db, tmp_path / "hazards", now_ms=NOW)
+
+    assert report["fetched"] == 0
+
+
+def test_summary_reads_only_the_store(migrated_db, tmp_path):
+    _seed(migrated_db)
+    store = tmp_path / "hazards"
+    db_hazard_analytics.export_incremental(migrated_db, store, now_ms=NOW)
+    migrated_db.unlink()
+
+    counts = db_hazard_analytics.summarize(store, ["month", "riskLevel"])
+
+    # hz-0000 已作废，默认不计入
+    assert sum(counts.values()) == 299
+    assert counts[("2026-01", "low")] == 49
+    assert db_hazard_analytics.summarize(store, ["rectificationDeptName"], include_voided=True)[("部门1",)] == 75
+
+
+def test_watermark_query_uses_updated_at_index(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    plan = conn.execute(
+        'EXPLAIN QUERY PLAN SELECT "id" FROM "HazardRecord" WHERE "updatedAt" <= ? AND ("updatedAt", "id") > (?, ?) '
+        'ORDER BY "updatedAt", "id" LIMIT 10',
+        (1, 0, ""),
+    ).fetchall()
+    conn.close()
+
+    details = " ".join(row[3] for row in plan)
+    assert "HazardRecord_updatedAt_idx" in details
+
+
+def test_ehs_db_cli_export_and_stats(migrated_db, tmp_path, capsys):
+    _seed(migrated_db)
+    store = tmp_path / "hazards"
+
+    assert ehs_db.main(["hazards", "export", "--db", str(migrated_db), "--store", str(store)]) == 0
+    assert ehs_db.main(["hazards", "stats", "--store", str(store), "--by", "riskLevel", "status"]) == 0
+    assert ehs_db.main(["hazards", "stats", "--store", str(store), "--by", "desc"]) == 1
+
+    output = capsys.readouterr().out
+    assert "新增 300" in output
+    assert "high | reported" in output
+    assert "列存中没有这些列: desc" in output
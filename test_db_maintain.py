@@ -0,0 +1,100 @@
+"""
+db_maintain SQLite 空间回收测试（pytest）
+
+先写入再删除大量 SystemLog 制造空闲页，验证 VACUUM INTO 替换与增量回收
+都能回收空间、保留数据，并报告写锁时长与探测延迟。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+
+import db_maintain
+import ehs_db
+
+
+def _bloat(db_file, rows=3000, prefix="a"):
+    """写入 rows 行后只保留前 100 行"""
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+        [(f"{prefix}-{i:06d}", "hazard", "update", "x" * 1000) for i in range(rows)],
+    )
+    conn.commit()
+    conn.execute('DELETE FROM "SystemLog" WHERE "id" BETWEEN ? AND ?', (f"{prefix}-{100:06d}", f"{prefix}-~"))
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+
+def _count_logs(db_file) -> int:
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute('SELECT count(*) FROM "SystemLog"').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_incremental_requires_incremental_auto_vacuum(migrated_db):
+    _bloat(migrated_db, rows=200)
+    with pytest.raises(ValueError, match="auto_vacuum"):
+        db_maintain.incremental_vacuum(migrated_db)
+
+
+def test_copy_swap_then_incremental_reclaims_space(migrated_db):
+    _bloat(migrated_db)
+
+    report = db_maintain.maintain(migrated_db, "copy", baseline_s=0.2, enable_incremental=True)
+
+    assert report["reclaimed_bytes"] > 2 * 1024 * 1024
+    assert report["after"]["freelist_count"] == 0
+    assert report["auto_vacuum"] == "incremental"
+    assert report["copies"] == 1
+    assert report["lock_ms"]
+    assert report["latency_baseline"]["count"] > 0
+    assert _count_logs(migrated_db) == 100
+    assert not db_maintain.wal_file(migrated_db).exists() or db_maintain.wal_file(migrated_db).stat().st_size == 0
+    # 替换前的文件作为硬链接保留
+    assert sqlite3.connect(report["backup"]).execute('SELECT count(*) FROM "SystemLog"').fetchone()[0] == 100
+
+    # 切换到 INCREMENTAL 之后，后续删除产生的空闲页可分片回收
+    _bloat(migrated_db, prefix="b")
+    incremental = db_maintain.maintain(migrated_db, "incremental", baseline_s=0, slice_ms=5, pause_ms=0)
+
+    assert incremental["pages_freed"] > 0
+    assert incremental["remaining_free_pages"] == 0
+    assert incremental["reclaimed_bytes"] > 2 * 1024 * 1024
+    assert len(incremental["lock_ms"]) > 1
+    assert _count_logs(migrated_db) == 200
+
+
+def test_copy_refuses_swap_while_other_connection_is_open(migrated_db):
+    _bloat(migrated_db, rows=300)
+    app = sqlite3.connect(migrated_db)
+    app.execute('SELECT count(*) FROM "SystemLog"').fetchone()
+    size = migrated_db.stat().st_size
+
+    with pytest.raises(RuntimeError, match="--stop-container"):
+        db_maintain.vacuum_into_and_swap(migrated_db, lock_timeout_s=0.1)
+
+    # 应用连接不受影响，原文件未被替换，临时副本已清理
+    app.execute('INSERT INTO "SystemLog" ("id", "module", "action") VALUES (?, ?, ?)', ("late", "hazard", "update"))
+    app.commit()
+    app.close()
+    assert migrated_db.stat().st_size == size
+    assert _count_logs(migrated_db) == 101
+    assert not list(migrated_db.parent.glob("*.maintain-*"))
+
+
+def test_ehs_db_cli_runs_maintain(migrated_db, capsys):
+    _bloat(migrated_db, rows=500)
+
+    code = ehs_db.main(["maintain", "--db", str(migrated_db), "--mode", "copy", "--no-backup", "--baseline", "0"])
+
+    assert code == 0
+    out = capsys.readouterr().out
+    assert "回收" in out and "写锁持有" in out
+    assert not list(migrated_db.parent.glob("*.pre-maintain-*"))
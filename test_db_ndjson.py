@@ -0,0 +1,157 @@
+"""
+db_ndjson 流式导出/导入测试（pytest）
+
+验证外键分层顺序、NDJSON 往返不丢数据（含自引用与二进制列），
+以及按小缓冲区增量解析旧版 database_full.json。
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+import db_ndjson
+import ehs_db
+
+
+def _rows(db_file, table):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(f'SELECT * FROM "{table}" ORDER BY "id"').fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def empty_copy(migrated_db, tmp_path):
+    target = tmp_path / "target.db"
+    shutil.copy(migrated_db, target)
+    return target
+
+
+def _populate(db_file):
+    conn = sqlite3.connect(db_file)
+    # 子部门的 rowid 在父部门之前，导入时依赖延迟外键检查
+    conn.executemany(
+        'INSERT INTO "Department" ("id", "name", "parentId", "level", "updatedAt") VALUES (?, ?, ?, ?, ?)',
+        [("dept-child", "生产部", "dept-root", 2, 1768224475506), ("dept-root", "总公司", None, 1, 1768224475506)],
+    )
+    conn.execute(
+        'INSERT INTO "User" ("id", "username", "name", "password", "departmentId", "updatedAt") '
+        "VALUES ('u1', 'zhangsan', '张三', 'x', 'dept-child', 1768224475506)"
+    )
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "snapshot", "createdAt") VALUES (?, ?, ?, ?, ?)',
+        [(f"log-{i:05d}", "hazard", "update", b"\x00\xffraw" if i == 0 else None, 1768224475506 + i)
+         for i in range(12000)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_dependency_levels_follow_foreign_keys(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    tables = ["HazardExtension", "HazardRecord", "User", "Department", "SystemLog"]
+    levels = db_ndjson.dependency_levels(db_ndjson.table_dependencies(conn, tables))
+    conn.close()
+
+    assert levels == [["Department", "SystemLog"], ["User"], ["HazardRecord"], ["HazardExtension"]]
+
+
+def test_dependency_levels_strict_rejects_cycles():
+    dependencies = {"A": {"B"}, "B": {"A"}, "C": set(), "D": {"A"}}
+
+    assert db_ndjson.dependency_levels(dependencies)[-1] == ["A", "B", "D"]
+    with pytest.raises(ValueError, match="外键存在环.*A, B, D"):
+        db_ndjson.dependency_levels(dependencies, strict=True)
+
+
+def test_orphan_foreign_key_rolls_back_table_without_hanging(empty_copy, tmp_path):
+    dump = tmp_path / "dump"
+    dump.mkdir()
+    (dump / "User.ndjson").write_text(json.dumps({
+        "id": "u1", "username": "zhangsan", "name": "张三", "password": "x",
+        "departmentId": "dept-missing", "updatedAt": 1768224475506,
+    }) + "\n", encoding="utf-8")
+
+    result = {}
+    # 延迟外键在 COMMIT 时才报错，之前会卡在排空队列上
+    worker = threading.Thread(
+        target=lambda: result.update(db_ndjson.import_tables(empty_copy, db_ndjson.ndjson_sources(dump))),
+        daemon=True,
+    )
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive()
+    assert "FOREIGN KEY" in result["errors"]["User"]
+    assert result["tables"]["User"]["rows"] == 0
+    assert _rows(empty_copy, "User") == []
+
+
+def test_export_import_round_trip(migrated_db, empty_copy, tmp_path):
+    _populate(migrated_db)
+    out = tmp_path / "export"
+
+    manifest = db_ndjson.export_database(migrated_db, out, compress=True)
+
+    by_name = {t["name"]: t for t in manifest["tables"]}
+    assert by_name["SystemLog"]["rows"] == 12000
+    assert by_name["User"]["level"] > by_name["Department"]["level"]
+    assert (out / "SystemLog.ndjson.gz").exists()
+
+    report = db_ndjson.import_tables(empty_copy, db_ndjson.ndjson_sources(out), mode="insert", batch=1000)
+
+    assert report["errors"] == {}
+    assert report["fk_violations"] == 0
+    assert report["rows"] == 12003
+    for table in ("Department", "User", "SystemLog"):
+        assert _rows(empty_copy, table) == _rows(migrated_db, table)
+
+    # 再导入一次：insert 模式主键冲突时整表回滚，upsert 模式覆盖
+    again = db_ndjson.import_tables(empty_copy, db_ndjson.ndjson_sources(out), mode="insert")
+    assert set(again["errors"]) == {"Department", "User", "SystemLog"}
+    upsert = db_ndjson.import_tables(empty_copy, db_ndjson.ndjson_sources(out))
+    assert upsert["errors"] == {}
+    assert len(_rows(empty_copy, "SystemLog")) == 12000
+
+
+def test_legacy_backup_is_parsed_incrementally(migrated_db, tmp_path, monkeypatch):
+    backup = tmp_path / "database_full.json"
+    backup.write_text(json.dumps({
+        "metadata": {"version": "1.0.0", "tables": [{"name": "department", "recordCount": 2}]},
+        "data": {
+            "department": [
+                {"id": "d2", "name": "车间", "parentId": "d1", "level": 2,
+                 "createdAt": "2026-01-12T11:44:20.748Z", "updatedAt": "2026-01-12T11:44:20.748Z"},
+                {"id": "d1", "name": "总公司", "parentId": None, "level": 1,
+                 "createdAt": "2026-01-12T11:44:20.748Z", "updatedAt": "2026-01-12T11:44:20.748Z"},
+            ],
+            "unknownModel": [{"id": 1}],
+            "systemLog": [],
+        },
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    # 极小的读缓冲，覆盖值被缓冲区边界截断的情况
+    monkeypatch.setattr(db_ndjson, "READ_CHUNK", 7)
+
+    report = db_ndjson.import_legacy_backup(migrated_db, backup)
+
+    assert report["rows"] == 2
+    assert report["skipped"] == ["unknownModel"]
+    conn = sqlite3.connect(migrated_db)
+    rows = conn.execute('SELECT "id", "parentId", "createdAt" FROM "Department" ORDER BY "id"').fetchall()
+    conn.close()
+    # ISO 时间转换为 Prisma 的毫秒整数
+    assert rows == [("d1", None, 1768218260748), ("d2", "d1", 1768218260748)]
+
+
+def test_ehs_db_cli_imports_shipped_full_backup(migrated_db, capsys):
+    code = ehs_db.main(["import", str(db_ndjson.LEGACY_FULL_BACKUP), "--db", str(migrated_db)])
+
+    assert code == 0
+    assert "流式导入" in capsys.readouterr().out
+    assert len(_rows(migrated_db, "User")) == 89
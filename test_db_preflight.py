@@ -0,0 +1,129 @@
+"""
+db_preflight SQLite 启动前检查测试（pytest）
+
+基于按迁移建好的数据库，验证 WAL 切换、统计信息过期判断、
+WAL 检查点与前后页数报告，以及部署前只读检查不修改数据库、失败的迁移会中止部署。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+
+import db_preflight
+
+
+def _insert_logs(db_file, count, start=0):
+    conn = sqlite3.connect(db_file)
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+        [(f"log-{i:08d}", "hazard", "update", "x" * 200) for i in range(start, start + count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_preflight_enables_wal_and_analyzes_fresh_database(migrated_db):
+    _insert_logs(migrated_db, 500)
+
+    report = db_preflight.run_preflight(migrated_db)
+
+    assert report["journal_mode"] == "wal"
+    assert "SystemLog" in report["stale_tables"]
+    assert any(a.startswith("journal_mode") for a in report["actions"])
+    assert any(a.startswith("ANALYZE") for a in report["actions"])
+    assert report["after"]["page_count"] >= report["before"]["page_count"]
+    assert {"journal_mode", "stats_check", "analyze"} <= set(report["timings"])
+
+    # 统计信息刚更新过，第二次检查不应再做任何事
+    again = db_preflight.run_preflight(migrated_db)
+    assert again["actions"] == []
+    assert again["stale_tables"] == []
+
+
+def test_stats_become_stale_after_large_growth(migrated_db):
+    _insert_logs(migrated_db, 100)
+    db_preflight.run_preflight(migrated_db)
+    _insert_logs(migrated_db, 100, start=100)
+
+    conn = db_preflight.connect(migrated_db)
+    assert "SystemLog" in db_preflight.stale_statistics(conn, drift=0.2)
+    assert db_preflight.stale_statistics(conn, drift=2.0) == []
+    conn.close()
+
+
+def test_oversized_wal_is_checkpointed_and_truncated(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+        [(f"log-{i}", "hazard", "update", "y" * 1000) for i in range(2000)],
+    )
+    conn.commit()
+    # 保持一个连接打开，防止关闭时自动检查点清空 WAL
+    assert db_preflight.wal_file(migrated_db).stat().st_size > 1024 * 1024
+
+    report = db_preflight.run_preflight(migrated_db, wal_limit_mb=1, analyze=False)
+    conn.close()
+
+    assert report["before"]["wal_bytes"] > 1024 * 1024
+    assert report["after"]["wal_bytes"] == 0
+    assert any(a.startswith("wal_checkpoint") for a in report["actions"])
+
+
+def test_fragmentation_detects_interleaved_tables(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    # 两张表交替写入，叶子页在文件中相互穿插
+    for i in range(300):
+        conn.execute('INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+                     (f"log-{i:05d}", "m", "a", "z" * 500))
+        conn.execute('INSERT INTO "Notification" ("id", "userId", "type", "title", "content", "updatedAt") '
+                     'VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)', (f"n-{i:05d}", "u", "t", "title", "c" * 500))
+    conn.commit()
+
+    ratios = db_preflight.fragmentation(conn)
+    conn.close()
+    assert ratios["SystemLog"] > 0.3
+
+
+def test_missing_database_is_skipped(tmp_path, capsys):
+    assert db_preflight.preflight_database(str(tmp_path / "missing.db"))
+    assert "跳过" in capsys.readouterr().out
+
+
+def test_read_only_preflight_only_warns(migrated_db):
+    _insert_logs(migrated_db, 500)
+    before = migrated_db.read_bytes()
+
+    report = db_preflight.run_preflight(migrated_db, read_only=True)
+
+    assert report["actions"] == [] and report["errors"] == []
+    assert report["journal_mode"] == "delete"
+    assert "SystemLog" in report["stale_tables"]
+    assert any("统计信息过期" in w for w in report["warnings"])
+    assert any("journal_mode" in w for w in report["warnings"])
+    assert migrated_db.read_bytes() == before
+    assert not db_preflight.wal_file(migrated_db).exists()
+
+
+def test_failed_migration_fails_preflight(migrated_db, tmp_path, capsys):
+    migrations_dir = tmp_path / "migrations"
+    for name in ("001_init", "002_failed", "003_new"):
+        (migrations_dir / name).mkdir(parents=True)
+        (migrations_dir / name / "migration.sql").write_text("SELECT 1;")
+    conn = sqlite3.connect(migrated_db)
+    conn.execute('CREATE TABLE "_prisma_migrations" ("id" TEXT PRIMARY KEY, "migration_name" TEXT NOT NULL, '
+                 '"started_at" DATETIME, "finished_at" DATETIME, "rolled_back_at" DATETIME)')
+    conn.executemany('INSERT INTO "_prisma_migrations" VALUES (?, ?, ?, ?, ?)', [
+        ("a", "001_init", 1, 2, None),
+        ("b", "002_failed", 3, None, None),
+    ])
+    conn.commit()
+    conn.close()
+
+    with closing(db_preflight.connect(migrated_db, read_only=True)) as conn:
+        assert db_preflight.migration_status(conn, migrations_dir) == {"failed": ["002_failed"], "pending": ["003_new"]}
+    assert not db_preflight.preflight_database(str(migrated_db), read_only=True, migrations_dir=migrations_dir)
+    output = capsys.readouterr().out
+    assert "（只读）" in output and "002_failed" in output and "待执行迁移 1 个" in output
@@ -0,0 +1,169 @@
+"""
+db_salvage 页级扫描与数据抢救测试（pytest）
+
+在迁移得到的数据库中写入 SystemLog 后直接改写文件中的页，
+验证扫描能定位损坏页及所属表，抢救能取回其余所有行（包括只在 -wal 中的已提交事务），
+文件头损坏时命令行报错退出而不是抛出异常。
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import sqlite3
+from contextlib import closing
+
+import db_salvage
+import ehs_db
+
+
+ROWS = 2000
+
+
+def _fill_logs(db_file):
+    conn = sqlite3.connect(db_file)
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+        [(f"log-{i:06d}", "hazard", "update", "x" * 200) for i in range(ROWS)],
+    )
+    conn.execute(
+        'INSERT INTO "Department" ("id", "name", "updatedAt") VALUES (?, ?, CURRENT_TIMESTAMP)', ("dept-1", "安环部")
+    )
+    conn.commit()
+    conn.close()
+
+
+def _system_log_pages(db_file, pagetype):
+    """返回 SystemLog 表指定类型的 (页号, 单元格数)"""
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(
+            "SELECT pageno, ncell FROM dbstat WHERE name = 'SystemLog' AND pagetype = ? ORDER BY pageno",
+            (pagetype,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def _overwrite(db_file, pgno, offset, data: bytes):
+    page_size = sqlite3.connect(db_file).execute("PRAGMA page_size").fetchone()[0]
+    with open(db_file, "r+b") as f:
+        f.seek((pgno - 1) * page_size + offset)
+        f.write(data)
+
+
+def test_scan_clean_database(migrated_db):
+    _fill_logs(migrated_db)
+
+    report = db_salvage.scan_database(migrated_db, workers=1)
+
+    assert report.damaged == {}
+    assert report.orphan_leaves == []
+    assert any(obj.name == "SystemLog" for obj in report.schema)
+    assert "SystemLog" in report.owners.values()
+
+
+def test_damaged_leaf_is_reported_and_skipped(migrated_db, tmp_path):
+    _fill_logs(migrated_db)
+    pgno, ncell = _system_log_pages(migrated_db, "leaf")[3]
+    # 单元格数改成 0xFFFF，指针数组超出页面
+    _overwrite(migrated_db, pgno, 3, b"\xff\xff")
+
+    report = db_salvage.scan_database(migrated_db, workers=1)
+    assert report.damaged_by_owner() == {"SystemLog": [pgno]}
+    assert "单元格数过大" in report.damaged[pgno]
+
+    output = tmp_path / "salvaged.db"
+    result = db_salvage.salvage_database(migrated_db, output, report)
+
+    assert result["tables"]["SystemLog"]["method"] == "pages"
+    assert result["tables"]["SystemLog"]["rows"] == ROWS - ncell
+    assert result["failed_objects"] == []
+    conn = sqlite3.connect(output)
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert conn.execute('SELECT count(*) FROM "SystemLog"').fetchone()[0] == ROWS - ncell
+    # 未受损的表仍然走 SQLite 读取
+    assert result["tables"]["Department"]["method"] == "sqlite"
+    assert result["tables"]["Department"]["rows"] == 1
+    assert conn.execute('SELECT "name" FROM "Department"').fetchone()[0] == "安环部"
+
+
+def test_orphan_leaves_recovered_after_interior_damage(migrated_db, tmp_path):
+    _fill_logs(migrated_db)
+    interior = _system_log_pages(migrated_db, "internal")
+    assert interior, "测试数据应当让 SystemLog 至少有一层内部页"
+    leaves = [pgno for pgno, _ in _system_log_pages(migrated_db, "leaf")]
+    root = interior[0][0]
+    _overwrite(migrated_db, root, 0, b"\x00")
+
+    report = db_salvage.scan_database(migrated_db, workers=1)
+    assert report.damaged_by_owner() == {"SystemLog": [root]}
+    assert report.orphan_leaves == leaves
+
+    result = db_salvage.salvage_database(migrated_db, tmp_path / "salvaged.db", report)
+
+    assert result["tables"]["SystemLog"]["rows"] == ROWS
+
+
+def test_ehs_db_scan_cli_writes_json(migrated_db, tmp_path, capsys):
+    _fill_logs(migrated_db)
+    pgno, _ = _system_log_pages(migrated_db, "leaf")[0]
+    _overwrite(migrated_db, pgno, 0, b"\x07")
+    report_file = tmp_path / "scan.json"
+
+    code = ehs_db.main(["scan", str(migrated_db), "--workers", "1", "--json", str(report_file)])
+
+    assert code == 1
+    assert "SystemLog" in capsys.readouterr().out
+    data = json.loads(report_file.read_text(encoding="utf-8"))
+    assert data["damaged"] == {"SystemLog": [pgno]}
+
+
+def test_salvage_includes_committed_wal_frames(migrated_db, tmp_path):
+    _fill_logs(migrated_db)
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA wal_autocheckpoint = 0")
+    conn.executemany(
+        'INSERT INTO "SystemLog" ("id", "module", "action", "details") VALUES (?, ?, ?, ?)',
+        [(f"wal-{i:06d}", "hazard", "update", "w" * 200) for i in range(300)],
+    )
+    conn.commit()
+    # 未提交的事务不应被合并
+    conn.execute('INSERT INTO "SystemLog" ("id", "module", "action") VALUES (?, ?, ?)', ("pending", "hazard", "x"))
+    wal = db_salvage.wal_file(migrated_db)
+    wal_bytes = wal.read_bytes()
+    main_bytes = migrated_db.read_bytes()
+
+    result = db_salvage.salvage_database(migrated_db, tmp_path / "salvaged.db")
+    # 原文件与 -wal 保持原样
+    assert (migrated_db.read_bytes(), wal.read_bytes()) == (main_bytes, wal_bytes)
+    conn.rollback()
+    conn.close()
+
+    assert result["tables"]["SystemLog"]["rows"] == ROWS + 300
+    with closing(sqlite3.connect(tmp_path / "salvaged.db")) as salvaged:
+        assert salvaged.execute('SELECT COUNT(*) FROM "SystemLog" WHERE "id" = \'pending\'').fetchone()[0] == 0
+
+
+def test_salvage_escapes_special_characters_in_path(migrated_db, tmp_path):
+    _fill_logs(migrated_db)
+    source = tmp_path / "备份 #1?50%" / "ehs.db"
+    source.parent.mkdir()
+    shutil.copy(migrated_db, source)
+
+    result = db_salvage.salvage_database(source, tmp_path / "salvaged.db")
+
+    # 路径未转义时打不开源库，会悄悄退回逐页解析
+    assert result["tables"]["SystemLog"] == {**result["tables"]["SystemLog"], "rows": ROWS, "method": "sqlite"}
+
+
+def test_cli_reports_corrupt_header(migrated_db, tmp_path, capsys):
+    _fill_logs(migrated_db)
+    _overwrite(migrated_db, 1, 0, b"not a database!!")
+
+    assert ehs_db.main(["scan", str(migrated_db), "--workers", "1"]) == 1
+    assert ehs_db.main(["salvage", str(migrated_db), "--output", str(tmp_path / "out.db")]) == 1
+
+    output = capsys.readouterr().out
+    assert "❌ 无法扫描" in output and "❌ 无法抢救" in output and "文件头损坏" in output
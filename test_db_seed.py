@@ -0,0 +1,142 @@
+"""
+db_seed 大规模测试数据生成测试（pytest）
+
+验证生成数据的引用完整性与分布、写入后索引被完整重建、失败时整体回滚，
+以及 hazard_lifecycle.ensure_users 的批量 upsert。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+import db_seed
+import ehs_db
+from hazard_lifecycle import ADMIN, TEST_USERS, USER_A, ensure_users
+
+
+NOW = int(datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp() * 1000)
+SMALL = dict(users=120, departments=12, hazards=3000, days=60, now_ms=NOW)
+
+
+def _indexes(conn):
+    return conn.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL ORDER BY name"
+    ).fetchall()
+
+
+def test_seed_generates_consistent_dataset(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    before = _indexes(conn)
+
+    report = db_seed.seed_database(migrated_db, seed=7, **SMALL)
+
+    tables = report["tables"]
+    assert (tables["Department"], tables["User"], tables["HazardRecord"]) == (12, 120, 3000)
+    assert report["indexes"] > 0
+    assert _indexes(conn) == before
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+
+    steps = db_seed.load_workflow_steps()
+    # 每条隐患为已到达的每一步各写一条步骤记录
+    assert conn.execute('SELECT SUM("currentStepIndex" + 1) FROM "HazardRecord"').fetchone()[0] == (
+        tables["HazardWorkflowStep"]
+    )
+    assert conn.execute(
+        'SELECT COUNT(*) FROM "HazardRecord" WHERE "status" = \'closed\' AND "currentExecutorId" IS NOT NULL'
+    ).fetchone()[0] == 0
+    assert conn.execute(
+        'SELECT COUNT(*) FROM "HazardRecord" WHERE "status" = \'closed\' AND "currentStepIndex" != ?',
+        (len(steps) - 1,),
+    ).fetchone()[0] == 0
+    statuses = dict(conn.execute('SELECT "status", COUNT(*) FROM "HazardRecord" GROUP BY 1').fetchall())
+    # 越早的隐患越可能已闭环，最近几天的仍在流程中
+    assert statuses["closed"] > 0.7 * 3000
+    assert len(statuses) > 2
+    roles = dict(conn.execute('SELECT "role", COUNT(*) FROM "HazardVisibility" GROUP BY 1').fetchall())
+    assert roles["creator"] == roles["responsible"] == 3000
+    assert roles["verifier"] == statuses["closed"]
+    codes = [row[0] for row in conn.execute('SELECT "code" FROM "HazardRecord"')]
+    assert all(code.startswith("Hazard2026") or code.startswith("Hazard2025") for code in codes)
+    assert conn.execute('SELECT MAX("updatedAt") FROM "Notification"').fetchone()[0] <= NOW
+    conn.close()
+
+
+def test_same_seed_generates_same_rows(migrated_db, tmp_path):
+    other = tmp_path / "other.db"
+    other.write_bytes(migrated_db.read_bytes())
+
+    db_seed.seed_database(migrated_db, seed=3, **SMALL)
+    db_seed.seed_database(other, seed=3, **SMALL)
+
+    query = 'SELECT * FROM "HazardRecord" ORDER BY "id"'
+    with sqlite3.connect(migrated_db) as a, sqlite3.connect(other) as b:
+        assert a.execute(query).fetchall() == b.execute(query).fetchall()
+
+
+def test_seeding_twice_continues_daily_code_sequence(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    day = datetime.fromtimestamp((NOW - db_seed.DAY_MS) / 1000, tz=timezone.utc).strftime("%Y%m%d")
+    # 编号池里已预生成的编号同样不能再用
+    conn.execute(
+        'INSERT INTO "HazardCodePool" ("id", "code", "datePrefix", "sequence", "status", "createdAt", "updatedAt") '
+        "VALUES ('pool-1', ?, ?, 998, 'available', ?, ?)",
+        (f"Hazard{day}998", day, NOW, NOW),
+    )
+    conn.commit()
+
+    db_seed.seed_database(migrated_db, seed=5, **SMALL)
+    report = db_seed.seed_database(migrated_db, seed=6, **SMALL)
+
+    assert report["tables"]["HazardRecord"] == 3000
+    total, distinct = conn.execute('SELECT COUNT("code"), COUNT(DISTINCT "code") FROM "HazardRecord"').fetchone()
+    assert total == distinct > 0
+    assert conn.execute('SELECT COUNT(*) FROM "HazardRecord" WHERE "code" = ?', (f"Hazard{day}998",)).fetchone()[0] == 0
+    last_day = conn.execute(
+        'SELECT "code" FROM "HazardRecord" WHERE "code" LIKE ? ORDER BY "code"', (f"Hazard{day}%",)
+    ).fetchall()
+    assert last_day[-1][0] == f"Hazard{day}999"
+    conn.close()
+
+
+def test_failed_seed_rolls_back_including_dropped_indexes(migrated_db):
+    db_seed.seed_database(migrated_db, seed=5, **SMALL)
+    conn = sqlite3.connect(migrated_db)
+    before = _indexes(conn)
+    hazards = conn.execute('SELECT COUNT(*) FROM "HazardRecord"').fetchone()[0]
+
+    # 相同种子生成相同的主键，写入时报主键冲突
+    with pytest.raises(sqlite3.IntegrityError):
+        db_seed.seed_database(migrated_db, seed=5, **SMALL)
+
+    assert _indexes(conn) == before
+    assert conn.execute('SELECT COUNT(*) FROM "HazardRecord"').fetchone()[0] == hazards
+    conn.close()
+
+
+def test_ensure_users_upserts_in_bulk(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    ensure_users(conn, TEST_USERS)
+    conn.execute('UPDATE "User" SET "isActive" = 0, "role" = \'user\' WHERE "id" = ?', (ADMIN["id"],))
+
+    ensure_users(conn, [ADMIN, USER_A])
+
+    assert conn.execute('SELECT COUNT(*) FROM "User" WHERE "id" LIKE \'test-%\'').fetchone()[0] == len(TEST_USERS)
+    assert conn.execute('SELECT "role", "isActive" FROM "User" WHERE "id" = ?', (ADMIN["id"],)).fetchone() == (
+        "admin", 1
+    )
+    conn.close()
+
+
+def test_ehs_db_cli_seed(migrated_db, capsys):
+    argv = ["seed", "--db", str(migrated_db), "--hazards", "500", "--users", "50", "--departments", "5"]
+
+    assert ehs_db.main(argv + ["--seed", "1"]) == 0
+    assert ehs_db.main(argv + ["--seed", "1"]) == 1
+
+    output = capsys.readouterr().out
+    assert "HazardRecord" in output and "行/分钟" in output
+    assert "生成失败，已回滚" in output
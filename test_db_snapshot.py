@@ -0,0 +1,129 @@
+"""
+db_snapshot 测试数据库快照测试（pytest）
+
+验证黄金库按指纹缓存、克隆副本之间相互隔离，以及 isolated_app 把应用实例
+指向数据库副本与独立的工作流配置。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import textwrap
+import urllib.request
+
+import db_snapshot
+import ehs_db
+from hazard_lifecycle import TEST_USERS, build_workflow_config, isolated_app
+
+
+def _count(db_file, table):
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+
+
+def test_golden_database_is_cached_by_fingerprint(tmp_path):
+    cache = tmp_path / "cache"
+
+    golden = db_snapshot.golden_database(cache)
+    mtime = golden.stat().st_mtime_ns
+
+    assert db_snapshot.golden_database(cache) == golden
+    assert golden.stat().st_mtime_ns == mtime
+    assert _count(golden, "User") == len(TEST_USERS)
+    schema = db_snapshot.golden_database(cache, test_users=False)
+    assert schema != golden and _count(schema, "User") == 0
+    seeded = db_snapshot.golden_database(cache, {"hazards": 200, "users": 20, "departments": 4, "seed": 1})
+    assert _count(seeded, "HazardRecord") == 200
+    assert sorted(p.name for p in cache.iterdir()) == sorted(p.name for p in (golden, schema, seeded))
+
+
+def test_clones_are_independent(golden_db, tmp_path):
+    first, second = tmp_path / "a" / "ehs.db", tmp_path / "b" / "ehs.db"
+
+    assert db_snapshot.clone_database(golden_db, first) in ("reflink", "backup")
+    assert db_snapshot.clone_database(golden_db, second, method="backup") == "backup"
+
+    with sqlite3.connect(first) as conn:
+        conn.execute('DELETE FROM "User"')
+    assert _count(first, "User") == 0
+    assert _count(second, "User") == _count(golden_db, "User") == len(TEST_USERS)
+
+
+def test_backup_clone_escapes_special_characters_in_path(golden_db, tmp_path):
+    source = tmp_path / "备份 #1?50%" / "ehs.db"
+    source.parent.mkdir()
+    source.write_bytes(golden_db.read_bytes())
+    target = tmp_path / "copy.db"
+
+    assert db_snapshot.clone_database(source, target, method="backup") == "backup"
+    assert _count(target, "User") == len(TEST_USERS)
+
+
+def test_snapshot_db_fixture_writes_do_not_reach_golden(snapshot_db, golden_db):
+    with sqlite3.connect(snapshot_db) as conn:
+        conn.execute('UPDATE "User" SET "role" = \'admin\'')
+    with sqlite3.connect(golden_db) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM "User" WHERE "role" = \'admin\'').fetchone()[0] == 1
+
+
+def test_reflink_falls_back_without_leaving_target(golden_db, tmp_path):
+    target = tmp_path / "copy.db"
+
+    if not db_snapshot.reflink(golden_db, target):
+        assert not target.exists()
+    else:
+        assert target.read_bytes() == golden_db.read_bytes()
+
+
+def test_isolated_app_points_instance_at_copy(snapshot_db, tmp_path, monkeypatch):
+    stub = tmp_path / "stub_app.py"
+    stub.write_text(textwrap.dedent("""
+        import json, os, sys
+        from http.server import BaseHTTPRequestHandler, HTTPServer
+        from pathlib import Path
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps({
+                    "db": os.environ["DATABASE_URL"],
+                    "workflow": json.loads(Path("data/hazard-workflow.json").read_text(encoding="utf-8")),
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        HTTPServer(("127.0.0.1", int(sys.argv[1])), Handler).serve_forever()
+    """), encoding="utf-8")
+    monkeypatch.setenv("EHS_APP_CMD", f"{sys.executable} {stub} {{port}}")
+    work_dir = tmp_path / "worker"
+    work_dir.mkdir()
+    config = build_workflow_config()
+
+    with isolated_app(tmp_path, work_dir, snapshot_db, config, timeout=30) as base_url:
+        with urllib.request.urlopen(f"{base_url}/api/hazards/workflow", timeout=10) as response:
+            seen = json.loads(response.read())
+
+    assert seen["db"] == f"file:{snapshot_db.resolve()}"
+    assert seen["workflow"] == config
+
+
+def test_isolated_app_without_build_yields_none(snapshot_db, tmp_path, monkeypatch):
+    monkeypatch.delenv("EHS_APP_CMD", raising=False)
+
+    with isolated_app(tmp_path, tmp_path, snapshot_db, build_workflow_config()) as base_url:
+        assert base_url is None
+
+
+def test_ehs_db_cli_snapshot_clone(golden_db, tmp_path, capsys):
+    target = tmp_path / "clone.db"
+
+    assert ehs_db.main(["snapshot", "clone", str(golden_db), str(target), "--method", "backup"]) == 0
+    assert ehs_db.main(["snapshot", "clone", str(tmp_path / "missing.db"), str(target)]) == 1
+
+    output = capsys.readouterr().out
+    assert "backup" in output
+    assert "找不到源数据库" in output
+    assert _count(target, "User") == len(TEST_USERS)
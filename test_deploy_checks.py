@@ -0,0 +1,150 @@
+"""
+deploy_checks 部署后检查测试（pytest）
+
+用本地 HTTP 服务模拟应用接口，验证预热的冷/热延迟统计。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import deploy_checks
+
+
+@pytest.fixture
+def fake_app():
+    """模拟应用：每个路径首次访问较慢（冷编译），之后很快；/api/broken 始终 500。"""
+    seen: set[str] = set()
+    lock = threading.Lock()
+    headers: list[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            headers.append(self.headers.get("x-user-id"))
+            if self.path.startswith("/api/broken"):
+                self.send_response(500)
+                self.end_headers()
+                return
+            with lock:
+                cold = self.path not in seen
+                seen.add(self.path)
+            if cold:
+                time.sleep(0.05)
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", headers
+    server.shutdown()
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert deploy_checks.percentile(values, 50) == 50.0
+    assert deploy_checks.percentile(values, 95) == 95.0
+    assert deploy_checks.percentile([], 95) == 0.0
+
+
+def test_warmup_reports_cold_and_warm_latency(fake_app):
+    base_url, headers = fake_app
+    report = deploy_checks.run_warmup(base_url, user_id="u-1", concurrency=2, max_rounds=5)
+
+    assert report["ok"]
+    assert set(report["routes"]) == {"hazard-list", "my-tasks", "dashboard-stats", "notifications"}
+    for route in report["routes"].values():
+        assert route["cold_p95_ms"] >= route["warm_p50_ms"]
+    assert set(headers) == {"u-1"}
+
+
+def test_warmup_flags_broken_routes(fake_app):
+    base_url, _ = fake_app
+    plan = [{"name": "ok", "path": "/api/health"}, {"name": "broken", "path": "/api/broken"}]
+    report = deploy_checks.run_warmup(base_url, plan, concurrency=1, max_rounds=2)
+
+    assert not report["ok"]
+    assert not report["routes"]["broken"]["healthy"]
+    assert report["routes"]["broken"]["errors"] == 2
+
+
+def test_load_plan_defaults_name_to_path(fake_app, tmp_path):
+    base_url, _ = fake_app
+    plan_file = tmp_path / "warmup.json"
+    plan_file.write_text('[{"path": "/api/health"}, {"name": "dashboard", "path": "/api/dashboard/stats"}]')
+
+    plan = deploy_checks.load_plan(plan_file)
+    report = deploy_checks.run_warmup(base_url, plan, concurrency=1, max_rounds=2)
+
+    assert [item["name"] for item in plan] == ["/api/health", "dashboard"]
+    assert set(report["routes"]) == {"/api/health", "dashboard"}
+    plan_file.write_text('[{"name": "no-path"}]')
+    with pytest.raises(ValueError, match="预热计划格式错误"):
+        deploy_checks.load_plan(plan_file)
+
+
+def test_load_mix_aggregates_recorded_requests(tmp_path):
+    recorded = tmp_path / "mix.ndjson"
+    recorded.write_text(
+        '{"method": "GET", "path": "/api/hazards?page=1"}\n'
+        '{"method": "GET", "path": "/api/hazards?page=1"}\n'
+        '{"path": "/api/dashboard/stats"}\n'
+    )
+    mix = deploy_checks.load_mix(recorded)
+
+    weights = {item["path"]: item["weight"] for item in mix}
+    assert weights == {"/api/hazards?page=1": 2, "/api/dashboard/stats": 1}
+
+
+@pytest.mark.parametrize("text", ['["/api/health"]', '[{"path": "/api/health"}, null]', '"/api/health"\n'])
+def test_load_mix_rejects_non_object_items(tmp_path, text):
+    mix_file = tmp_path / "mix.json"
+    mix_file.write_text(text)
+
+    with pytest.raises(ValueError, match="请求组合格式错误"):
+        deploy_checks.load_mix(mix_file)
+
+
+def test_compare_with_baseline_explains_regressed_routes():
+    baseline = {
+        "throughput_rps": 100.0,
+        "routes": {
+            "hazard-list": {"p50_ms": 40.0, "p95_ms": 80.0},
+            "notifications": {"p50_ms": 10.0, "p95_ms": 20.0},
+        },
+    }
+    result = {
+        "requests": 200,
+        "errors": 0,
+        "throughput_rps": 50.0,
+        "routes": {
+            "hazard-list": {"p50_ms": 200.0, "p95_ms": 400.0},
+            # 比例超标但绝对差值很小，视为噪声
+            "notifications": {"p50_ms": 18.0, "p95_ms": 30.0},
+        },
+    }
+    regressions = deploy_checks.compare_with_baseline(result, baseline)
+
+    assert any("吞吐量" in line for line in regressions)
+    assert any(line.startswith("hazard-list p50") for line in regressions)
+    assert any(line.startswith("hazard-list p95") for line in regressions)
+    assert not any("notifications" in line for line in regressions)
+
+
+def test_latency_gate_saves_baseline_only_when_passing(fake_app, tmp_path):
+    base_url, _ = fake_app
+    baseline_file = tmp_path / "baseline.json"
+
+    assert deploy_checks.run_latency_gate(base_url, baseline_file=baseline_file, label="abc123") == []
+    assert deploy_checks.load_baseline(baseline_file)["label"] == "abc123"
+
+    strict = {"throughput_ratio": 1e9}
+    assert deploy_checks.run_latency_gate(base_url, baseline_file=baseline_file, thresholds=strict, label="def456")
+    assert deploy_checks.load_baseline(baseline_file)["label"] == "abc123"
@@ -0,0 +1,108 @@
+"""
+docker_oneclick startup orchestration tests (pytest)
+
+A fake docker shim records every call with a timestamp; the app build is slow,
+so MinIO must be pulled and started while the build is still running.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import docker_oneclick
+
+FAKE_DOCKER = """#!{python}
+import json, os, sys, time
+args = sys.argv[1:]
+with open(os.environ["FAKE_DOCKER_LOG"], "a") as f:
+    f.write(json.dumps({{"args": args, "at": time.time()}}) + "\\n")
+if "build" in args:
+    time.sleep(0.8)
+    with open(os.environ["FAKE_DOCKER_LOG"], "a") as f:
+        f.write(json.dumps({{"args": ["build-done"], "at": time.time()}}) + "\\n")
+elif args[:1] == ["inspect"]:
+    print("healthy")
+elif args[:2] == ["logs", "-f"]:
+    print("📊 Running database migrations...", flush=True)
+    time.sleep(0.1)
+    print("🌐 Starting Next.js application...", flush=True)
+    time.sleep(30)
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    shim = bin_dir / "docker"
+    shim.write_text(FAKE_DOCKER.format(python=sys.executable))
+    shim.chmod(0o755)
+    log_file = tmp_path / "docker-calls.jsonl"
+    log_file.touch()
+
+    root = tmp_path / "site"
+    root.mkdir()
+    (root / "docker-compose.prod.yml").write_text("services: {}\n")
+    port = _free_port()
+    (root / ".env.docker").write_text(f"APP_PORT={port}\n")
+
+    monkeypatch.setenv("FAKE_DOCKER_LOG", str(log_file))
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.delenv("APP_PORT", raising=False)
+    monkeypatch.setattr(docker_oneclick, "ROOT", root)
+    monkeypatch.setattr(docker_oneclick, "COMPOSE_FILE", root / "docker-compose.prod.yml")
+    monkeypatch.setattr(docker_oneclick, "ENV_FILE", root / ".env.docker")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield root, log_file
+    server.shutdown()
+
+
+def test_minio_starts_while_app_image_builds(site, monkeypatch, capsys):
+    root, log_file = site
+    monkeypatch.setattr(sys, "argv", ["docker_oneclick.py", "--min-free-gb", "0"])
+
+    docker_oneclick.main()
+
+    calls = [json.loads(line) for line in log_file.read_text().splitlines()]
+    at = {}
+    for call in calls:
+        key = " ".join(a for a in call["args"] if not a.startswith(("-", str(root))) and a != ".env.docker")
+        at.setdefault(key, call["at"])
+
+    assert at["compose up minio"] < at["build-done"]
+    assert at["compose pull minio"] < at["build-done"]
+    assert at["compose up app"] > at["build-done"]
+    assert all((root / rel).is_dir() for rel in docker_oneclick.REQUIRED_DIRS)
+
+    out = capsys.readouterr().out
+    for stage in ("Build app", "Pull MinIO", "MinIO ready", "Migrations", "App healthy"):
+        assert stage in out
+
+
+def test_free_disk_check_rejects_small_volumes(tmp_path):
+    with pytest.raises(SystemExit):
+        docker_oneclick.check_free_disk(tmp_path / "missing" / "dir", min_free_gb=10 ** 9)
+    assert docker_oneclick.check_free_disk(tmp_path / "missing", min_free_gb=0) > 0
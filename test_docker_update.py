@@ -0,0 +1,299 @@
+"""
+docker_update 部署编排测试（pytest）
+
+使用伪造的 docker 命令行（fake docker shim）记录调用，
+用本地 HTTP 服务模拟新容器，验证蓝绿切换、代理转发与旧容器回收。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+import docker_update
+
+FAKE_DOCKER = """#!{python}
+import json, os, sys
+args = sys.argv[1:]
+with open(os.environ["FAKE_DOCKER_LOG"], "a") as f:
+    f.write(json.dumps(args) + "\\n")
+
+# 镜像标签表：{{"repo:tag": "sha256:..."}}，支持 image inspect / images / tag / rmi
+images_file = os.environ["FAKE_DOCKER_IMAGES"]
+images = json.load(open(images_file))
+if args[:2] == ["image", "inspect"]:
+    if args[-1] not in images:
+        sys.exit(1)
+    print(images[args[-1]])
+elif args[0] == "images":
+    repo = args[1]
+    for name, image_id in images.items():
+        if name.startswith(repo + ":"):
+            print(name.split(":", 1)[1] + "\\t" + image_id)
+elif args[0] == "tag":
+    if args[1] not in images:
+        sys.exit(1)
+    images[args[2]] = images[args[1]]
+elif args[0] == "rmi":
+    images.pop(args[1], None)
+json.dump(images, open(images_file, "w"))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _serve_health(port: int, body: str) -> ThreadingHTTPServer:
+    """启动一个模拟容器的健康检查服务，返回 body 以便区分颜色。"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(body.encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def fake_docker(tmp_path, monkeypatch):
+    """把伪造的 docker 命令放到 PATH 最前面，返回读取调用记录的函数。"""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    shim = bin_dir / "docker"
+    shim.write_text(FAKE_DOCKER.format(python=sys.executable))
+    shim.chmod(0o755)
+
+    log_file = tmp_path / "docker-calls.jsonl"
+    log_file.touch()
+    images_file = tmp_path / "docker-images.json"
+    images_file.write_text("{}")
+    monkeypatch.setenv("FAKE_DOCKER_LOG", str(log_file))
+    monkeypatch.setenv("FAKE_DOCKER_IMAGES", str(images_file))
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    class FakeDocker:
+        def calls(self) -> list[list[str]]:
+            return [json.loads(line) for line in log_file.read_text().splitlines()]
+
+        @property
+        def images(self) -> dict[str, str]:
+            return json.loads(images_file.read_text())
+
+        @images.setter
+        def images(self, value: dict[str, str]):
+            images_file.write_text(json.dumps(value))
+
+    return FakeDocker()
+
+
+def test_backoff_delays_start_small_and_cap():
+    delays = docker_update.backoff_delays(initial=0.02, factor=2.0, cap=0.1)
+    assert [next(delays) for _ in range(5)] == [0.02, 0.04, 0.08, 0.1, 0.1]
+
+
+def test_record_deploy_timing_appends_history(tmp_path):
+    history = tmp_path / "deploy-history.jsonl"
+    docker_update.record_deploy_timing(history, {"healthy": True, "time_to_ready_s": 1.5})
+    docker_update.record_deploy_timing(history, {"healthy": True, "time_to_ready_s": 2.0})
+
+    records = [json.loads(line) for line in history.read_text().splitlines()]
+    assert [r["time_to_ready_s"] for r in records] == [1.5, 2.0]
+
+
+def test_bluegreen_switches_proxy_and_drains_old_container(tmp_path, fake_docker):
+    ports = {"blue": _free_port(), "green": _free_port()}
+    public_port = _free_port()
+    state_file = tmp_path / "bluegreen.json"
+    pid_file = tmp_path / "bluegreen-proxy.pid"
+    servers = []
+
+    def deploy():
+        return docker_update.update_service_bluegreen(
+            Path("docker-compose.prod.yml"),
+            Path(".env.docker"),
+            public_port=public_port,
+            state_file=state_file,
+            ports=ports,
+            health_timeout=5,
+            drain_timeout=2,
+        )
+
+    try:
+        # 首次部署：从 compose 管理的 ehs-app 切到 blue，由代理接管对外端口
+        servers.append(_serve_health(ports["blue"], "blue"))
+        assert deploy() == "ehs-app-blue"
+        assert docker_update.load_bluegreen_state(state_file)["active"] == "blue"
+        assert docker_update.probe_health(f"http://127.0.0.1:{public_port}/api/health")
+
+        # 第二次部署：blue -> green，代理切换上游，旧容器被停止并移除
+        servers.append(_serve_health(ports["green"], "green"))
+        assert deploy() == "ehs-app-green"
+
+        from urllib.request import urlopen
+        with urlopen(f"http://127.0.0.1:{public_port}/api/health", timeout=2) as response:
+            assert response.read() == b"green"
+
+        calls = fake_docker.calls()
+        assert ["stop", "ehs-app"] in calls
+        assert ["stop", "ehs-app-blue"] in calls
+        assert ["rm", "ehs-app-blue"] in calls
+        run_calls = [c for c in calls if "run" in c]
+        assert any(f"127.0.0.1:{ports['green']}:3000" in c for c in run_calls)
+    finally:
+        if pid_file.exists():
+            os.kill(int(pid_file.read_text()), signal.SIGTERM)
+        for server in servers:
+            server.shutdown()
+
+
+def test_bluegreen_keeps_old_container_when_new_one_fails(tmp_path, fake_docker):
+    ports = {"blue": _free_port(), "green": _free_port()}
+    state_file = tmp_path / "bluegreen.json"
+
+    container = docker_update.update_service_bluegreen(
+        Path("docker-compose.prod.yml"),
+        Path(".env.docker"),
+        public_port=_free_port(),
+        state_file=state_file,
+        ports=ports,
+        health_timeout=1,
+    )
+
+    assert container is None
+    assert not state_file.exists()
+    calls = fake_docker.calls()
+    assert ["rm", "-f", "ehs-app-blue"] in calls
+    assert ["stop", "ehs-app"] not in calls
+
+
+def test_bluegreen_restarts_old_container_when_proxy_cannot_take_over(tmp_path, fake_docker):
+    ports = {"blue": _free_port(), "green": _free_port()}
+    state_file = tmp_path / "bluegreen.json"
+    server = _serve_health(ports["blue"], "blue")
+    # 对外端口被其他进程占用（docker stop 之后也没有释放），代理无法接管
+    occupied = socket.socket()
+    occupied.bind(("127.0.0.1", 0))
+    occupied.listen()
+
+    try:
+        container = docker_update.update_service_bluegreen(
+            Path("docker-compose.prod.yml"),
+            Path(".env.docker"),
+            public_port=occupied.getsockname()[1],
+            state_file=state_file,
+            ports=ports,
+            health_timeout=5,
+            proxy_timeout=1,
+        )
+    finally:
+        occupied.close()
+        server.shutdown()
+
+    assert container is None
+    assert not state_file.exists()
+    assert not (tmp_path / "bluegreen-proxy.pid").exists()
+    assert not (tmp_path / "bluegreen-proxy-check.pid").exists()
+    calls = fake_docker.calls()
+    # 演练通过后才停旧容器；接管失败时重新启动旧容器并移除新容器
+    assert calls.index(["stop", "ehs-app"]) < calls.index(["start", "ehs-app"])
+    assert ["rm", "-f", "ehs-app-blue"] in calls
+
+
+def test_leave_bluegreen_frees_public_port_for_compose(tmp_path, fake_docker):
+    ports = {"blue": _free_port(), "green": _free_port()}
+    public_port = _free_port()
+    state_file = tmp_path / "bluegreen.json"
+    pid_file = tmp_path / "bluegreen-proxy.pid"
+    server = _serve_health(ports["blue"], "blue")
+
+    try:
+        assert docker_update.update_service_bluegreen(
+            Path("docker-compose.prod.yml"),
+            Path(".env.docker"),
+            public_port=public_port,
+            state_file=state_file,
+            ports=ports,
+            health_timeout=5,
+        ) == "ehs-app-blue"
+        assert docker_update.leave_bluegreen(state_file)
+    finally:
+        if pid_file.exists():
+            os.kill(int(pid_file.read_text()), signal.SIGTERM)
+        server.shutdown()
+
+    assert not state_file.exists()
+    assert not pid_file.exists()
+    assert ["rm", "-f", "ehs-app-blue"] in fake_docker.calls()
+    # 代理已释放对外端口，compose 的 ehs-app 可以重新绑定
+    with socket.socket() as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("0.0.0.0", public_port))
+    # 没有蓝绿状态时不做任何事
+    assert docker_update.leave_bluegreen(state_file)
+
+
+def test_release_tags_are_reused_and_pruned(fake_docker):
+    fake_docker.images = {
+        "ehs-system:prod": "sha256:e",
+        "ehs-system:aaa1111-20260101-000000": "sha256:a",
+        "ehs-system:bbb2222-20260102-000000": "sha256:b",
+        "ehs-system:ccc3333-20260103-000000": "sha256:c",
+        "ehs-system:ddd4444-20260104-000000": "sha256:d",
+    }
+
+    tag = docker_update.tag_release_image("eee5555")
+    assert tag.startswith("eee5555-")
+    # 同一镜像再次打标签时复用已有发布标签
+    assert docker_update.tag_release_image("fff6666") == tag
+
+    docker_update.prune_release_images(keep=3)
+    assert sorted(fake_docker.images) == [
+        "ehs-system:ccc3333-20260103-000000",
+        "ehs-system:ddd4444-20260104-000000",
+        f"ehs-system:{tag}",
+        "ehs-system:prod",
+    ]
+    assert docker_update.previous_release()["tag"] == "ddd4444-20260104-000000"
+
+
+def test_rollback_repoints_prod_to_retained_tag(tmp_path, fake_docker, monkeypatch):
+    fake_docker.images = {
+        "ehs-system:prod": "sha256:b",
+        "ehs-system:aaa1111-20260101-000000": "sha256:a",
+        "ehs-system:bbb2222-20260102-000000": "sha256:b",
+    }
+    monkeypatch.setattr(docker_update, "BLUEGREEN_STATE_FILE", tmp_path / "bluegreen.json")
+    server = _serve_health(_free_port(), "ok")
+    health_url = f"http://127.0.0.1:{server.server_address[1]}/api/health"
+
+    try:
+        assert docker_update.rollback_to_image(
+            Path("docker-compose.prod.yml"), Path(".env.docker"),
+            health_url=health_url, health_timeout=5,
+        )
+        assert not docker_update.rollback_to_image(
+            Path("docker-compose.prod.yml"), Path(".env.docker"), tag="missing-20260101-000000",
+            health_url=health_url, health_timeout=5,
+        )
+    finally:
+        server.shutdown()
+
+    assert fake_docker.images["ehs-system:prod"] == "sha256:a"
+    assert any(call[-4:] == ["up", "-d", "--no-deps", "app"] for call in fake_docker.calls())
@@ -0,0 +1,144 @@
+"""
+hazard_api_stub 隐患接口替身测试（pytest）
+
+直接调用 HazardApiStub.handle()，验证认证与权限、上报时的编号/步骤解析/派发、
+流转时的执行人校验与回退保护、作废释放编号，以及工作流配置的读取与保存。
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+
+import pytest
+
+from hazard_api_stub import HazardApiStub
+from hazard_lifecycle import (
+    ADMIN,
+    TRANSITIONS,
+    USER_A,
+    USER_B,
+    USER_C,
+    USER_D,
+    USER_E,
+    advance_payload,
+    build_workflow_config,
+    close_payload,
+    create_payload,
+    void_payload,
+)
+
+
+@pytest.fixture
+def api(snapshot_db, tmp_path):
+    workflow_file = tmp_path / "data" / "hazard-workflow.json"
+    workflow_file.parent.mkdir()
+    workflow_file.write_text(json.dumps(build_workflow_config(), ensure_ascii=False), encoding="utf-8")
+    stub = HazardApiStub(snapshot_db, workflow_file)
+    yield stub
+    stub.close()
+
+
+def _ok(response):
+    status, body = response
+    assert status == 200, body
+    return body
+
+
+def _report(api):
+    return _ok(api.handle("POST", "/api/hazards", USER_A["id"], create_payload()))
+
+
+def test_auth_and_report_permission(api):
+    assert api.handle("POST", "/api/hazards", None, create_payload())[0] == 401
+    assert api.handle("POST", "/api/hazards", "nobody", create_payload())[0] == 401
+    status, body = api.handle("POST", "/api/hazards", USER_B["id"], create_payload())
+    assert status == 403
+    assert body["details"] == "需要 hidden_danger.report 权限"
+    assert api.handle("DELETE", "/api/hazards", ADMIN["id"])[0] == 404
+
+
+def test_report_resolves_steps_and_dispatches(api, snapshot_db):
+    hazard = _report(api)
+
+    assert (hazard["status"], hazard["currentStepId"], hazard["currentStepIndex"]) == ("assigned", "confirm", 1)
+    assert hazard["currentExecutorId"] == hazard["dopersonal_ID"] == USER_C["id"]
+    assert hazard["code"].startswith("Hazard") and len(hazard["code"]) == 17
+    assert [log["action"] for log in hazard["logs"]] == ["上报隐患", "提交上报"]
+    with sqlite3.connect(snapshot_db) as conn:
+        steps = conn.execute(
+            'SELECT "stepId", "handlerUserIds" FROM "HazardWorkflowStep" WHERE "hazardId" = ? ORDER BY "stepIndex"',
+            (hazard["id"],),
+        ).fetchall()
+        roles = set(conn.execute('SELECT "userId", "role" FROM "HazardVisibility" WHERE "hazardId" = ?', (hazard["id"],)))
+        notified = conn.execute('SELECT "userId" FROM "Notification" WHERE "relatedId" = ?', (hazard["id"],)).fetchall()
+    assert steps == [
+        ("report", json.dumps([USER_A["id"]])),
+        ("confirm", json.dumps([USER_C["id"]])),
+        ("approve", json.dumps([USER_D["id"]])),
+        ("rectify", json.dumps([USER_B["id"]])),
+        ("verify", json.dumps([USER_E["id"]])),
+    ]
+    assert roles == {(USER_A["id"], "creator"), (USER_C["id"], "executor"), (USER_B["id"], "responsible")}
+    assert notified == [(USER_C["id"],)]
+
+
+def test_full_lifecycle_and_executor_checks(api):
+    steps = build_workflow_config()["steps"]
+    hazard = _report(api)
+    for name, operator, next_step_id, index, assignee, action, extra, status in TRANSITIONS:
+        if name == "rectify":
+            # 提交整改只允许当前步骤的处理人（B）
+            wrong = advance_payload(hazard, USER_D, next_step_id, index, steps, assignee, action, extra)
+            assert api.handle("PATCH", "/api/hazards", USER_D["id"], wrong) == (
+                500, {"error": "权限不足：您没有权限执行此操作", "details": "权限不足：您没有权限执行此操作"}
+            )
+        payload = advance_payload(hazard, operator, next_step_id, index, steps, assignee, action, extra)
+        hazard = _ok(api.handle("PATCH", "/api/hazards", operator["id"], payload))
+        assert (hazard["status"], hazard["currentStepId"], hazard["currentExecutorId"]) == (
+            status, next_step_id, assignee["id"]
+        )
+    assert hazard["rectifyDesc"] == "已完成整改并上传现场照片"
+
+    stale = advance_payload(hazard, USER_C, "approve", 2, steps, USER_D, "确认")
+    status, body = api.handle("PATCH", "/api/hazards", USER_C["id"], stale)
+    assert status == 500 and body["error"].startswith("并发冲突")
+
+    hazard = _ok(api.handle("PATCH", "/api/hazards", USER_E["id"], close_payload(hazard)))
+    assert (hazard["status"], hazard["currentExecutorId"]) == ("closed", None)
+    assert hazard["verificationNotes"] == hazard["verifyDesc"] == "验收通过，流程闭环"
+    assert hazard["logs"][0]["action"] == "验收通过"
+
+
+def test_void_releases_code_for_reuse(api):
+    first = _report(api)
+    second = _report(api)
+    assert first["code"] != second["code"]
+
+    voided = _ok(api.handle("POST", "/api/hazards/void", USER_A["id"], void_payload(first)))
+    assert voided["data"]["originalCode"] == first["code"] and voided["data"]["code"] is None
+    assert api.handle("POST", "/api/hazards/void", USER_A["id"], void_payload(first))[0] == 400
+    assert api.handle("POST", "/api/hazards/void", USER_A["id"], {"hazardId": first["id"]})[0] == 400
+    assert api.handle("POST", "/api/hazards/void", USER_A["id"], void_payload({"id": "missing"}))[0] == 404
+
+    assert _report(api)["code"] == first["code"]
+
+
+def test_workflow_config_read_and_save(api, tmp_path):
+    assert _ok(api.handle("GET", "/api/hazards/workflow", USER_B["id"]))["data"] == build_workflow_config()
+
+    config = build_workflow_config()
+    config["steps"].insert(1, {"id": "precheck", "name": "预审", "handlerStrategy": {"type": "reporter"}})
+    assert api.handle("POST", "/api/hazards/workflow", USER_A["id"], {"config": config})[0] == 403
+    assert api.handle("POST", "/api/hazards/workflow", ADMIN["id"], {"config": {}})[0] == 400
+    saved = _ok(api.handle("POST", "/api/hazards/workflow", ADMIN["id"], {"config": config}))["data"]
+    assert saved["version"] == 2 and saved["updatedBy"] == ADMIN["name"]
+
+    # 保存后的配置对下一次上报立即生效，新的第二步由上报人自己处理
+    hazard = _report(api)
+    assert (hazard["currentStepId"], hazard["currentExecutorId"]) == ("precheck", USER_A["id"])
+
+    missing = HazardApiStub(api.db_file, tmp_path / "fresh" / "hazard-workflow.json")
+    default = _ok(missing.handle("GET", "/api/hazards/workflow", USER_A["id"]))["data"]
+    missing.close()
+    assert [step["id"] for step in default["steps"]] == ["report", "assign", "rectify", "verify"]
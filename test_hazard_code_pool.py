@@ -0,0 +1,156 @@
+"""
+hazard_code_pool 隐患编号池测试（pytest）
+
+验证预生成跳过已占用的序号且重复执行只补差额、取号命中最小的预生成编号，
+回收各步骤（误释放纠正、去掉过期时间、重新置为可用、清理过期与已使用记录），以及 ehs-db code-pool 命令行。
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+import ehs_db
+import hazard_code_pool as pool
+
+TODAY = date(2026, 10, 19)
+NOW = 1_792_000_000_000
+DAY_MS = 86_400_000
+
+
+def _insert_hazards(db_file, codes):
+    with sqlite3.connect(db_file) as conn:
+        conn.execute(
+            'INSERT OR IGNORE INTO "User" ("id", "username", "name", "password", "updatedAt") '
+            "VALUES ('u1', 'reporter', '上报人', 'x', 0)"
+        )
+        conn.executemany(
+            'INSERT INTO "HazardRecord" ("id", "code", "type", "location", "desc", "reporterId", "reporterName", '
+            "\"createdAt\", \"updatedAt\") VALUES (?, ?, '设备', '车间', '描述', 'u1', '上报人', 0, 0)",
+            [(f"hz-{code}", code) for code in codes],
+        )
+
+
+def _pool(db_file) -> dict:
+    with sqlite3.connect(db_file) as conn:
+        return {row[0]: row[1:] for row in conn.execute(
+            'SELECT "code", "status", "expiresAt", "usedBy" FROM "HazardCodePool"'
+        )}
+
+
+@pytest.mark.parametrize("code, expected", [
+    ("Hazard20261019001", ("20261019", 1)),
+    ("Hazard20261019999", ("20261019", 999)),
+    ("Hazard2026101901", None),
+    ("HZ20261019001", None),
+    (None, None),
+])
+def test_parse_code(code, expected):
+    assert pool.parse_code(code) == expected
+
+
+def test_fill_skips_used_sequences_and_only_tops_up(migrated_db):
+    _insert_hazards(migrated_db, ["Hazard20261019001", "Hazard20261019003", "Hazard20261020001"])
+
+    report = pool.fill(migrated_db, days=3, depth=5, today=TODAY, now_ms=NOW)
+
+    assert report["added"] == {"20261019": 5, "20261020": 5, "20261021": 5}
+    codes = _pool(migrated_db)
+    assert sorted(c for c in codes if c.startswith("Hazard20261019")) == [
+        "Hazard20261019002", "Hazard20261019004", "Hazard20261019005", "Hazard20261019006", "Hazard20261019007",
+    ]
+    assert all(status == "available" and expires is None for status, expires, _ in codes.values())
+    assert report["depth_by_day"]["20261021"] == {"available": 5, "prefilled": 5, "used": 0}
+
+    with sqlite3.connect(migrated_db) as conn:
+        conn.isolation_level = None
+        assert pool.acquire_code(conn, "u1", now_ms=NOW, today=TODAY) == "Hazard20261019002"
+    again = pool.fill(migrated_db, days=3, depth=5, today=TODAY, now_ms=NOW)
+
+    assert again["added"] == {"20261019": 1, "20261020": 0, "20261021": 0}
+    assert "Hazard20261019008" in _pool(migrated_db)
+    assert again["depth_by_day"]["20261019"] == {"available": 5, "prefilled": 5, "used": 1}
+
+
+def test_acquire_prefers_permanent_then_unexpired_then_scans(migrated_db):
+    _insert_hazards(migrated_db, ["Hazard20261019001", "Hazard20261019002"])
+    with sqlite3.connect(migrated_db) as conn:
+        conn.isolation_level = None
+        assert pool.release_code(conn, "Hazard20261019005", "u2", now_ms=NOW)
+        assert not pool.release_code(conn, "bad-code", "u2", now_ms=NOW)
+
+        assert pool.acquire_code(conn, "u1", now_ms=NOW, today=TODAY) == "Hazard20261019005"
+        assert _pool(migrated_db)["Hazard20261019005"] == ("used", NOW + 30 * DAY_MS, "u1")
+        # 编号池里没有可用编号时扫描 HazardRecord，不写入编号池
+        assert pool.acquire_code(conn, "u1", now_ms=NOW, today=TODAY) == "Hazard20261019003"
+
+        # 永久有效的编号优先于序号更小的未过期编号
+        pool.release_code(conn, "Hazard20261019004", "u2", now_ms=NOW)
+        pool.release_code(conn, "Hazard20261019009", "u2", now_ms=NOW)
+        conn.execute('UPDATE "HazardCodePool" SET "expiresAt" = NULL WHERE "code" = \'Hazard20261019009\'')
+        assert pool.acquire_code(conn, "u1", now_ms=NOW, today=TODAY) == "Hazard20261019009"
+
+
+def test_acquire_raises_when_day_is_exhausted(migrated_db):
+    _insert_hazards(migrated_db, [f"Hazard20261019{n:03d}" for n in range(1, 1000)])
+    with sqlite3.connect(migrated_db) as conn:
+        with pytest.raises(pool.CodePoolExhausted, match="当天隐患编号已用尽"):
+            pool.acquire_code(conn, "u1", now_ms=NOW, today=TODAY)
+    assert pool.fill(migrated_db, days=1, today=TODAY, now_ms=NOW)["added"] == {"20261019": 0}
+
+
+def test_recycle_steps(migrated_db):
+    _insert_hazards(migrated_db, ["Hazard20261019001", "Hazard20261018001"])
+    stale = NOW - pool.STALE_USED_GRACE_MS - 1
+    with sqlite3.connect(migrated_db) as conn:
+        conn.isolation_level = None
+        release = lambda code, now=NOW: pool.release_code(conn, code, "u2", now_ms=now)  # noqa: E731
+        release("Hazard20261019001")  # 编号冲突回滚时误释放
+        release("Hazard20261019002")  # 当天作废释放，带 30 天过期
+        release("Hazard20261018002")  # 过去日期
+        release("Hazard20261201001", now=NOW - 40 * DAY_MS)  # 未来日期但已过期（先去掉过期时间，不删除）
+        for code, used_at in [("Hazard20261019003", stale), ("Hazard20261019004", NOW),
+                              ("Hazard20261018003", stale), ("Hazard20261018001", NOW - 100 * DAY_MS)]:
+            release(code)
+            conn.execute('UPDATE "HazardCodePool" SET "status" = \'used\', "usedAt" = ? WHERE "code" = ?',
+                         (used_at, code))
+
+    report = pool.recycle(migrated_db, batch=1, today=TODAY, now_ms=NOW)
+
+    assert report["steps"] == {"occupied": 1, "made_permanent": 2, "reclaimed": 1, "expired": 1, "purged_used": 2}
+    assert _pool(migrated_db) == {
+        "Hazard20261019001": ("used", NOW + 30 * DAY_MS, None),
+        "Hazard20261019002": ("available", None, None),
+        "Hazard20261201001": ("available", None, None),
+        "Hazard20261019003": ("available", None, None),
+        "Hazard20261019004": ("used", NOW + 30 * DAY_MS, None),
+    }
+    assert report["depth_by_day"]["20261019"] == {"available": 2, "prefilled": 0, "used": 2}
+
+    assert all(n == 0 for n in pool.recycle(migrated_db, today=TODAY, now_ms=NOW)["steps"].values())
+
+
+def test_pool_depth_past_days(migrated_db):
+    pool.fill(migrated_db, days=1, depth=3, today=date(2026, 10, 17), now_ms=NOW)
+    pool.fill(migrated_db, days=2, depth=2, today=TODAY, now_ms=NOW)
+
+    with sqlite3.connect(migrated_db) as conn:
+        assert list(pool.pool_depth(conn, TODAY)) == ["20261019", "20261020"]
+        assert pool.pool_depth(conn, TODAY, past_days=2)["20261017"] == {"available": 3, "prefilled": 3, "used": 0}
+
+
+def test_ehs_db_cli_code_pool(migrated_db, capsys):
+    assert ehs_db.main(["code-pool", "stats", "--db", str(migrated_db)]) == 0
+    assert ehs_db.main(["code-pool", "fill", "--db", str(migrated_db), "--days", "2", "--depth", "4"]) == 0
+    assert ehs_db.main(["code-pool", "recycle", "--db", str(migrated_db), "--batch", "10"]) == 0
+    assert ehs_db.main(["code-pool", "stats", "--db", str(migrated_db), "--low-water", "5"]) == 0
+    assert ehs_db.main(["code-pool", "stats", "--db", str(migrated_db.parent / "missing.db")]) == 1
+
+    output = capsys.readouterr().out
+    assert "编号池为空" in output
+    assert "新增 8 个编号" in output
+    assert "仍可用但已被隐患占用: 0" in output
+    assert "深度不足" in output
+    assert "未找到 SQLite 数据库" in output
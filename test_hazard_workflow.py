@@ -0,0 +1,192 @@
+"""
+hazard_workflow 工作流编译模型与流转模拟测试（pytest）
+
+验证状态表与后端 getStatusByStepId 一致、编译结果按文件 mtime 缓存、各处理人策略与抄送规则的解析、
+配置校验的发现项，以及模拟回放的计数。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+
+import pytest
+
+import ehs_db
+import hazard_workflow as hw
+from hazard_lifecycle import build_workflow_config
+
+
+USERS = [
+    {"id": "boss", "name": "总经理", "departmentId": "root", "jobTitle": "经理"},
+    {"id": "mgr", "name": "车间主任", "departmentId": "shop", "jobTitle": "经理"},
+    {"id": "safety", "name": "安全员甲", "departmentId": "team", "jobTitle": "安全员"},
+    {"id": "worker", "name": "工人乙", "departmentId": "shop", "jobTitle": "操作工"},
+    {"id": "lead", "name": "班长丙", "departmentId": "team", "jobTitle": "班长"},
+]
+DEPARTMENTS = [
+    {"id": "root", "name": "总公司", "parentId": None, "managerId": "boss"},
+    {"id": "shop", "name": "一车间", "parentId": "root", "managerId": "mgr"},
+    {"id": "team", "name": "一车间1班", "parentId": "shop", "managerId": "lead"},
+]
+HAZARD = {
+    "reporterId": "worker",
+    "reporterName": "工人乙",
+    "responsibleId": "lead",
+    "responsibleName": "班长丙",
+    "assignedDepartmentId": "team",
+    "location": "一车间东侧",
+    "type": "火灾",
+    "riskLevel": "high",
+}
+
+
+@pytest.fixture(params=[hw.Directory, hw.LinearDirectory], ids=["indexed", "linear"])
+def directory(request):
+    return request.param(USERS, DEPARTMENTS)
+
+
+def test_status_table_matches_backend_rules():
+    ids = ("report", "pre", "assign", "review", "rectify", "check", "verify", "archive")
+
+    assert hw.step_statuses(ids) == (
+        "reported", "assigned", "assigned", "assigned", "rectifying", "rectifying", "verified", "verified"
+    )
+    # 超出最后一步的索引按相对位置兜底，verify 之后仍是 verified
+    assert hw.status_for_step("archive", 12, ids) == "verified"
+    assert hw.status_for_step("extra", 3, ("report", "assign")) == "assigned"
+    assert hw.status_for_step("rectify", 0, ()) == "rectifying"
+
+
+def test_load_workflow_is_cached_by_mtime(tmp_path):
+    path = tmp_path / "hazard-workflow.json"
+    path.write_text(json.dumps(build_workflow_config()), encoding="utf-8")
+
+    first = hw.load_workflow(path)
+    assert hw.load_workflow(path) is first
+    assert first.step_ids[0] == "report"
+
+    config = build_workflow_config()
+    config["steps"].insert(2, {"id": "review", "name": "复核", "handlerStrategy": {"type": "reporter"}})
+    path.write_text(json.dumps(config), encoding="utf-8")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1_000_000))
+
+    second = hw.load_workflow(path)
+    assert second is not first
+    assert second.steps[second.index_by_id["review"]].status == "assigned"
+
+
+@pytest.mark.parametrize("strategy, expected", [
+    ({"type": "fixed", "fixedUsers": [{"userId": "safety"}, {"userId": "gone"}]}, ["safety"]),
+    ({"type": "fixed", "description": "执行人：上报人"}, ["worker"]),
+    ({"type": "fixed", "description": "由整改责任人处理"}, ["lead"]),
+    ({"type": "reporter"}, ["worker"]),
+    ({"type": "reporter_manager"}, ["mgr"]),
+    ({"type": "assigned_department_manager"}, ["lead"]),
+    # 责任人本身是班组负责人，主管取上级部门负责人
+    ({"type": "responsible_manager"}, ["mgr"]),
+    ({"type": "dept_manager", "targetDeptId": "root"}, ["boss"]),
+    ({"type": "role", "targetDeptId": "shop", "roleName": "安全"}, ["safety"]),
+    ({"type": "location_match", "rules": [{"location": "二车间", "deptId": "root"},
+                                          {"location": "一车间", "deptId": "shop"}]}, ["mgr"]),
+    ({"type": "type_match", "rules": [{"type": "火", "deptId": "team"}]}, ["lead"]),
+    ({"type": "risk_match", "rules": [{"riskLevel": "high", "deptId": "root"}]}, ["boss"]),
+    ({"type": "location_match", "locationMatches": [{"location": "一车间", "deptId": "shop"}]}, []),
+    ({"type": "unknown"}, []),
+])
+def test_handler_strategies(directory, strategy, expected):
+    resolve = hw.compile_handler(strategy)
+
+    assert [u["id"] for u in resolve(HAZARD, directory)] == expected
+
+
+def test_cc_rules_are_deduplicated_in_order(directory):
+    config = {"steps": [{
+        "id": "report",
+        "handlerStrategy": {"type": "reporter"},
+        "ccRules": [
+            {"type": "handler_manager"},
+            {"type": "reporter_manager"},
+            {"type": "fixed_users", "config": {"userIds": ["boss"], "userNames": ["总经理"]}},
+            {"type": "dept_by_location", "config": {"locationMatch": "一车间", "deptId": "team"}},
+            {"type": "dept_by_type", "config": {"typeMatch": "触电", "deptId": "root"}},
+            {"type": "role_match", "config": {"deptId": "shop", "roleName": "安全"}},
+            {"type": "responsible", "config": {}},
+        ],
+    }]}
+    step = hw.compile_workflow(config).steps[0]
+
+    handlers, cc = step.resolve(HAZARD, directory)
+
+    assert [u["id"] for u in handlers] == ["worker"]
+    # role_match 只看部门本身的成员，安全员在下级班组中不算
+    assert cc == ["mgr", "boss", "safety", "lead"]
+
+
+def test_validate_reports_config_problems():
+    config = {"steps": [
+        {"id": "report", "handlerStrategy": {"type": "fixed", "fixedUsers": [{"userId": "ghost"}]}},
+        {"id": "report", "handlerStrategy": {"type": "fixed"}},
+        {"id": "route", "handlerStrategy": {"type": "location_match", "locationMatches": [{"location": "x"}]}},
+        {"id": "approve", "handlerStrategy": {"type": "dept_manager", "targetDeptId": "nowhere", "approvalMode": "ALL"}},
+        {"id": "rectify", "handlerStrategy": {"type": "magic"},
+         "ccRules": [{"id": "c1", "type": "dept_by_type", "config": {"deptId": "shop"}}]},
+    ]}
+
+    issues = hw.validate_workflow(config, hw.Directory(USERS, DEPARTMENTS))
+    messages = [(i["level"], i["step"], i["message"]) for i in issues]
+
+    assert ("error", "report", "步骤 ID 重复") in messages
+    assert any(m[0] == "warning" and "verify" in m[2] for m in messages)
+    assert any(m[1] == "report" and "ghost" in m[2] for m in messages)
+    assert any(m[0] == "error" and "无法推断" in m[2] for m in messages)
+    assert any(m[1] == "route" and "rules" in m[2] for m in messages)
+    assert any(m[1] == "approve" and "nowhere" in m[2] for m in messages)
+    assert any(m[1] == "approve" and "ALL" in m[2] for m in messages)
+    assert any(m[1] == "rectify" and "magic" in m[2] for m in messages)
+    assert any(m[1] == "rectify" and "typeMatch" in m[2] for m in messages)
+    assert hw.validate_workflow(build_workflow_config()) == []
+
+
+def test_simulate_counts_transitions_and_stuck_hazards():
+    directory = hw.synthetic_directory(users=200, departments=12)
+    workflow = hw.compile_workflow(hw.synthetic_workflow(6, 3))
+
+    report = hw.simulate(workflow, directory, hazards=500, seed=2, reject_rate=0.5)
+    by_step = {entry["step"]: entry for entry in report["steps"]}
+
+    assert report["closed"] + report["stuck"] == 500
+    assert report["rejections"] > 0
+    assert report["transitions"] == sum(entry["entered"] for entry in report["steps"])
+    assert report["stuck"] == sum(entry["no_handler"] for entry in report["steps"])
+    assert by_step["report"]["entered"] == 500 and by_step["report"]["no_handler"] == 0
+    assert report["status_regressions"] == 0
+    # 固定 seed 可复现
+    again = hw.simulate(workflow, directory, hazards=500, seed=2, reject_rate=0.5)
+    assert (again["closed"], again["transitions"]) == (report["closed"], report["transitions"])
+
+
+def test_ehs_db_cli_workflow(snapshot_db, tmp_path, capsys):
+    config_file = tmp_path / "hazard-workflow.json"
+    config_file.write_text(json.dumps(build_workflow_config()), encoding="utf-8")
+    broken = tmp_path / "broken.json"
+    broken.write_text(json.dumps({"steps": [{"id": "report", "handlerStrategy": {"type": "nope"}}]}), encoding="utf-8")
+    empty = tmp_path / "empty.json"
+    empty.write_text(json.dumps({"steps": []}), encoding="utf-8")
+
+    argv = ["workflow", "check", "--db", str(snapshot_db), "--hazards", "200"]
+    assert ehs_db.main(argv + ["--file", str(config_file)]) == 0
+    assert ehs_db.main(argv + ["--file", str(broken)]) == 1
+    assert ehs_db.main(argv + ["--file", str(empty)]) == 1
+    assert ehs_db.main(["workflow", "bench", "--steps", "5", "--rules", "0", "2",
+                        "--users", "50", "--departments", "5", "--transitions", "500"]) == 0
+
+    output = capsys.readouterr().out
+    assert "模拟 200 条隐患" in output
+    assert "未知的处理人策略: nope" in output
+    assert "没有任何步骤" in output
+    assert output.count("模拟 200 条隐患") == 1 and output.count("跳过流转模拟") == 2
+    assert "µs/次" in output
+    with sqlite3.connect(snapshot_db) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM "HazardRecord"').fetchone()[0] == 0
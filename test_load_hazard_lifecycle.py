@@ -0,0 +1,230 @@
+"""
+load_hazard_lifecycle 隐患生命周期压测测试（pytest）
+
+用进程内的假 /api/hazards 服务（keep-alive，部分响应使用 chunked 编码）驱动压测，
+验证连接复用、每步延迟统计与错误率计算，以及连接池只在请求确定未送达（或方法幂等）时重试。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+
+import pytest
+
+import load_hazard_lifecycle
+
+
+class FakeHazardApi:
+    """按请求体推进状态的最小服务端；fail_step 每 fail_every 次返回 500"""
+
+    def __init__(self, fail_step: str = "", fail_every: int = 0):
+        self.hazards: dict[str, dict] = {}
+        self.ids = itertools.count(1)
+        self.connections = 0
+        self.requests = 0
+        self.fail_step = fail_step
+        self.fail_every = fail_every
+        self.fail_counter = 0
+
+    def route(self, method: str, path: str, payload):
+        if method == "GET" and path == "/api/hazards/workflow":
+            return 200, {"steps": []}
+        if method == "POST" and path == "/api/hazards":
+            hazard = {
+                "id": f"hz-{next(self.ids)}", "status": "assigned", "currentStepId": "confirm",
+                "currentStepIndex": 1, "currentExecutorId": "test-user-c",
+            }
+            self.hazards[hazard["id"]] = hazard
+            return 200, hazard
+        if method == "PATCH" and path == "/api/hazards":
+            if payload["currentStepId"] == self.fail_step:
+                self.fail_counter += 1
+                if self.fail_counter % self.fail_every == 0:
+                    return 500, {"error": "injected"}
+            hazard = self.hazards[payload["id"]]
+            hazard.update(
+                status=payload["status"],
+                currentStepId=payload["currentStepId"],
+                currentStepIndex=payload["currentStepIndex"],
+                currentExecutorId=payload["dopersonal_ID"],
+            )
+            return 200, hazard
+        if method == "POST" and path == "/api/hazards/void":
+            self.hazards[payload["hazardId"]]["isVoided"] = True
+            return 200, {"success": True}
+        return 404, {"error": "not found"}
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = self.route(method, path, json.loads(body) if body else None)
+                await asyncio.sleep(0.001)
+                data = json.dumps(payload).encode()
+                self.requests += 1
+                if self.requests % 2:
+                    half = len(data) // 2
+                    chunks = b"".join(b"%x\r\n%s\r\n" % (len(c), c) for c in (data[:half], data[half:]))
+                    writer.write(b"HTTP/1.1 %d X\r\nTransfer-Encoding: chunked\r\n\r\n%s0\r\n\r\n" % (status, chunks))
+                else:
+                    writer.write(b"HTTP/1.1 %d X\r\nContent-Length: %d\r\n\r\n%s" % (status, len(data), data))
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+def _run(api: FakeHazardApi, **kwargs) -> dict:
+    async def scenario():
+        server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await load_hazard_lifecycle.run_load(f"http://127.0.0.1:{port}", **kwargs)
+
+    return asyncio.run(scenario())
+
+
+class ScriptedServer:
+    """
+    按顺序对每个请求执行一个动作：ok 正常响应，close 响应后关闭连接，drop 读完请求后不响应直接断开，
+    bad-status / bad-length 返回畸形的状态行 / Content-Length
+    """
+
+    def __init__(self, *actions: str):
+        self.actions = list(actions)
+        self.received: list[str] = []
+
+    async def handle(self, reader, writer):
+        try:
+            while request_line := await reader.readline():
+                headers = {}
+                while (line := await reader.readline()) != b"\r\n":
+                    key, _, value = line.decode().partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers.get("content-length", 0)))
+                self.received.append(request_line.decode().split(" ", 1)[0])
+                action = self.actions.pop(0)
+                if action == "drop":
+                    break
+                if action == "bad-status":
+                    writer.write(b"HTTP/1.1 OK\r\nContent-Length: 0\r\n\r\n")
+                elif action == "bad-length":
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: two\r\n\r\n{}")
+                else:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+                if action == "close":
+                    break
+        finally:
+            writer.close()
+
+    def run(self, *methods: str) -> tuple[list, load_hazard_lifecycle.ConnectionPool]:
+        """依次发出请求（每个之间留出时间让客户端收到 FIN），返回每个请求的结果或异常"""
+        async def scenario():
+            server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+            pool = load_hazard_lifecycle.ConnectionPool(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            results = []
+            async with server:
+                for method in methods:
+                    try:
+                        results.append((await pool.request(method, "/api/hazards", json_body={})).status)
+                    except load_hazard_lifecycle.HttpError as e:
+                        results.append(e)
+                    await asyncio.sleep(0.05)
+                await pool.close()
+            return results, pool
+
+        return asyncio.run(scenario())
+
+
+def test_pool_does_not_resend_post_that_may_have_been_processed():
+    server = ScriptedServer("ok", "drop")
+
+    results, pool = server.run("POST", "POST")
+
+    assert results[0] == 200 and isinstance(results[1], load_hazard_lifecycle.HttpError)
+    assert server.received == ["POST", "POST"] and pool.retries == 0
+
+
+def test_pool_retries_idempotent_request_and_skips_closed_idle_connection():
+    # 第一个连接在响应后被服务端关闭：复用前就能发现，POST 直接走新连接，不算重试
+    server = ScriptedServer("close", "ok", "drop", "ok")
+
+    results, pool = server.run("POST", "POST", "GET")
+
+    assert results == [200, 200, 200]
+    assert server.received == ["POST", "POST", "GET", "GET"]
+    assert pool.retries == 1 and pool.opened == 3
+
+
+@pytest.mark.parametrize("action", ["bad-status", "bad-length"])
+def test_pool_reports_malformed_response_as_http_error(action):
+    server = ScriptedServer(action, "ok")
+
+    results, pool = server.run("POST", "POST")
+
+    assert isinstance(results[0], load_hazard_lifecycle.HttpError) and results[1] == 200
+    assert pool.opened == 2
+
+
+def test_percentile_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert load_hazard_lifecycle.percentile(values, 50) == 0.05
+    assert load_hazard_lifecycle.percentile(values, 99) == 0.099
+    assert load_hazard_lifecycle.percentile([0.2], 95) == 0.2
+    assert load_hazard_lifecycle.percentile([], 50) == 0.0
+
+
+def test_lifecycles_reuse_keepalive_connections():
+    api = FakeHazardApi()
+
+    report = _run(api, count=150, rate=3000, concurrency=40, connections=8)
+
+    assert report["lifecycles"] == {"started": 150, "completed": 150, "failed": 0}
+    assert list(report["transitions"]) == ["report", "confirm", "approve", "rectify", "close", "void"]
+    for stats in report["transitions"].values():
+        assert stats["count"] == 150
+        assert stats["errors"] == 0
+        assert 0 < stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"] <= stats["max_ms"]
+    assert report["connections_opened"] == api.connections <= 8
+    assert report["throughput"]["requests_per_s"] > 0
+    assert all(h["status"] == "closed" and h["isVoided"] for h in api.hazards.values())
+
+
+def test_failed_transitions_are_counted_per_step(capsys):
+    api = FakeHazardApi(fail_step="rectify", fail_every=5)
+
+    report = _run(api, count=50, rate=2000, concurrency=20, connections=4)
+
+    approve = report["transitions"]["approve"]
+    assert approve["errors"] == 10
+    assert approve["error_kinds"] == {"http_500": 10}
+    assert approve["error_rate"] == 0.2
+    assert report["lifecycles"]["failed"] == 10
+    assert report["transitions"]["rectify"]["count"] == 40
+    # 失败的流程同样被作废清理
+    assert report["transitions"]["void"]["count"] == 50
+
+    load_hazard_lifecycle.print_load_report(report)
+    output = capsys.readouterr().out
+    assert "http_500 ×10" in output
+    assert "完成 40，失败 10" in output
+
+
+def test_load_against_stub_server():
+    with load_hazard_lifecycle.stub_server() as base_url:
+        report = asyncio.run(load_hazard_lifecycle.run_load(base_url, count=60, rate=3000, concurrency=20, connections=8))
+
+    assert report["lifecycles"] == {"started": 60, "completed": 60, "failed": 0}
+    assert all(stats["errors"] == 0 for stats in report["transitions"].values())
+    assert report["connections_opened"] <= 8
@@ -0,0 +1,248 @@
+"""
+minio_s3 对象级增量备份测试（pytest）
+
+验证 SigV4 签名、分页列表、增量备份只下载新增或变化的对象并硬链接其余对象、
+恢复并发上传且重复恢复时跳过相同内容，docker_backup 的 s3 备份方式，
+以及 docker_restore 在 --no-restart 时给出补做命令、--only-minio-objects 只恢复对象。
+默认使用进程内的 S3 替身（s3_stub）；设置 EHS_S3_ENDPOINT（以及 EHS_S3_ACCESS_KEY、EHS_S3_SECRET_KEY）
+时改为对接本地 MinIO，测试在随机命名的桶中进行，结束后删除
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+
+import pytest
+
+import docker_backup
+import docker_restore
+import minio_s3
+import s3_stub
+
+EXTERNAL_ENDPOINT = os.getenv("EHS_S3_ENDPOINT")
+
+
+@pytest.fixture
+def s3():
+    """yield (客户端, 替身或 None, 两个空桶名)"""
+    if EXTERNAL_ENDPOINT:
+        client = minio_s3.S3Client(EXTERNAL_ENDPOINT, os.getenv("EHS_S3_ACCESS_KEY", "admin"),
+                                   os.getenv("EHS_S3_SECRET_KEY", ""))
+        buckets = [f"ehs-test-{secrets.token_hex(4)}-{name}" for name in ("private", "public")]
+        for bucket in buckets:
+            client.ensure_bucket(bucket)
+        yield client, None, buckets
+        for bucket in buckets:
+            for obj in list(client.list_objects(bucket)):
+                client.delete(bucket, obj.key)
+            client.delete(bucket)
+        return
+    stub = s3_stub.S3Stub(page_size=3)
+    with s3_stub.serve(stub) as endpoint:
+        client = minio_s3.S3Client(endpoint, stub.access_key, stub.secret_key)
+        buckets = list(minio_s3.DEFAULT_BUCKETS)
+        for bucket in buckets:
+            client.ensure_bucket(bucket)
+        yield client, stub, buckets
+
+
+def _put(client, bucket, key, data: bytes, content_type="application/octet-stream"):
+    src = _put.tmp / hashlib.md5(f"{bucket}/{key}".encode()).hexdigest()
+    src.write_bytes(data)
+    return client.upload(bucket, key, src, content_type)
+
+
+@pytest.fixture
+def seeded(s3, tmp_path):
+    client, stub, (private, public) = s3
+    _put.tmp = tmp_path
+    objects = {
+        (private, "hazards/2026/10/a.jpg"): (b"a" * 3000, "image/jpeg"),
+        (private, "hazards/2026/10/中文 文件+1.pdf"): (b"pdf" * 100, "application/pdf"),
+        (private, "signatures/u1.png"): (b"png", "image/png"),
+        (public, "docs/manual.pdf"): (b"m" * 70_000, "application/pdf"),
+        (public, "docs/empty.txt"): (b"", "text/plain"),
+        (public, "thumbs/x.webp"): (b"w" * 10, "image/webp"),
+        (public, "thumbs/y.webp"): (b"y" * 11, "image/webp"),
+    }
+    for (bucket, key), (data, content_type) in objects.items():
+        _put(client, bucket, key, data, content_type)
+    return client, stub, (private, public), objects
+
+
+def test_signature_matches_aws_example():
+    """AWS 文档中 GET Object 的签名示例"""
+    headers = {
+        "host": "examplebucket.s3.amazonaws.com",
+        "range": "bytes=0-9",
+        "x-amz-content-sha256": minio_s3.EMPTY_SHA256,
+        "x-amz-date": "20130524T000000Z",
+    }
+    assert minio_s3.signature(
+        "wJalrXUtnFEMI/K7MDENG/bPxRfiCYEXAMPLEKEY", "GET", "/test.txt", "", headers, sorted(headers),
+        minio_s3.EMPTY_SHA256, "20130524T000000Z",
+    ) == "f0e8bdb87c964420e857bd35b5d6ed310bd44f0170aba48dd91039c6036bdb41"
+
+
+def test_wrong_secret_is_rejected(s3):
+    client, _, (private, _) = s3
+    wrong = minio_s3.S3Client(client.endpoint, client.access_key, "not-the-secret")
+
+    with pytest.raises(minio_s3.S3Error) as info:
+        list(wrong.list_objects(private))
+    assert info.value.status == 403 and info.value.code == "SignatureDoesNotMatch"
+
+
+def test_list_objects_pages_in_key_order(seeded):
+    client, _, (private, public), objects = seeded
+
+    listed = list(client.list_objects(public))
+
+    assert {private, public} <= set(client.list_buckets())
+    assert [obj.key for obj in listed] == sorted(key for bucket, key in objects if bucket == public)
+    manual = next(obj for obj in listed if obj.key == "docs/manual.pdf")
+    assert (manual.size, manual.etag) == (70_000, hashlib.md5(b"m" * 70_000).hexdigest())
+    assert [obj.key for obj in client.list_objects(private, prefix="hazards/")] == [
+        "hazards/2026/10/a.jpg", "hazards/2026/10/中文 文件+1.pdf",
+    ]
+
+
+def test_incremental_backup_downloads_only_changes(seeded, tmp_path):
+    client, stub, (private, public), objects = seeded
+    first_dir = tmp_path / "backups" / "backup-20261018-020000"
+    second_dir = tmp_path / "backups" / "backup-20261019-020000"
+
+    first = minio_s3.backup_objects(client, first_dir, buckets=[private, public], workers=3)
+
+    assert (first["objects"], first["downloaded"], first["linked"], first["failed"]) == (7, 7, 0, [])
+    assert minio_s3.find_previous_index(tmp_path / "backups", exclude=second_dir) == \
+        first_dir / "minio-objects" / "index.json"
+
+    _put(client, private, "signatures/u1.png", b"new-png", "image/png")
+    _put(client, public, "docs/new.pdf", b"n" * 5)
+    client.delete(public, "thumbs/y.webp")
+    if stub:
+        stub.requests.clear()
+
+    second = minio_s3.backup_objects(client, second_dir, buckets=[private, public], workers=3,
+                                     previous_index=Path(first["index"]))
+
+    assert (second["objects"], second["downloaded"], second["linked"]) == (7, 2, 5)
+    assert second["downloaded_bytes"] == len(b"new-png") + 5
+    index = minio_s3.load_index(second_dir / "minio-objects" / "index.json")
+    assert "thumbs/y.webp" not in index[public]
+    assert index[private]["hazards/2026/10/中文 文件+1.pdf"]["contentType"] == "application/pdf"
+    old, new = (d / "minio-objects" / private / "hazards" / "2026" / "10" / "a.jpg" for d in (first_dir, second_dir))
+    assert os.path.samefile(old, new)
+    assert (second_dir / "minio-objects" / private / "signatures" / "u1.png").read_bytes() == b"new-png"
+    assert (first_dir / "minio-objects" / private / "signatures" / "u1.png").read_bytes() == b"png"
+    if stub:
+        assert stub.requests[("GET", "object")] == 2
+
+
+def test_backup_verifies_content_and_skips_unsafe_keys(s3, tmp_path):
+    client, stub, (private, _) = s3
+    if stub is None:
+        pytest.skip("需要替身构造分段 ETag 与非法键")
+    stub.put_object(private, "multi/part.bin", b"p" * 100, etag="0123456789abcdef0123456789abcdef-2")
+    stub.put_object(private, "bad/etag.bin", b"x", etag="0" * 32)
+    stub.put_object(private, "../escape.txt", b"e")
+    stub.put_object(private, "folder/", b"")
+
+    report = minio_s3.backup_objects(client, tmp_path / "backup-1", buckets=[private])
+
+    assert report["objects"] == 1
+    assert [f["object"] for f in report["failed"]] == [f"{private}/bad/etag.bin"]
+    assert sorted(report["skipped"]) == [f"{private}/../escape.txt", f"{private}/folder/"]
+    assert not (tmp_path / "escape.txt").exists()
+    assert not (tmp_path / "backup-1" / "minio-objects" / private / "bad" / "etag.bin").exists()
+    index = json.loads((tmp_path / "backup-1" / "minio-objects" / "index.json").read_text(encoding="utf-8"))
+    assert index["buckets"][private]["multi/part.bin"]["md5"] == hashlib.md5(b"p" * 100).hexdigest()
+
+
+def test_restore_uploads_in_parallel_and_skips_identical(seeded, tmp_path):
+    client, stub, (private, public), objects = seeded
+    session = tmp_path / "backup-20261019-020000"
+    minio_s3.backup_objects(client, session, buckets=[private, public], workers=4)
+    for bucket in (private, public):
+        for obj in list(client.list_objects(bucket)):
+            client.delete(bucket, obj.key)
+    client.delete(public)
+    _put(client, private, "hazards/2026/10/a.jpg", b"a" * 3000, "image/jpeg")  # 已存在相同内容
+    if stub:
+        stub.connections = 0
+
+    report = minio_s3.restore_objects(client, session, workers=4)
+
+    assert (report["uploaded"], report["unchanged"], report["failed"]) == (6, 1, [])
+    for (bucket, key), (data, content_type) in objects.items():
+        dest = tmp_path / "restored" / bucket / key
+        size, md5, restored_type = client.download(bucket, key, dest)
+        assert (dest.read_bytes(), restored_type) == (data, content_type)
+    if stub:
+        # 主线程列表连接 + 最多 4 个上传线程各一个连接
+        assert stub.connections <= 5
+
+    again = minio_s3.restore_objects(client, session, workers=4)
+    assert (again["uploaded"], again["unchanged"]) == (0, 7)
+
+
+def test_docker_backup_s3_mode_uses_env_credentials(s3, tmp_path, monkeypatch, capsys):
+    client, stub, _ = s3
+    if stub is None:
+        pytest.skip("docker_backup 固定备份 ehs-private/ehs-public")
+    stub.put_object("ehs-private", "hazards/a.jpg", b"a" * 10)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".env.docker").write_text(
+        f"MINIO_PRIMARY_ENDPOINT={client.endpoint}\nMINIO_ACCESS_KEY={stub.access_key}\n"
+        f"MINIO_SECRET_KEY={stub.secret_key}  # 注释\n",
+        encoding="utf-8",
+    )
+    for name in ("MINIO_PRIMARY_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY"):
+        monkeypatch.delenv(name, raising=False)
+
+    first = docker_backup.backup_minio_objects(tmp_path / "backups" / "backup-20261018-020000")
+    second = docker_backup.backup_minio_objects(tmp_path / "backups" / "backup-20261019-020000")
+
+    assert first.name == "index.json" and second.exists()
+    output = capsys.readouterr().out
+    assert "本次为全量" in output
+    assert "下载 0 个（0.00 MB），沿用上次备份 1 个" in output
+
+
+def test_docker_restore_defers_objects_until_minio_runs(s3, tmp_path, monkeypatch, capsys):
+    client, stub, _ = s3
+    if stub is None:
+        pytest.skip("docker_restore 固定恢复 ehs-private/ehs-public")
+    stub.put_object("ehs-private", "hazards/a.jpg", b"a" * 10)
+    session = tmp_path / "backups" / "backup-20261019-020000"
+    minio_s3.backup_objects(client, session, buckets=["ehs-private"])
+    client.delete("ehs-private", "hazards/a.jpg")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / ".env.docker").write_text(
+        f"MINIO_PRIMARY_ENDPOINT={client.endpoint}\nMINIO_ACCESS_KEY={stub.access_key}\n"
+        f"MINIO_SECRET_KEY={stub.secret_key}\n",
+        encoding="utf-8",
+    )
+    for name in ("MINIO_PRIMARY_ENDPOINT", "MINIO_ACCESS_KEY", "MINIO_SECRET_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr("builtins.input", lambda prompt: "yes")
+
+    # --no-restart：不启动 MinIO，也不等待上传，只给出补做命令
+    monkeypatch.setattr("sys.argv", ["docker_restore.py", "--backup-dir", str(session), "--no-restart",
+                                     "--skip-env", "--skip-uploads"])
+    docker_restore.main()
+    output = capsys.readouterr().out
+    assert f"--backup-dir {session} --only-minio-objects" in output
+    assert list(client.list_objects("ehs-private")) == []
+
+    monkeypatch.setattr("sys.argv", ["docker_restore.py", "--backup-dir", str(session), "--only-minio-objects"])
+    with pytest.raises(SystemExit) as info:
+        docker_restore.main()
+    assert info.value.code == 0
+    assert "上传 1 个" in capsys.readouterr().out
+    assert [obj.key for obj in client.list_objects("ehs-private")] == ["hazards/a.jpg"]
@@ -0,0 +1,221 @@
+"""
+ops_metrics 运行指标采集测试（pytest）
+
+验证环形缓冲的回绕与跨进程读取、各采样函数（健康检查、docker stats 解析、文件大小、备份时间），
+分位数与趋势统计，以及 collect --once 与 status 命令行。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ops_metrics
+
+
+@pytest.fixture
+def health_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status = 200 if self.path == "/api/health" else 503
+            self.send_response(status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_ring_wraps_and_is_readable_from_another_handle(tmp_path):
+    path = tmp_path / "metrics.ring"
+    with ops_metrics.MetricsRing.create(path, ["a", "b"], capacity=5) as ring:
+        size = path.stat().st_size
+        for n in range(1, 13):
+            ring.append(1000.0 + n, {"a": float(n)} if n % 2 else {"a": float(n), "b": n * 10.0})
+
+        with ops_metrics.MetricsRing.open(path) as reader:
+            samples = reader.samples()
+            assert reader.written == 12
+            assert [ts for ts, _ in reader.samples(since=1010.5)] == [1011.0, 1012.0]
+            assert len(reader.samples(limit=2)) == 2
+
+    assert path.stat().st_size == size
+    assert [values["a"] for _, values in samples] == [8.0, 9.0, 10.0, 11.0, 12.0]
+    assert samples[-1][1]["b"] == 120.0 and math.isnan(samples[-2][1]["b"])
+
+
+def test_reader_skips_slot_being_overwritten(tmp_path):
+    path = tmp_path / "metrics.ring"
+    with ops_metrics.MetricsRing.create(path, ["a"], capacity=3) as ring:
+        for n in range(1, 5):
+            ring.append(float(n), {"a": float(n)})
+        # 写入第 5 个样本时先清零了槽位序号
+        ring._map[ring._offset(5):ring._offset(5) + 8] = bytes(8)
+
+        assert [ts for ts, _ in ring.samples()] == [3.0, 4.0]
+
+
+def test_open_for_writing_recreates_on_schema_change(tmp_path):
+    path = tmp_path / "metrics.ring"
+    with ops_metrics.MetricsRing.create(path, ["old"], capacity=4) as ring:
+        ring.append(1.0, {"old": 1.0})
+    path.with_name("metrics.ring.tmp").write_bytes(b"")
+
+    with ops_metrics.MetricsRing.open_for_writing(path, capacity=8) as ring:
+        assert ring.fields == ops_metrics.FIELDS and ring.capacity == 8 and ring.written == 0
+        ring.append(2.0, {"health_ms": 3.0})
+    with ops_metrics.MetricsRing.open_for_writing(path, capacity=8) as ring:
+        assert ring.written == 1
+
+    assert ops_metrics.MetricsRing.open(tmp_path / "metrics.ring.old").fields == ["old"]
+    (tmp_path / "garbage.ring").write_bytes(b"x" * 2000)
+    with pytest.raises(ValueError, match="不是指标环形缓冲文件"):
+        ops_metrics.MetricsRing.open(tmp_path / "garbage.ring")
+
+
+def test_sample_health(health_server):
+    ok = ops_metrics.sample_health(f"{health_server}/api/health")
+    failed = ops_metrics.sample_health(f"{health_server}/missing")
+    down = ops_metrics.sample_health("http://127.0.0.1:9/api/health", timeout=0.5)
+
+    assert ok["health_ok"] == 1.0 and ok["health_ms"] > 0
+    assert failed["health_ok"] == 0.0 and math.isnan(failed["health_ms"])
+    assert down["health_ok"] == 0.0
+
+
+def test_parse_docker_stats():
+    output = "\n".join(json.dumps(entry) for entry in [
+        {"Name": "ehs-app", "CPUPerc": "12.50%", "MemUsage": "256MiB / 1.944GiB"},
+        {"Name": "other", "CPUPerc": "99%", "MemUsage": "1GiB / 2GiB"},
+    ])
+
+    values = ops_metrics.parse_docker_stats(output)
+
+    assert values["app_cpu"] == 12.5 and values["app_mem_mb"] == 256.0
+    assert math.isnan(values["minio_cpu"]) and math.isnan(values["minio_mem_mb"])
+    assert ops_metrics.parse_size("1.5GiB") == 1.5 * 1024 ** 3
+    assert ops_metrics.parse_size("800kB") == 800_000
+    assert ops_metrics.parse_size("12B") == 12
+
+
+def test_file_samplers(tmp_path):
+    db_file = tmp_path / "ehs.db"
+    db_file.write_bytes(b"d" * 1024 ** 2)
+    (tmp_path / "ehs.db-wal").write_bytes(b"w" * 512 * 1024)
+    minio = tmp_path / "minio-data"
+    (minio / "ehs-private" / "a" / "xl.meta").parent.mkdir(parents=True)
+    (minio / "ehs-private" / "a" / "xl.meta").write_bytes(b"m" * 1024 ** 2)
+    (minio / "ehs-public.txt").write_bytes(b"p" * 1024 ** 2)
+    old, new = tmp_path / "backups" / "backup-20261017-020000", tmp_path / "backups" / "backup-20261018-020000"
+    for session, age_h in [(old, 50), (new, 30)]:
+        session.mkdir(parents=True)
+        (session / "backup-manifest.txt").write_text("EHS 系统备份清单")
+        os.utime(session / "backup-manifest.txt", (1_000_000 - age_h * 3600,) * 2)
+    (tmp_path / "backups" / "backup-20261019-020000").mkdir()  # 未完成的备份没有清单
+
+    assert ops_metrics.sample_database(db_file) == {"db_mb": 1.0, "wal_mb": 0.5}
+    assert math.isnan(ops_metrics.sample_database(tmp_path / "missing.db")["db_mb"])
+    assert ops_metrics.sample_minio_data(minio) == {"minio_data_mb": 2.0}
+    assert ops_metrics.sample_backup_age(tmp_path / "backups", now=1_000_000) == {"backup_age_h": 30.0}
+    assert math.isnan(ops_metrics.sample_backup_age(tmp_path / "none")["backup_age_h"])
+
+
+def test_collect_samples_only_due_metrics():
+    calls = []
+    samplers = [
+        ops_metrics.Sampler("fast", 10, lambda: calls.append("fast") or {"health_ms": 5.0}),
+        ops_metrics.Sampler("slow", 25, lambda: calls.append("slow") or {"db_mb": 1.0}),
+    ]
+    clock = [0.0]
+    appended = []
+
+    class Ring:
+        def append(self, timestamp, values):
+            appended.append(values)
+            if len(appended) == 4:
+                raise KeyboardInterrupt
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    with pytest.raises(KeyboardInterrupt):
+        ops_metrics.collect(Ring(), samplers, sleep=sleep, clock=lambda: clock[0])
+
+    # t=0 两者，t=10 fast，t=20 fast，t=25 slow
+    assert calls == ["fast", "slow", "fast", "fast", "slow"]
+    assert [sorted(k for k in values if k != "collector_cpu") for values in appended] == [
+        ["db_mb", "health_ms"], ["health_ms"], ["health_ms"], ["db_mb"],
+    ]
+
+
+def test_summarize_percentiles_and_trends():
+    samples = [(3600.0 * i / 10, {"health_ms": float(10 + i), "db_mb": 100.0 + i, "health_ok": 1.0})
+               for i in range(11)]
+    samples.append((3700.0, {"health_ms": math.nan, "db_mb": math.nan, "health_ok": 0.0}))
+
+    summary = ops_metrics.summarize(samples, 0, 3700)
+
+    latency = summary["health_ms"]
+    assert (latency["count"], latency["last"], latency["p50"], latency["p95"], latency["max"]) == (11, 20, 15, 20, 20)
+    assert latency["trend"] == pytest.approx((17.5 - 12) / 12)
+    assert summary["db_mb"]["trend"] == pytest.approx(10.0)  # 每小时 +10MB
+    assert len(latency["spark"]) == 12 and latency["spark"][0] == "▁" and latency["spark"][-1] == "█"
+    assert "app_cpu" not in summary
+
+
+def test_cli_collect_once_and_status(tmp_path, health_server, capsys):
+    ring = tmp_path / "ops-metrics.ring"
+    db_file = tmp_path / "ehs.db"
+    db_file.write_bytes(b"d" * 2048)
+    base = ["--ring", str(ring)]
+    collect = base + ["collect", "--once", "--capacity", "16", "--health-url", f"{health_server}/api/health",
+                      "--db", str(db_file), "--minio-data", str(tmp_path / "minio"),
+                      "--backup-dir", str(tmp_path / "backups")]
+
+    assert ops_metrics.main(base + ["status"]) == 1
+    for _ in range(3):
+        assert ops_metrics.main(collect) == 0
+    with ops_metrics.MetricsRing.open(ring) as reader:
+        reader_samples = reader.samples()
+    started = time.perf_counter()
+    assert ops_metrics.main(base + ["status", "--minutes", "5"]) == 0
+    elapsed = time.perf_counter() - started
+
+    output = capsys.readouterr().out
+    assert len(reader_samples) == 3 and reader_samples[0][1]["health_ok"] == 1.0
+    assert "未找到指标文件" in output
+    assert "最近 5 分钟，3 个样本" in output
+    assert "健康检查延迟 (ms)" in output and "ehs.db (MB)" in output
+    assert "健康检查失败" not in output
+    assert elapsed < 1.0
+
+
+def test_status_warnings(tmp_path, capsys):
+    ring_path = tmp_path / "ops-metrics.ring"
+    now = time.time()
+    with ops_metrics.MetricsRing.create(ring_path) as ring:
+        ring.append(now - 7200, {"health_ok": 1.0})  # 窗口之外
+        ring.append(now - 60, {"health_ok": 0.0, "backup_age_h": 40.0, "collector_cpu": 3.0})
+        ring.append(now - 30, {"health_ok": 0.0, "collector_cpu": 2.0})
+
+    assert ops_metrics.print_status(ring_path, 10, now=now) == 0
+
+    output = capsys.readouterr().out
+    assert "2 个样本" in output
+    assert "健康检查失败 2 次，最近一次失败" in output
+    assert "最近一次备份在 40 小时前" in output
+    assert "请调大采样间隔" in output
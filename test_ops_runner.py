@@ -0,0 +1,105 @@
+"""
+ops_runner 公共命令执行器测试（pytest）
+
+用 python -c 子进程模拟 docker/tar 等命令，验证流式输出、并发、超时与取消。
+"""
+
+from __future__ import annotations
+
+import subprocess
+import sys
+import time
+
+import pytest
+
+import ops_runner
+
+
+def _py(code: str) -> list[str]:
+    return [sys.executable, "-c", code]
+
+
+def test_lines_are_streamed_before_the_command_exits():
+    arrivals = []
+    started = time.perf_counter()
+
+    def on_output(stream_name, line):
+        arrivals.append((stream_name, line, time.perf_counter() - started))
+
+    result = ops_runner.run_command(
+        _py("import sys, time\nprint('first', flush=True)\ntime.sleep(0.5)\nprint('second')\nprint('oops', file=sys.stderr)"),
+        on_output=on_output,
+        echo=False,
+    )
+
+    assert result.returncode == 0
+    assert result.stdout == "first\nsecond\n"
+    assert result.stderr == "oops\n"
+    first = next(a for a in arrivals if a[1] == "first\n")
+    assert first[2] < result.duration - 0.3
+
+
+def test_binary_chunks_without_capture_keep_memory_flat():
+    received = bytearray()
+    result = ops_runner.run_command(
+        _py("import sys\nsys.stdout.buffer.write(b'x' * 300000)"),
+        binary=True,
+        capture=False,
+        echo=False,
+        on_output=lambda stream_name, chunk: received.extend(chunk),
+    )
+
+    assert len(received) == 300000
+    assert result.bytes_out == 300000
+    assert result.stdout == ""
+
+
+def test_stdin_chunks_are_fed_to_the_process():
+    result = ops_runner.run_command(
+        _py("import sys\nprint(len(sys.stdin.buffer.read()))"),
+        stdin_chunks=(b"a" * 1000 for _ in range(100)),
+        echo=False,
+    )
+    assert result.stdout.strip() == "100000"
+
+
+def test_timeout_terminates_the_process():
+    with pytest.raises(subprocess.TimeoutExpired):
+        ops_runner.run_command(_py("import time\ntime.sleep(30)"), timeout=0.3, echo=False)
+    assert ops_runner.COMMAND_HISTORY[-1].timed_out
+    assert ops_runner.COMMAND_HISTORY[-1].duration < 10
+
+
+def test_independent_commands_run_concurrently():
+    started = time.perf_counter()
+    results = ops_runner.run_commands(
+        [_py(f"import time\ntime.sleep(0.5)\nprint({i})") for i in range(4)],
+        echo=False,
+    )
+
+    assert [r.stdout.strip() for r in results] == ["0", "1", "2", "3"]
+    assert time.perf_counter() - started < 1.5
+
+
+def test_failure_cancels_the_remaining_commands():
+    started = time.perf_counter()
+    with pytest.raises(subprocess.CalledProcessError):
+        ops_runner.run_commands(
+            [_py("import sys\nsys.exit(3)"), _py("import time\ntime.sleep(30)")],
+            echo=False,
+        )
+    assert time.perf_counter() - started < 10
+    assert ops_runner.COMMAND_HISTORY[-1].cancelled
+
+
+def test_background_command_stops_on_request():
+    lines = []
+    command = ops_runner.BackgroundCommand(
+        _py("import time\nwhile True:\n    print('tick', flush=True)\n    time.sleep(0.05)"),
+        lambda stream_name, line: lines.append(line),
+    ).start()
+    time.sleep(0.3)
+    command.stop()
+
+    assert "tick\n" in lines
+    assert ops_runner.COMMAND_HISTORY[-1].cancelled
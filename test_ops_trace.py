@@ -0,0 +1,102 @@
+"""
+ops_trace 阶段追踪测试（pytest）
+
+验证嵌套区间、子进程区间、字节数标注，以及追踪文件的写出与对比。
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+
+import pytest
+
+import ops_runner
+import ops_trace
+
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    tracer = ops_trace.Tracer(tmp_path / "trace.json")
+    monkeypatch.setattr(ops_trace, "TRACER", tracer)
+    return tracer
+
+
+def _events(tracer, name):
+    return [e for e in tracer.events if e["name"] == name]
+
+
+def test_spans_are_noops_without_tracing(monkeypatch):
+    monkeypatch.setattr(ops_trace, "TRACER", None)
+
+    @ops_trace.traced("stage")
+    def stage():
+        ops_trace.annotate(bytes=1)
+        return 42
+
+    assert stage() == 42
+
+
+def test_nested_stages_record_parent_bytes_and_subprocesses(tracer):
+    @ops_trace.traced("backup.database")
+    def backup_database():
+        ops_runner.run_command([sys.executable, "-c", "print('x' * 999)"], echo=False)
+        ops_trace.annotate(bytes=1234)
+
+    with ops_trace.span("backup"):
+        backup_database()
+
+    (outer,) = _events(tracer, "backup")
+    (inner,) = _events(tracer, "backup.database")
+    (proc,) = [e for e in tracer.events if e["cat"] == "subprocess"]
+
+    assert inner["args"]["parent"] == "backup"
+    assert inner["args"]["bytes"] == 1234
+    assert "cpu_s" in inner["args"]
+    assert outer["ts"] <= inner["ts"] and inner["dur"] <= outer["dur"]
+
+    assert proc["args"]["parent"] == "backup.database"
+    assert proc["args"]["returncode"] == 0
+    assert proc["args"]["bytes"] == 1000
+    assert proc["tid"] >= ops_trace.SUBPROCESS_LANE_BASE
+
+
+def test_failed_stage_records_error(tracer):
+    @ops_trace.traced("restore.database")
+    def restore_database():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        restore_database()
+
+    (event,) = _events(tracer, "restore.database")
+    assert "boom" in event["args"]["error"]
+
+
+def test_concurrent_commands_get_separate_lanes(tracer):
+    sleeper = [sys.executable, "-c", "import time; time.sleep(0.2)"]
+    ops_runner.run_commands([sleeper, sleeper], echo=False)
+
+    lanes = {e["tid"] for e in tracer.events if e["cat"] == "subprocess"}
+    assert len(lanes) == 2
+
+
+def test_written_traces_can_be_compared(tracer, tmp_path, capsys):
+    with ops_trace.span("update.build"):
+        ops_trace.annotate(bytes=10)
+    tracer.write()
+
+    data = json.loads(tracer.trace_file.read_text(encoding="utf-8"))
+    assert data["metadata"]["host"]
+    assert any(e["name"] == "update.build" for e in data["traceEvents"])
+
+    current = tmp_path / "current.json"
+    data["traceEvents"] = [dict(e, dur=e["dur"] * 2 + 1000) for e in data["traceEvents"] if e["ph"] == "X"]
+    current.write_text(json.dumps(data), encoding="utf-8")
+
+    totals = ops_trace.load_stage_totals(current)
+    assert totals["update.build"]["bytes"] == 10
+
+    ops_trace.compare_traces(tracer.trace_file, current)
+    out = capsys.readouterr().out
+    assert "update.build" in out and "+" in out
@@ -0,0 +1,94 @@
+"""
+热点查询执行计划回归测试（pytest）
+
+对 prisma/query-plans.json 中的每条查询执行 EXPLAIN QUERY PLAN：
+出现未标注为已知的全表扫描或临时排序 B-tree 即失败，失败信息附带覆盖索引建议。
+默认在按 prisma/migrations 建立的空库上检查；设置 EHS_PLAN_DB=<数据库文件>
+可改为在生产数据库的副本（含 sqlite_stat1 统计信息）上检查。
+"""
+
+from __future__ import annotations
+
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+import db_query_plans
+
+CATALOG = db_query_plans.load_catalog()
+
+
+@pytest.fixture(scope="module")
+def plan_db(tmp_path_factory):
+    db_file = os.environ.get("EHS_PLAN_DB")
+    workdir = tmp_path_factory.mktemp("plans")
+    with closing(db_query_plans.open_copy(Path(db_file) if db_file else None, workdir)) as conn:
+        yield conn
+
+
+@pytest.mark.parametrize("entry", CATALOG, ids=[entry["name"] for entry in CATALOG])
+def test_hot_query_plan_has_no_new_scans(plan_db, entry):
+    result = db_query_plans.check_entry(plan_db, entry, db_query_plans.table_names(plan_db))
+
+    assert result.error is None, result.error
+    assert result.ok, "\n".join(
+        [f"{entry['name']} 执行计划退化:"] + result.plan + ["建议:"] + result.suggestions
+    )
+
+
+def test_dropped_index_is_reported_with_suggestion(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute('DROP INDEX "HazardCodePool_datePrefix_sequence_idx"')
+    conn.execute('DROP INDEX "HazardCodePool_datePrefix_status_idx"')
+    conn.execute('DROP INDEX "HazardCodePool_status_idx"')
+    conn.execute('DROP INDEX "HazardCodePool_expiresAt_idx"')
+    entry = next(e for e in CATALOG if e["name"] == "code_pool.next_permanent")
+
+    result = db_query_plans.check_entry(conn, entry, db_query_plans.table_names(conn))
+    conn.close()
+
+    assert not result.ok
+    assert any(detail.startswith("SCAN") for detail in result.issues)
+    assert any(detail.startswith("USE TEMP B-TREE") for detail in result.issues)
+    assert result.suggestions[0].startswith(
+        'CREATE INDEX "HazardCodePool_datePrefix_status_expiresAt_sequence_code_idx"'
+    )
+
+
+def test_open_copy_escapes_special_characters_in_path(migrated_db, tmp_path):
+    db_file = tmp_path / "备份 #1?50%" / "ehs.db"
+    db_file.parent.mkdir()
+    shutil.copy(migrated_db, db_file)
+
+    with closing(db_query_plans.open_copy(db_file, tmp_path)) as conn:
+        assert "HazardRecord" in db_query_plans.table_names(conn)
+
+
+def test_subquery_alias_resolves_to_table():
+    sql = db_query_plans.normalize_sql(next(e for e in CATALOG if e["name"] == "hazards.my_tasks")["sql"])
+    assert db_query_plans.order_by_table(sql) == "HazardRecord"
+    assert "HazardVisibility" in db_query_plans.suggest_index(sql, "HazardVisibility")
+
+
+def test_capture_merges_queries_from_app_log(tmp_path):
+    log_lines = [
+        "prisma:query BEGIN",
+        'prisma:query SELECT `main`.`Notification`.`id` FROM `main`.`Notification` WHERE `main`.`Notification`.`userId` = ? LIMIT ? OFFSET ?',
+        'prisma:query SELECT `main`.`Notification`.`id` FROM `main`.`Notification` WHERE `main`.`Notification`.`userId` = ? LIMIT ? OFFSET ?',
+        "GET /api/notifications 200 in 12ms",
+        f"prisma:query {CATALOG[0]['sql']}",
+    ]
+    counts = db_query_plans.extract_queries(log_lines)
+    assert len(counts) == 2
+
+    catalog = [dict(entry) for entry in CATALOG]
+    merged = db_query_plans.merge_captured(catalog, counts)
+
+    assert len(merged) == len(CATALOG) + 1
+    assert merged[-1]["name"] == "captured.Notification.1"
+    assert merged[-1]["captured_count"] == 2
+    assert merged[0]["captured_count"] == 1